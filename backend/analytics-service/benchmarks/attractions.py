@@ -0,0 +1,140 @@
+"""
+Attraction benchmark: storage and peak allocations of the attraction paths.
+
+A fresh interpreter fills a throwaway SQLite database with a year of hourly
+rows for 60 attractions with UUID ids (525,600 rows by default), reports the
+size of attraction_analytics and its indexes (from dbstat), then runs each
+endpoint under tracemalloc and reports its peak allocations and time.
+--service-dir points the run at another checkout of backend/analytics-service,
+so two versions can be compared on the same data, e.g.:
+
+    git worktree add /tmp/before <commit>
+    python benchmarks/attractions.py --service-dir /tmp/before/backend/analytics-service
+    python benchmarks/attractions.py
+
+Run from backend/analytics-service.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed by the child interpreter in the service directory; prints one JSON
+# line. Attractions are stored through attraction_dimension or inline, and
+# revenue as cents or a decimal amount, whichever the checkout's schema has.
+PROBE = '''
+import importlib, json, os, random, sys, time, tracemalloc, uuid
+from datetime import date, timedelta
+from decimal import Decimal
+path, attraction_count, days = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+paths = sys.argv[4:]
+# Checkouts without create_app configure a module-level app from the environment
+os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+main = importlib.import_module('src.main')
+from src.models.analytics import db
+if hasattr(main, 'create_app'):
+    app = main.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ANALYTICS_MIGRATE_ON_START': True})
+else:
+    app = main.app
+random.seed(1)
+today = date.today()
+dates = [today - timedelta(days=n) for n in range(days)]
+ids = [str(uuid.UUID(int=random.getrandbits(128), version=4)) for _ in range(attraction_count)]
+
+with app.app_context():
+    table = db.metadata.tables['attraction_analytics']
+    if 'attraction_key' in table.c:
+        with db.engine.begin() as connection:
+            connection.execute(db.metadata.tables['attraction_dimension'].insert(), [
+                {'attraction_key': n + 1, 'attraction_id': attraction_id, 'name': f'Attraction {n} Experience'}
+                for n, attraction_id in enumerate(ids)
+            ])
+        identify = lambda n: {'attraction_key': n + 1}
+    else:
+        identify = lambda n: {'attraction_id': ids[n], 'attraction_name': f'Attraction {n} Experience'}
+    cents = 'revenue_generated_cents' in table.c
+    with db.engine.begin() as connection:
+        for day in dates:
+            connection.execute(table.insert(), [
+                dict(
+                    identify(n), date=day, hour=hour, total_visitors=random.randrange(50, 400),
+                    average_wait_time=random.randrange(5, 90), max_wait_time=120, capacity_utilization=0.8,
+                    **({'revenue_generated_cents': 152050} if cents else {'revenue_generated': Decimal('1520.50')})
+                )
+                for hour in range(24) for n in range(attraction_count)
+            ])
+        sizes = dict(connection.exec_driver_sql('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').all())
+        indexes = [(row[1], row[3]) for row in connection.exec_driver_sql('PRAGMA index_list(attraction_analytics)')]
+    db.session.remove()
+
+client = app.test_client()
+values = {'start': (today - timedelta(days=29)).isoformat(), 'end': today.isoformat()}
+endpoints = {}
+for template in paths:
+    url = template.format(**values)
+    # Warm up caches and lazy imports, so the measured request only holds its own data
+    client.get(url).get_data()
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url)
+    response.get_data()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if response.status_code != 200:
+        sys.exit(f'{url}: status {response.status_code}')
+    endpoints[template] = {'peak': peak, 'ms': elapsed * 1000}
+with app.app_context():
+    db.engine.dispose()
+print(json.dumps({
+    'rows': attraction_count * days * 24, 'table': sizes['attraction_analytics'],
+    # origin 'u' marks the UNIQUE constraint's index, 'pk' the primary key's
+    'indexes': {name: sizes[name] for name, _ in indexes},
+    'unique_index': sum(sizes[name] for name, origin in indexes if origin == 'u'),
+    'endpoints': endpoints
+}))
+'''
+
+# (label, path template)
+ENDPOINTS = (
+    ('attractions 30d', '/api/v1/analytics/attractions?start_date={start}&end_date={end}'),
+    ('attractions-status', '/api/v1/dashboard/attractions-status'),
+    ('daily-summary', '/api/v1/reports/daily-summary?date={end}'),
+    ('attraction CSV export', '/api/v1/reports/export/csv?type=attractions&start_date={start}&end_date={end}'),
+)
+
+def megabytes(size):
+    return f'{size / 1024 / 1024:.1f} MB'
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure attraction storage and endpoint allocations')
+    parser.add_argument('--attractions', type=int, default=60)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--service-dir', default=SERVICE_DIR, help='Checkout of backend/analytics-service to run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, os.path.join(directory, 'analytics.db'), str(args.attractions),
+             str(args.days), *(path for _, path in ENDPOINTS)],
+            cwd=args.service_dir, capture_output=True, text=True
+        )
+    if result.returncode:
+        sys.exit(result.stderr)
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+
+    print(f'{args.service_dir}: {measured["rows"]} attraction hours')
+    print(f'  table                  {megabytes(measured["table"]):>10}')
+    print(f'  unique index           {megabytes(measured["unique_index"]):>10}')
+    for name, size in sorted(measured['indexes'].items()):
+        print(f'    {name:40} {megabytes(size):>10}')
+    for label, path in ENDPOINTS:
+        endpoint = measured['endpoints'][path]
+        print(f'  {label:22} {megabytes(endpoint["peak"]):>10} peak  {endpoint["ms"]:>8.0f} ms')
+
+if __name__ == '__main__':
+    main()
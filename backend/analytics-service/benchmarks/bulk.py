@@ -0,0 +1,107 @@
+"""
+Bulk upsert benchmark: rows per second through the /bulk endpoints.
+
+Builds a throwaway SQLite database and posts generated hourly rows as NDJSON
+through the Flask test client, so the timings include body parsing,
+validation and the database writes but no network. Every request is sent
+twice: the first pass inserts its rows, the second updates them. Run from
+backend/analytics-service:
+
+    python benchmarks/bulk.py
+    python benchmarks/bulk.py --rows 100000 --requests 3 --dataset attractions --no-outcomes
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from src.main import create_app  # noqa: E402
+from src.models.analytics import db  # noqa: E402
+
+ATTRACTIONS = 60
+FIRST_DAY = date(2024, 1, 1)
+
+def operational_rows(count, offset, revision):
+    for n in range(offset, offset + count):
+        day, hour = divmod(n, 24)
+        yield {
+            'metric_date': (FIRST_DAY + timedelta(days=day)).isoformat(), 'metric_hour': hour,
+            'total_visitors': 1000 + n % 500 + revision, 'total_revenue': '12345.67', 'average_wait_time': 20
+        }
+
+def attraction_rows(count, offset, revision):
+    for n in range(offset, offset + count):
+        hours, attraction = divmod(n, ATTRACTIONS)
+        day, hour = divmod(hours, 24)
+        yield {
+            'attraction_id': f'attraction-{attraction:03d}', 'attraction_name': f'Attraction {attraction}',
+            'date': (FIRST_DAY + timedelta(days=day)).isoformat(), 'hour': hour,
+            'total_visitors': 200 + revision, 'average_wait_time': 25, 'max_wait_time': 60,
+            'capacity_utilization': 0.85, 'revenue_generated': '1520.50'
+        }
+
+def payment_rows(count, offset, revision):
+    methods = ('CREDIT_CARD', 'MOBILE_WALLET', 'CASH', 'GIFT_CARD')
+    for n in range(offset, offset + count):
+        hours, method = divmod(n, len(methods))
+        day, hour = divmod(hours, 24)
+        yield {
+            'date': (FIRST_DAY + timedelta(days=day)).isoformat(), 'hour': hour, 'payment_method': methods[method],
+            'transaction_count': 40 + revision, 'total_amount': '2100.40', 'success_rate': 98.5
+        }
+
+DATASETS = {
+    'operational-metrics': operational_rows,
+    'attractions': attraction_rows,
+    'payments': payment_rows,
+}
+
+def post(client, dataset, body, outcomes):
+    path = f'/api/v1/analytics/{dataset}/bulk' + ('' if outcomes else '?outcomes=false')
+    started = time.perf_counter()
+    response = client.post(path, data=body, content_type='application/x-ndjson')
+    seconds = time.perf_counter() - started
+    if response.status_code != 200:
+        raise SystemExit(f'{path}: status {response.status_code}: {response.get_data(as_text=True)[:500]}')
+    return seconds, response.get_json()['data']
+
+def main():
+    parser = argparse.ArgumentParser(description='Time bulk upserts through the test client')
+    parser.add_argument('--dataset', choices=sorted(DATASETS), default='attractions')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows per request')
+    parser.add_argument('--requests', type=int, default=3, help='Requests, each with new keys')
+    parser.add_argument('--no-outcomes', dest='outcomes', action='store_false', help='Skip per-row outcomes')
+    args = parser.parse_args()
+
+    generate = DATASETS[args.dataset]
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'analytics.db')}",
+            'ANALYTICS_MIGRATE_ON_START': True,
+            'BULK_UPSERT_MAX_ROWS': max(args.rows, 100000),
+        })
+        client = app.test_client()
+        totals = {'insert': [0, 0.0], 'update': [0, 0.0]}
+        for number in range(args.requests):
+            for revision, phase in enumerate(('insert', 'update')):
+                body = '\n'.join(json.dumps(row) for row in generate(args.rows, number * args.rows, revision))
+                seconds, data = post(client, args.dataset, body, args.outcomes)
+                if data['failed']:
+                    raise SystemExit(f'{data["failed"]} rows failed: {data["errors"][:3]}')
+                totals[phase][0] += args.rows
+                totals[phase][1] += seconds
+                print(f'request {number + 1} {phase:6} {args.rows:>8} rows  {seconds:6.2f}s  {args.rows / seconds:>8.0f} rows/s')
+
+        for phase, (rows, seconds) in totals.items():
+            print(f'{phase:6} total     {rows:>8} rows  {seconds:6.2f}s  {rows / seconds:>8.0f} rows/s')
+        with app.app_context():
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
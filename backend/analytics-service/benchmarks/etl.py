@@ -0,0 +1,183 @@
+"""
+ETL benchmark: fold one park day of gate scans and served queue entries.
+
+Builds a throwaway SQLite database holding the analytics tables and the core
+API source tables, times `run_stream` for each stream, and checks every
+hourly row against a GROUP BY over the source events. With --crash the ETL
+first runs in a child process that is killed with SIGKILL part-way through,
+and the restarted run has to produce the same totals. Run from
+backend/analytics-service:
+
+    python benchmarks/etl.py
+    python benchmarks/etl.py --entries 2000000 --queue 1000000 --crash
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import text
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from src.main import create_app  # noqa: E402
+from src.models.analytics import db, AttractionAnalytics, AttractionDimension, OperationalMetrics  # noqa: E402
+from src.models.sources import attraction_queue, attractions, entry_logs, source_metadata  # noqa: E402
+from src.services.etl import run_stream, source_engine  # noqa: E402
+
+STREAM_NAMES = ('entry_logs', 'attraction_queue')
+ATTRACTIONS = 60
+INSERT_CHUNK = 50000
+# Park hours of the generated day
+OPENING_HOUR, CLOSING_HOUR = 9, 21
+
+def make_app(path):
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ANALYTICS_MIGRATE_ON_START': True})
+
+def _times(rng, day, count):
+    """Sorted event times spread over the park day"""
+    opening = datetime.combine(day, datetime.min.time()) + timedelta(hours=OPENING_HOUR)
+    offsets = np.sort(rng.uniform(0, (CLOSING_HOUR - OPENING_HOUR) * 3600, count))
+    return [opening + timedelta(seconds=float(offset)) for offset in offsets]
+
+def _insert(connection, table, rows):
+    for offset in range(0, len(rows), INSERT_CHUNK):
+        connection.execute(table.insert(), rows[offset:offset + INSERT_CHUNK])
+
+def generate(entry_count, queue_count, day, seed=1):
+    """Source events of one day; about 2% of the gate scans are rejected"""
+    rng = np.random.default_rng(seed)
+    engine = source_engine()
+    source_metadata.create_all(engine)
+    with engine.begin() as connection:
+        # The core schema indexes the keyset columns the ETL scans by
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_entry_keyset ON entry_logs (entry_timestamp, entry_id)'))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_queue_keyset ON attraction_queue (served_at, queue_id)'))
+        _insert(connection, attractions, [
+            {'attraction_id': f'attraction-{n:03d}', 'name': f'Attraction {n}', 'max_capacity': 24, 'duration_minutes': 4}
+            for n in range(ATTRACTIONS)
+        ])
+        valid = rng.random(entry_count) >= 0.02
+        _insert(connection, entry_logs, [
+            {'entry_id': f'e{n:09d}', 'entry_timestamp': timestamp, 'is_valid_entry': bool(valid[n])}
+            for n, timestamp in enumerate(_times(rng, day, entry_count))
+        ])
+        rides = rng.integers(0, ATTRACTIONS, queue_count)
+        waits = rng.gamma(2.0, 12.0, queue_count)
+        _insert(connection, attraction_queue, [
+            {
+                'queue_id': f'q{n:09d}', 'attraction_id': f'attraction-{rides[n]:03d}', 'estimated_wait_time': 20,
+                'joined_at': served - timedelta(minutes=float(waits[n])), 'served_at': served
+            }
+            for n, served in enumerate(_times(rng, day, queue_count))
+        ])
+
+def run_streams(batch_size):
+    timings = {}
+    for name in STREAM_NAMES:
+        started = time.perf_counter()
+        events = run_stream(name, batch_size, settle_seconds=0)
+        timings[name] = (events, time.perf_counter() - started)
+    return timings
+
+def verify(day):
+    """Differences between the hourly rows and a GROUP BY over the source events"""
+    problems = []
+    with source_engine().connect() as connection:
+        entries = dict(connection.execute(text(
+            "SELECT CAST(strftime('%H', entry_timestamp) AS INTEGER), COUNT(*) FROM entry_logs "
+            "WHERE is_valid_entry GROUP BY 1"
+        )).all())
+        riders = {
+            (attraction_id, hour): (count, average, longest)
+            for attraction_id, hour, count, average, longest in connection.execute(text(
+                "SELECT attraction_id, CAST(strftime('%H', served_at) AS INTEGER), COUNT(*), "
+                "AVG((julianday(served_at) - julianday(joined_at)) * 1440), "
+                "MAX((julianday(served_at) - julianday(joined_at)) * 1440) "
+                "FROM attraction_queue GROUP BY 1, 2"
+            ))
+        }
+
+    stored = {row.metric_hour: row.total_visitors for row in OperationalMetrics.query.filter_by(metric_date=day)}
+    if stored != entries:
+        problems.append(f'entries per hour differ: {stored} != {entries}')
+
+    ids = dict(db.session.query(AttractionDimension.attraction_key, AttractionDimension.attraction_id).all())
+    hours = {(ids[row.attraction_key], row.hour): row for row in AttractionAnalytics.query.filter_by(date=day)}
+    if set(hours) != set(riders):
+        problems.append(f'{len(hours)} attraction hours stored, {len(riders)} in the source')
+    for key, (count, average, longest) in riders.items():
+        row = hours.get(key)
+        if row is None:
+            continue
+        # julianday() loses sub-millisecond precision, so waits are compared to the minute
+        if row.total_visitors != count or abs(row.average_wait_time - average) > 0.51 or abs(row.max_wait_time - longest) > 0.51:
+            problems.append(
+                f'{key}: stored ({row.total_visitors}, {row.average_wait_time}, {row.max_wait_time}), '
+                f'source ({count}, {average:.2f}, {longest:.2f})'
+            )
+    return problems
+
+def crash_run(path, batch_size, crash_after):
+    """Run the ETL in a child process and kill it with SIGKILL after `crash_after` seconds"""
+    child = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', path, '--batch-size', str(batch_size)], cwd=SERVICE_DIR
+    )
+    time.sleep(crash_after)
+    if child.poll() is not None:
+        raise SystemExit('The ETL finished before it was killed; lower --crash-after')
+    os.kill(child.pid, signal.SIGKILL)
+    child.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the access_control ETL and check its results')
+    parser.add_argument('--entries', type=int, default=200000, help='Gate scans to generate')
+    parser.add_argument('--queue', type=int, default=100000, help='Served queue entries to generate')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Events per ETL transaction')
+    parser.add_argument('--crash', action='store_true', help='Kill a first ETL run part-way and restart it')
+    parser.add_argument('--crash-after', type=float, default=2.0, help='Seconds before the first run is killed')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with make_app(args.child).app_context():
+            run_streams(args.batch_size)
+        return
+
+    day = date.today() - timedelta(days=1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'analytics.db')
+        app = make_app(path)
+        with app.app_context():
+            started = time.perf_counter()
+            generate(args.entries, args.queue, day)
+            print(f'Generated {args.entries} entries and {args.queue} queue events in {time.perf_counter() - started:.1f}s')
+            db.session.remove()
+
+        if args.crash:
+            crash_run(path, args.batch_size, args.crash_after)
+            print(f'Killed the first ETL run after {args.crash_after}s')
+
+        with app.app_context():
+            timings = run_streams(args.batch_size)
+            total_events = sum(events for events, _ in timings.values())
+            total_seconds = sum(seconds for _, seconds in timings.values())
+            for name, (events, seconds) in timings.items():
+                print(f'{name:18} {events:>9} events  {seconds:7.1f}s  {events / seconds if seconds else 0:>9.0f} events/s')
+            print(f'{"total":18} {total_events:>9} events  {total_seconds:7.1f}s')
+
+            problems = verify(day)
+            for problem in problems[:20]:
+                print(problem)
+            print('Results match the source' if not problems else f'{len(problems)} mismatches')
+            db.session.remove()
+            db.engine.dispose()
+        return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Id storage benchmark: insert rate and index sizes per kind of surrogate id.
+
+For random UUIDv4 strings, time-ordered UUID strings and 16-byte binary ids,
+a fresh interpreter inserts rows in batches into a fresh SQLite database,
+then reports the rate and the primary key index and table sizes (from the
+dbstat table). Each mode runs in its own interpreter because the id storage
+is fixed at startup. Run from backend/analytics-service:
+
+    python benchmarks/ids.py
+    python benchmarks/ids.py --rows 1000000 --table visitor_analytics
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (label, ANALYTICS_ID_STORAGE, how ids are made)
+MODES = (
+    ('text, uuid4', 'text', 'uuid4'),
+    ('text, time-ordered', 'text', 'ordered'),
+    ('binary', 'binary', 'ordered'),
+)
+TABLES = ('visitor_analytics', 'attraction_analytics')
+
+# Executed by each child interpreter; prints one JSON line
+PROBE = '''
+import json, sys, time, uuid
+from datetime import date, datetime, timedelta
+path, storage, ids, table_name, rows, batch_size = sys.argv[1:7]
+rows, batch_size = int(rows), int(batch_size)
+from src.main import create_app
+from src.models.analytics import db
+from src.models.keys import new_id
+app = create_app({
+    'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ANALYTICS_MIGRATE_ON_START': True, 'ANALYTICS_ID_STORAGE': storage
+})
+make_id = (lambda: str(uuid.uuid4())) if ids == 'uuid4' else new_id
+first = date(2024, 1, 1)
+
+def visitor(n):
+    return {
+        'id': make_id(), 'user_id': str(uuid.uuid4()), 'visit_date': first + timedelta(days=n // 2000),
+        'entry_time': datetime(2024, 1, 1, 9) + timedelta(seconds=n), 'total_spending_cents': 2500,
+        'attractions_visited': 4, 'device_type': 'ios'
+    }
+
+def attraction(n):
+    hours, key = divmod(n, 60)
+    return {
+        'id': make_id(), 'attraction_key': key + 1, 'date': first + timedelta(days=hours // 24), 'hour': hours % 24,
+        'total_visitors': 200, 'average_wait_time': 25, 'max_wait_time': 60, 'revenue_generated_cents': 152050
+    }
+
+with app.app_context():
+    table = db.metadata.tables[table_name]
+    make_row = visitor if table_name == 'visitor_analytics' else attraction
+    elapsed = 0.0
+    with db.engine.connect() as connection:
+        for offset in range(0, rows, batch_size):
+            batch = [make_row(n) for n in range(offset, min(offset + batch_size, rows))]
+            started = time.perf_counter()
+            connection.execute(table.insert(), batch)
+            connection.commit()
+            elapsed += time.perf_counter() - started
+        sizes = dict(connection.exec_driver_sql('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').all())
+        # (name, origin): origin 'pk' marks the primary key index
+        indexes = [(row[1], row[3]) for row in connection.exec_driver_sql(f'PRAGMA index_list({table_name})')]
+    db.engine.dispose()
+print(json.dumps({
+    'rows_per_second': rows / elapsed, 'table': sizes[table_name],
+    'pk_index': sum(sizes[name] for name, origin in indexes if origin == 'pk'),
+    'other_indexes': sum(sizes[name] for name, origin in indexes if origin != 'pk')
+}))
+'''
+
+def run_mode(table, storage, ids, rows, batch_size):
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, os.path.join(directory, 'analytics.db'), storage, ids, table,
+             str(rows), str(batch_size)],
+            cwd=SERVICE_DIR, capture_output=True, text=True
+        )
+    if result.returncode:
+        sys.exit(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def megabytes(size):
+    return f'{size / 1024 / 1024:.1f}MB'
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare surrogate id storages on SQLite')
+    parser.add_argument('--rows', type=int, default=200000, help='Rows inserted per run')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows per insert statement')
+    parser.add_argument('--table', choices=TABLES, action='append', help='Table to fill (default: both)')
+    args = parser.parse_args()
+
+    print(f"{'':22} {'pk index':>10} {'table':>10} {'other idx':>10} {'insert rows/s':>14}")
+    for table in args.table or TABLES:
+        print(table)
+        for label, storage, ids in MODES:
+            result = run_mode(table, storage, ids, args.rows, args.batch_size)
+            print(
+                f'  {label:20} {megabytes(result["pk_index"]):>10} {megabytes(result["table"]):>10} '
+                f'{megabytes(result["other_indexes"]):>10} {result["rows_per_second"] / 1000:>13.1f}k'
+            )
+
+if __name__ == '__main__':
+    main()
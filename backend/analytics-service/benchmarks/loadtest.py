@@ -0,0 +1,415 @@
+"""
+Load test replaying a park day against a local instance of the service.
+
+Requests arrive open-loop (Poisson) at a rate that follows the intraday curve,
+compressed into --duration seconds, and are sent over a pool of keep-alive
+connections. Latency is measured from each request's scheduled arrival, so time
+spent waiting for a free connection counts: a saturated service shows up as
+growing latency rather than as a lower request rate. The service writes the
+feedback and real-time snapshots it receives, so point it at a scratch database:
+
+    gunicorn --config gunicorn.conf.py &
+    python benchmarks/loadtest.py --peak-rps 200 --duration 300
+    python benchmarks/loadtest.py --mix park_day.json --json results.json
+
+A --mix file may override "peak_rps", "curve" ({"hour": relative rate}) and
+"routes" (list of route dicts as in DEFAULT_ROUTES).
+"""
+import argparse
+import asyncio
+import bisect
+import ipaddress
+import json
+import random
+import socket
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+# Relative arrival rate per park hour (08:00 to 22:00): the opening rush peaks
+# at 09:00, a lunch bump follows and traffic tails off towards closing
+PARK_DAY_CURVE = {
+    8: 0.35, 9: 1.0, 10: 0.85, 11: 0.7, 12: 0.75, 13: 0.7, 14: 0.65,
+    15: 0.6, 16: 0.55, 17: 0.5, 18: 0.45, 19: 0.4, 20: 0.3, 21: 0.15, 22: 0.05,
+}
+
+# Share of the peak rate per route. Routes with "curve": false (monitoring pushes
+# and health checks) keep their rate all day, the others follow the curve.
+# "body" names a payload generator, "delta_sync" polls with each dashboard's
+# last watermark, and "{day}" in a path is a random day of the last 30.
+DEFAULT_ROUTES = [
+    {'name': 'dashboard overview', 'path': '/api/v1/dashboard/overview', 'weight': 20},
+    {'name': 'attractions status', 'path': '/api/v1/dashboard/attractions-status', 'weight': 20, 'delta_sync': True},
+    {'name': 'payment trends', 'path': '/api/v1/dashboard/payment-trends', 'weight': 6},
+    {'name': 'system health', 'path': '/api/v1/dashboard/system-health', 'weight': 6, 'curve': False},
+    {'name': 'feedback', 'method': 'POST', 'path': '/api/v1/analytics/feedback', 'weight': 15, 'body': 'feedback'},
+    {
+        'name': 'real-time ingest', 'method': 'POST', 'path': '/api/v1/dashboard/update-real-time',
+        'weight': 25, 'body': 'real_time', 'curve': False
+    },
+    {'name': 'daily summary', 'path': '/api/v1/reports/daily-summary?date={day}', 'weight': 2},
+    {'name': 'weekly summary', 'path': '/api/v1/reports/weekly-summary', 'weight': 1},
+    {'name': 'csv export', 'path': '/api/v1/reports/export/csv?type=visitors', 'weight': 0.5},
+]
+
+DEVICE_TYPES = ('ios', 'android', 'web')
+
+# A window is saturated when it misses the latency objective, fails more than
+# this share of requests, or completes less than this share of the offered rate
+MAX_ERROR_RATE = 0.01
+MIN_THROUGHPUT_RATIO = 0.9
+
+def feedback_body(load, number):
+    return {
+        'rating': random.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 6, 6))[0],
+        'user_id': f'load-user-{number}',
+        'session_id': f'load-session-{number}',
+        'comments': 'Load test feedback',
+        'device_type': random.choice(DEVICE_TYPES),
+        'app_version': 'loadtest'
+    }
+
+def real_time_body(load, number):
+    return {
+        'current_visitors': int(12000 * load),
+        'active_queues': int(40 * load),
+        'average_queue_time': round(45 * load, 1),
+        'system_load_percentage': round(80 * load, 1),
+        'payment_success_rate': 99.5,
+        'api_response_time_ms': 120,
+        'cache_hit_rate': 85,
+        'concurrent_users': int(3000 * load)
+    }
+
+BODIES = {'feedback': feedback_body, 'real_time': real_time_body}
+
+def curve_at(curve, hour):
+    """Relative rate at a fractional park `hour`, interpolated between the hourly points"""
+    hours = sorted(curve)
+    if hour <= hours[0]:
+        return curve[hours[0]]
+    if hour >= hours[-1]:
+        return curve[hours[-1]]
+    index = bisect.bisect_right(hours, hour)
+    low, high = hours[index - 1], hours[index]
+    return curve[low] + (curve[high] - curve[low]) * (hour - low) / (high - low)
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, target, body=None):
+        """Send one request; returns (status, body bytes). Reconnects as needed."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        headers = [f'{method} {target} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Accept: */*']
+        payload = b''
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers += ['Content-Type: application/json', f'Content-Length: {len(payload)}']
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + payload)
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        version, status = lines[0].split(' ', 2)[:2]
+        response_headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await self.reader.readline()) not in (b'\r\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size + 2))
+            content = b''.join(chunk[:-2] for chunk in chunks)
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        connection = response_headers.get('connection', '').lower()
+        if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+            self.close()
+        return int(status), content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class LoadTest:
+    """Open-loop replay of a traffic mix following an intraday curve"""
+
+    def __init__(self, base_url, routes, curve, peak_rps, duration, connections=64, timeout=30,
+                 dashboards=50, slo_ms=500, windows=None, max_pending=10000):
+        url = urlsplit(base_url)
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 80
+        self.routes = [dict({'method': 'GET', 'curve': True}, **route) for route in routes]
+        self.curve = {int(hour): float(rate) for hour, rate in curve.items()}
+        self.peak_rps = peak_rps
+        self.duration = duration
+        self.connections = connections
+        self.timeout = timeout
+        self.slo_ms = slo_ms
+        self.windows = windows or len(self.curve) - 1
+        self.max_pending = max_pending
+        # Watermark per simulated dashboard and delta-sync route
+        self.dashboards = dashboards
+        self.watermarks = {}
+        self.results = []
+
+    def _park_hour(self, elapsed):
+        hours = sorted(self.curve)
+        return hours[0] + (hours[-1] - hours[0]) * elapsed / self.duration
+
+    def _rates(self, elapsed):
+        """Requests per second of each route `elapsed` seconds into the run"""
+        total_weight = sum(route['weight'] for route in self.routes)
+        load = curve_at(self.curve, self._park_hour(elapsed))
+        return [
+            self.peak_rps * route['weight'] / total_weight * (load if route['curve'] else 1)
+            for route in self.routes
+        ], load
+
+    def _target(self, route):
+        path = route['path']
+        if '{day}' in path:
+            path = path.replace('{day}', (date.today() - timedelta(days=random.randrange(30))).isoformat())
+        if route.get('delta_sync'):
+            dashboard = random.randrange(self.dashboards)
+            watermark = self.watermarks.get((route['name'], dashboard), '0')
+            path += f"{'&' if '?' in path else '?'}since={watermark}"
+            return path, dashboard
+        return path, None
+
+    async def _send(self, pool, route, number, scheduled, load, started):
+        target, dashboard = self._target(route)
+        body = BODIES[route['body']](load, number) if route.get('body') else None
+        connection = await pool.get()
+        sent = time.perf_counter()
+        try:
+            status, content = await asyncio.wait_for(connection.request(route['method'], target, body), self.timeout)
+            outcome = 'ok' if status < 400 else f'HTTP {status}'
+            if dashboard is not None and status == 200:
+                watermark = (json.loads(content).get('data') or {}).get('watermark')
+                if watermark:
+                    self.watermarks[(route['name'], dashboard)] = watermark
+        except asyncio.TimeoutError:
+            connection.close()
+            outcome, content = 'timeout', b''
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            connection.close()
+            outcome, content = type(e).__name__, b''
+        finally:
+            pool.put_nowait(connection)
+        finished = time.perf_counter()
+        self.results.append({
+            'route': route['name'],
+            'at': scheduled - started,
+            'done': finished - started,
+            'latency': finished - scheduled,
+            'service': finished - sent,
+            'outcome': outcome,
+            'bytes': len(content),
+        })
+
+    async def run(self):
+        pool = asyncio.Queue()
+        for _ in range(self.connections):
+            pool.put_nowait(HttpConnection(self.host, self.port))
+
+        pending = set()
+        started = time.perf_counter()
+        next_arrival = started
+        number = 0
+        while next_arrival - started < self.duration:
+            rates, load = self._rates(next_arrival - started)
+            total = sum(rates)
+            if total <= 0:
+                next_arrival += 0.1
+                continue
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            route = random.choices(self.routes, weights=rates)[0]
+            number += 1
+            if len(pending) >= self.max_pending:
+                # The client cannot keep up either; count the arrival as dropped
+                self.results.append({
+                    'route': route['name'], 'at': next_arrival - started, 'done': None, 'latency': None,
+                    'service': None, 'outcome': 'dropped', 'bytes': 0,
+                })
+            else:
+                task = asyncio.create_task(self._send(pool, route, number, next_arrival, load, started))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            next_arrival += random.expovariate(total)
+
+        if pending:
+            await asyncio.wait(pending)
+        while not pool.empty():
+            pool.get_nowait().close()
+        return time.perf_counter() - started
+
+    # Reporting
+
+    def _summary(self, results, seconds):
+        latencies = sorted(result['latency'] * 1000 for result in results if result['latency'] is not None)
+        ok = sum(1 for result in results if result['outcome'] == 'ok')
+        return {
+            'requests': len(results),
+            'ok': ok,
+            'error_rate': (len(results) - ok) / len(results) if results else 0,
+            'throughput_rps': ok / seconds if seconds else 0,
+            'p50_ms': percentile(latencies, 0.5),
+            'p90_ms': percentile(latencies, 0.9),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': latencies[-1] if latencies else None,
+            'errors': dict(Counter(result['outcome'] for result in results if result['outcome'] != 'ok')),
+        }
+
+    def report(self, elapsed):
+        routes = defaultdict(list)
+        for result in self.results:
+            routes[result['route']].append(result)
+
+        window_seconds = self.duration / self.windows
+        # Requests count towards the window they arrived in, completions towards the one they finished in
+        by_window = defaultdict(list)
+        completed = Counter()
+        for result in self.results:
+            by_window[min(int(result['at'] // window_seconds), self.windows - 1)].append(result)
+            if result['outcome'] == 'ok' and result['done'] < self.duration:
+                completed[int(result['done'] // window_seconds)] += 1
+        windows = []
+        saturation = None
+        for index in range(self.windows):
+            summary = self._summary(by_window[index], window_seconds)
+            summary['park_hour'] = self._park_hour((index + 0.5) * window_seconds)
+            summary['offered_rps'] = len(by_window[index]) / window_seconds
+            summary['throughput_rps'] = completed[index] / window_seconds
+            summary['saturated'] = bool(by_window[index]) and (
+                (summary['p95_ms'] or 0) > self.slo_ms
+                or summary['error_rate'] > MAX_ERROR_RATE
+                or summary['throughput_rps'] < MIN_THROUGHPUT_RATIO * summary['offered_rps']
+            )
+            if summary['saturated'] and saturation is None:
+                saturation = summary
+            windows.append(summary)
+
+        sustained = [window['throughput_rps'] for window in windows if not window['saturated'] and window['requests']]
+        return {
+            'target': f'http://{self.host}:{self.port}',
+            'duration_seconds': elapsed,
+            'peak_rps': self.peak_rps,
+            'connections': self.connections,
+            'slo_p95_ms': self.slo_ms,
+            'total': self._summary(self.results, elapsed),
+            'routes': {name: self._summary(results, elapsed) for name, results in routes.items()},
+            'windows': windows,
+            'max_sustained_rps': max(sustained) if sustained else None,
+            'saturated_at_offered_rps': saturation['offered_rps'] if saturation else None,
+            'saturated_at_park_hour': saturation['park_hour'] if saturation else None,
+        }
+
+def _ms(value):
+    return f'{value:8.1f}' if value is not None else f"{'-':>8}"
+
+def print_report(report):
+    print(f"{report['target']}: {report['total']['requests']} requests in {report['duration_seconds']:.0f}s, "
+          f"peak {report['peak_rps']:g} req/s offered over {report['connections']} connections")
+    print()
+    print(f"{'route':22} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, summary in sorted(report['routes'].items()) + [('total', report['total'])]:
+        print(f"{name:22} {summary['requests']:8} {summary['throughput_rps']:8.1f} {summary['error_rate']:7.1%} "
+              f"{_ms(summary['p50_ms'])} {_ms(summary['p90_ms'])} {_ms(summary['p99_ms'])} {_ms(summary['max_ms'])}"
+              + (f"  {summary['errors']}" if summary['errors'] else ''))
+    print()
+    print(f"{'park time':9} {'offered':>8} {'done/s':>8} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for window in report['windows']:
+        hour = window['park_hour']
+        print(f"{int(hour):02d}:{int(hour % 1 * 60):02d}     {window['offered_rps']:8.1f} {window['throughput_rps']:8.1f} "
+              f"{window['error_rate']:7.1%} {_ms(window['p50_ms'])} {_ms(window['p95_ms'])} {_ms(window['p99_ms'])}"
+              f"{'  saturated' if window['saturated'] else ''}")
+    print()
+    if report['saturated_at_offered_rps'] is None:
+        print(f"No saturation: p95 stayed under {report['slo_p95_ms']} ms at up to "
+              f"{max(window['offered_rps'] for window in report['windows']):.1f} req/s offered")
+    else:
+        hour = report['saturated_at_park_hour']
+        sustained = report['max_sustained_rps']
+        print(f"Saturated at {report['saturated_at_offered_rps']:.1f} req/s offered "
+              f"(park time {int(hour):02d}:{int(hour % 1 * 60):02d}); "
+              + (f"highest unsaturated throughput {sustained:.1f} req/s" if sustained is not None
+                 else "no window met the objective, lower --peak-rps to find the limit"))
+
+def _require_local(base_url):
+    host = urlsplit(base_url).hostname or ''
+    try:
+        address = ipaddress.ip_address(socket.gethostbyname(host))
+    except (OSError, ValueError):
+        raise SystemExit(f'Cannot resolve {host!r}')
+    if not address.is_loopback:
+        raise SystemExit(f'Load tests only run against a local instance, not {host}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a park-day traffic profile against a local instance')
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='Base URL of the local service')
+    parser.add_argument('--mix', default=None, help='JSON file overriding peak_rps, curve and routes')
+    parser.add_argument('--peak-rps', type=float, default=None, help='Total request rate at the busiest hour (default 50)')
+    parser.add_argument('--duration', type=float, default=120, help='Seconds the park day is compressed into')
+    parser.add_argument('--connections', type=int, default=64, help='Keep-alive connections, i.e. most requests in flight')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as timed out')
+    parser.add_argument('--slo-ms', type=float, default=500, help='p95 latency above which a window is saturated')
+    parser.add_argument('--windows', type=int, default=None, help='Report windows (default one per park hour)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for a repeatable arrival sequence')
+    parser.add_argument('--json', default=None, help='Also write the full report to this file')
+    args = parser.parse_args()
+
+    _require_local(args.url)
+    mix = {}
+    if args.mix:
+        with open(args.mix) as f:
+            mix = json.load(f)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    load_test = LoadTest(
+        args.url,
+        routes=mix.get('routes', DEFAULT_ROUTES),
+        curve=mix.get('curve', PARK_DAY_CURVE),
+        peak_rps=args.peak_rps or mix.get('peak_rps', 50),
+        duration=args.duration,
+        connections=args.connections,
+        timeout=args.timeout,
+        slo_ms=args.slo_ms,
+        windows=args.windows
+    )
+    elapsed = asyncio.run(load_test.run())
+    report = load_test.report(elapsed)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
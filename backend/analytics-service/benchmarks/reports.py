@@ -0,0 +1,169 @@
+"""
+Report benchmark: response times of the report and range endpoints.
+
+A fresh interpreter fills a throwaway SQLite database with generated
+visits, hourly metrics, attraction hours and payments, then times each
+endpoint through the test client and keeps the best of --runs. --service-dir
+points the run at another checkout of backend/analytics-service, so two
+versions can be compared on the same data, e.g.:
+
+    git worktree add /tmp/before <commit>
+    python benchmarks/reports.py --service-dir /tmp/before/backend/analytics-service
+    python benchmarks/reports.py
+
+Run from backend/analytics-service.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed by the child interpreter in the service directory; prints one JSON
+# line of best timings in milliseconds. Money columns are filled as cents or as
+# decimal amounts, and attractions through attraction_dimension or inline,
+# whichever the checkout's schema has.
+PROBE = '''
+import importlib, json, os, random, sys, time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+path, visitors_per_day, days, runs = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+paths = sys.argv[5:]
+# Checkouts without create_app configure a module-level app from the environment
+os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+main = importlib.import_module('src.main')
+from src.models.analytics import db
+if hasattr(main, 'create_app'):
+    app = main.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ANALYTICS_MIGRATE_ON_START': True})
+else:
+    app = main.app
+random.seed(1)
+end = date.today() - timedelta(days=1)
+first = end - timedelta(days=days - 1)
+dates = [first + timedelta(days=n) for n in range(days)]
+
+def money(table, row, name, cents):
+    if name + '_cents' in table.c:
+        row[name + '_cents'] = cents
+    else:
+        row[name] = Decimal(cents) / 100
+    return row
+
+with app.app_context():
+    tables = db.metadata.tables
+    started = time.perf_counter()
+    with db.engine.begin() as connection:
+        visits = tables['visitor_analytics']
+        for day in dates:
+            rows = []
+            for n in range(visitors_per_day):
+                entry = datetime.combine(day, datetime.min.time()) + timedelta(hours=9, seconds=random.randrange(12 * 3600))
+                duration = random.randrange(60, 600)
+                rows.append(money(visits, {
+                    'user_id': f'user-{random.randrange(visitors_per_day * days // 2)}', 'visit_date': day,
+                    'entry_time': entry, 'exit_time': entry + timedelta(minutes=duration),
+                    'total_duration_minutes': duration, 'attractions_visited': random.randrange(1, 12),
+                    'queue_time_minutes': random.randrange(5, 120),
+                    'satisfaction_rating': random.choice((None, 3, 4, 5)), 'device_type': random.choice(('ios', 'android'))
+                }, 'total_spending', random.randrange(0, 20000)))
+            connection.execute(visits.insert(), rows)
+
+        operational = tables['operational_metrics']
+        connection.execute(operational.insert(), [
+            money(operational, {'metric_date': day, 'metric_hour': hour, 'total_visitors': random.randrange(500, 5000),
+                                'average_wait_time': random.randrange(5, 60)}, 'total_revenue', random.randrange(10 ** 6, 10 ** 7))
+            for day in dates for hour in range(24)
+        ])
+
+        attractions = tables['attraction_analytics']
+        if 'attraction_key' in attractions.c:
+            connection.execute(tables['attraction_dimension'].insert(), [
+                {'attraction_key': n + 1, 'attraction_id': f'ATR{n:03d}', 'name': f'Attraction {n}'} for n in range(60)
+            ])
+            identify = lambda n: {'attraction_key': n + 1}
+        else:
+            identify = lambda n: {'attraction_id': f'ATR{n:03d}', 'attraction_name': f'Attraction {n}'}
+        connection.execute(attractions.insert(), [
+            money(attractions, dict(identify(n), date=day, hour=hour, total_visitors=random.randrange(50, 400),
+                                    average_wait_time=random.randrange(5, 90), max_wait_time=120, capacity_utilization=0.8),
+                  'revenue_generated', random.randrange(0, 200000))
+            for day in dates for hour in range(24) for n in range(60)
+        ])
+
+        payments = tables['payment_analytics']
+        rows = []
+        for day in dates:
+            for hour in range(24):
+                for method in ('CREDIT_CARD', 'MOBILE_WALLET', 'CASH', 'GIFT_CARD'):
+                    row = money(payments, {'date': day, 'hour': hour, 'payment_method': method,
+                                           'transaction_count': 40, 'success_rate': 98.5}, 'total_amount', 210040)
+                    rows.append(money(payments, row, 'average_transaction_amount', 5251))
+        connection.execute(payments.insert(), rows)
+    loaded = time.perf_counter() - started
+
+    # Build the rollup tiers where the checkout has them, as a deployment would
+    try:
+        rollups = importlib.import_module('src.services.rollups')
+    except ImportError:
+        rollups = None
+    if rollups is not None and hasattr(rollups, 'refresh_rollups'):
+        for name in rollups.ROLLUP_SOURCES:
+            rollups.refresh_rollups(name, settle_seconds=0)
+    db.session.remove()
+
+client = app.test_client()
+values = {'start': first.isoformat(), 'end': end.isoformat()}
+best = {}
+for run in range(runs):
+    for template in paths:
+        url = template.format(**values)
+        started = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            sys.exit(f'{url}: status {response.status_code}')
+        best[template] = min(best.get(template, elapsed), elapsed)
+with app.app_context():
+    db.engine.dispose()
+print(json.dumps({'load_seconds': loaded, 'best_ms': best}))
+'''
+
+# (label, path template)
+ENDPOINTS = (
+    ('daily-summary', '/api/v1/reports/daily-summary?date={end}'),
+    ('weekly-summary', '/api/v1/reports/weekly-summary?end_date={end}'),
+    ('visitor-stats', '/api/v1/analytics/visitor-stats?start_date={start}&end_date={end}'),
+    ('payments', '/api/v1/analytics/payments?start_date={start}&end_date={end}'),
+    ('attractions', '/api/v1/analytics/attractions?start_date={start}&end_date={end}'),
+    ('export visitors', '/api/v1/reports/export/csv?type=visitors&start_date={start}&end_date={end}'),
+)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time report endpoints on generated data')
+    parser.add_argument('--visitors-per-day', type=int, default=40000)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--runs', type=int, default=3, help='Requests per endpoint; the best is reported')
+    parser.add_argument('--service-dir', default=SERVICE_DIR, help='Checkout of backend/analytics-service to run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, os.path.join(directory, 'analytics.db'), str(args.visitors_per_day),
+             str(args.days), str(args.runs), *(path for _, path in ENDPOINTS)],
+            cwd=args.service_dir, capture_output=True, text=True
+        )
+    if result.returncode:
+        sys.exit(result.stderr)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+
+    print(f'{args.service_dir}: {args.visitors_per_day} visitors/day over {args.days} days, '
+          f'loaded in {timings["load_seconds"]:.1f}s, best of {args.runs}')
+    for label, path in ENDPOINTS:
+        print(f'  {label:18} {timings["best_ms"][path]:>9.0f} ms')
+
+if __name__ == '__main__':
+    main()
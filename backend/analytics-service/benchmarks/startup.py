@@ -0,0 +1,94 @@
+"""
+Startup benchmark: import time, app creation and time to first request.
+
+Every run starts a fresh interpreter, so module and connection caches never
+carry over between runs. Run from backend/analytics-service against the
+configured DATABASE_URL (migrate it first, or pass --migrate):
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --path /health --path /api/v1/reports/daily-summary
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed by each child interpreter; prints one JSON line of timings in milliseconds
+PROBE = '''
+import importlib, json, sys, time
+started = time.perf_counter()
+target, migrate, paths = sys.argv[1], sys.argv[2] == '1', sys.argv[3:]
+module_name, _, attribute = target.partition(':')
+module = importlib.import_module(module_name)
+timings = {'import': time.perf_counter() - started}
+
+mark = time.perf_counter()
+app = getattr(module, attribute or 'app')
+if not hasattr(app, 'test_client'):
+    app = app()
+timings['create_app'] = time.perf_counter() - mark
+
+if migrate:
+    mark = time.perf_counter()
+    from src.commands import migrate_database
+    with app.app_context():
+        migrate_database()
+    timings['migrate'] = time.perf_counter() - mark
+
+client = app.test_client()
+for path in paths:
+    mark = time.perf_counter()
+    response = client.get(path)
+    response.close()
+    if response.status_code >= 500:
+        sys.exit(f'{path}: status {response.status_code}')
+    timings[f'first {path}'] = time.perf_counter() - mark
+timings['first response'] = time.perf_counter() - started
+print(json.dumps({name: seconds * 1000 for name, seconds in timings.items()}))
+'''
+
+def run_once(target, migrate, paths):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, target, '1' if migrate else '0', *paths],
+        cwd=SERVICE_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip() or f'Probe failed with exit code {result.returncode}')
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # Includes interpreter start-up, which the probe cannot see
+    timings['process start to first response'] = elapsed * 1000
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time and time to first request')
+    parser.add_argument('--target', default='src.main:create_app', help='module:attribute of the app or its factory')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to start')
+    parser.add_argument('--path', action='append', dest='paths', help='Requested in order after start-up, repeatable')
+    parser.add_argument('--migrate', action='store_true', help='Also time the schema upgrade before the first request')
+    parser.add_argument('--json', action='store_true', help='Print every run instead of a summary')
+    args = parser.parse_args()
+    paths = args.paths or ['/health', '/api/v1/dashboard/overview']
+
+    # The first run also warms the OS file cache and writes bytecode; it is not counted
+    run_once(args.target, args.migrate, paths)
+    runs = [run_once(args.target, args.migrate, paths) for _ in range(args.runs)]
+    if args.json:
+        for timings in runs:
+            print(json.dumps(timings))
+        return
+
+    print(f"{args.target}, {args.runs} runs (ms)")
+    print(f"{'':34} {'median':>8} {'min':>8} {'max':>8}")
+    for name in runs[0]:
+        values = [timings[name] for timings in runs]
+        print(f"{name:34} {statistics.median(values):8.1f} {min(values):8.1f} {max(values):8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Production server settings: gunicorn --config gunicorn.conf.py
+
+Pre-fork workers with a thread pool each. The app is loaded once in the master
+and forked, so workers start without re-importing it; the schema is upgraded
+beforehand by `flask --app src.main db upgrade`.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'src.wsgi:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# Workers each keep their own forecast, attraction and sketch caches
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Requests mostly wait on the database, so threads stretch a worker's memory further.
+# /api/v1/dashboard/stream belongs on the gevent server of gunicorn.stream.conf.py,
+# since here each open stream would hold a thread
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Seconds an idle client connection stays open; raise above the load balancer's idle timeout
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Recycle workers after this many requests (0 never does); caches are rebuilt on restart
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master (ANALYTICS_MIGRATE_ON_START) must not be shared
+    from src.models.analytics import db
+    from src.models.routing import replica_router
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+    if replica_router.engine is not None:
+        replica_router.engine.dispose(close=False)
@@ -0,0 +1,27 @@
+"""
+Event stream server: gunicorn --config gunicorn.stream.conf.py
+
+Serves /api/v1/dashboard/stream from gevent workers, where an open stream is a
+greenlet waiting for the next event instead of an OS thread, so one worker
+holds hundreds of idle dashboards. The proxy sends only the stream here; every
+other route stays on the threaded server of gunicorn.conf.py. Events published
+by the workers of either server reach all of them through the `stream_events`
+table, which each worker polls while it has subscribers.
+"""
+import os
+
+wsgi_app = 'src.wsgi:app'
+bind = f"0.0.0.0:{os.environ.get('STREAM_PORT', 5002)}"
+
+workers = int(os.environ.get('STREAM_WORKERS', 2))
+worker_class = 'gevent'
+# Open streams per worker
+worker_connections = int(os.environ.get('STREAM_WORKER_CONNECTIONS', 1000))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Each worker loads the app after gevent has patched threading, so the broker's waits are cooperative
+preload_app = False
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
@@ -0,0 +1,341 @@
+import json
+import time
+from datetime import date, datetime, timedelta
+from time import perf_counter
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from src.models.analytics import db
+from src.models.keys import id_storage
+from src.models.migrations import convert_id_storage, stored_id_storages, upgrade_schema
+from src.services.archive import ARCHIVED_MODELS, current_archive
+from src.services.backfill import ROLLUPS, RollupBackfill
+from src.services.etl import STREAMS, etl_status, rebuild_wait_sketches, run_stream, sync_attractions
+from src.services.partitioning import next_month, parse_month
+from src.services.quantiles import rebuild_quantile_sketches
+from src.services.retention import configured_retention, compact_real_time_stats
+from src.services.rollups import ROLLUP_SOURCES, recompute_rollups, refresh_rollups
+from src.services.sampling import rebuild_sample, start_sample_coverage
+from src.services.sketches import rebuild_sketches
+
+def migrate_database():
+    """Create missing tables and columns, bring partitions in line with the models and start the visitor sample"""
+    upgrade_schema(db)
+    current_app.extensions['partitions'].prepare(current_app.config.get('PARTITION_MONTHS_AHEAD', 2))
+    start_sample_coverage()
+
+@click.group('db')
+def db_group():
+    """Create and upgrade the analytics schema"""
+
+@db_group.command('upgrade')
+@with_appcontext
+def upgrade_db_command():
+    """Upgrade the schema and partitions; run once per deploy, before starting the workers"""
+    started = perf_counter()
+    migrate_database()
+    click.echo(f"Schema up to date in {perf_counter() - started:.2f}s")
+
+@click.command('compact-real-time-stats')
+@click.option('--batch-size', type=int, default=None, help='Rows moved per transaction')
+@with_appcontext
+def compact_real_time_stats_command(batch_size):
+    """Roll old real-time stats into minute and hour aggregates"""
+    raw_retention, minute_retention = configured_retention()
+    result = compact_real_time_stats(
+        raw_retention,
+        minute_retention,
+        batch_size=batch_size or current_app.config.get('REAL_TIME_COMPACTION_BATCH_SIZE', 5000)
+    )
+    click.echo(
+        f"Compacted {result['raw_rows_compacted']} raw snapshots (older than {result['raw_cutoff']}) "
+        f"and {result['minute_buckets_compacted']} minute buckets and {result['minute_sketches_compacted']} "
+        f"minute sketches (older than {result['minute_cutoff']})"
+    )
+
+@click.group('partitions')
+def partitions_group():
+    """Manage monthly partitions of the hourly analytics tables"""
+
+def _month_argument(value):
+    try:
+        return parse_month(value)
+    except ValueError:
+        raise click.BadParameter(f'Expected YYYY-MM, got {value}')
+
+def _recompute_month_rollups(month):
+    """Rows of the month appeared or disappeared without a new `updated_at`, so its rollups are rebuilt"""
+    for name in ('attraction_analytics', 'operational_metrics'):
+        recompute_rollups(name, month, next_month(month) - timedelta(days=1))
+
+@partitions_group.command('list')
+@with_appcontext
+def list_partitions_command():
+    """List partitions and whether they are attached"""
+    for partition in current_app.extensions['partitions'].list_partitions():
+        click.echo(f"{partition.get('table', '*'):24} {partition['month'] or 'default':8} {partition['state']:9} {partition['name']}")
+
+@partitions_group.command('ensure')
+@click.option('--months-ahead', type=int, default=None, help='Future months to create (PostgreSQL)')
+@with_appcontext
+def ensure_partitions_command(months_ahead):
+    """Create partitions for the current and upcoming months"""
+    if months_ahead is None:
+        months_ahead = current_app.config.get('PARTITION_MONTHS_AHEAD', 2)
+    created = current_app.extensions['partitions'].ensure_partitions(months_ahead)
+    click.echo(f"Ensured {len(created)} partitions")
+
+@partitions_group.command('create')
+@click.argument('month')
+@with_appcontext
+def create_partition_command(month):
+    """Create the partition for MONTH (YYYY-MM); on SQLite this seals a closed month"""
+    try:
+        created = current_app.extensions['partitions'].create_partition(_month_argument(month))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Created {', '.join(created) or 'nothing (already exists)'}")
+
+@partitions_group.command('detach')
+@click.argument('month')
+@with_appcontext
+def detach_partition_command(month):
+    """Detach MONTH (YYYY-MM) but keep its data"""
+    try:
+        current_app.extensions['partitions'].detach_partition(_month_argument(month))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    _recompute_month_rollups(_month_argument(month))
+    click.echo(f"Detached {month}")
+
+@partitions_group.command('attach')
+@click.argument('month')
+@with_appcontext
+def attach_partition_command(month):
+    """Re-attach a detached MONTH (YYYY-MM)"""
+    try:
+        current_app.extensions['partitions'].attach_partition(_month_argument(month))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    _recompute_month_rollups(_month_argument(month))
+    click.echo(f"Attached {month}")
+
+@partitions_group.command('drop')
+@click.argument('month')
+@click.confirmation_option(prompt='This permanently deletes the month. Continue?')
+@with_appcontext
+def drop_partition_command(month):
+    """Drop MONTH (YYYY-MM) and all of its rows"""
+    try:
+        current_app.extensions['partitions'].drop_partition(_month_argument(month))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    _recompute_month_rollups(_month_argument(month))
+    click.echo(f"Dropped {month}")
+
+@click.group('archive')
+def archive_group():
+    """Move old visitor and attraction analytics to the cold archive"""
+
+def _cold_archive():
+    archive = current_archive()
+    if archive is None:
+        raise click.ClickException('Cold archive is not configured (set ARCHIVE_DIR)')
+    return archive
+
+@archive_group.command('run')
+@click.option('--before', default=None, help='Archive rows dated before this date (YYYY-MM-DD)')
+@click.option('--table', type=click.Choice(sorted(ARCHIVED_MODELS)), default=None, help='Only archive this table')
+@click.option('--batch-size', type=int, default=5000, help='Rows read and deleted per batch')
+@with_appcontext
+def run_archive_command(before, table, batch_size):
+    """Archive rows older than ARCHIVE_HOT_DAYS (or --before)"""
+    if before:
+        try:
+            cutoff = datetime.strptime(before, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter(f'Expected YYYY-MM-DD, got {before}')
+    else:
+        cutoff = date.today() - timedelta(days=current_app.config.get('ARCHIVE_HOT_DAYS', 30))
+
+    archive = _cold_archive()
+    for name in ([table] if table else sorted(ARCHIVED_MODELS)):
+        result = archive.archive_before(name, cutoff, batch_size=batch_size)
+        click.echo(f"{name}: archived {result['rows_archived']} rows, cutoff {result['cutoff']}")
+
+@archive_group.command('status')
+@with_appcontext
+def archive_status_command():
+    """Show the archive cutoff and archived months per table"""
+    click.echo(json.dumps(_cold_archive().status(), indent=2))
+
+@click.group('sketches')
+def sketches_group():
+    """Maintain the unique-visitor and percentile sketches and the visitor sample"""
+
+@sketches_group.command('rebuild')
+@click.option('--start', required=True, help='First visit date (YYYY-MM-DD)')
+@click.option('--end', default=None, help='Last visit date (YYYY-MM-DD), defaults to today')
+@with_appcontext
+def rebuild_sketches_command(start, end):
+    """Recompute sketches from stored rows, e.g. after loading data outside the ORM"""
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else date.today()
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    rows = rebuild_sketches(start_date, end_date)
+    snapshots = rebuild_quantile_sketches(start_date, end_date)
+    waits = rebuild_wait_sketches(start_date, end_date)
+    rebuild_sample(start_date, end_date)
+    click.echo(
+        f"Rebuilt sketches for {start_date.isoformat()} to {end_date.isoformat()} "
+        f"from {rows} visitor rows, {snapshots} real-time snapshots and {waits} queue events"
+    )
+
+@click.group('rollups')
+def rollups_group():
+    """Maintain the day and month rollups that serve wide analytics queries"""
+
+@rollups_group.command('refresh')
+@click.argument('sources', nargs=-1, type=click.Choice(sorted(ROLLUP_SOURCES)))
+@click.option('--start', default=None, help='Also recompute every date from this one (YYYY-MM-DD)')
+@with_appcontext
+def refresh_rollups_command(sources, start):
+    """Recompute the rollups of dates changed since the last refresh (all sources by default)"""
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for name in sources or sorted(ROLLUP_SOURCES):
+        started = perf_counter()
+        result = refresh_rollups(name, start_date, current_app.config.get('ROLLUP_SETTLE_SECONDS', 60))
+        click.echo(
+            f"{name}: recomputed {result['dates']} dates from {result['rows_read']} rows "
+            f"in {perf_counter() - started:.1f}s"
+        )
+
+@click.command('backfill')
+@click.argument('rollup', type=click.Choice(sorted(ROLLUPS)))
+@click.option('--start', required=True, help='First date to recompute (YYYY-MM-DD)')
+@click.option('--end', default=None, help='Last date to recompute (YYYY-MM-DD), defaults to today')
+@click.option('--workers', type=int, default=None, help='Worker processes, defaults to the CPU count')
+@click.option('--job', default=None, help='Checkpoint name, defaults to ROLLUP:START:END')
+@click.option('--restart', is_flag=True, help='Ignore existing checkpoints and recompute every day')
+@with_appcontext
+def backfill_command(rollup, start, end, workers, job, restart):
+    """Recompute ROLLUP from raw analytics for a date range, one day per task; resumes from checkpoints"""
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else date.today()
+        backfill = RollupBackfill(rollup, start_date, end_date, job)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    if restart:
+        backfill.reset()
+    days = backfill.pending()
+    total_days = (end_date - start_date).days + 1
+    click.echo(f"Job {backfill.job}: {len(days)} of {total_days} days to recompute")
+
+    started = perf_counter()
+    completed = rows = source_rows = 0
+    failed = []
+    for result in backfill.run(days, workers):
+        if 'error' in result:
+            failed.append(result['date'])
+            click.echo(f"  {result['date']}: failed: {result['error']}", err=True)
+            continue
+        completed += 1
+        rows += result['rows_written']
+        source_rows += result['source_rows']
+        elapsed = max(perf_counter() - started, 1e-9)
+        click.echo(
+            f"[{completed + len(failed)}/{len(days)}] {result['date']}: {result['rows_written']} rows "
+            f"from {result['source_rows']} source rows in {result['seconds']:.2f}s "
+            f"({completed / elapsed:.1f} days/s, {source_rows / elapsed:.0f} source rows/s)"
+        )
+
+    click.echo(
+        f"Recomputed {completed} days ({rows} rows from {source_rows} source rows) "
+        f"in {perf_counter() - started:.1f}s"
+    )
+    if failed:
+        raise click.ClickException(f"{len(failed)} days failed ({', '.join(sorted(failed))}); rerun to retry them")
+
+@click.group('etl')
+def etl_group():
+    """Fold core API events (gate entries, ride queues) into the hourly analytics tables"""
+
+@etl_group.command('run')
+@click.argument('streams', nargs=-1, type=click.Choice(sorted(STREAMS)))
+@click.option('--batch-size', type=int, default=None, help='Events applied per transaction')
+@click.option('--follow', is_flag=True, help='Keep running, polling every ETL_INTERVAL_SECONDS')
+@with_appcontext
+def run_etl_command(streams, batch_size, follow):
+    """Apply events past each stream's watermark (all streams by default)"""
+    config = current_app.config
+    batch_size = batch_size or config.get('ETL_BATCH_SIZE', 10000)
+    while True:
+        for name in streams or sorted(STREAMS):
+            started = perf_counter()
+            applied = run_stream(name, batch_size, config.get('ETL_SETTLE_SECONDS', 5))
+            elapsed = max(perf_counter() - started, 1e-9)
+            if applied or not follow:
+                click.echo(f"{name}: applied {applied} events in {elapsed:.1f}s ({applied / elapsed:.0f} events/s)")
+        if not follow:
+            break
+        time.sleep(config.get('ETL_INTERVAL_SECONDS', 30))
+
+@etl_group.command('status')
+@with_appcontext
+def etl_status_command():
+    """Show each stream's watermark and event count"""
+    click.echo(json.dumps(etl_status(), indent=2))
+
+@etl_group.command('sync-attractions')
+@with_appcontext
+def sync_attractions_command():
+    """Copy attraction names and metadata from the core API into attraction_dimension"""
+    click.echo(f"Synced {sync_attractions()} attractions")
+
+@click.group('ids')
+def ids_group():
+    """Storage of the surrogate ids (ANALYTICS_ID_STORAGE)"""
+
+@ids_group.command('status')
+@with_appcontext
+def ids_status_command():
+    """Show how each table stores its ids"""
+    for name, storage in sorted(stored_id_storages(db.engine, db.metadata).items()):
+        click.echo(f"{name:28} {storage}{'' if storage == id_storage() else '  (needs migration)'}")
+
+@ids_group.command('migrate')
+@click.option('--batch-size', type=int, default=10000, help='Rows copied per statement (SQLite)')
+@with_appcontext
+def migrate_ids_command(batch_size):
+    """Convert existing tables to the configured ANALYTICS_ID_STORAGE"""
+    partitions = current_app.extensions['partitions']
+    db.session.remove()
+    started = perf_counter()
+    try:
+        converted = convert_id_storage(
+            db.engine, db.metadata, sqlite_files=partitions.month_files(), batch_size=batch_size
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for path, table, rows in converted:
+        click.echo(f"{table}: converted{'' if rows is None else f' {rows} rows'}{f' in {path}' if path else ''}")
+    click.echo(f"Converted {len(converted)} tables to {id_storage()} ids in {perf_counter() - started:.2f}s")
+
+def register_commands(app):
+    """Register maintenance commands with the Flask CLI"""
+    app.cli.add_command(db_group)
+    app.cli.add_command(compact_real_time_stats_command)
+    app.cli.add_command(partitions_group)
+    app.cli.add_command(archive_group)
+    app.cli.add_command(sketches_group)
+    app.cli.add_command(rollups_group)
+    app.cli.add_command(backfill_command)
+    app.cli.add_command(etl_group)
+    app.cli.add_command(ids_group)
@@ -6,9 +6,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
 from src.models.analytics import db
-from src.routes.analytics import analytics_bp
-from src.routes.dashboard import dashboard_bp
-from src.routes.reports import reports_bp
+from src.models.keys import set_id_storage
+from src.models.routing import replica_router
+from src.services.admission import admission_control
+from src.services.coalescing import single_flight
+from src.services.partitioning import PartitionManager
+from src.commands import migrate_database, register_commands
 import logging
 from datetime import datetime
 
@@ -19,128 +22,225 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuration
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'themepark-analytics-secret-key-2025')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
-    'DATABASE_URL', 
-    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'analytics.db')}"
-)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,
-    'pool_recycle': 300,
-}
-
-# Enable CORS for all routes
-CORS(app, origins=['*'], supports_credentials=True)
-
-# Register blueprints
-app.register_blueprint(analytics_bp, url_prefix='/api/v1/analytics')
-app.register_blueprint(dashboard_bp, url_prefix='/api/v1/dashboard')
-app.register_blueprint(reports_bp, url_prefix='/api/v1/reports')
-
-# Initialize database
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-    logger.info("Database initialized successfully")
-
-# Health check endpoint
-@app.route('/health')
-def health_check():
-    """Health check endpoint for monitoring"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'Theme Park Analytics Service',
-        'version': '1.0.0',
-        'timestamp': datetime.utcnow().isoformat()
-    })
-
-# API info endpoint
-@app.route('/api/v1/info')
-def api_info():
-    """API information endpoint"""
-    return jsonify({
-        'service': 'Theme Park QR System Analytics Service',
-        'version': '1.0.0',
-        'description': 'Analytics and reporting service for theme park operations',
-        'author': 'SC MASEKO 402110470',
-        'endpoints': {
-            'analytics': '/api/v1/analytics',
-            'dashboard': '/api/v1/dashboard',
-            'reports': '/api/v1/reports',
-            'health': '/health'
-        },
-        'timestamp': datetime.utcnow().isoformat()
-    })
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({
-        'success': False,
-        'error': {
-            'code': 'NOT_FOUND',
-            'message': 'Resource not found'
-        },
-        'timestamp': datetime.utcnow().isoformat()
-    }), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    logger.error(f"Internal server error: {error}")
-    return jsonify({
-        'success': False,
-        'error': {
-            'code': 'INTERNAL_ERROR',
-            'message': 'Internal server error'
-        },
-        'timestamp': datetime.utcnow().isoformat()
-    }), 500
-
-@app.errorhandler(400)
-def bad_request(error):
-    return jsonify({
-        'success': False,
-        'error': {
-            'code': 'BAD_REQUEST',
-            'message': 'Bad request'
-        },
-        'timestamp': datetime.utcnow().isoformat()
-    }), 400
-
-# Static file serving for frontend
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+def load_config(app):
+    """Read the service configuration from the environment"""
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'themepark-analytics-secret-key-2025')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL', 
+        f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'analytics.db')}"
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': True,
+        'pool_recycle': 300,
+    }
+    app.config['ANALYTICS_ID_STORAGE'] = os.environ.get('ANALYTICS_ID_STORAGE', 'text')  # text or binary (16-byte ids)
+    # Optional read replica for GET handlers, e.g. a streaming standby, or locally a
+    # read-only view of the same SQLite file: sqlite:///file:/path/analytics.db?mode=ro&uri=true
+    app.config['SQLALCHEMY_REPLICA_URI'] = os.environ.get('DATABASE_REPLICA_URL')
+    app.config['REPLICA_MAX_STALENESS_SECONDS'] = int(os.environ.get('REPLICA_MAX_STALENESS_SECONDS', 5))
+    app.config['REPLICA_CHECK_INTERVAL_SECONDS'] = int(os.environ.get('REPLICA_CHECK_INTERVAL_SECONDS', 5))
+    app.config['STREAM_HEARTBEAT_SECONDS'] = int(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15))
+    # Each process polls the shared stream_events table this often while it has stream subscribers
+    app.config['STREAM_POLL_SECONDS'] = float(os.environ.get('STREAM_POLL_SECONDS', 0.5))
+    app.config['STREAM_HISTORY_SIZE'] = int(os.environ.get('STREAM_HISTORY_SIZE', 256))
+    app.config['DELTA_SYNC_SETTLE_SECONDS'] = int(os.environ.get('DELTA_SYNC_SETTLE_SECONDS', 2))
+    app.config['REAL_TIME_RAW_RETENTION_HOURS'] = int(os.environ.get('REAL_TIME_RAW_RETENTION_HOURS', 24))
+    app.config['REAL_TIME_MINUTE_RETENTION_DAYS'] = int(os.environ.get('REAL_TIME_MINUTE_RETENTION_DAYS', 30))
+    app.config['REAL_TIME_COMPACTION_BATCH_SIZE'] = int(os.environ.get('REAL_TIME_COMPACTION_BATCH_SIZE', 5000))
+    app.config['ANOMALY_EWMA_ALPHA'] = float(os.environ.get('ANOMALY_EWMA_ALPHA', 0.05))
+    app.config['ANOMALY_SEASONAL_ALPHA'] = float(os.environ.get('ANOMALY_SEASONAL_ALPHA', 0.01))
+    app.config['ANOMALY_Z_THRESHOLD'] = float(os.environ.get('ANOMALY_Z_THRESHOLD', 3.0))
+    app.config['ANOMALY_CRITICAL_Z_THRESHOLD'] = float(os.environ.get('ANOMALY_CRITICAL_Z_THRESHOLD', 5.0))
+    app.config['ANOMALY_WARMUP_SAMPLES'] = int(os.environ.get('ANOMALY_WARMUP_SAMPLES', 30))
+    # Snapshots are applied once this old, as concurrent posts may commit out of order
+    app.config['ANOMALY_SETTLE_SECONDS'] = int(os.environ.get('ANOMALY_SETTLE_SECONDS', 2))
+    # Alerts expire when no snapshot this recent has been applied
+    app.config['ANOMALY_STALE_SECONDS'] = int(os.environ.get('ANOMALY_STALE_SECONDS', 300))
+    app.config['FORECAST_HISTORY_DAYS'] = int(os.environ.get('FORECAST_HISTORY_DAYS', 120))
+    app.config['FORECAST_HALF_LIFE_DAYS'] = float(os.environ.get('FORECAST_HALF_LIFE_DAYS', 28))
+    app.config['FORECAST_MAX_DAYS'] = int(os.environ.get('FORECAST_MAX_DAYS', 14))
+    app.config['BULK_UPSERT_MAX_ROWS'] = int(os.environ.get('BULK_UPSERT_MAX_ROWS', 100000))
+    app.config['BULK_UPSERT_BATCH_SIZE'] = int(os.environ.get('BULK_UPSERT_BATCH_SIZE', 5000))
+    # Core API database read by the ETL (defaults to DATABASE_URL, i.e. the shared database)
+    app.config['ETL_SOURCE_DATABASE_URL'] = os.environ.get('ETL_SOURCE_DATABASE_URL')
+    app.config['ETL_BATCH_SIZE'] = int(os.environ.get('ETL_BATCH_SIZE', 10000))
+    app.config['ETL_SETTLE_SECONDS'] = int(os.environ.get('ETL_SETTLE_SECONDS', 5))
+    app.config['ETL_PAYMENT_REVISION_MINUTES'] = int(os.environ.get('ETL_PAYMENT_REVISION_MINUTES', 15))
+    app.config['ETL_INTERVAL_SECONDS'] = int(os.environ.get('ETL_INTERVAL_SECONDS', 30))
+    app.config['ANALYTICS_PARTITION_DIR'] = os.environ.get('ANALYTICS_PARTITION_DIR')  # Monthly partition files (SQLite only)
+    app.config['PARTITION_MONTHS_AHEAD'] = int(os.environ.get('PARTITION_MONTHS_AHEAD', 2))
+    app.config['ARCHIVE_DIR'] = os.environ.get(
+        'ARCHIVE_DIR',
+        os.path.join(os.path.dirname(__file__), 'database', 'archive')
+    )
+    app.config['ARCHIVE_HOT_DAYS'] = int(os.environ.get('ARCHIVE_HOT_DAYS', 30))
+    app.config['ATTRACTION_CACHE_TTL_SECONDS'] = int(os.environ.get('ATTRACTION_CACHE_TTL_SECONDS', 300))
+    # Per-process concurrency limits; keep the heavy lane's concurrency plus queue below the worker's threads
+    app.config['ADMISSION_LIVE_CONCURRENCY'] = int(os.environ.get('ADMISSION_LIVE_CONCURRENCY', 32))
+    app.config['ADMISSION_LIVE_QUEUE'] = int(os.environ.get('ADMISSION_LIVE_QUEUE', 64))
+    app.config['ADMISSION_LIVE_QUEUE_SECONDS'] = float(os.environ.get('ADMISSION_LIVE_QUEUE_SECONDS', 2))
+    app.config['ADMISSION_HEAVY_CONCURRENCY'] = int(os.environ.get('ADMISSION_HEAVY_CONCURRENCY', 1))
+    app.config['ADMISSION_HEAVY_QUEUE'] = int(os.environ.get('ADMISSION_HEAVY_QUEUE', 1))
+    app.config['ADMISSION_HEAVY_QUEUE_SECONDS'] = float(os.environ.get('ADMISSION_HEAVY_QUEUE_SECONDS', 10))
+    app.config['ADMISSION_HEAVY_RANGE_DAYS'] = int(os.environ.get('ADMISSION_HEAVY_RANGE_DAYS', 31))
+    # Range queries estimated above this many rows read the day or month rollups
+    app.config['QUERY_PLANNER_MAX_ROWS'] = int(os.environ.get('QUERY_PLANNER_MAX_ROWS', 50000))
+    app.config['QUERY_PLANNER_STATISTICS_SECONDS'] = int(os.environ.get('QUERY_PLANNER_STATISTICS_SECONDS', 300))
+    app.config['ROLLUP_SETTLE_SECONDS'] = int(os.environ.get('ROLLUP_SETTLE_SECONDS', 60))
+    # Share of each day's visits, after its first few, kept for approximate queries (rebuild the sample after changing)
+    app.config['VISITOR_SAMPLE_RATE'] = float(os.environ.get('VISITOR_SAMPLE_RATE', 0.05))
+    app.config['VISITOR_SAMPLE_CENSUS_PER_DAY'] = int(os.environ.get('VISITOR_SAMPLE_CENSUS_PER_DAY', 10))
+    # Longest wait for an identical in-flight request before computing separately
+    app.config['COALESCE_TIMEOUT_SECONDS'] = float(os.environ.get('COALESCE_TIMEOUT_SECONDS', 5))
+    # Upgrade the schema while the app is created instead of through `flask db upgrade`
+    app.config['ANALYTICS_MIGRATE_ON_START'] = os.environ.get('ANALYTICS_MIGRATE_ON_START') == 'true'
+
+def create_app(config=None):
+    """
+    Create the analytics app, with `config` overriding the environment.
+
+    Nothing here touches the database: the schema is upgraded by `flask db upgrade`
+    (or ANALYTICS_MIGRATE_ON_START), and the forecast, anomaly, attraction and archive
+    services are created on first use, so pre-forked workers start cheaply and each
+    builds its own caches.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    load_config(app)
+    if config:
+        app.config.update(config)
+
+    # Enable CORS for all routes
+    CORS(app, origins=['*'], supports_credentials=True)
+
+    # Identical concurrent requests share one response; followers skip the admission lanes
+    single_flight.init_app(app)
+    # Live and heavy request lanes, checked before any handler runs
+    admission_control.init_app(app)
+
+    # Register blueprints
+    from src.routes.analytics import analytics_bp
+    from src.routes.dashboard import dashboard_bp
+    from src.routes.reports import reports_bp
+    app.register_blueprint(analytics_bp, url_prefix='/api/v1/analytics')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/v1/dashboard')
+    app.register_blueprint(reports_bp, url_prefix='/api/v1/reports')
+    register_service_routes(app)
+
+    # Maintenance commands (flask --app src.main <command>)
+    register_commands(app)
+
+    # Initialize database
+    set_id_storage(app.config['ANALYTICS_ID_STORAGE'])
+    db.init_app(app)
+    with app.app_context():
+        app.extensions['partitions'] = PartitionManager(db.engine, db.metadata, app.config['ANALYTICS_PARTITION_DIR'])
+        replica_router.init_app(app, db.engine)
+        if app.config['ANALYTICS_MIGRATE_ON_START']:
+            migrate_database()
+            logger.info("Database initialized successfully")
+
+    return app
+
+def register_service_routes(app):
+    """Health, info and error handlers, and the frontend's static files"""
+    # Health check endpoint
+    @app.route('/health')
+    def health_check():
+        """Health check endpoint for monitoring"""
+        return jsonify({
+            'status': 'healthy',
+            'service': 'Theme Park Analytics Service',
+            'version': '1.0.0',
+            'admission': admission_control.status(),
+            'coalescing': single_flight.status(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    # API info endpoint
+    @app.route('/api/v1/info')
+    def api_info():
+        """API information endpoint"""
+        return jsonify({
+            'service': 'Theme Park QR System Analytics Service',
+            'version': '1.0.0',
+            'description': 'Analytics and reporting service for theme park operations',
+            'author': 'SC MASEKO 402110470',
+            'endpoints': {
+                'analytics': '/api/v1/analytics',
+                'dashboard': '/api/v1/dashboard',
+                'reports': '/api/v1/reports',
+                'health': '/health'
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(error):
         return jsonify({
             'success': False,
             'error': {
-                'code': 'CONFIG_ERROR',
-                'message': 'Static folder not configured'
-            }
+                'code': 'NOT_FOUND',
+                'message': 'Resource not found'
+            },
+            'timestamp': datetime.utcnow().isoformat()
         }), 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+    @app.errorhandler(500)
+    def internal_error(error):
+        logger.error(f"Internal server error: {error}")
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INTERNAL_ERROR',
+                'message': 'Internal server error'
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'BAD_REQUEST',
+                'message': 'Bad request'
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        }), 400
+
+    # Static file serving for frontend
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'CONFIG_ERROR',
+                    'message': 'Static folder not configured'
+                }
+            }), 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            # Return API info if no frontend is available
-            return api_info()
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                # Return API info if no frontend is available
+                return api_info()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     debug = os.environ.get('FLASK_ENV') == 'development'
-    
+
+    # The development server keeps creating the schema on start
+    app = create_app({'ANALYTICS_MIGRATE_ON_START': True})
     logger.info(f"Starting Theme Park Analytics Service on port {port}")
     logger.info(f"Debug mode: {debug}")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
-
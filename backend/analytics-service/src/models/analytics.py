@@ -1,8 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
-import uuid
+import json
+from src.models.keys import CompactId, new_id
+from src.models.money import from_cents
+from src.models.routing import RoutingSession
 
-db = SQLAlchemy()
+# GET handlers read from the replica when one is configured (see routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class VisitorAnalytics(db.Model):
     """
@@ -11,7 +15,7 @@ class VisitorAnalytics(db.Model):
     """
     __tablename__ = 'visitor_analytics'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(CompactId, primary_key=True, default=new_id)
     user_id = db.Column(db.String(36), nullable=True)  # Can be null for anonymous visitors
     session_id = db.Column(db.String(36), nullable=True)
     visit_date = db.Column(db.Date, nullable=False, default=date.today)
@@ -19,7 +23,7 @@ class VisitorAnalytics(db.Model):
     exit_time = db.Column(db.DateTime, nullable=True)
     total_duration_minutes = db.Column(db.Integer, nullable=True)
     attractions_visited = db.Column(db.Integer, default=0)
-    total_spending = db.Column(db.Numeric(10, 2), default=0.00)
+    total_spending_cents = db.Column(db.BigInteger, default=0)  # Cents
     queue_time_minutes = db.Column(db.Integer, default=0)
     satisfaction_rating = db.Column(db.Integer, nullable=True)  # 1-5 scale
     feedback_comments = db.Column(db.Text, nullable=True)
@@ -37,7 +41,7 @@ class VisitorAnalytics(db.Model):
             'exit_time': self.exit_time.isoformat() if self.exit_time else None,
             'total_duration_minutes': self.total_duration_minutes,
             'attractions_visited': self.attractions_visited,
-            'total_spending': float(self.total_spending) if self.total_spending else 0.0,
+            'total_spending': from_cents(self.total_spending_cents),
             'queue_time_minutes': self.queue_time_minutes,
             'satisfaction_rating': self.satisfaction_rating,
             'feedback_comments': self.feedback_comments,
@@ -46,6 +50,65 @@ class VisitorAnalytics(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class VisitorSketch(db.Model):
+    """
+    Visitor Sketch Model
+    HyperLogLog sketch of distinct user or session ids for one hour or day
+    """
+    __tablename__ = 'visitor_sketches'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    granularity = db.Column(db.String(10), nullable=False)  # hour, day
+    field = db.Column(db.String(20), nullable=False)  # user_id, session_id
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    registers = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed HLL registers
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'field', 'bucket_start', name='unique_sketch_bucket'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'granularity': self.granularity,
+            'field': self.field,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class QuantileSketch(db.Model):
+    """
+    Quantile Sketch Model
+    DDSketch of one metric for one scope (e.g. an attraction) and time bucket
+    """
+    __tablename__ = 'quantile_sketches'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    metric = db.Column(db.String(50), nullable=False)  # wait_time, api_response_time_ms, average_queue_time
+    scope = db.Column(db.String(50), nullable=False, default='')  # attraction_id, or '' for park-wide metrics
+    granularity = db.Column(db.String(10), nullable=False)  # minute, hour
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    sample_count = db.Column(db.Float, nullable=False, default=0)
+    sketch = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed DDSketch bins
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'scope', 'granularity', 'bucket_start', name='unique_quantile_sketch_bucket'),
+        db.Index('idx_quantile_sketch_lookup', 'metric', 'granularity', 'bucket_start'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'metric': self.metric,
+            'scope': self.scope,
+            'granularity': self.granularity,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'sample_count': self.sample_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class OperationalMetrics(db.Model):
     """
     Operational Metrics Model
@@ -53,11 +116,11 @@ class OperationalMetrics(db.Model):
     """
     __tablename__ = 'operational_metrics'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    metric_date = db.Column(db.Date, nullable=False)
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    metric_date = db.Column(db.Date, primary_key=True)  # Part of the key so PostgreSQL can partition by month
     metric_hour = db.Column(db.Integer, nullable=False)  # 0-23
     total_visitors = db.Column(db.Integer, default=0)
-    total_revenue = db.Column(db.Numeric(12, 2), default=0.00)
+    total_revenue_cents = db.Column(db.BigInteger, default=0)  # Cents
     average_wait_time = db.Column(db.Integer, default=0)
     peak_capacity_percentage = db.Column(db.Numeric(5, 2), default=0.00)
     staff_efficiency_score = db.Column(db.Numeric(5, 2), default=0.00)
@@ -65,9 +128,11 @@ class OperationalMetrics(db.Model):
     error_count = db.Column(db.Integer, default=0)
     customer_satisfaction_avg = db.Column(db.Numeric(3, 2), default=0.00)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     __table_args__ = (
         db.UniqueConstraint('metric_date', 'metric_hour', name='unique_date_hour'),
+        {'postgresql_partition_by': 'RANGE (metric_date)'}
     )
     
     def to_dict(self):
@@ -76,14 +141,15 @@ class OperationalMetrics(db.Model):
             'metric_date': self.metric_date.isoformat() if self.metric_date else None,
             'metric_hour': self.metric_hour,
             'total_visitors': self.total_visitors,
-            'total_revenue': float(self.total_revenue) if self.total_revenue else 0.0,
+            'total_revenue': from_cents(self.total_revenue_cents),
             'average_wait_time': self.average_wait_time,
             'peak_capacity_percentage': float(self.peak_capacity_percentage) if self.peak_capacity_percentage else 0.0,
             'staff_efficiency_score': float(self.staff_efficiency_score) if self.staff_efficiency_score else 0.0,
             'system_uptime_percentage': float(self.system_uptime_percentage) if self.system_uptime_percentage else 100.0,
             'error_count': self.error_count,
             'customer_satisfaction_avg': float(self.customer_satisfaction_avg) if self.customer_satisfaction_avg else 0.0,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class RealTimeStats(db.Model):
@@ -93,8 +159,8 @@ class RealTimeStats(db.Model):
     """
     __tablename__ = 'real_time_stats'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     current_visitors = db.Column(db.Integer, default=0)
     active_queues = db.Column(db.Integer, default=0)
     average_queue_time = db.Column(db.Integer, default=0)
@@ -118,6 +184,206 @@ class RealTimeStats(db.Model):
             'concurrent_users': self.concurrent_users
         }
 
+# Real-time metrics kept as min/max/avg/last in the rollup tiers
+REAL_TIME_METRICS = (
+    'current_visitors',
+    'active_queues',
+    'average_queue_time',
+    'system_load_percentage',
+    'payment_success_rate',
+    'api_response_time_ms',
+    'cache_hit_rate',
+    'concurrent_users',
+)
+
+ROLLUP_AGGREGATES = ('min', 'max', 'avg', 'last')
+
+class RealTimeRollupMixin:
+    """
+    Columns shared by the real-time stats rollup tiers.
+    Each bucket stores min/max/avg/last of every metric in REAL_TIME_METRICS
+    as `<metric>_<aggregate>` columns, and as `<metric>_count` the samples
+    with a value, which weight the average (`sample_count` includes nulls).
+    """
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    bucket_start = db.Column(db.DateTime, nullable=False, unique=True, index=True)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    last_timestamp = db.Column(db.DateTime, nullable=True)  # Timestamp of the sample behind the `last` values
+
+    def to_dict(self):
+        result = {
+            'id': self.id,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'sample_count': self.sample_count,
+            'last_timestamp': self.last_timestamp.isoformat() if self.last_timestamp else None
+        }
+        for metric in REAL_TIME_METRICS:
+            result[metric] = {
+                aggregate: getattr(self, f'{metric}_{aggregate}') for aggregate in ROLLUP_AGGREGATES
+            }
+            result[metric]['count'] = getattr(self, f'{metric}_count')
+        return result
+
+for _metric in REAL_TIME_METRICS:
+    for _aggregate in ROLLUP_AGGREGATES:
+        setattr(RealTimeRollupMixin, f'{_metric}_{_aggregate}', db.Column(db.Float, nullable=True))
+    setattr(RealTimeRollupMixin, f'{_metric}_count', db.Column(db.Integer, nullable=True))
+
+class RealTimeStatsMinute(RealTimeRollupMixin, db.Model):
+    """
+    Real-time Statistics Minute Rollup
+    Per-minute aggregates of real-time stats older than the raw retention window
+    """
+    __tablename__ = 'real_time_stats_minute'
+
+class RealTimeStatsHour(RealTimeRollupMixin, db.Model):
+    """
+    Real-time Statistics Hour Rollup
+    Per-hour aggregates of real-time stats older than the minute retention window
+    """
+    __tablename__ = 'real_time_stats_hour'
+
+class StreamEventRecord(db.Model):
+    """
+    Stream Event Model
+    Published dashboard stream events, read by every worker process's stream poller
+    """
+    __tablename__ = 'stream_events'
+
+    # An increasing integer rather than a CompactId: it is the SSE event id subscribers resume after
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.Text, nullable=False)  # JSON, serialized once by the publisher
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BackfillCheckpoint(db.Model):
+    """
+    Backfill Checkpoint Model
+    One completed day of a rollup backfill job, so interrupted runs resume
+    """
+    __tablename__ = 'backfill_checkpoints'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    job = db.Column(db.String(100), nullable=False)
+    chunk_date = db.Column(db.Date, nullable=False)
+    rows_written = db.Column(db.Integer, default=0)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('job', 'chunk_date', name='unique_backfill_job_date'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job': self.job,
+            'chunk_date': self.chunk_date.isoformat() if self.chunk_date else None,
+            'rows_written': self.rows_written,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class EtlWatermark(db.Model):
+    """
+    ETL Watermark Model
+    Position of the last source event folded in by one ETL stream
+    """
+    __tablename__ = 'etl_watermarks'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    stream = db.Column(db.String(50), nullable=False)
+    position_timestamp = db.Column(db.DateTime, nullable=True)  # Naive UTC for time zone aware sources
+    position_id = db.Column(db.String(36), nullable=True)  # Breaks ties between events with the same timestamp
+    events_processed = db.Column(db.BigInteger, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('stream', name='unique_etl_stream'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stream': self.stream,
+            'position_timestamp': self.position_timestamp.isoformat() if self.position_timestamp else None,
+            'position_id': self.position_id,
+            'events_processed': self.events_processed,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class DetectorState(db.Model):
+    """
+    Detector State Model
+    Baselines, active alerts (JSON) and watermark of an online detector,
+    shared by every worker process
+    """
+    __tablename__ = 'detector_state'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    detector = db.Column(db.String(50), nullable=False)
+    state = db.Column(db.Text, nullable=False, default='{}')
+    position_timestamp = db.Column(db.DateTime, nullable=True)  # Last snapshot applied
+    position_id = db.Column(db.String(36), nullable=True)  # Breaks ties between snapshots with the same timestamp
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped by every save, so concurrent saves conflict
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('detector', name='unique_detector_state'),
+    )
+
+class EtlBucket(db.Model):
+    """
+    ETL Bucket Model
+    Exact running totals (JSON) of one ETL stream for one scope and hour, from
+    which the hourly analytics rows are derived
+    """
+    __tablename__ = 'etl_buckets'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    stream = db.Column(db.String(50), nullable=False)
+    scope = db.Column(db.String(50), nullable=False, default='')  # attraction_id, or '' for park-wide totals
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    totals = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('stream', 'scope', 'bucket_start', name='unique_etl_bucket'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stream': self.stream,
+            'scope': self.scope,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'totals': json.loads(self.totals) if self.totals else {},
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class AttractionDimension(db.Model):
+    """
+    Attraction Dimension Model
+    One row per attraction: the compact key hourly rows carry, and the id,
+    name and metadata synced from access_control.attractions
+    """
+    __tablename__ = 'attraction_dimension'
+    
+    attraction_key = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    attraction_id = db.Column(db.String(36), nullable=False, unique=True)
+    name = db.Column(db.String(200), nullable=False)
+    max_capacity = db.Column(db.Integer, nullable=True)  # Riders per cycle
+    duration_minutes = db.Column(db.Integer, nullable=True)  # Minutes per cycle
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'attraction_id': self.attraction_id,
+            'name': self.name,
+            'max_capacity': self.max_capacity,
+            'duration_minutes': self.duration_minutes,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class AttractionAnalytics(db.Model):
     """
     Attraction Analytics Model
@@ -125,10 +391,11 @@ class AttractionAnalytics(db.Model):
     """
     __tablename__ = 'attraction_analytics'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    attraction_id = db.Column(db.String(36), nullable=False)
-    attraction_name = db.Column(db.String(200), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    # Key into attraction_dimension, which holds the attraction's id and name (not a
+    # foreign key: SQLite month partitions live in files of their own)
+    attraction_key = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, primary_key=True)  # Part of the key so PostgreSQL can partition by month
     hour = db.Column(db.Integer, nullable=False)  # 0-23
     total_visitors = db.Column(db.Integer, default=0)
     average_wait_time = db.Column(db.Integer, default=0)
@@ -136,18 +403,21 @@ class AttractionAnalytics(db.Model):
     capacity_utilization = db.Column(db.Numeric(5, 2), default=0.00)
     satisfaction_rating = db.Column(db.Numeric(3, 2), default=0.00)
     downtime_minutes = db.Column(db.Integer, default=0)
-    revenue_generated = db.Column(db.Numeric(10, 2), default=0.00)
+    revenue_generated_cents = db.Column(db.BigInteger, default=0)  # Cents
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     __table_args__ = (
-        db.UniqueConstraint('attraction_id', 'date', 'hour', name='unique_attraction_date_hour'),
+        db.UniqueConstraint('attraction_key', 'date', 'hour', name='unique_attraction_date_hour'),
+        {'postgresql_partition_by': 'RANGE (date)'}
     )
     
-    def to_dict(self):
+    def to_dict(self, attraction):
+        """`attraction` is the row's attraction_dimension entry (see services/attractions.py)"""
         return {
             'id': self.id,
-            'attraction_id': self.attraction_id,
-            'attraction_name': self.attraction_name,
+            'attraction_id': attraction.attraction_id,
+            'attraction_name': attraction.name,
             'date': self.date.isoformat() if self.date else None,
             'hour': self.hour,
             'total_visitors': self.total_visitors,
@@ -156,8 +426,9 @@ class AttractionAnalytics(db.Model):
             'capacity_utilization': float(self.capacity_utilization) if self.capacity_utilization else 0.0,
             'satisfaction_rating': float(self.satisfaction_rating) if self.satisfaction_rating else 0.0,
             'downtime_minutes': self.downtime_minutes,
-            'revenue_generated': float(self.revenue_generated) if self.revenue_generated else 0.0,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'revenue_generated': from_cents(self.revenue_generated_cents),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class PaymentAnalytics(db.Model):
@@ -167,19 +438,20 @@ class PaymentAnalytics(db.Model):
     """
     __tablename__ = 'payment_analytics'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    date = db.Column(db.Date, nullable=False)
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    date = db.Column(db.Date, primary_key=True)  # Part of the key so PostgreSQL can partition by month
     hour = db.Column(db.Integer, nullable=False)
     payment_method = db.Column(db.String(50), nullable=False)  # CREDIT_CARD, MOBILE_WALLET, etc.
     transaction_count = db.Column(db.Integer, default=0)
-    total_amount = db.Column(db.Numeric(12, 2), default=0.00)
-    average_transaction_amount = db.Column(db.Numeric(10, 2), default=0.00)
+    total_amount_cents = db.Column(db.BigInteger, default=0)  # Cents
+    average_transaction_amount_cents = db.Column(db.BigInteger, default=0)  # Cents
     success_rate = db.Column(db.Numeric(5, 2), default=100.00)
     average_processing_time_ms = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     __table_args__ = (
         db.UniqueConstraint('date', 'hour', 'payment_method', name='unique_payment_date_hour_method'),
+        {'postgresql_partition_by': 'RANGE (date)'}
     )
     
     def to_dict(self):
@@ -189,10 +461,208 @@ class PaymentAnalytics(db.Model):
             'hour': self.hour,
             'payment_method': self.payment_method,
             'transaction_count': self.transaction_count,
-            'total_amount': float(self.total_amount) if self.total_amount else 0.0,
-            'average_transaction_amount': float(self.average_transaction_amount) if self.average_transaction_amount else 0.0,
+            'total_amount': from_cents(self.total_amount_cents),
+            'average_transaction_amount': from_cents(self.average_transaction_amount_cents),
             'success_rate': float(self.success_rate) if self.success_rate else 100.0,
             'average_processing_time_ms': self.average_processing_time_ms,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+class VisitorRollup(db.Model):
+    """
+    Visitor Rollup Model
+    Visit totals per hour, day or month tier, kept current as visitor rows are
+    ingested; `period` is the bucket label visitor stats report
+    """
+    __tablename__ = 'visitor_rollups'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    granularity = db.Column(db.String(10), nullable=False)  # hour, day, month
+    visit_date = db.Column(db.Date, nullable=False)  # First of the month for the month tier
+    period = db.Column(db.String(16), nullable=False)  # YYYY-MM-DD HH:00 (or the visit date without an entry time), YYYY-MM-DD, YYYY-MM
+    visitors = db.Column(db.Integer, nullable=False, default=0)
+    spending_cents = db.Column(db.BigInteger, nullable=False, default=0)  # Cents
+    duration_minutes = db.Column(db.BigInteger, nullable=False, default=0)
+    satisfaction_sum = db.Column(db.Integer, nullable=False, default=0)
+    satisfaction_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'visit_date', 'period', name='unique_visitor_rollup'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'granularity': self.granularity,
+            'visit_date': self.visit_date.isoformat() if self.visit_date else None,
+            'period': self.period,
+            'visitors': self.visitors,
+            'total_spending': from_cents(self.spending_cents),
+            'duration_minutes': self.duration_minutes,
+            'satisfaction_sum': self.satisfaction_sum,
+            'satisfaction_count': self.satisfaction_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class OperationalRollup(db.Model):
+    """
+    Operational Rollup Model
+    Sums of the hourly operational metrics per day or month tier, from which
+    the per-hour averages are derived
+    """
+    __tablename__ = 'operational_rollups'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    granularity = db.Column(db.String(10), nullable=False)  # day, month
+    metric_date = db.Column(db.Date, nullable=False)  # First of the month for the month tier
+    hours = db.Column(db.Integer, nullable=False, default=0)  # Hourly rows summed
+    total_visitors = db.Column(db.BigInteger, nullable=False, default=0)
+    total_revenue_cents = db.Column(db.BigInteger, nullable=False, default=0)  # Cents
+    wait_time_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    capacity_sum = db.Column(db.Float, nullable=False, default=0)
+    efficiency_sum = db.Column(db.Float, nullable=False, default=0)
+    uptime_sum = db.Column(db.Float, nullable=False, default=0)
+    satisfaction_sum = db.Column(db.Float, nullable=False, default=0)
+    error_count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'metric_date', name='unique_operational_rollup'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'granularity': self.granularity,
+            'metric_date': self.metric_date.isoformat() if self.metric_date else None,
+            'hours': self.hours,
+            'total_visitors': self.total_visitors,
+            'total_revenue': from_cents(self.total_revenue_cents),
+            'error_count': self.error_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class AttractionRollup(db.Model):
+    """
+    Attraction Rollup Model
+    Sums of one attraction's hourly analytics per day or month tier, from
+    which the per-hour averages are derived
+    """
+    __tablename__ = 'attraction_rollups'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    granularity = db.Column(db.String(10), nullable=False)  # day, month
+    attraction_key = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)  # First of the month for the month tier
+    hours = db.Column(db.Integer, nullable=False, default=0)  # Hourly rows summed
+    total_visitors = db.Column(db.BigInteger, nullable=False, default=0)
+    wait_time_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    max_wait_time = db.Column(db.Integer, nullable=False, default=0)
+    capacity_sum = db.Column(db.Float, nullable=False, default=0)
+    satisfaction_sum = db.Column(db.Float, nullable=False, default=0)
+    downtime_minutes = db.Column(db.BigInteger, nullable=False, default=0)
+    revenue_cents = db.Column(db.BigInteger, nullable=False, default=0)  # Cents
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'date', 'attraction_key', name='unique_attraction_rollup'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'granularity': self.granularity,
+            'attraction_key': self.attraction_key,
+            'date': self.date.isoformat() if self.date else None,
+            'hours': self.hours,
+            'total_visitors': self.total_visitors,
+            'max_wait_time': self.max_wait_time,
+            'downtime_minutes': self.downtime_minutes,
+            'revenue_generated': from_cents(self.revenue_cents),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class RollupState(db.Model):
+    """
+    Rollup State Model
+    How far the rollup tiers of one source table are complete: every date from
+    `covered_from` whose rows have not changed since `refreshed_through`. The
+    visitor sample records its coverage here too, as `visitor_samples`.
+    """
+    __tablename__ = 'rollup_states'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    source = db.Column(db.String(50), nullable=False)
+    covered_from = db.Column(db.Date, nullable=True)  # Null when the tiers cover every date
+    refreshed_through = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('source', name='unique_rollup_source'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'source': self.source,
+            'covered_from': self.covered_from.isoformat() if self.covered_from else None,
+            'refreshed_through': self.refreshed_through.isoformat() if self.refreshed_through else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class VisitorSample(db.Model):
+    """
+    Visitor Sample Model
+    One visit of the per-day stratified sample that approximate queries read:
+    either one of the day's first visits, all of which are kept (`census`), or
+    a visit kept at `VISITOR_SAMPLE_RATE` from the rest of the day
+    """
+    __tablename__ = 'visitor_samples'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    visit_date = db.Column(db.Date, nullable=False, index=True)
+    census = db.Column(db.Boolean, nullable=False, default=False)
+    total_duration_minutes = db.Column(db.Integer, nullable=True)
+    total_spending_cents = db.Column(db.BigInteger, nullable=True)  # Cents
+    satisfaction_rating = db.Column(db.Integer, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'visit_date': self.visit_date.isoformat() if self.visit_date else None,
+            'census': self.census,
+            'total_duration_minutes': self.total_duration_minutes,
+            'total_spending': from_cents(self.total_spending_cents),
+            'satisfaction_rating': self.satisfaction_rating
+        }
+
+class VisitorSampleStratum(db.Model):
+    """
+    Visitor Sample Stratum Model
+    Visits of one day and how many of them the sample holds, which weight the
+    sampled visits of that day
+    """
+    __tablename__ = 'visitor_sample_strata'
+
+    id = db.Column(CompactId, primary_key=True, default=new_id)
+    visit_date = db.Column(db.Date, nullable=False)
+    visits = db.Column(db.Integer, nullable=False, default=0)  # Every visit of the day
+    census = db.Column(db.Integer, nullable=False, default=0)  # First visits, all sampled
+    sampled = db.Column(db.Integer, nullable=False, default=0)  # Later visits sampled at the rate
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('visit_date', name='unique_sample_stratum'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'visit_date': self.visit_date.isoformat() if self.visit_date else None,
+            'visits': self.visits,
+            'census': self.census,
+            'sampled': self.sampled,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,72 @@
+import os
+import time
+from sqlalchemy import LargeBinary, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+# How surrogate ids are stored: `text` (36-character UUID strings) or `binary`
+# (16 bytes: a native uuid column on PostgreSQL, a BLOB elsewhere). Set once at
+# startup, before any table is created or queried; `flask ids migrate`
+# converts an existing database.
+ID_STORAGES = ('text', 'binary')
+_storage = {'mode': 'text'}
+
+def set_id_storage(mode):
+    if mode not in ID_STORAGES:
+        raise ValueError(f"ANALYTICS_ID_STORAGE must be one of {', '.join(ID_STORAGES)}, got {mode}")
+    _storage['mode'] = mode
+
+def id_storage():
+    return _storage['mode']
+
+def new_id():
+    """
+    Time-ordered UUID (version 7 layout: 48-bit Unix milliseconds, then
+    random bits) as a string. New rows land at the right edge of the primary
+    key index instead of splitting random pages, in either storage.
+    """
+    value = bytearray((time.time_ns() // 1_000_000).to_bytes(6, 'big') + os.urandom(10))
+    value[6] = 0x70 | (value[6] & 0x0F)
+    value[8] = 0x80 | (value[8] & 0x3F)
+    return id_from_bytes(value)
+
+# Plain hex slicing: ids are converted once per bound or fetched row, and uuid.UUID is several times slower
+
+def id_to_bytes(value):
+    """16-byte form of a UUID string"""
+    data = bytes.fromhex(value.replace('-', ''))
+    if len(data) != 16:
+        raise ValueError(f'Not a UUID: {value}')
+    return data
+
+def id_from_bytes(value):
+    """UUID string of a 16-byte id"""
+    h = value.hex()
+    return f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}'
+
+class CompactId(TypeDecorator):
+    """Surrogate id column: a UUID string in Python and the API, stored per `id_storage()`"""
+
+    impl = String(36)
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return str
+
+    def load_dialect_impl(self, dialect):
+        if id_storage() != 'binary':
+            return dialect.type_descriptor(String(36))
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str) and id_storage() == 'binary' and dialect.name != 'postgresql':
+            return id_to_bytes(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, bytes):
+            return id_from_bytes(value)
+        return value
@@ -0,0 +1,336 @@
+import sqlite3
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, String, Table, UniqueConstraint, Uuid, create_engine, inspect, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+from src.models.analytics import REAL_TIME_METRICS
+from src.models.keys import CompactId, id_from_bytes, id_storage, id_to_bytes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Backfills for columns added to existing tables, run after the column exists
+COLUMN_BACKFILLS = {
+    ('operational_metrics', 'updated_at'): 'UPDATE operational_metrics SET updated_at = created_at WHERE updated_at IS NULL',
+    ('attraction_analytics', 'updated_at'): 'UPDATE attraction_analytics SET updated_at = created_at WHERE updated_at IS NULL',
+    # Money moved from NUMERIC amounts to integer cents
+    ('visitor_analytics', 'total_spending_cents'):
+        'UPDATE visitor_analytics SET total_spending_cents = CAST(ROUND(total_spending * 100) AS BIGINT)',
+    ('operational_metrics', 'total_revenue_cents'):
+        'UPDATE operational_metrics SET total_revenue_cents = CAST(ROUND(total_revenue * 100) AS BIGINT)',
+    ('attraction_analytics', 'revenue_generated_cents'):
+        'UPDATE attraction_analytics SET revenue_generated_cents = CAST(ROUND(revenue_generated * 100) AS BIGINT)',
+    ('payment_analytics', 'total_amount_cents'):
+        'UPDATE payment_analytics SET total_amount_cents = CAST(ROUND(total_amount * 100) AS BIGINT)',
+    ('payment_analytics', 'average_transaction_amount_cents'):
+        'UPDATE payment_analytics SET average_transaction_amount_cents = '
+        'CAST(ROUND(average_transaction_amount * 100) AS BIGINT)',
+}
+
+# Buckets compacted before the per-metric counts existed: every sample of a
+# bucket with an average is assumed to have had a value
+for _table in ('real_time_stats_minute', 'real_time_stats_hour'):
+    for _metric in REAL_TIME_METRICS:
+        COLUMN_BACKFILLS[(_table, f'{_metric}_count')] = (
+            f'UPDATE {_table} SET {_metric}_count = '
+            f'CASE WHEN {_metric}_avg IS NULL THEN 0 ELSE sample_count END'
+        )
+
+# Columns replaced by the ones above, dropped once their values are copied so
+# every table and month file keeps the models' column set
+RETIRED_COLUMNS = {
+    'visitor_analytics': ('total_spending',),
+    'operational_metrics': ('total_revenue',),
+    'attraction_analytics': ('revenue_generated',),
+    'payment_analytics': ('total_amount', 'average_transaction_amount'),
+}
+
+def add_missing_columns(engine, metadata):
+    """
+    Add columns declared on the models but missing from existing tables.
+    `create_all` only creates whole tables, so databases created by an older
+    version of the service would otherwise fail on the new columns. Columns
+    in RETIRED_COLUMNS are dropped after the backfills have copied them.
+    """
+    inspector = inspect(engine)
+    added = []
+    retired = []
+
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            retired += [(table.name, name) for name in RETIRED_COLUMNS.get(table.name, ()) if name in existing_columns]
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+                added.append((table.name, column.name))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+        for table_column in added:
+            backfill = COLUMN_BACKFILLS.get(table_column)
+            if backfill:
+                connection.execute(text(backfill))
+
+        for table_name, column_name in retired:
+            connection.execute(text(f'ALTER TABLE {table_name} DROP COLUMN {column_name}'))
+            logger.info(f"Dropped retired column {table_name}.{column_name}")
+
+    # Indexes declared on the new columns
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    return added
+
+def id_tables(metadata):
+    """Tables keyed by a `CompactId` surrogate id"""
+    return [table for table in metadata.sorted_tables if 'id' in table.c and isinstance(table.c.id.type, CompactId)]
+
+def stored_id_storages(engine, metadata):
+    """How each existing table stores its ids (`text` or `binary`), by table name"""
+    inspector = inspect(engine)
+    storages = {}
+    for table in id_tables(metadata):
+        if not inspector.has_table(table.name):
+            continue
+        column = next(c for c in inspector.get_columns(table.name) if c['name'] == 'id')
+        storages[table.name] = 'binary' if isinstance(column['type'], (LargeBinary, Uuid)) else 'text'
+    return storages
+
+def _sqlite_convert_ids(connection, table, storage, batch_size):
+    """
+    Rebuild `table` in an SQLite file with its ids converted to `storage`.
+    SQLite cannot change a column's type, so the rows are copied into a new
+    table under the original name.
+    """
+    old = f'{table.name}__ids'
+    columns = [row[1] for row in connection.execute(f'PRAGMA table_info({table.name})')]
+    indexes = [row[1] for row in connection.execute(f'PRAGMA index_list({table.name})') if row[3] == 'c']
+
+    copy = table.to_metadata(MetaData())
+    copy.c.id.type = LargeBinary(16) if storage == 'binary' else String(36)
+    columns = [name for name in columns if name in copy.c]
+    convert = id_to_bytes if storage == 'binary' else id_from_bytes
+    position = columns.index('id')
+
+    connection.execute(f'ALTER TABLE {table.name} RENAME TO {old}')
+    for index in indexes:
+        connection.execute(f'DROP INDEX {index}')
+    dialect = sqlite.dialect()
+    connection.execute(str(CreateTable(copy).compile(dialect=dialect)))
+    for index in copy.indexes:
+        connection.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+    names = ', '.join(columns)
+    insert = f"INSERT INTO {table.name} ({names}) VALUES ({', '.join('?' for _ in columns)})"
+    last_rowid = 0
+    copied = 0
+    while True:
+        rows = connection.execute(
+            f'SELECT rowid, {names} FROM {old} WHERE rowid > ? ORDER BY rowid LIMIT ?', (last_rowid, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+        batch = []
+        for row in rows:
+            row = list(row[1:])
+            try:
+                row[position] = convert(row[position])
+            except (ValueError, TypeError, AttributeError):
+                raise ValueError(f'{table.name} has an id that is not a UUID: {row[position]!r}')
+            batch.append(row)
+        connection.executemany(insert, batch)
+        copied += len(batch)
+    connection.execute(f'DROP TABLE {old}')
+    return copied
+
+def convert_id_storage(engine, metadata, storage=None, sqlite_files=(), batch_size=10000):
+    """
+    Convert the id columns of existing tables to `storage` (the configured
+    one by default); tables already stored that way are left alone. On
+    SQLite `sqlite_files` lists further database files to convert (sealed and
+    detached month partitions). Each table converts in its own transaction.
+    Returns (file or None, table, rows) for every converted table.
+    """
+    storage = storage or id_storage()
+    converted = []
+    if engine.dialect.name == 'postgresql':
+        current = stored_id_storages(engine, metadata)
+        with engine.begin() as connection:
+            for table in id_tables(metadata):
+                if current.get(table.name, storage) == storage:
+                    continue
+                target = 'uuid USING id::uuid' if storage == 'binary' else 'varchar(36) USING id::text'
+                # Partitioned tables pass the change on to their partitions
+                connection.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN id TYPE {target}'))
+                converted.append((None, table.name, None))
+                logger.info(f"Converted {table.name} ids to {storage}")
+        return converted
+
+    if engine.dialect.name != 'sqlite':
+        raise ValueError(f'Id conversion is not supported on {engine.dialect.name}')
+
+    for path in [engine.url.database] + list(sqlite_files):
+        # Plain connection with explicit transactions: the DDL must roll back with the copy
+        connection = sqlite3.connect(path, isolation_level=None)
+        try:
+            existing = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in id_tables(metadata):
+                if table.name not in existing:
+                    continue
+                declared = next(row[2] for row in connection.execute(f'PRAGMA table_info({table.name})') if row[1] == 'id')
+                if ('binary' if declared.upper() == 'BLOB' else 'text') == storage:
+                    continue
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    rows = _sqlite_convert_ids(connection, table, storage, batch_size)
+                    connection.execute('COMMIT')
+                except Exception:
+                    connection.execute('ROLLBACK')
+                    raise
+                converted.append((path, table.name, rows))
+                logger.info(f"Converted {rows} {table.name} ids in {path} to {storage}")
+        finally:
+            connection.close()
+    return converted
+
+# Columns attraction_analytics carried before attraction_dimension held them
+LEGACY_ATTRACTION_COLUMNS = ('attraction_id', 'attraction_name')
+
+def _sqlite_rekey_attractions(connection, legacy, metadata, dimension):
+    """
+    Rebuild attraction_analytics in an SQLite file with `attraction_key` in
+    place of the attraction id and name, registering the attractions in the
+    `dimension` schema's attraction_dimension first. The other columns keep
+    their declared types, including ones add_missing_columns has yet to
+    backfill and drop, and indexes come back from the model.
+    """
+    model = metadata.tables['attraction_analytics']
+    old = f'{model.name}__legacy'
+    indexes = [row[1] for row in connection.execute(f'PRAGMA index_list({model.name})') if row[3] == 'c']
+
+    # Latest name of each attraction: SQLite takes bare columns from the row holding the MAX()
+    connection.execute(
+        f'INSERT OR IGNORE INTO {dimension}.attraction_dimension (attraction_id, name, updated_at) '
+        f'SELECT attraction_id, attraction_name, MAX(COALESCE(updated_at, created_at)) '
+        f'FROM {model.name} GROUP BY attraction_id'
+    )
+
+    kept = [c for c in legacy.columns if c.name not in LEGACY_ATTRACTION_COLUMNS]
+    copy = Table(
+        model.name, MetaData(),
+        *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in kept],
+        Column('attraction_key', Integer, nullable=False),
+        UniqueConstraint('attraction_key', 'date', 'hour', name='unique_attraction_date_hour')
+    )
+
+    connection.execute(f'ALTER TABLE {model.name} RENAME TO {old}')
+    for index in indexes:
+        connection.execute(f'DROP INDEX {index}')
+    dialect = sqlite.dialect()
+    connection.execute(str(CreateTable(copy).compile(dialect=dialect)))
+    for index in model.indexes:
+        if all(c.name in copy.c for c in index.columns):
+            connection.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+    names = ', '.join(c.name for c in kept)
+    selected = ', '.join(f'a.{c.name}' for c in kept)
+    connection.execute(
+        f'INSERT INTO {model.name} ({names}, attraction_key) SELECT {selected}, d.attraction_key '
+        f'FROM {old} AS a JOIN {dimension}.attraction_dimension AS d ON d.attraction_id = a.attraction_id'
+    )
+    rows = connection.execute(f'SELECT COUNT(*) FROM {model.name}').fetchone()[0]
+    connection.execute(f'DROP TABLE {old}')
+    return rows
+
+def _pg_rekey_attractions(connection):
+    connection.execute(text(
+        'INSERT INTO attraction_dimension (attraction_id, name, updated_at) '
+        'SELECT DISTINCT ON (attraction_id) attraction_id, attraction_name, COALESCE(updated_at, created_at) '
+        'FROM attraction_analytics ORDER BY attraction_id, updated_at DESC NULLS LAST '
+        'ON CONFLICT (attraction_id) DO NOTHING'
+    ))
+    connection.execute(text('ALTER TABLE attraction_analytics ADD COLUMN attraction_key INTEGER'))
+    connection.execute(text(
+        'UPDATE attraction_analytics AS a SET attraction_key = d.attraction_key '
+        'FROM attraction_dimension AS d WHERE d.attraction_id = a.attraction_id'
+    ))
+    connection.execute(text('ALTER TABLE attraction_analytics ALTER COLUMN attraction_key SET NOT NULL'))
+    connection.execute(text('ALTER TABLE attraction_analytics DROP CONSTRAINT unique_attraction_date_hour'))
+    # The partitioned table passes the constraint and the dropped columns on to its partitions
+    connection.execute(text(
+        'ALTER TABLE attraction_analytics ADD CONSTRAINT unique_attraction_date_hour UNIQUE (attraction_key, date, hour)'
+    ))
+    for column in LEGACY_ATTRACTION_COLUMNS:
+        connection.execute(text(f'ALTER TABLE attraction_analytics DROP COLUMN {column}'))
+
+def rekey_attraction_rows(engine, metadata, path=None):
+    """
+    Move attraction_analytics from per-row attraction ids and names to keys
+    into attraction_dimension, which lives in the engine's database. On
+    SQLite `path` is the file to convert when it is not the engine's own (a
+    month partition). Tables already keyed are left alone. Returns the
+    number of rows converted, or None.
+    """
+    if engine.dialect.name == 'postgresql':
+        inspector = inspect(engine)
+        if not inspector.has_table('attraction_analytics') or \
+                'attraction_id' not in {c['name'] for c in inspector.get_columns('attraction_analytics')}:
+            return None
+        with engine.begin() as connection:
+            _pg_rekey_attractions(connection)
+        logger.info("Moved attraction_analytics to attraction_dimension keys")
+        return None
+
+    if engine.dialect.name != 'sqlite':
+        return None
+    path = path or engine.url.database
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(attraction_analytics)')}
+        if 'attraction_id' not in columns:
+            return None
+        file_engine = create_engine(f'sqlite:///{path}')
+        try:
+            legacy = Table('attraction_analytics', MetaData(), autoload_with=file_engine)
+        finally:
+            file_engine.dispose()
+        dimension = 'main'
+        if path != engine.url.database:
+            connection.execute('ATTACH DATABASE ? AS dimension', (engine.url.database,))
+            dimension = 'dimension'
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = _sqlite_rekey_attractions(connection, legacy, metadata, dimension)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        logger.info(f"Moved {rows} attraction_analytics rows in {path} to attraction_dimension keys")
+        return rows
+    finally:
+        connection.close()
+
+def upgrade_schema(db):
+    """Bring an existing database up to date with the models"""
+    db.create_all()
+    rekey_attraction_rows(db.engine, db.metadata)
+    added = add_missing_columns(db.engine, db.metadata)
+
+    mismatched = [name for name, storage in stored_id_storages(db.engine, db.metadata).items() if storage != id_storage()]
+    if mismatched:
+        logger.error(
+            f"Tables {', '.join(mismatched)} do not store ids as {id_storage()} (ANALYTICS_ID_STORAGE); "
+            f"run `flask ids migrate` before serving traffic"
+        )
+    return added
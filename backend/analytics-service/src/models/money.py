@@ -0,0 +1,22 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money columns hold integer minor units (cents), so sums are exact in SQL
+# and in Python. Amounts become decimals only where they leave the service.
+CENTS_PER_UNIT = 100
+
+def to_cents(amount):
+    """Integer cents of a decimal amount (Decimal, int, float or numeric string), rounding half up"""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * CENTS_PER_UNIT).to_integral_value(ROUND_HALF_UP))
+
+def from_cents(cents):
+    """Amount of `cents` for API responses and exports: the closest float, e.g. 1250 -> 12.5"""
+    return cents / CENTS_PER_UNIT if cents else 0.0
+
+def average_cents(total_cents, count):
+    """`total_cents / count` rounded half up to whole cents (0 when count is 0)"""
+    if not count:
+        return 0
+    quotient, remainder = divmod(total_cents, count)
+    return quotient + (1 if 2 * remainder >= count else 0)
@@ -0,0 +1,150 @@
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql import Delete, Insert, Update
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Replication lag in seconds on a PostgreSQL standby; 0 when caught up or on a primary
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class ReplicaRouter:
+    """
+    Read replica for GET handlers.
+
+    The replica is health-checked at most every `REPLICA_CHECK_INTERVAL_SECONDS`;
+    while it is unreachable or lags more than `REPLICA_MAX_STALENESS_SECONDS`
+    behind the primary, reads fall back to the primary engine. Locally the
+    replica can be a second SQLite file or a read-only connection to the same
+    file (the primary then runs in WAL mode so readers never block writers).
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.max_staleness = 5
+        self.check_interval = 5
+        self._healthy = False
+        self._checked_at = 0.0
+        self._lag = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, primary_engine):
+        # A previous app of the same process may have configured a replica
+        if self.engine is not None:
+            self.engine.dispose()
+        self.engine = None
+        self._healthy = False
+        self._checked_at = 0.0
+        self._lag = None
+        replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+        if not replica_uri:
+            return
+
+        self.max_staleness = app.config.get('REPLICA_MAX_STALENESS_SECONDS', 5)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL_SECONDS', 5)
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        if replica_uri.startswith('sqlite'):
+            options.pop('pool_recycle', None)
+        self.engine = create_engine(replica_uri, **options)
+        event.listen(self.engine, 'handle_error', self._on_error)
+
+        if primary_engine.dialect.name == 'sqlite':
+            event.listen(primary_engine, 'connect', _enable_wal)
+            primary_engine.dispose()
+
+        logger.info(f"Read replica configured (max staleness {self.max_staleness}s)")
+
+    def read_engine(self):
+        """The replica engine if it is healthy and fresh enough, else None"""
+        if self.engine is None:
+            return None
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self._check()
+        return self.engine if self._healthy else None
+
+    def status(self):
+        return {
+            'configured': self.engine is not None,
+            'healthy': self._healthy,
+            'lag_seconds': self._lag,
+            'max_staleness_seconds': self.max_staleness
+        }
+
+    def _check(self):
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            healthy = False
+            try:
+                with self.engine.connect() as connection:
+                    if self.engine.dialect.name == 'postgresql':
+                        self._lag = float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0)
+                    else:
+                        connection.execute(text('SELECT 1'))
+                        self._lag = 0.0
+                healthy = self._lag <= self.max_staleness
+            except Exception as e:
+                self._lag = None
+                logger.warning(f"Read replica check failed: {str(e)}")
+
+            if healthy != self._healthy:
+                logger.info(f"Read replica {'available' if healthy else 'unavailable'} (lag {self._lag}s)")
+            self._healthy = healthy
+            self._checked_at = time.monotonic()
+
+    def _on_error(self, context):
+        if context.is_disconnect:
+            # Send reads to the primary until the next successful check
+            self._healthy = False
+            self._checked_at = time.monotonic()
+
+def _enable_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.close()
+
+replica_router = ReplicaRouter()
+
+def prefer_replica_for_reads():
+    """Blueprint `before_request` hook: route the reads of GET requests to the replica"""
+    if request.method == 'GET':
+        g.prefer_replica = True
+
+def report_read_source(response):
+    """Blueprint `after_request` hook: tell clients which engine served the reads"""
+    if g.get('prefer_replica'):
+        response.headers['X-Read-Source'] = g.get('read_source', 'primary')
+    return response
+
+def replica_lag_allowance():
+    """Seconds the current request's reads may trail the primary (0 when served by the primary)"""
+    if has_request_context() and g.get('read_source') == 'replica':
+        return replica_router.max_staleness
+    return 0
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica while a request prefers it.
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not isinstance(clause, (Insert, Update, Delete))
+            and has_request_context()
+            and g.get('prefer_replica')
+        ):
+            engine = replica_router.read_engine()
+            if engine is not None:
+                g.read_source = 'replica'
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,53 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, Numeric, String, Table
+
+# Core API tables read by the analytics ETL. Only the columns it uses are
+# declared; the analytics service never creates or writes these tables.
+source_metadata = MetaData()
+
+# Schemas of the source tables, dropped on SQLite sources (one flat file)
+SOURCE_SCHEMAS = ('access_control', 'payment_system')
+
+entry_logs = Table(
+    'entry_logs', source_metadata,
+    Column('entry_id', String(36), primary_key=True),
+    Column('entry_timestamp', DateTime(timezone=True)),
+    Column('is_valid_entry', Boolean),
+    schema='access_control'
+)
+
+attractions = Table(
+    'attractions', source_metadata,
+    Column('attraction_id', String(36), primary_key=True),
+    Column('name', String(200)),
+    Column('max_capacity', Integer),
+    Column('duration_minutes', Integer),
+    schema='access_control'
+)
+
+attraction_queue = Table(
+    'attraction_queue', source_metadata,
+    Column('queue_id', String(36), primary_key=True),
+    Column('attraction_id', String(36)),
+    Column('estimated_wait_time', Integer),
+    Column('joined_at', DateTime(timezone=True)),
+    Column('served_at', DateTime(timezone=True)),
+    schema='access_control'
+)
+
+payment_methods = Table(
+    'payment_methods', source_metadata,
+    Column('payment_method_id', String(36), primary_key=True),
+    Column('method_type', String(20)),
+    schema='payment_system'
+)
+
+transactions = Table(
+    'transactions', source_metadata,
+    Column('transaction_id', String(36), primary_key=True),
+    Column('payment_method_id', String(36)),
+    Column('amount', Numeric(10, 2)),
+    Column('status', String(20)),
+    Column('created_at', DateTime(timezone=True)),
+    Column('completed_at', DateTime(timezone=True)),
+    schema='payment_system'
+)
@@ -1,14 +1,30 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, date, timedelta
+from src.models.routing import prefer_replica_for_reads, report_read_source
 from src.models.analytics import (
     db, VisitorAnalytics, OperationalMetrics, 
-    RealTimeStats, AttractionAnalytics, PaymentAnalytics
+    AttractionAnalytics, PaymentAnalytics
 )
+from src.models.money import CENTS_PER_UNIT, from_cents
+from src.services.archive import fetch_range
+from src.services.attractions import current_attractions
+from src.services.bulk import BULK_MODELS, BulkUpsert, parse_bulk_rows
+from src.services.dashboard import DashboardData, format_real_time_stats
+from src.services.delta import parse_watermark, next_watermark, filter_changed_since
+from src.services.downsampling import MIN_POINTS, downsample
+from src.services.forecasting import current_forecasts, hour_index
+from src.services.partitioning import partition_sessions
+from src.services.quantiles import percentiles, wait_time_sketches
+from src.services.rollups import GRANULARITIES, ROLLUP_SOURCES, QueryPlan, current_planner, period_of, read_periods
+from src.services.sampling import VisitorSampleEstimator, confidence_interval, sample_gap
+from src.services.sketches import load_sketches, unique_visitors, unique_visitors_by
 import logging
 
 logger = logging.getLogger(__name__)
 
 analytics_bp = Blueprint('analytics', __name__)
+analytics_bp.before_request(prefer_replica_for_reads)
+analytics_bp.after_request(report_read_source)
 
 def success_response(data, message="Success"):
     """Helper function to create consistent success responses"""
@@ -30,6 +46,26 @@ def error_response(code, message, status_code=400):
         'timestamp': datetime.utcnow().isoformat()
     }), status_code
 
+def parse_max_points():
+    """The `max_points` query parameter, or None when it is absent; ValueError when it is invalid"""
+    value = request.args.get('max_points')
+    if not value:
+        return None
+    max_points = int(value)
+    if max_points < MIN_POINTS:
+        raise ValueError(value)
+    return max_points
+
+def invalid_max_points():
+    return error_response('INVALID_PARAMETER', f'max_points must be an integer of at least {MIN_POINTS}')
+
+def planned_response(data, plan):
+    """Success response naming the tier and granularity the query planner chose"""
+    response = success_response(data)
+    response.headers['X-Query-Tier'] = plan.tier
+    response.headers['X-Query-Granularity'] = plan.granularity
+    return response
+
 @analytics_bp.route('/visitor-stats', methods=['GET'])
 def get_visitor_stats():
     """
@@ -38,11 +74,24 @@ def get_visitor_stats():
     - start_date: Start date (YYYY-MM-DD)
     - end_date: End date (YYYY-MM-DD)
     - granularity: hour, day, week, month
+    - max_points: Longest time series to return (optional); longer ones are
+      downsampled with LTTB on the visitor counts, keeping their peaks
+    - approx: `true` to estimate from the visitor sample, with 95% confidence
+      intervals (exact for hourly series, or when the sample does not cover
+      the range; `approximate` is then false and `approximate_reason` says why)
+    Wide ranges are read from the hour, day or month rollups instead of the
+    visit rows; `query_plan` names the tier used.
     """
+    try:
+        max_points = parse_max_points()
+    except ValueError:
+        return invalid_max_points()
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         granularity = request.args.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            granularity = 'day'
         
         # Default to last 7 days if no dates provided
         if not start_date:
@@ -54,77 +103,66 @@ def get_visitor_stats():
         start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Query visitor analytics
-        query = VisitorAnalytics.query.filter(
-            VisitorAnalytics.visit_date >= start_date_obj,
-            VisitorAnalytics.visit_date <= end_date_obj
-        )
+        approximate_reason = None
+        if request.args.get('approx') == 'true':
+            # An hour holds too few sampled visits for a useful estimate
+            approximate_reason = 'hourly periods are answered exactly' if granularity == 'hour' else sample_gap(start_date_obj)
+            if approximate_reason is None:
+                return _approximate_visitor_stats(start_date_obj, end_date_obj, granularity, max_points)
+            logger.info(f"Answering visitor stats from {start_date} exactly: {approximate_reason}")
         
-        visitor_data = query.all()
+        # Totals per period from the visit rows (archived months included) or a rollup tier
+        plan = current_planner().plan('visitor_analytics', start_date_obj, end_date_obj, granularity)
+        grouped_data = {period: totals for (_, period), totals in read_periods(plan, start_date_obj, end_date_obj).items()}
         
         # Calculate aggregated statistics
-        total_visitors = len(visitor_data)
-        total_spending = sum(float(v.total_spending or 0) for v in visitor_data)
-        avg_duration = sum(v.total_duration_minutes or 0 for v in visitor_data) / max(total_visitors, 1)
-        avg_satisfaction = sum(v.satisfaction_rating or 0 for v in visitor_data if v.satisfaction_rating) / max(
-            len([v for v in visitor_data if v.satisfaction_rating]), 1
+        total_visitors = sum(data['visitors'] for data in grouped_data.values())
+        # Money is summed as integer cents and converted once for the response
+        total_spending_cents = sum(data['spending_cents'] for data in grouped_data.values())
+        avg_duration = sum(data['duration_minutes'] for data in grouped_data.values()) / max(total_visitors, 1)
+        avg_satisfaction = sum(data['satisfaction_sum'] for data in grouped_data.values()) / max(
+            sum(data['satisfaction_count'] for data in grouped_data.values()), 1
         )
         
-        # Group by granularity
-        grouped_data = {}
-        for visitor in visitor_data:
-            if granularity == 'hour' and visitor.entry_time:
-                key = visitor.entry_time.strftime('%Y-%m-%d %H:00')
-            elif granularity == 'day':
-                key = visitor.visit_date.isoformat()
-            elif granularity == 'week':
-                week_start = visitor.visit_date - timedelta(days=visitor.visit_date.weekday())
-                key = week_start.isoformat()
-            elif granularity == 'month':
-                key = visitor.visit_date.strftime('%Y-%m')
-            else:
-                key = visitor.visit_date.isoformat()
-            
-            if key not in grouped_data:
-                grouped_data[key] = {
-                    'visitors': 0,
-                    'spending': 0,
-                    'duration': 0,
-                    'satisfaction': []
-                }
-            
-            grouped_data[key]['visitors'] += 1
-            grouped_data[key]['spending'] += float(visitor.total_spending or 0)
-            grouped_data[key]['duration'] += visitor.total_duration_minutes or 0
-            if visitor.satisfaction_rating:
-                grouped_data[key]['satisfaction'].append(visitor.satisfaction_rating)
+        day_sketches, unique_by_period = _unique_visitors_by_period(start_date_obj, end_date_obj, granularity)
         
         # Format grouped data
         time_series = []
         for key, data in sorted(grouped_data.items()):
-            avg_satisfaction_period = sum(data['satisfaction']) / max(len(data['satisfaction']), 1)
+            avg_satisfaction_period = data['satisfaction_sum'] / max(data['satisfaction_count'], 1)
             time_series.append({
                 'period': key,
                 'visitors': data['visitors'],
-                'total_spending': data['spending'],
-                'avg_duration': data['duration'] / max(data['visitors'], 1),
+                'unique_visitors': unique_by_period.get(key, {'users': 0, 'sessions': 0}),
+                'total_spending': from_cents(data['spending_cents']),
+                'avg_duration': data['duration_minutes'] / max(data['visitors'], 1),
                 'avg_satisfaction': avg_satisfaction_period
             })
         
+        # The summary above covers every period, whatever is dropped here
+        time_series, downsampling = downsample(time_series, max_points, 'visitors')
+        
         result = {
             'summary': {
                 'total_visitors': total_visitors,
-                'total_revenue': total_spending,
+                'unique_visitors': unique_visitors(day_sketches),
+                'total_revenue': from_cents(total_spending_cents),
                 'average_visit_duration': avg_duration,
-                'average_spending_per_visitor': total_spending / max(total_visitors, 1),
+                'average_spending_per_visitor': from_cents(total_spending_cents) / max(total_visitors, 1),
                 'average_satisfaction': avg_satisfaction,
                 'period': f"{start_date} to {end_date}"
             },
             'time_series': time_series,
-            'granularity': granularity
+            'granularity': granularity,
+            'query_plan': plan.to_dict()
         }
+        if downsampling:
+            result['downsampling'] = downsampling
+        if approximate_reason:
+            result['approximate'] = False
+            result['approximate_reason'] = approximate_reason
         
-        return success_response(result)
+        return planned_response(result, plan)
         
     except ValueError as e:
         return error_response('INVALID_DATE', f'Invalid date format: {str(e)}')
@@ -132,34 +170,97 @@ def get_visitor_stats():
         logger.error(f"Error getting visitor stats: {str(e)}")
         return error_response('INTERNAL_ERROR', 'Failed to retrieve visitor statistics', 500)
 
+def _unique_visitors_by_period(start_date_obj, end_date_obj, granularity):
+    """Day sketches of the range, and distinct visitors per period merged from the day or hour HyperLogLog sketches"""
+    day_sketches = load_sketches('day', start_date_obj, end_date_obj)
+    if granularity == 'hour':
+        period_sketches = load_sketches('hour', start_date_obj, end_date_obj)
+        period_key = lambda bucket: bucket.strftime('%Y-%m-%d %H:00')
+    elif granularity == 'week':
+        period_sketches = day_sketches
+        period_key = lambda bucket: (bucket.date() - timedelta(days=bucket.weekday())).isoformat()
+    elif granularity == 'month':
+        period_sketches = day_sketches
+        period_key = lambda bucket: bucket.strftime('%Y-%m')
+    else:
+        period_sketches = day_sketches
+        period_key = lambda bucket: bucket.date().isoformat()
+    return day_sketches, unique_visitors_by(period_sketches, period_key)
+
+def _approximate_visitor_stats(start_date_obj, end_date_obj, granularity, max_points):
+    """Visitor stats estimated from the per-day stratified visitor sample, with confidence intervals"""
+    estimator = VisitorSampleEstimator(start_date_obj, end_date_obj)
+    periods = estimator.estimate(lambda day: period_of(granularity, day))
+    total = estimator.estimate(lambda day: 'total').get('total')
+    day_sketches, unique_by_period = _unique_visitors_by_period(start_date_obj, end_date_obj, granularity)
+    
+    def money(estimate):
+        return from_cents(int(round(estimate[0])))
+    
+    def money_interval(estimate):
+        return confidence_interval(estimate, 1 / CENTS_PER_UNIT, 2)
+    
+    time_series = []
+    for key, estimates in sorted(periods.items()):
+        time_series.append({
+            'period': key,
+            'visitors': int(round(estimates['visitors'][0])),
+            'unique_visitors': unique_by_period.get(key, {'users': 0, 'sessions': 0}),
+            'total_spending': money(estimates['spending_cents']),
+            'avg_duration': float(estimates['average_duration'][0]),
+            'avg_satisfaction': float(estimates['average_satisfaction'][0]),
+            'confidence_intervals': {
+                'visitors': confidence_interval(estimates['visitors'], digits=1),
+                'total_spending': money_interval(estimates['spending_cents']),
+                'avg_duration': confidence_interval(estimates['average_duration'], digits=2),
+                'avg_satisfaction': confidence_interval(estimates['average_satisfaction'], digits=3)
+            }
+        })
+    time_series, downsampling = downsample(time_series, max_points, 'visitors')
+    
+    summary = {
+        'total_visitors': 0,
+        'unique_visitors': unique_visitors(day_sketches),
+        'total_revenue': 0.0,
+        'average_visit_duration': 0.0,
+        'average_spending_per_visitor': 0.0,
+        'average_satisfaction': 0.0,
+        'period': f"{start_date_obj.isoformat()} to {end_date_obj.isoformat()}"
+    }
+    if total:
+        summary.update({
+            'total_visitors': int(round(total['visitors'][0])),
+            'total_revenue': money(total['spending_cents']),
+            'average_visit_duration': float(total['average_duration'][0]),
+            'average_spending_per_visitor': float(total['average_spending_cents'][0]) / CENTS_PER_UNIT,
+            'average_satisfaction': float(total['average_satisfaction'][0]),
+            'confidence_intervals': {
+                'total_visitors': confidence_interval(total['visitors'], digits=1),
+                'total_revenue': money_interval(total['spending_cents']),
+                'average_visit_duration': confidence_interval(total['average_duration'], digits=2),
+                'average_spending_per_visitor': money_interval(total['average_spending_cents']),
+                'average_satisfaction': confidence_interval(total['average_satisfaction'], digits=3)
+            }
+        })
+    
+    plan = QueryPlan(ROLLUP_SOURCES['visitor_analytics'], granularity, 'sample', estimator.sampled_visits)
+    result = {
+        'summary': summary,
+        'time_series': time_series,
+        'granularity': granularity,
+        'approximate': estimator.describe(),
+        'query_plan': plan.to_dict()
+    }
+    if downsampling:
+        result['downsampling'] = downsampling
+    return planned_response(result, plan)
+
 @analytics_bp.route('/real-time', methods=['GET'])
 def get_real_time_stats():
     """Get current real-time statistics"""
     try:
-        # Get the latest real-time stats
-        latest_stats = RealTimeStats.query.order_by(RealTimeStats.timestamp.desc()).first()
-        
-        if not latest_stats:
-            # Return default values if no data exists
-            default_stats = {
-                'current_visitors': 0,
-                'active_queues': 0,
-                'average_queue_time': 0,
-                'system_load_percentage': 0.0,
-                'payment_success_rate': 100.0,
-                'api_response_time_ms': 0,
-                'cache_hit_rate': 0.0,
-                'concurrent_users': 0,
-                'last_updated': datetime.utcnow().isoformat()
-            }
-            return success_response(default_stats)
-        
-        stats_data = latest_stats.to_dict()
-        stats_data['last_updated'] = stats_data['timestamp']
-        del stats_data['timestamp']
-        del stats_data['id']
-        
-        return success_response(stats_data)
+        # Latest real-time stats, or default values if no data exists
+        return success_response(format_real_time_stats(DashboardData().latest_stats))
         
     except Exception as e:
         logger.error(f"Error getting real-time stats: {str(e)}")
@@ -173,11 +274,16 @@ def get_attraction_analytics():
     - attraction_id: Specific attraction ID (optional)
     - start_date: Start date (YYYY-MM-DD)
     - end_date: End date (YYYY-MM-DD)
+    - granularity: hour, day, week, month (optional); hourly rows by default.
+      Coarser periods are read from the day and month rollups on wide ranges.
     """
     try:
         attraction_id = request.args.get('attraction_id')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        granularity = request.args.get('granularity')
+        if granularity is not None and granularity not in GRANULARITIES:
+            return error_response('INVALID_PARAMETER', f"granularity must be one of {', '.join(GRANULARITIES)}")
         
         # Default to last 7 days if no dates provided
         if not start_date:
@@ -189,25 +295,30 @@ def get_attraction_analytics():
         start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Build query
-        query = AttractionAnalytics.query.filter(
-            AttractionAnalytics.date >= start_date_obj,
-            AttractionAnalytics.date <= end_date_obj
+        directory = current_attractions()
+        attraction_key = directory.key_for(attraction_id) if attraction_id else None
+        plan = current_planner().plan(
+            'attraction_analytics', start_date_obj, end_date_obj, granularity, scope=attraction_key
+        )
+        if attraction_id and attraction_key is None:
+            return planned_response([], plan)
+        if plan.granularity != 'hour':
+            return planned_response(_attraction_periods(plan, start_date_obj, end_date_obj, attraction_id, attraction_key), plan)
+        
+        # Query attraction analytics (archived months are included transparently)
+        attraction_data = fetch_range(
+            AttractionAnalytics, start_date_obj, end_date_obj, attraction_key=attraction_key
         )
         
-        if attraction_id:
-            query = query.filter(AttractionAnalytics.attraction_id == attraction_id)
-        
-        attraction_data = query.all()
-        
-        # Group by attraction
+        # Group by attraction; ids and names come from the attraction dimension
         attractions = {}
         for data in attraction_data:
-            aid = data.attraction_id
+            aid = data.attraction_key
+            attraction = directory.get(aid)
             if aid not in attractions:
                 attractions[aid] = {
-                    'attraction_id': aid,
-                    'attraction_name': data.attraction_name,
+                    'attraction_id': attraction.attraction_id,
+                    'attraction_name': attraction.name,
                     'total_visitors': 0,
                     'average_wait_time': 0,
                     'max_wait_time': 0,
@@ -221,11 +332,16 @@ def get_attraction_analytics():
             attractions[aid]['total_visitors'] += data.total_visitors
             attractions[aid]['max_wait_time'] = max(attractions[aid]['max_wait_time'], data.max_wait_time)
             attractions[aid]['total_downtime_minutes'] += data.downtime_minutes
-            attractions[aid]['total_revenue'] += float(data.revenue_generated or 0)
-            attractions[aid]['daily_data'].append(data.to_dict())
+            attractions[aid]['total_revenue'] += data.revenue_generated_cents or 0
+            attractions[aid]['daily_data'].append(data.to_dict(attraction))
+        
+        # Wait-time percentiles, merged from the per-attraction-hour sketches
+        wait_sketches = wait_time_sketches(start_date_obj, end_date_obj, attraction_id)
         
         # Calculate averages
         for attraction in attractions.values():
+            attraction['total_revenue'] = from_cents(attraction['total_revenue'])
+            attraction['wait_time_percentiles'] = percentiles(wait_sketches.get(attraction['attraction_id']))
             data_points = len(attraction['daily_data'])
             if data_points > 0:
                 attraction['average_wait_time'] = sum(d['average_wait_time'] for d in attraction['daily_data']) / data_points
@@ -234,7 +350,7 @@ def get_attraction_analytics():
         
         result = list(attractions.values())
         
-        return success_response(result)
+        return planned_response(result, plan)
         
     except ValueError as e:
         return error_response('INVALID_DATE', f'Invalid date format: {str(e)}')
@@ -242,6 +358,61 @@ def get_attraction_analytics():
         logger.error(f"Error getting attraction analytics: {str(e)}")
         return error_response('INTERNAL_ERROR', 'Failed to retrieve attraction analytics', 500)
 
+def _attraction_periods(plan, start_date, end_date, attraction_id, attraction_key):
+    """Attraction analytics with `daily_data` summed per day, week or month instead of per hour"""
+    directory = current_attractions()
+    periods = read_periods(plan, start_date, end_date, attraction_key)
+    wait_sketches = wait_time_sketches(start_date, end_date, attraction_id)
+    
+    attractions = {}
+    for (key, period), totals in sorted(periods.items()):
+        if key not in attractions:
+            attraction = directory.get(key)
+            attractions[key] = {
+                'attraction_id': attraction.attraction_id,
+                'attraction_name': attraction.name,
+                'total_visitors': 0,
+                'max_wait_time': 0,
+                'total_downtime_minutes': 0,
+                'total_revenue': 0,
+                'hours': 0,
+                'wait_time_sum': 0,
+                'capacity_sum': 0,
+                'satisfaction_sum': 0,
+                'daily_data': []
+            }
+        entry = attractions[key]
+        hours = max(totals['hours'], 1)
+        entry['total_visitors'] += totals['total_visitors']
+        entry['max_wait_time'] = max(entry['max_wait_time'], totals['max_wait_time'])
+        entry['total_downtime_minutes'] += totals['downtime_minutes']
+        entry['total_revenue'] += totals['revenue_cents']
+        for name in ('hours', 'wait_time_sum', 'capacity_sum', 'satisfaction_sum'):
+            entry[name] += totals[name]
+        entry['daily_data'].append({
+            'period': period,
+            'hours': totals['hours'],
+            'total_visitors': totals['total_visitors'],
+            'average_wait_time': totals['wait_time_sum'] / hours,
+            'max_wait_time': totals['max_wait_time'],
+            'capacity_utilization': totals['capacity_sum'] / hours,
+            'satisfaction_rating': totals['satisfaction_sum'] / hours,
+            'downtime_minutes': totals['downtime_minutes'],
+            'revenue_generated': from_cents(totals['revenue_cents'])
+        })
+    
+    # Averages over every hour, as for hourly rows
+    result = []
+    for entry in attractions.values():
+        hours = max(entry.pop('hours'), 1)
+        entry['average_wait_time'] = entry.pop('wait_time_sum') / hours
+        entry['average_capacity_utilization'] = entry.pop('capacity_sum') / hours
+        entry['average_satisfaction'] = entry.pop('satisfaction_sum') / hours
+        entry['total_revenue'] = from_cents(entry['total_revenue'])
+        entry['wait_time_percentiles'] = percentiles(wait_sketches.get(entry['attraction_id']))
+        result.append(entry)
+    return result
+
 @analytics_bp.route('/payments', methods=['GET'])
 def get_payment_analytics():
     """
@@ -266,20 +437,13 @@ def get_payment_analytics():
         start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Build query
-        query = PaymentAnalytics.query.filter(
-            PaymentAnalytics.date >= start_date_obj,
-            PaymentAnalytics.date <= end_date_obj
+        payment_data = fetch_range(
+            PaymentAnalytics, start_date_obj, end_date_obj, payment_method=payment_method or None
         )
         
-        if payment_method:
-            query = query.filter(PaymentAnalytics.payment_method == payment_method)
-        
-        payment_data = query.all()
-        
         # Calculate summary statistics
         total_transactions = sum(p.transaction_count for p in payment_data)
-        total_amount = sum(float(p.total_amount or 0) for p in payment_data)
+        total_amount_cents = sum(p.total_amount_cents or 0 for p in payment_data)
         avg_success_rate = sum(float(p.success_rate or 0) for p in payment_data) / max(len(payment_data), 1)
         avg_processing_time = sum(p.average_processing_time_ms for p in payment_data) / max(len(payment_data), 1)
         
@@ -297,10 +461,11 @@ def get_payment_analytics():
                 }
             
             by_method[method]['transaction_count'] += payment.transaction_count
-            by_method[method]['total_amount'] += float(payment.total_amount or 0)
+            by_method[method]['total_amount'] += payment.total_amount_cents or 0
         
         # Calculate method averages
         for method_data in by_method.values():
+            method_data['total_amount'] = from_cents(method_data['total_amount'])
             method_payments = [p for p in payment_data if p.payment_method == method_data['payment_method']]
             if method_payments:
                 method_data['success_rate'] = sum(float(p.success_rate or 0) for p in method_payments) / len(method_payments)
@@ -309,8 +474,8 @@ def get_payment_analytics():
         result = {
             'summary': {
                 'total_transactions': total_transactions,
-                'total_amount': total_amount,
-                'average_transaction_amount': total_amount / max(total_transactions, 1),
+                'total_amount': from_cents(total_amount_cents),
+                'average_transaction_amount': from_cents(total_amount_cents) / max(total_transactions, 1),
                 'average_success_rate': avg_success_rate,
                 'average_processing_time_ms': avg_processing_time,
                 'period': f"{start_date} to {end_date}"
@@ -367,10 +532,30 @@ def submit_feedback():
 
 @analytics_bp.route('/operational-metrics', methods=['GET'])
 def get_operational_metrics():
-    """Get operational metrics data"""
+    """
+    Get operational metrics data
+    Query parameters:
+    - start_date: Start date (YYYY-MM-DD)
+    - end_date: End date (YYYY-MM-DD)
+    - granularity: hour, day, week, month (optional); hourly rows by default.
+      Coarser periods are read from the day and month rollups on wide ranges.
+    - max_points: Longest `hourly_data` or `time_series` to return (optional);
+      longer ones are downsampled with LTTB on the visitor counts, keeping
+      their peaks (not applied with `since`)
+    - since: Watermark from a previous response; only hourly rows changed after
+      it are returned, without the summary (use `0` for the initial full sync)
+    """
+    try:
+        max_points = parse_max_points()
+    except ValueError:
+        return invalid_max_points()
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        since_param = request.args.get('since')
+        granularity = request.args.get('granularity')
+        if granularity is not None and granularity not in GRANULARITIES:
+            return error_response('INVALID_PARAMETER', f"granularity must be one of {', '.join(GRANULARITIES)}")
         
         # Default to last 7 days if no dates provided
         if not start_date:
@@ -382,15 +567,43 @@ def get_operational_metrics():
         start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Query operational metrics
-        metrics = OperationalMetrics.query.filter(
-            OperationalMetrics.metric_date >= start_date_obj,
-            OperationalMetrics.metric_date <= end_date_obj
-        ).order_by(OperationalMetrics.metric_date, OperationalMetrics.metric_hour).all()
+        if since_param is not None:
+            try:
+                since = parse_watermark(since_param)
+            except ValueError:
+                return error_response('INVALID_WATERMARK', f'Invalid watermark: {since_param}')
+            
+            watermark = next_watermark(since, current_app.config.get('DELTA_SYNC_SETTLE_SECONDS', 2))
+            changed = []
+            for session in partition_sessions(OperationalMetrics, start_date_obj, end_date_obj):
+                query = session.query(OperationalMetrics).filter(
+                    OperationalMetrics.metric_date >= start_date_obj,
+                    OperationalMetrics.metric_date <= end_date_obj
+                )
+                changed.extend(filter_changed_since(query, OperationalMetrics.updated_at, since).all())
+            changed.sort(key=lambda m: (m.metric_date, m.metric_hour))
+            
+            return success_response({
+                'hourly_data': [m.to_dict() for m in changed],
+                'watermark': watermark,
+                'full_sync': since is None,
+                'period': f"{start_date} to {end_date}"
+            })
+        
+        plan = current_planner().plan('operational_metrics', start_date_obj, end_date_obj, granularity)
+        if plan.granularity != 'hour':
+            return planned_response(
+                _operational_periods(plan, start_date_obj, end_date_obj, start_date, end_date, max_points), plan
+            )
+        
+        metrics = fetch_range(
+            OperationalMetrics, start_date_obj, end_date_obj,
+            order_by=(OperationalMetrics.metric_date, OperationalMetrics.metric_hour)
+        )
         
         # Calculate summary statistics
         total_visitors = sum(m.total_visitors for m in metrics)
-        total_revenue = sum(float(m.total_revenue or 0) for m in metrics)
+        total_revenue_cents = sum(m.total_revenue_cents or 0 for m in metrics)
         avg_wait_time = sum(m.average_wait_time for m in metrics) / max(len(metrics), 1)
         avg_capacity = sum(float(m.peak_capacity_percentage or 0) for m in metrics) / max(len(metrics), 1)
         avg_satisfaction = sum(float(m.customer_satisfaction_avg or 0) for m in metrics) / max(len(metrics), 1)
@@ -399,17 +612,26 @@ def get_operational_metrics():
         result = {
             'summary': {
                 'total_visitors': total_visitors,
-                'total_revenue': total_revenue,
+                'total_revenue': from_cents(total_revenue_cents),
                 'average_wait_time': avg_wait_time,
                 'average_capacity_utilization': avg_capacity,
                 'average_satisfaction': avg_satisfaction,
                 'average_uptime': avg_uptime,
                 'period': f"{start_date} to {end_date}"
             },
-            'hourly_data': [m.to_dict() for m in metrics]
+            'hourly_data': [m.to_dict() for m in metrics],
+            'granularity': plan.granularity,
+            'query_plan': plan.to_dict()
         }
+        # Hours are spaced by time, so gaps (e.g. closed hours) keep their width
+        result['hourly_data'], downsampling = downsample(
+            result['hourly_data'], max_points, 'total_visitors',
+            x=[hour_index(m.metric_date, m.metric_hour) for m in metrics]
+        )
+        if downsampling:
+            result['downsampling'] = downsampling
         
-        return success_response(result)
+        return planned_response(result, plan)
         
     except ValueError as e:
         return error_response('INVALID_DATE', f'Invalid date format: {str(e)}')
@@ -417,3 +639,114 @@ def get_operational_metrics():
         logger.error(f"Error getting operational metrics: {str(e)}")
         return error_response('INTERNAL_ERROR', 'Failed to retrieve operational metrics', 500)
 
+def _operational_periods(plan, start_date_obj, end_date_obj, start_date, end_date, max_points=None):
+    """Operational metrics with a `time_series` summed per day, week or month instead of `hourly_data`"""
+    periods = {period: totals for (_, period), totals in read_periods(plan, start_date_obj, end_date_obj).items()}
+    
+    time_series = []
+    for period, totals in sorted(periods.items()):
+        hours = max(totals['hours'], 1)
+        time_series.append({
+            'period': period,
+            'hours': totals['hours'],
+            'total_visitors': totals['total_visitors'],
+            'total_revenue': from_cents(totals['total_revenue_cents']),
+            'average_wait_time': totals['wait_time_sum'] / hours,
+            'average_capacity_utilization': totals['capacity_sum'] / hours,
+            'average_staff_efficiency': totals['efficiency_sum'] / hours,
+            'average_uptime': totals['uptime_sum'] / hours,
+            'average_satisfaction': totals['satisfaction_sum'] / hours,
+            'error_count': totals['error_count']
+        })
+    
+    # Averages over every hour, as for hourly rows
+    hours = max(sum(totals['hours'] for totals in periods.values()), 1)
+    def average(name):
+        return sum(totals[name] for totals in periods.values()) / hours
+    
+    time_series, downsampling = downsample(time_series, max_points, 'total_visitors')
+    result = {
+        'summary': {
+            'total_visitors': sum(totals['total_visitors'] for totals in periods.values()),
+            'total_revenue': from_cents(sum(totals['total_revenue_cents'] for totals in periods.values())),
+            'average_wait_time': average('wait_time_sum'),
+            'average_capacity_utilization': average('capacity_sum'),
+            'average_satisfaction': average('satisfaction_sum'),
+            'average_uptime': average('uptime_sum'),
+            'period': f"{start_date} to {end_date}"
+        },
+        'time_series': time_series,
+        'granularity': plan.granularity,
+        'query_plan': plan.to_dict()
+    }
+    if downsampling:
+        result['downsampling'] = downsampling
+    return result
+
+@analytics_bp.route('/forecast', methods=['GET'])
+def get_forecast():
+    """
+    Forecast hourly visitors, revenue and attraction wait times
+    Query parameters:
+    - days: Days ahead to forecast, starting with the next hour (default 7)
+    - attraction_id: Only forecast this attraction's wait times (optional)
+    """
+    try:
+        max_days = current_app.config.get('FORECAST_MAX_DAYS', 14)
+        try:
+            days = int(request.args.get('days', 7))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= max_days:
+            return error_response('INVALID_PARAMETER', f'days must be an integer between 1 and {max_days}')
+        
+        # Fold any hours written since the last request into the cached models
+        forecasts = current_forecasts()
+        forecasts.refresh()
+        
+        now = datetime.now()
+        start_hour = hour_index(now.date(), now.hour) + 1
+        result = forecasts.forecast(start_hour, days * 24, request.args.get('attraction_id'))
+        result['horizon_days'] = days
+        result['history_days'] = forecasts.history_days
+        result['generated_at'] = forecasts.refreshed_at.isoformat()
+        
+        return success_response(result)
+        
+    except Exception as e:
+        logger.error(f"Error generating forecast: {str(e)}")
+        return error_response('INTERNAL_ERROR', 'Failed to generate forecast', 500)
+
+@analytics_bp.route('/operational-metrics/bulk', methods=['POST'], defaults={'dataset': 'operational_metrics'})
+@analytics_bp.route('/attractions/bulk', methods=['POST'], defaults={'dataset': 'attraction_analytics'})
+@analytics_bp.route('/payments/bulk', methods=['POST'], defaults={'dataset': 'payment_analytics'})
+def bulk_upsert(dataset):
+    """
+    Insert or update many hourly rows in one request
+    Body: a JSON array of row objects, or one object per line with
+    Content-Type application/x-ndjson. Rows are keyed like the table's unique
+    constraint; fields left out of a row keep their stored values.
+    Query: outcomes=false to skip per-row inserted/updated outcomes
+    """
+    try:
+        try:
+            rows = parse_bulk_rows(request.get_data(cache=False), request.mimetype)
+        except ValueError as e:
+            return error_response('INVALID_DATA', str(e))
+        
+        if not rows:
+            return error_response('INVALID_DATA', 'No rows provided')
+        max_rows = current_app.config.get('BULK_UPSERT_MAX_ROWS', 100000)
+        if len(rows) > max_rows:
+            return error_response('TOO_MANY_ROWS', f'At most {max_rows} rows per request', 413)
+        
+        bulk = BulkUpsert(BULK_MODELS[dataset], current_app.config.get('BULK_UPSERT_BATCH_SIZE', 5000))
+        result = bulk.apply(rows, report_outcomes=request.args.get('outcomes') != 'false')
+        written = result['written'] if 'written' in result else result['inserted'] + result['updated']
+        
+        return success_response(result, f"Upserted {written} of {result['received']} rows")
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error bulk upserting {dataset}: {str(e)}")
+        return error_response('INTERNAL_ERROR', 'Failed to upsert rows', 500)
@@ -1,14 +1,25 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, date, timedelta
-from src.models.analytics import (
-    db, VisitorAnalytics, OperationalMetrics, 
-    RealTimeStats, AttractionAnalytics, PaymentAnalytics
-)
+from flask import Blueprint, request, jsonify, Response, current_app
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from src.models.routing import prefer_replica_for_reads, report_read_source
+from src.models.analytics import db, VisitorAnalytics, RealTimeStats, AttractionAnalytics
+from src.models.money import from_cents
+from src.services.anomaly import current_detector
+from src.services.attractions import current_attractions
+from src.services.coalescing import coalesce
+from src.services.dashboard import ATTRACTION_STATUS_COLUMNS, DashboardData, format_real_time_stats
+from src.services.delta import parse_watermark, next_watermark
+from src.services.quantiles import real_time_percentiles
+from src.services.retention import configured_retention, summarize_real_time_window
+from src.services.stream import current_broker, parse_last_event_id
 import logging
+from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
 dashboard_bp = Blueprint('dashboard', __name__)
+dashboard_bp.before_request(prefer_replica_for_reads)
+dashboard_bp.after_request(report_read_source)
 
 def success_response(data, message="Success"):
     """Helper function to create consistent success responses"""
@@ -31,348 +42,458 @@ def error_response(code, message, status_code=400):
     }), status_code
 
 @dashboard_bp.route('/overview', methods=['GET'])
+@coalesce
 def get_dashboard_overview():
     """Get comprehensive dashboard overview"""
     try:
-        today = date.today()
-        
-        # Get today's visitor analytics
-        today_visitors = VisitorAnalytics.query.filter(
-            VisitorAnalytics.visit_date == today
-        ).all()
-        
-        # Get today's operational metrics
-        today_metrics = OperationalMetrics.query.filter(
-            OperationalMetrics.metric_date == today
-        ).all()
-        
-        # Get latest real-time stats
-        latest_stats = RealTimeStats.query.order_by(
-            RealTimeStats.timestamp.desc()
-        ).first()
-        
-        # Calculate today's summary
-        total_visitors_today = len(today_visitors)
-        total_spending_today = sum(float(v.total_spending or 0) for v in today_visitors)
-        avg_satisfaction_today = 0
-        if today_visitors:
-            satisfaction_ratings = [v.satisfaction_rating for v in today_visitors if v.satisfaction_rating]
-            if satisfaction_ratings:
-                avg_satisfaction_today = sum(satisfaction_ratings) / len(satisfaction_ratings)
-        
-        # Calculate revenue from operational metrics
-        total_revenue_today = sum(float(m.total_revenue or 0) for m in today_metrics)
-        avg_wait_time_today = sum(m.average_wait_time for m in today_metrics) / max(len(today_metrics), 1)
-        
-        # Get week comparison
-        week_ago = today - timedelta(days=7)
-        week_visitors = VisitorAnalytics.query.filter(
-            VisitorAnalytics.visit_date >= week_ago,
-            VisitorAnalytics.visit_date < today
-        ).all()
-        
-        visitors_last_week = len(week_visitors)
-        spending_last_week = sum(float(v.total_spending or 0) for v in week_visitors)
-        
-        # Calculate growth percentages
-        visitor_growth = 0
-        revenue_growth = 0
-        if visitors_last_week > 0:
-            visitor_growth = ((total_visitors_today - (visitors_last_week / 7)) / (visitors_last_week / 7)) * 100
-        if spending_last_week > 0:
-            revenue_growth = ((total_spending_today - (spending_last_week / 7)) / (spending_last_week / 7)) * 100
-        
-        # Get hourly data for today
-        hourly_data = []
-        for hour in range(24):
-            hour_visitors = [v for v in today_visitors if v.entry_time and v.entry_time.hour == hour]
-            hour_metrics = [m for m in today_metrics if m.metric_hour == hour]
-            
-            hourly_data.append({
-                'hour': hour,
-                'visitors': len(hour_visitors),
-                'revenue': sum(float(m.total_revenue or 0) for m in hour_metrics),
-                'avg_wait_time': sum(m.average_wait_time for m in hour_metrics) / max(len(hour_metrics), 1)
-            })
-        
-        # Real-time stats
-        real_time_data = {}
-        if latest_stats:
-            real_time_data = {
-                'current_visitors': latest_stats.current_visitors,
-                'active_queues': latest_stats.active_queues,
-                'average_queue_time': latest_stats.average_queue_time,
-                'system_load': float(latest_stats.system_load_percentage or 0),
-                'payment_success_rate': float(latest_stats.payment_success_rate or 100),
-                'api_response_time': latest_stats.api_response_time_ms,
-                'last_updated': latest_stats.timestamp.isoformat()
-            }
-        else:
-            real_time_data = {
-                'current_visitors': 0,
-                'active_queues': 0,
-                'average_queue_time': 0,
-                'system_load': 0,
-                'payment_success_rate': 100,
-                'api_response_time': 0,
-                'last_updated': datetime.utcnow().isoformat()
-            }
-        
-        result = {
-            'summary': {
-                'total_visitors_today': total_visitors_today,
-                'total_revenue_today': max(total_spending_today, total_revenue_today),
-                'average_satisfaction_today': round(avg_satisfaction_today, 2),
-                'average_wait_time_today': round(avg_wait_time_today, 1),
-                'visitor_growth_percentage': round(visitor_growth, 1),
-                'revenue_growth_percentage': round(revenue_growth, 1)
-            },
-            'real_time': real_time_data,
-            'hourly_trends': hourly_data,
-            'date': today.isoformat()
-        }
-        
-        return success_response(result)
+        return success_response(build_overview(DashboardData()))
         
     except Exception as e:
         logger.error(f"Error getting dashboard overview: {str(e)}")
         return error_response('INTERNAL_ERROR', 'Failed to retrieve dashboard overview', 500)
 
+def build_overview(data):
+    """Today's summary, hourly trends and the latest real-time snapshot"""
+    today = data.today
+    today_visitors = data.today_visitors
+    today_metrics = data.today_metrics
+    latest_stats = data.latest_stats
+    
+    # Calculate today's summary
+    total_visitors_today = len(today_visitors)
+    # Money is summed as integer cents and converted once for the response
+    total_spending_today = sum(v.total_spending_cents or 0 for v in today_visitors)
+    avg_satisfaction_today = 0
+    if today_visitors:
+        satisfaction_ratings = [v.satisfaction_rating for v in today_visitors if v.satisfaction_rating]
+        if satisfaction_ratings:
+            avg_satisfaction_today = sum(satisfaction_ratings) / len(satisfaction_ratings)
+    
+    # Calculate revenue from operational metrics
+    total_revenue_today = sum(m.total_revenue_cents or 0 for m in today_metrics)
+    avg_wait_time_today = sum(m.average_wait_time for m in today_metrics) / max(len(today_metrics), 1)
+    
+    # Get week comparison
+    week_ago = today - timedelta(days=7)
+    visitors_last_week, spending_last_week = db.session.query(
+        func.count(VisitorAnalytics.id), func.coalesce(func.sum(VisitorAnalytics.total_spending_cents), 0)
+    ).filter(
+        VisitorAnalytics.visit_date >= week_ago,
+        VisitorAnalytics.visit_date < today
+    ).one()
+    
+    # Calculate growth percentages
+    visitor_growth = 0
+    revenue_growth = 0
+    if visitors_last_week > 0:
+        visitor_growth = ((total_visitors_today - (visitors_last_week / 7)) / (visitors_last_week / 7)) * 100
+    if spending_last_week > 0:
+        revenue_growth = ((total_spending_today - (spending_last_week / 7)) / (spending_last_week / 7)) * 100
+    
+    # Get hourly data for today, bucketed in one pass over the rows
+    visitors_by_hour = defaultdict(int)
+    for visitor in today_visitors:
+        if visitor.entry_time:
+            visitors_by_hour[visitor.entry_time.hour] += 1
+    metrics_by_hour = defaultdict(list)
+    for metric in today_metrics:
+        metrics_by_hour[metric.metric_hour].append(metric)
+    
+    hourly_data = []
+    for hour in range(24):
+        hour_metrics = metrics_by_hour.get(hour, [])
+        
+        hourly_data.append({
+            'hour': hour,
+            'visitors': visitors_by_hour.get(hour, 0),
+            'revenue': from_cents(sum(m.total_revenue_cents or 0 for m in hour_metrics)),
+            'avg_wait_time': sum(m.average_wait_time for m in hour_metrics) / max(len(hour_metrics), 1)
+        })
+    
+    # Real-time stats
+    real_time_data = {}
+    if latest_stats:
+        real_time_data = {
+            'current_visitors': latest_stats.current_visitors,
+            'active_queues': latest_stats.active_queues,
+            'average_queue_time': latest_stats.average_queue_time,
+            'system_load': float(latest_stats.system_load_percentage or 0),
+            'payment_success_rate': float(latest_stats.payment_success_rate or 100),
+            'api_response_time': latest_stats.api_response_time_ms,
+            'last_updated': latest_stats.timestamp.isoformat()
+        }
+    else:
+        real_time_data = {
+            'current_visitors': 0,
+            'active_queues': 0,
+            'average_queue_time': 0,
+            'system_load': 0,
+            'payment_success_rate': 100,
+            'api_response_time': 0,
+            'last_updated': datetime.utcnow().isoformat()
+        }
+    
+    return {
+        'summary': {
+            'total_visitors_today': total_visitors_today,
+            'total_revenue_today': from_cents(max(total_spending_today, total_revenue_today)),
+            'average_satisfaction_today': round(avg_satisfaction_today, 2),
+            'average_wait_time_today': round(avg_wait_time_today, 1),
+            'visitor_growth_percentage': round(visitor_growth, 1),
+            'revenue_growth_percentage': round(revenue_growth, 1)
+        },
+        'real_time': real_time_data,
+        'hourly_trends': hourly_data,
+        'date': today.isoformat()
+    }
+
+def build_attractions_status(attraction_data, current_hour):
+    """Group today's hourly attraction rows into per-attraction current status"""
+    directory = current_attractions()
+    # Group by attraction
+    attractions = {}
+    for data in attraction_data:
+        aid = data.attraction_key
+        if aid not in attractions:
+            attraction = directory.get(aid)
+            attractions[aid] = {
+                'attraction_id': attraction.attraction_id,
+                'attraction_name': attraction.name,
+                'current_visitors': 0,
+                'current_wait_time': 0,
+                'capacity_utilization': 0,
+                'status': 'OPEN',  # Default status
+                'satisfaction_rating': 0,
+                'total_visitors_today': 0
+            }
+        
+        # Use latest hour data for current status
+        if data.hour == current_hour:
+            attractions[aid]['current_visitors'] = data.total_visitors
+            attractions[aid]['current_wait_time'] = data.average_wait_time
+            attractions[aid]['capacity_utilization'] = float(data.capacity_utilization or 0)
+            attractions[aid]['satisfaction_rating'] = float(data.satisfaction_rating or 0)
+        
+        attractions[aid]['total_visitors_today'] += data.total_visitors
+    
+    # Convert to list and sort by popularity
+    attractions_list = list(attractions.values())
+    attractions_list.sort(key=lambda x: x['total_visitors_today'], reverse=True)
+    
+    # Add status based on capacity and wait time
+    for attraction in attractions_list:
+        if attraction['capacity_utilization'] > 95:
+            attraction['status'] = 'FULL_CAPACITY'
+        elif attraction['current_wait_time'] > 60:
+            attraction['status'] = 'HIGH_DEMAND'
+        elif attraction['capacity_utilization'] < 10:
+            attraction['status'] = 'LOW_DEMAND'
+        else:
+            attraction['status'] = 'OPEN'
+    
+    return attractions_list
+
 @dashboard_bp.route('/attractions-status', methods=['GET'])
+@coalesce
 def get_attractions_status():
-    """Get current status of all attractions"""
+    """
+    Get current status of all attractions
+    Query parameters:
+    - since: Watermark from a previous response; only attractions with rows
+      changed after it are returned (use `0` for the initial full sync)
+    """
+    since_param = request.args.get('since')
     try:
-        today = date.today()
-        current_hour = datetime.now().hour
-        
-        # Get latest attraction analytics for today
-        attraction_data = AttractionAnalytics.query.filter(
-            AttractionAnalytics.date == today,
-            AttractionAnalytics.hour <= current_hour
-        ).all()
-        
-        # Group by attraction
-        attractions = {}
-        for data in attraction_data:
-            aid = data.attraction_id
-            if aid not in attractions:
-                attractions[aid] = {
-                    'attraction_id': aid,
-                    'attraction_name': data.attraction_name,
-                    'current_visitors': 0,
-                    'current_wait_time': 0,
-                    'capacity_utilization': 0,
-                    'status': 'OPEN',  # Default status
-                    'satisfaction_rating': 0,
-                    'total_visitors_today': 0
-                }
-            
-            # Use latest hour data for current status
-            if data.hour == current_hour:
-                attractions[aid]['current_visitors'] = data.total_visitors
-                attractions[aid]['current_wait_time'] = data.average_wait_time
-                attractions[aid]['capacity_utilization'] = float(data.capacity_utilization or 0)
-                attractions[aid]['satisfaction_rating'] = float(data.satisfaction_rating or 0)
-            
-            attractions[aid]['total_visitors_today'] += data.total_visitors
-        
-        # Convert to list and sort by popularity
-        attractions_list = list(attractions.values())
-        attractions_list.sort(key=lambda x: x['total_visitors_today'], reverse=True)
-        
-        # Add status based on capacity and wait time
-        for attraction in attractions_list:
-            if attraction['capacity_utilization'] > 95:
-                attraction['status'] = 'FULL_CAPACITY'
-            elif attraction['current_wait_time'] > 60:
-                attraction['status'] = 'HIGH_DEMAND'
-            elif attraction['capacity_utilization'] < 10:
-                attraction['status'] = 'LOW_DEMAND'
-            else:
-                attraction['status'] = 'OPEN'
-        
-        return success_response(attractions_list)
+        return success_response(attractions_status(DashboardData(), since_param))
         
+    except ValueError:
+        return error_response('INVALID_WATERMARK', f'Invalid watermark: {since_param}')
     except Exception as e:
         logger.error(f"Error getting attractions status: {str(e)}")
         return error_response('INTERNAL_ERROR', 'Failed to retrieve attractions status', 500)
 
+def attractions_status(data, since_param=None):
+    """
+    Per-attraction status, or with a `since` watermark only the attractions
+    changed after it; ValueError for an invalid watermark
+    """
+    today = data.today
+    current_hour = data.now.hour
+    
+    if since_param is None:
+        # Latest attraction analytics for today
+        return build_attractions_status(data.today_attraction_rows, current_hour)
+    
+    since = parse_watermark(since_param)
+    
+    watermark = next_watermark(since, current_app.config.get('DELTA_SYNC_SETTLE_SECONDS', 2))
+    
+    # Current values move to a new hour row on the hour, so a watermark
+    # from before the rollover gets a full resend
+    hour_start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    full_sync = since is None or since < hour_start
+    
+    if full_sync:
+        rows = data.today_attraction_rows
+    else:
+        # Only attractions with rows changed after the watermark (indexed on updated_at)
+        changed_keys = [
+            row.attraction_key for row in db.session.query(AttractionAnalytics.attraction_key).filter(
+                AttractionAnalytics.updated_at > since,
+                AttractionAnalytics.date == today
+            ).distinct()
+        ]
+        if not changed_keys:
+            return {
+                'attractions': [],
+                'watermark': watermark,
+                'full_sync': False
+            }
+        rows = db.session.query(*ATTRACTION_STATUS_COLUMNS).filter(
+            AttractionAnalytics.date == today,
+            AttractionAnalytics.hour <= current_hour,
+            AttractionAnalytics.attraction_key.in_(changed_keys)
+        ).all()
+    
+    return {
+        'attractions': build_attractions_status(rows, current_hour),
+        'watermark': watermark,
+        'full_sync': full_sync
+    }
+
 @dashboard_bp.route('/payment-trends', methods=['GET'])
+@coalesce
 def get_payment_trends():
     """Get payment trends and statistics"""
     try:
-        today = date.today()
-        week_ago = today - timedelta(days=7)
+        return success_response(build_payment_trends(DashboardData()))
         
-        # Get payment analytics for the last week
-        payment_data = PaymentAnalytics.query.filter(
-            PaymentAnalytics.date >= week_ago,
-            PaymentAnalytics.date <= today
-        ).all()
+    except Exception as e:
+        logger.error(f"Error getting payment trends: {str(e)}")
+        return error_response('INTERNAL_ERROR', 'Failed to retrieve payment trends', 500)
+
+def build_payment_trends(data):
+    """Payment totals of the last week per method and per day"""
+    # Payment analytics for the last week
+    payment_data = data.week_payments
+    
+    # Group by payment method
+    by_method = {}
+    daily_totals = {}
+    
+    for payment in payment_data:
+        method = payment.payment_method
+        day = payment.date.isoformat()
+        
+        # By method aggregation
+        if method not in by_method:
+            by_method[method] = {
+                'payment_method': method,
+                'transaction_count': 0,
+                'total_amount': 0,
+                'success_rate': 0,
+                'avg_processing_time': 0,
+                'daily_data': []
+            }
         
-        # Group by payment method
-        by_method = {}
-        daily_totals = {}
+        by_method[method]['transaction_count'] += payment.transaction_count
+        by_method[method]['total_amount'] += payment.total_amount_cents or 0
+        by_method[method]['daily_data'].append({
+            'date': day,
+            'transactions': payment.transaction_count,
+            'amount': from_cents(payment.total_amount_cents)
+        })
         
-        for payment in payment_data:
-            method = payment.payment_method
-            day = payment.date.isoformat()
-            
-            # By method aggregation
-            if method not in by_method:
-                by_method[method] = {
-                    'payment_method': method,
-                    'transaction_count': 0,
-                    'total_amount': 0,
-                    'success_rate': 0,
-                    'avg_processing_time': 0,
-                    'daily_data': []
-                }
-            
-            by_method[method]['transaction_count'] += payment.transaction_count
-            by_method[method]['total_amount'] += float(payment.total_amount or 0)
-            by_method[method]['daily_data'].append({
+        # Daily totals
+        if day not in daily_totals:
+            daily_totals[day] = {
                 'date': day,
-                'transactions': payment.transaction_count,
-                'amount': float(payment.total_amount or 0)
-            })
-            
-            # Daily totals
-            if day not in daily_totals:
-                daily_totals[day] = {
-                    'date': day,
-                    'total_transactions': 0,
-                    'total_amount': 0,
-                    'methods': {}
-                }
-            
-            daily_totals[day]['total_transactions'] += payment.transaction_count
-            daily_totals[day]['total_amount'] += float(payment.total_amount or 0)
-            daily_totals[day]['methods'][method] = {
-                'transactions': payment.transaction_count,
-                'amount': float(payment.total_amount or 0)
+                'total_transactions': 0,
+                'total_amount': 0,
+                'methods': {}
             }
         
-        # Calculate averages for each method
-        for method_data in by_method.values():
-            method_payments = [p for p in payment_data if p.payment_method == method_data['payment_method']]
-            if method_payments:
-                method_data['success_rate'] = sum(float(p.success_rate or 0) for p in method_payments) / len(method_payments)
-                method_data['avg_processing_time'] = sum(p.average_processing_time_ms for p in method_payments) / len(method_payments)
-        
-        # Calculate overall statistics
-        total_transactions = sum(p.transaction_count for p in payment_data)
-        total_amount = sum(float(p.total_amount or 0) for p in payment_data)
-        avg_success_rate = sum(float(p.success_rate or 0) for p in payment_data) / max(len(payment_data), 1)
-        
-        result = {
-            'summary': {
-                'total_transactions_week': total_transactions,
-                'total_amount_week': total_amount,
-                'average_transaction_amount': total_amount / max(total_transactions, 1),
-                'overall_success_rate': round(avg_success_rate, 2),
-                'most_popular_method': max(by_method.values(), key=lambda x: x['transaction_count'])['payment_method'] if by_method else 'N/A'
-            },
-            'by_payment_method': list(by_method.values()),
-            'daily_trends': sorted(daily_totals.values(), key=lambda x: x['date'])
+        daily_totals[day]['total_transactions'] += payment.transaction_count
+        daily_totals[day]['total_amount'] += payment.total_amount_cents or 0
+        daily_totals[day]['methods'][method] = {
+            'transactions': payment.transaction_count,
+            'amount': from_cents(payment.total_amount_cents)
         }
-        
-        return success_response(result)
-        
-    except Exception as e:
-        logger.error(f"Error getting payment trends: {str(e)}")
-        return error_response('INTERNAL_ERROR', 'Failed to retrieve payment trends', 500)
+    
+    for day_data in daily_totals.values():
+        day_data['total_amount'] = from_cents(day_data['total_amount'])
+    
+    # Calculate averages for each method
+    for method_data in by_method.values():
+        method_data['total_amount'] = from_cents(method_data['total_amount'])
+        method_payments = [p for p in payment_data if p.payment_method == method_data['payment_method']]
+        if method_payments:
+            method_data['success_rate'] = sum(float(p.success_rate or 0) for p in method_payments) / len(method_payments)
+            method_data['avg_processing_time'] = sum(p.average_processing_time_ms for p in method_payments) / len(method_payments)
+    
+    # Calculate overall statistics
+    total_transactions = sum(p.transaction_count for p in payment_data)
+    total_amount = from_cents(sum(p.total_amount_cents or 0 for p in payment_data))
+    avg_success_rate = sum(float(p.success_rate or 0) for p in payment_data) / max(len(payment_data), 1)
+    
+    return {
+        'summary': {
+            'total_transactions_week': total_transactions,
+            'total_amount_week': total_amount,
+            'average_transaction_amount': total_amount / max(total_transactions, 1),
+            'overall_success_rate': round(avg_success_rate, 2),
+            'most_popular_method': max(by_method.values(), key=lambda x: x['transaction_count'])['payment_method'] if by_method else 'N/A'
+        },
+        'by_payment_method': list(by_method.values()),
+        'daily_trends': sorted(daily_totals.values(), key=lambda x: x['date'])
+    }
+
+def compute_system_health(data=None):
+    """Compute system health status and alerts from the last hour of real-time stats"""
+    # Summarize recent real-time stats (last hour) from the tiers covering the window
+    one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    raw_retention, minute_retention = configured_retention()
+    window = summarize_real_time_window(one_hour_ago, raw_retention, minute_retention)
+    latest_stat = (data or DashboardData()).latest_stats
+    
+    if not window['count'] or latest_stat is None:
+        # Return default healthy status if no data
+        return {
+            'status': 'HEALTHY',
+            'system_load': 0,
+            'api_response_time': 0,
+            'payment_success_rate': 100,
+            'cache_hit_rate': 0,
+            'uptime_percentage': 100,
+            'alerts': [],
+            'last_updated': datetime.utcnow().isoformat()
+        }
+    
+    # Averages over the last hour
+    averages = window['averages']
+    avg_system_load = averages['system_load_percentage'] or 0
+    avg_response_time = averages['api_response_time_ms'] or 0
+    avg_payment_success = averages['payment_success_rate'] or 0
+    avg_cache_hit = averages['cache_hit_rate'] or 0
+    
+    # Tail latency and queue times, merged from the per-minute quantile sketches
+    tails = real_time_percentiles(one_hour_ago)
+    
+    # Alerts come from the online detector, which applies snapshots as they are posted
+    alerts = current_detector().active_alerts()
+    status = 'HEALTHY'
+    if any(alert['level'] == 'CRITICAL' for alert in alerts):
+        status = 'CRITICAL'
+    elif alerts:
+        status = 'WARNING'
+    
+    # Calculate uptime (simplified - assume 100% if no critical alerts)
+    uptime_percentage = 100.0 if status != 'CRITICAL' else 95.0
+    
+    return {
+        'status': status,
+        'system_load': round(avg_system_load, 1),
+        'api_response_time': round(avg_response_time, 0),
+        'api_response_time_percentiles': tails['api_response_time_ms'],
+        'queue_time_percentiles': tails['average_queue_time'],
+        'payment_success_rate': round(avg_payment_success, 1),
+        'cache_hit_rate': round(avg_cache_hit, 1),
+        'uptime_percentage': uptime_percentage,
+        'current_visitors': latest_stat.current_visitors,
+        'concurrent_users': latest_stat.concurrent_users,
+        'alerts': alerts,
+        'last_updated': latest_stat.timestamp.isoformat(),
+        'metrics_count': window['count']
+    }
 
 @dashboard_bp.route('/system-health', methods=['GET'])
+@coalesce
 def get_system_health():
     """Get system health and performance metrics"""
     try:
-        # Get recent real-time stats (last hour)
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        recent_stats = RealTimeStats.query.filter(
-            RealTimeStats.timestamp >= one_hour_ago
-        ).order_by(RealTimeStats.timestamp.desc()).all()
-        
-        if not recent_stats:
-            # Return default healthy status if no data
-            return success_response({
-                'status': 'HEALTHY',
-                'system_load': 0,
-                'api_response_time': 0,
-                'payment_success_rate': 100,
-                'cache_hit_rate': 0,
-                'uptime_percentage': 100,
-                'alerts': [],
-                'last_updated': datetime.utcnow().isoformat()
-            })
-        
-        latest_stat = recent_stats[0]
-        
-        # Calculate averages over the last hour
-        avg_system_load = sum(float(s.system_load_percentage or 0) for s in recent_stats) / len(recent_stats)
-        avg_response_time = sum(s.api_response_time_ms for s in recent_stats) / len(recent_stats)
-        avg_payment_success = sum(float(s.payment_success_rate or 0) for s in recent_stats) / len(recent_stats)
-        avg_cache_hit = sum(float(s.cache_hit_rate or 0) for s in recent_stats) / len(recent_stats)
-        
-        # Determine system status and alerts
-        status = 'HEALTHY'
-        alerts = []
-        
-        if avg_system_load > 90:
-            status = 'CRITICAL'
-            alerts.append({
-                'level': 'CRITICAL',
-                'message': f'High system load: {avg_system_load:.1f}%',
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        elif avg_system_load > 75:
-            status = 'WARNING'
-            alerts.append({
-                'level': 'WARNING',
-                'message': f'Elevated system load: {avg_system_load:.1f}%',
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        
-        if avg_response_time > 1000:
-            if status != 'CRITICAL':
-                status = 'WARNING'
-            alerts.append({
-                'level': 'WARNING',
-                'message': f'Slow API response time: {avg_response_time:.0f}ms',
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        
-        if avg_payment_success < 95:
-            status = 'CRITICAL'
-            alerts.append({
-                'level': 'CRITICAL',
-                'message': f'Low payment success rate: {avg_payment_success:.1f}%',
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        
-        # Calculate uptime (simplified - assume 100% if no critical alerts)
-        uptime_percentage = 100.0 if status != 'CRITICAL' else 95.0
-        
-        result = {
-            'status': status,
-            'system_load': round(avg_system_load, 1),
-            'api_response_time': round(avg_response_time, 0),
-            'payment_success_rate': round(avg_payment_success, 1),
-            'cache_hit_rate': round(avg_cache_hit, 1),
-            'uptime_percentage': uptime_percentage,
-            'current_visitors': latest_stat.current_visitors,
-            'concurrent_users': latest_stat.concurrent_users,
-            'alerts': alerts,
-            'last_updated': latest_stat.timestamp.isoformat(),
-            'metrics_count': len(recent_stats)
-        }
-        
-        return success_response(result)
+        return success_response(compute_system_health())
         
     except Exception as e:
         logger.error(f"Error getting system health: {str(e)}")
         return error_response('INTERNAL_ERROR', 'Failed to retrieve system health', 500)
 
+# Panels /dashboard/batch can build, with the message reported when one fails
+BATCH_QUERIES = {
+    'overview': (build_overview, 'Failed to retrieve dashboard overview'),
+    'attractions-status': (
+        lambda data: attractions_status(data, request.args.get('since')), 'Failed to retrieve attractions status'
+    ),
+    'payment-trends': (build_payment_trends, 'Failed to retrieve payment trends'),
+    'system-health': (compute_system_health, 'Failed to retrieve system health'),
+    'real-time': (lambda data: format_real_time_stats(data.latest_stats), 'Failed to retrieve real-time statistics'),
+}
+
+@dashboard_bp.route('/batch', methods=['GET'])
+@coalesce
+def get_dashboard_batch():
+    """
+    Several dashboard panels in one response, built from datasets loaded once
+    Query parameters:
+    - queries: Comma-separated panels (overview, attractions-status,
+      payment-trends, system-health, real-time); all of them by default
+    - since: Watermark for attractions-status, as on its own endpoint
+    Each panel's body is under `results`; a panel that fails is reported under
+    `errors` without failing the others.
+    """
+    names = [name.strip() for name in request.args.get('queries', '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in BATCH_QUERIES]
+    if unknown:
+        return error_response('INVALID_PARAMETER', f"Unknown queries: {', '.join(unknown)}")
+    since_param = request.args.get('since')
+    if since_param is not None:
+        try:
+            parse_watermark(since_param)
+        except ValueError:
+            return error_response('INVALID_WATERMARK', f'Invalid watermark: {since_param}')
+    
+    data = DashboardData()
+    results = {}
+    errors = {}
+    for name in dict.fromkeys(names or BATCH_QUERIES):
+        build, failure = BATCH_QUERIES[name]
+        try:
+            results[name] = build(data)
+        except Exception as e:
+            logger.error(f"Error building dashboard batch query {name}: {str(e)}")
+            # Leaves the session usable for the remaining panels
+            db.session.rollback()
+            errors[name] = {'code': 'INTERNAL_ERROR', 'message': failure}
+    
+    return success_response({'results': results, 'errors': errors})
+
+def publish_live_update(stats):
+    """Push a new real-time snapshot and the recomputed system health to stream subscribers"""
+    current_broker().publish('live-update', {
+        'real_time': format_real_time_stats(stats),
+        'system_health': compute_system_health()
+    })
+
+@dashboard_bp.route('/stream', methods=['GET'])
+def stream_live_updates():
+    """
+    Server-Sent Events stream of real-time stats and system health
+    Headers:
+    - Last-Event-ID: Resume after this event id (also accepted as `last_event_id` query parameter)
+    """
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    )
+    heartbeat_seconds = current_app.config.get('STREAM_HEARTBEAT_SECONDS', 15)
+    
+    return Response(
+        current_broker().subscribe(last_event_id, heartbeat_seconds=heartbeat_seconds),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @dashboard_bp.route('/update-real-time', methods=['POST'])
 def update_real_time_stats():
     """Update real-time statistics (for system monitoring)"""
@@ -397,6 +518,19 @@ def update_real_time_stats():
         db.session.add(stats)
         db.session.commit()
         
+        # Detection first, so the pushed system health carries this snapshot's alerts
+        try:
+            current_detector().ingest(snapshot_id=stats.id)
+        except Exception as e:
+            # Snapshots not applied now are picked up by the next post
+            logger.error(f"Error running anomaly detection: {str(e)}")
+        
+        try:
+            publish_live_update(stats)
+        except Exception as e:
+            # The snapshot is stored; a failed push only delays live subscribers
+            logger.error(f"Error publishing live update: {str(e)}")
+        
         return success_response({
             'stats_id': stats.id,
             'message': 'Real-time stats updated successfully'
@@ -1,9 +1,14 @@
 from flask import Blueprint, request, jsonify, send_file
 from datetime import datetime, date, timedelta
-from src.models.analytics import (
-    db, VisitorAnalytics, OperationalMetrics, 
-    RealTimeStats, AttractionAnalytics, PaymentAnalytics
-)
+from src.models.routing import prefer_replica_for_reads, report_read_source
+from src.models.analytics import VisitorAnalytics, OperationalMetrics, AttractionAnalytics, PaymentAnalytics
+from src.models.money import from_cents
+from src.services.archive import fetch_range, count_range
+from src.services.attractions import current_attractions
+from src.services.coalescing import coalesce
+from src.services.quantiles import DDSketch, percentiles, wait_time_sketches
+from src.services.sampling import VisitorSampleEstimator, confidence_interval, sample_gap, sampled_day_visits
+from src.services.sketches import load_sketches, unique_visitors, unique_visitors_by
 import logging
 import io
 import csv
@@ -12,6 +17,8 @@ from collections import defaultdict
 logger = logging.getLogger(__name__)
 
 reports_bp = Blueprint('reports', __name__)
+reports_bp.before_request(prefer_replica_for_reads)
+reports_bp.after_request(report_read_source)
 
 def success_response(data, message="Success"):
     """Helper function to create consistent success responses"""
@@ -34,6 +41,7 @@ def error_response(code, message, status_code=400):
     }), status_code
 
 @reports_bp.route('/daily-summary', methods=['GET'])
+@coalesce
 def get_daily_summary():
     """Generate daily summary report"""
     try:
@@ -46,28 +54,26 @@ def get_daily_summary():
         report_date_obj = datetime.strptime(report_date, '%Y-%m-%d').date()
         
         # Get visitor data for the day
-        visitors = VisitorAnalytics.query.filter(
-            VisitorAnalytics.visit_date == report_date_obj
-        ).all()
+        visitors = fetch_range(VisitorAnalytics, report_date_obj, report_date_obj, columns=(
+            'entry_time', 'total_duration_minutes', 'attractions_visited', 'total_spending_cents', 'satisfaction_rating'
+        ))
         
         # Get operational metrics for the day
-        metrics = OperationalMetrics.query.filter(
-            OperationalMetrics.metric_date == report_date_obj
-        ).all()
+        metrics = fetch_range(OperationalMetrics, report_date_obj, report_date_obj)
         
         # Get attraction data for the day
-        attractions = AttractionAnalytics.query.filter(
-            AttractionAnalytics.date == report_date_obj
-        ).all()
+        attractions = fetch_range(AttractionAnalytics, report_date_obj, report_date_obj, columns=(
+            'attraction_key', 'total_visitors', 'average_wait_time', 'max_wait_time', 'revenue_generated_cents',
+            'downtime_minutes'
+        ))
         
         # Get payment data for the day
-        payments = PaymentAnalytics.query.filter(
-            PaymentAnalytics.date == report_date_obj
-        ).all()
+        payments = fetch_range(PaymentAnalytics, report_date_obj, report_date_obj)
         
         # Calculate visitor statistics
         total_visitors = len(visitors)
-        total_visitor_spending = sum(float(v.total_spending or 0) for v in visitors)
+        # Money is summed as integer cents and converted once for the response
+        total_visitor_spending = sum(v.total_spending_cents or 0 for v in visitors)
         avg_visit_duration = sum(v.total_duration_minutes or 0 for v in visitors) / max(total_visitors, 1)
         avg_attractions_visited = sum(v.attractions_visited or 0 for v in visitors) / max(total_visitors, 1)
         
@@ -79,19 +85,21 @@ def get_daily_summary():
             satisfaction_distribution[rating] += 1
         
         # Operational statistics
-        total_operational_revenue = sum(float(m.total_revenue or 0) for m in metrics)
+        total_operational_revenue = sum(m.total_revenue_cents or 0 for m in metrics)
         avg_wait_time = sum(m.average_wait_time for m in metrics) / max(len(metrics), 1)
         peak_capacity = max((float(m.peak_capacity_percentage or 0) for m in metrics), default=0)
         avg_system_uptime = sum(float(m.system_uptime_percentage or 0) for m in metrics) / max(len(metrics), 1)
         total_errors = sum(m.error_count for m in metrics)
         
-        # Attraction statistics
+        # Attraction statistics; names come from the attraction dimension
+        directory = current_attractions()
         attraction_stats = {}
+        wait_totals = defaultdict(lambda: [0, 0])
         for attraction in attractions:
-            aid = attraction.attraction_id
+            aid = attraction.attraction_key
             if aid not in attraction_stats:
                 attraction_stats[aid] = {
-                    'name': attraction.attraction_name,
+                    'name': directory.get(aid).name,
                     'total_visitors': 0,
                     'avg_wait_time': 0,
                     'max_wait_time': 0,
@@ -104,14 +112,24 @@ def get_daily_summary():
                 attraction_stats[aid]['max_wait_time'], 
                 attraction.max_wait_time
             )
-            attraction_stats[aid]['revenue'] += float(attraction.revenue_generated or 0)
+            attraction_stats[aid]['revenue'] += attraction.revenue_generated_cents or 0
             attraction_stats[aid]['downtime'] += attraction.downtime_minutes
+            wait_totals[aid][0] += attraction.average_wait_time
+            wait_totals[aid][1] += 1
+        
+        # Wait-time percentiles per attraction and park-wide, merged from the attraction-hour sketches
+        wait_sketches = wait_time_sketches(report_date_obj, report_date_obj)
+        park_wait_sketch = DDSketch()
+        for sketch in wait_sketches.values():
+            park_wait_sketch.merge(sketch)
         
         # Calculate average wait times for attractions
         for aid, stats in attraction_stats.items():
-            attraction_hours = [a for a in attractions if a.attraction_id == aid]
-            if attraction_hours:
-                stats['avg_wait_time'] = sum(a.average_wait_time for a in attraction_hours) / len(attraction_hours)
+            stats['revenue'] = from_cents(stats['revenue'])
+            stats['wait_time_percentiles'] = percentiles(wait_sketches.get(directory.get(aid).attraction_id))
+            wait_sum, hours = wait_totals[aid]
+            if hours:
+                stats['avg_wait_time'] = wait_sum / hours
         
         # Payment statistics
         payment_stats = {}
@@ -129,27 +147,42 @@ def get_daily_summary():
                 }
             
             payment_stats[method]['transaction_count'] += payment.transaction_count
-            payment_stats[method]['total_amount'] += float(payment.total_amount or 0)
+            payment_stats[method]['total_amount'] += payment.total_amount_cents or 0
             total_transactions += payment.transaction_count
-            total_payment_amount += float(payment.total_amount or 0)
+            total_payment_amount += payment.total_amount_cents or 0
         
         # Calculate payment method averages
         for method, stats in payment_stats.items():
+            stats['total_amount'] = from_cents(stats['total_amount'])
             method_payments = [p for p in payments if p.payment_method == method]
             if method_payments:
                 stats['success_rate'] = sum(float(p.success_rate or 0) for p in method_payments) / len(method_payments)
                 stats['avg_processing_time'] = sum(p.average_processing_time_ms for p in method_payments) / len(method_payments)
         
-        # Hourly breakdown
+        # Distinct visitors for the day and per entry hour
+        day_unique = unique_visitors(load_sketches('day', report_date_obj, report_date_obj))
+        hourly_unique = unique_visitors_by(
+            load_sketches('hour', report_date_obj, report_date_obj), lambda bucket: bucket.hour
+        )
+        
+        # Hourly breakdown, bucketed in one pass over the rows
+        visitors_by_hour = defaultdict(int)
+        for visitor in visitors:
+            if visitor.entry_time:
+                visitors_by_hour[visitor.entry_time.hour] += 1
+        metrics_by_hour = defaultdict(list)
+        for metric in metrics:
+            metrics_by_hour[metric.metric_hour].append(metric)
+        
         hourly_breakdown = []
         for hour in range(24):
-            hour_visitors = [v for v in visitors if v.entry_time and v.entry_time.hour == hour]
-            hour_metrics = [m for m in metrics if m.metric_hour == hour]
+            hour_metrics = metrics_by_hour.get(hour, [])
             
             hourly_breakdown.append({
                 'hour': hour,
-                'visitors': len(hour_visitors),
-                'revenue': sum(float(m.total_revenue or 0) for m in hour_metrics),
+                'visitors': visitors_by_hour.get(hour, 0),
+                'unique_visitors': hourly_unique.get(hour, {'users': 0, 'sessions': 0}),
+                'revenue': from_cents(sum(m.total_revenue_cents or 0 for m in hour_metrics)),
                 'avg_wait_time': sum(m.average_wait_time for m in hour_metrics) / max(len(hour_metrics), 1),
                 'capacity_utilization': sum(float(m.peak_capacity_percentage or 0) for m in hour_metrics) / max(len(hour_metrics), 1)
             })
@@ -162,25 +195,27 @@ def get_daily_summary():
             'report_date': report_date,
             'summary': {
                 'total_visitors': total_visitors,
-                'total_revenue': max(total_visitor_spending, total_operational_revenue, total_payment_amount),
+                'total_revenue': from_cents(max(total_visitor_spending, total_operational_revenue, total_payment_amount)),
                 'average_visit_duration_minutes': round(avg_visit_duration, 1),
                 'average_attractions_visited': round(avg_attractions_visited, 1),
                 'average_satisfaction_rating': round(avg_satisfaction, 2),
                 'average_wait_time_minutes': round(avg_wait_time, 1),
+                'wait_time_percentiles': percentiles(park_wait_sketch),
                 'peak_capacity_percentage': round(peak_capacity, 1),
                 'system_uptime_percentage': round(avg_system_uptime, 1),
                 'total_system_errors': total_errors
             },
             'visitor_analytics': {
                 'total_count': total_visitors,
-                'total_spending': total_visitor_spending,
+                'unique_visitors': day_unique,
+                'total_spending': from_cents(total_visitor_spending),
                 'satisfaction_distribution': dict(satisfaction_distribution),
                 'average_satisfaction': round(avg_satisfaction, 2)
             },
             'attraction_performance': list(attraction_stats.values()),
             'payment_analytics': {
                 'total_transactions': total_transactions,
-                'total_amount': total_payment_amount,
+                'total_amount': from_cents(total_payment_amount),
                 'by_method': payment_stats
             },
             'peak_hours': {
@@ -205,8 +240,17 @@ def get_daily_summary():
         return error_response('INTERNAL_ERROR', 'Failed to generate daily summary', 500)
 
 @reports_bp.route('/weekly-summary', methods=['GET'])
+@coalesce
 def get_weekly_summary():
-    """Generate weekly summary report"""
+    """
+    Generate weekly summary report
+    Query parameters:
+    - end_date: Last day of the week (YYYY-MM-DD)
+    - approx: `true` to count visits from the visitor sample's strata and
+      estimate satisfaction from the sample, with 95% confidence intervals
+      (exact when the sample does not cover this and the previous week;
+      `approximate` is then false and `approximate_reason` says why)
+    """
     try:
         end_date = request.args.get('end_date')
         
@@ -216,34 +260,66 @@ def get_weekly_summary():
         # Parse end date and calculate start date
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
         start_date_obj = end_date_obj - timedelta(days=6)  # 7 days total
+        prev_week_start = start_date_obj - timedelta(days=7)
+        prev_week_end = start_date_obj - timedelta(days=1)
+        
+        approximate = request.args.get('approx') == 'true'
+        approximate_reason = sample_gap(prev_week_start) if approximate else None
+        if approximate_reason:
+            logger.info(f"Answering the weekly summary to {end_date} exactly: {approximate_reason}")
+            approximate = False
         
         # Get data for the week
-        visitors = VisitorAnalytics.query.filter(
-            VisitorAnalytics.visit_date >= start_date_obj,
-            VisitorAnalytics.visit_date <= end_date_obj
-        ).all()
+        if approximate:
+            estimator = VisitorSampleEstimator(start_date_obj, end_date_obj)
+            day_estimates = estimator.estimate(lambda day: day.isoformat())
+            week_estimate = estimator.estimate(lambda day: 'week').get('week')
+            visitors = []
+        else:
+            visitors = fetch_range(VisitorAnalytics, start_date_obj, end_date_obj, columns=('visit_date', 'satisfaction_rating'))
+        
+        metrics = fetch_range(OperationalMetrics, start_date_obj, end_date_obj)
         
-        metrics = OperationalMetrics.query.filter(
-            OperationalMetrics.metric_date >= start_date_obj,
-            OperationalMetrics.metric_date <= end_date_obj
-        ).all()
+        # Distinct visitors per day and across the whole week
+        week_sketches = load_sketches('day', start_date_obj, end_date_obj)
+        daily_unique = unique_visitors_by(week_sketches, lambda bucket: bucket.date())
+        
+        # Group by day, bucketed in one pass over the rows
+        visitors_by_day = defaultdict(list)
+        for visitor in visitors:
+            visitors_by_day[visitor.visit_date].append(visitor)
+        metrics_by_day = defaultdict(list)
+        for metric in metrics:
+            metrics_by_day[metric.metric_date].append(metric)
         
-        # Group by day
         daily_stats = {}
         for day in range(7):
             current_date = start_date_obj + timedelta(days=day)
-            day_visitors = [v for v in visitors if v.visit_date == current_date]
-            day_metrics = [m for m in metrics if m.metric_date == current_date]
+            day_visitors = visitors_by_day.get(current_date, [])
+            day_metrics = metrics_by_day.get(current_date, [])
             
             daily_stats[current_date.isoformat()] = {
                 'date': current_date.isoformat(),
                 'day_of_week': current_date.strftime('%A'),
                 'visitors': len(day_visitors),
-                'revenue': sum(float(m.total_revenue or 0) for m in day_metrics),
+                'unique_visitors': daily_unique.get(current_date, {'users': 0, 'sessions': 0}),
+                'revenue': from_cents(sum(m.total_revenue_cents or 0 for m in day_metrics)),
                 'avg_satisfaction': 0,
                 'avg_wait_time': sum(m.average_wait_time for m in day_metrics) / max(len(day_metrics), 1)
             }
             
+            if approximate:
+                estimates = day_estimates.get(current_date.isoformat())
+                if estimates:
+                    daily_stats[current_date.isoformat()].update({
+                        'visitors': int(estimates['visitors'][0]),
+                        'avg_satisfaction': float(estimates['average_satisfaction'][0]),
+                        'confidence_intervals': {
+                            'avg_satisfaction': confidence_interval(estimates['average_satisfaction'], digits=3)
+                        }
+                    })
+                continue
+            
             # Calculate satisfaction for the day
             day_satisfaction = [v.satisfaction_rating for v in day_visitors if v.satisfaction_rating]
             if day_satisfaction:
@@ -251,12 +327,17 @@ def get_weekly_summary():
         
         # Calculate week totals and averages
         total_visitors_week = len(visitors)
-        total_revenue_week = sum(float(m.total_revenue or 0) for m in metrics)
+        total_revenue_week = sum(m.total_revenue_cents or 0 for m in metrics)
         avg_satisfaction_week = 0
         
-        all_satisfaction = [v.satisfaction_rating for v in visitors if v.satisfaction_rating]
-        if all_satisfaction:
-            avg_satisfaction_week = sum(all_satisfaction) / len(all_satisfaction)
+        if approximate:
+            total_visitors_week = estimator.visits
+            if week_estimate:
+                avg_satisfaction_week = float(week_estimate['average_satisfaction'][0])
+        else:
+            all_satisfaction = [v.satisfaction_rating for v in visitors if v.satisfaction_rating]
+            if all_satisfaction:
+                avg_satisfaction_week = sum(all_satisfaction) / len(all_satisfaction)
         
         avg_wait_time_week = sum(m.average_wait_time for m in metrics) / max(len(metrics), 1)
         
@@ -267,20 +348,15 @@ def get_weekly_summary():
         best_day_revenue = max(daily_list, key=lambda x: x['revenue'])
         
         # Calculate trends (compare with previous week)
-        prev_week_start = start_date_obj - timedelta(days=7)
-        prev_week_end = start_date_obj - timedelta(days=1)
-        
-        prev_visitors = VisitorAnalytics.query.filter(
-            VisitorAnalytics.visit_date >= prev_week_start,
-            VisitorAnalytics.visit_date <= prev_week_end
-        ).count()
-        
-        prev_metrics = OperationalMetrics.query.filter(
-            OperationalMetrics.metric_date >= prev_week_start,
-            OperationalMetrics.metric_date <= prev_week_end
-        ).all()
+        if approximate:
+            prev_visitors = sampled_day_visits(prev_week_start, prev_week_end)
+        else:
+            prev_visitors = count_range(VisitorAnalytics, prev_week_start, prev_week_end)
         
-        prev_revenue = sum(float(m.total_revenue or 0) for m in prev_metrics)
+        prev_revenue = sum(
+            m.total_revenue_cents or 0
+            for m in fetch_range(OperationalMetrics, prev_week_start, prev_week_end, columns=('total_revenue_cents',))
+        )
         
         # Calculate growth
         visitor_growth = 0
@@ -294,9 +370,10 @@ def get_weekly_summary():
             'period': f"{start_date_obj.isoformat()} to {end_date_obj.isoformat()}",
             'summary': {
                 'total_visitors': total_visitors_week,
-                'total_revenue': total_revenue_week,
+                'unique_visitors': unique_visitors(week_sketches),
+                'total_revenue': from_cents(total_revenue_week),
                 'average_daily_visitors': total_visitors_week / 7,
-                'average_daily_revenue': total_revenue_week / 7,
+                'average_daily_revenue': from_cents(total_revenue_week) / 7,
                 'average_satisfaction': round(avg_satisfaction_week, 2),
                 'average_wait_time': round(avg_wait_time_week, 1),
                 'visitor_growth_percentage': round(visitor_growth, 1),
@@ -321,6 +398,15 @@ def get_weekly_summary():
                 }
             }
         }
+        if approximate:
+            if week_estimate:
+                result['summary']['confidence_intervals'] = {
+                    'average_satisfaction': confidence_interval(week_estimate['average_satisfaction'], digits=3)
+                }
+            result['approximate'] = estimator.describe()
+        elif approximate_reason:
+            result['approximate'] = False
+            result['approximate_reason'] = approximate_reason
         
         return success_response(result)
         
@@ -354,10 +440,10 @@ def export_csv_report():
         
         if report_type == 'visitors':
             # Visitor analytics CSV
-            visitors = VisitorAnalytics.query.filter(
-                VisitorAnalytics.visit_date >= start_date_obj,
-                VisitorAnalytics.visit_date <= end_date_obj
-            ).all()
+            visitors = fetch_range(VisitorAnalytics, start_date_obj, end_date_obj, columns=(
+                'visit_date', 'user_id', 'entry_time', 'exit_time', 'total_duration_minutes', 'attractions_visited',
+                'total_spending_cents', 'satisfaction_rating', 'feedback_comments', 'device_type'
+            ))
             
             # Write header
             writer.writerow([
@@ -375,7 +461,7 @@ def export_csv_report():
                     visitor.exit_time.isoformat() if visitor.exit_time else '',
                     visitor.total_duration_minutes or 0,
                     visitor.attractions_visited or 0,
-                    float(visitor.total_spending or 0),
+                    from_cents(visitor.total_spending_cents),
                     visitor.satisfaction_rating or '',
                     visitor.feedback_comments or '',
                     visitor.device_type or ''
@@ -385,10 +471,10 @@ def export_csv_report():
             
         elif report_type == 'operational':
             # Operational metrics CSV
-            metrics = OperationalMetrics.query.filter(
-                OperationalMetrics.metric_date >= start_date_obj,
-                OperationalMetrics.metric_date <= end_date_obj
-            ).order_by(OperationalMetrics.metric_date, OperationalMetrics.metric_hour).all()
+            metrics = fetch_range(
+                OperationalMetrics, start_date_obj, end_date_obj,
+                order_by=(OperationalMetrics.metric_date, OperationalMetrics.metric_hour)
+            )
             
             # Write header
             writer.writerow([
@@ -403,7 +489,7 @@ def export_csv_report():
                     metric.metric_date.isoformat() if metric.metric_date else '',
                     metric.metric_hour,
                     metric.total_visitors,
-                    float(metric.total_revenue or 0),
+                    from_cents(metric.total_revenue_cents),
                     metric.average_wait_time,
                     float(metric.peak_capacity_percentage or 0),
                     float(metric.staff_efficiency_score or 0),
@@ -416,10 +502,10 @@ def export_csv_report():
             
         elif report_type == 'attractions':
             # Attraction analytics CSV
-            attractions = AttractionAnalytics.query.filter(
-                AttractionAnalytics.date >= start_date_obj,
-                AttractionAnalytics.date <= end_date_obj
-            ).order_by(AttractionAnalytics.date, AttractionAnalytics.hour).all()
+            attractions = fetch_range(
+                AttractionAnalytics, start_date_obj, end_date_obj,
+                order_by=(AttractionAnalytics.date, AttractionAnalytics.hour)
+            )
             
             # Write header
             writer.writerow([
@@ -428,20 +514,22 @@ def export_csv_report():
                 'Satisfaction Rating', 'Downtime (minutes)', 'Revenue Generated'
             ])
             
-            # Write data
+            # Write data, with each attraction's id and name from the attraction dimension
+            directory = current_attractions()
             for attraction in attractions:
+                entry = directory.get(attraction.attraction_key)
                 writer.writerow([
                     attraction.date.isoformat() if attraction.date else '',
                     attraction.hour,
-                    attraction.attraction_id,
-                    attraction.attraction_name,
+                    entry.attraction_id,
+                    entry.name,
                     attraction.total_visitors,
                     attraction.average_wait_time,
                     attraction.max_wait_time,
                     float(attraction.capacity_utilization or 0),
                     float(attraction.satisfaction_rating or 0),
                     attraction.downtime_minutes,
-                    float(attraction.revenue_generated or 0)
+                    from_cents(attraction.revenue_generated_cents)
                 ])
             
             filename = f'attraction_analytics_{start_date}_to_{end_date}.csv'
@@ -0,0 +1,193 @@
+import math
+import os
+import threading
+import time
+from datetime import date, datetime
+from flask import g, jsonify, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Never queued or shed: health checks must answer under load, and an event
+# stream would hold its slot for as long as the client stays connected
+EXEMPT_ENDPOINTS = {'health_check', 'dashboard.stream_live_updates'}
+
+# Cheap endpoints the live dashboards and ingestion depend on
+LIVE_ENDPOINTS = {'analytics.get_real_time_stats', 'analytics.submit_feedback'}
+LIVE_BLUEPRINTS = {'dashboard'}
+
+# Always heavy: reports, exports and bulk writes
+HEAVY_ENDPOINTS = {'analytics.bulk_upsert'}
+HEAVY_BLUEPRINTS = {'reports'}
+# Range queries become heavy past ADMISSION_HEAVY_RANGE_DAYS
+RANGE_ENDPOINTS = {
+    'analytics.get_visitor_stats', 'analytics.get_attraction_analytics',
+    'analytics.get_payment_analytics', 'analytics.get_operational_metrics',
+}
+# Range the range endpoints read when a date is left out
+DEFAULT_RANGE_DAYS = 7
+
+# Bounds of the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+class Lane:
+    """
+    Concurrency limit with a bounded wait queue.
+
+    Up to `limit` requests run at once; up to `queue_size` more wait at most
+    `queue_seconds` for a slot. Anything beyond that is shed.
+    """
+
+    def __init__(self, name, limit, queue_size, queue_seconds):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_seconds = queue_seconds
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        # Smoothed seconds per request, for Retry-After
+        self.average_seconds = None
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; False when the request is shed"""
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue_size:
+                    self.shed_queue_full += 1
+                    return False
+                self.waiting += 1
+                deadline = time.monotonic() + self.queue_seconds
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.shed_timeout += 1
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self, seconds):
+        with self._condition:
+            self.active -= 1
+            self.average_seconds = seconds if self.average_seconds is None else 0.8 * self.average_seconds + 0.2 * seconds
+            self._condition.notify()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: the queue ahead, drained `limit` at a time"""
+        average = self.average_seconds or 1
+        estimate = math.ceil(average * (self.waiting + self.active) / max(self.limit, 1))
+        return min(max(estimate, MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+    def status(self):
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'queue_limit': self.queue_size,
+            'queue_depth': self.waiting,
+            'admitted': self.admitted,
+            'shed': self.shed_queue_full + self.shed_timeout,
+            'shed_queue_full': self.shed_queue_full,
+            'shed_timeout': self.shed_timeout,
+            'average_ms': round(self.average_seconds * 1000, 1) if self.average_seconds is not None else None,
+        }
+
+class AdmissionControl:
+    """
+    Per-process admission control with a lane for live endpoints and one for heavy ones.
+
+    Requests are classified by endpoint (and date range) before their handler
+    runs. A full lane queues the request briefly, then sheds it with
+    `429 Too Many Requests` and a `Retry-After` hint, so a burst of exports or
+    long range queries cannot take every worker thread from the live routes.
+    Requests in neither lane are not limited. Limits apply per worker process.
+    """
+
+    def __init__(self):
+        self.lanes = {}
+        self.heavy_range_days = 31
+
+    def init_app(self, app):
+        config = app.config
+        self.heavy_range_days = config.get('ADMISSION_HEAVY_RANGE_DAYS', 31)
+        self.lanes = {
+            'live': Lane(
+                'live',
+                config.get('ADMISSION_LIVE_CONCURRENCY', 32),
+                config.get('ADMISSION_LIVE_QUEUE', 64),
+                config.get('ADMISSION_LIVE_QUEUE_SECONDS', 2)
+            ),
+            'heavy': Lane(
+                'heavy',
+                config.get('ADMISSION_HEAVY_CONCURRENCY', 1),
+                config.get('ADMISSION_HEAVY_QUEUE', 1),
+                config.get('ADMISSION_HEAVY_QUEUE_SECONDS', 10)
+            ),
+        }
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+        app.extensions['admission'] = self
+
+    def classify(self):
+        """Lane of the current request, or None for unlimited and exempt requests"""
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if endpoint in HEAVY_ENDPOINTS or request.blueprint in HEAVY_BLUEPRINTS:
+            return 'heavy'
+        if endpoint in LIVE_ENDPOINTS or request.blueprint in LIVE_BLUEPRINTS:
+            return 'live'
+        if endpoint in RANGE_ENDPOINTS and self._range_days() > self.heavy_range_days:
+            return 'heavy'
+        return None
+
+    def _range_days(self):
+        try:
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else date.today()
+            if not request.args.get('start_date'):
+                return DEFAULT_RANGE_DAYS
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        except ValueError:
+            # The handler rejects it
+            return 0
+        return (end - start).days + 1
+
+    def _admit(self):
+        lane = self.lanes.get(self.classify())
+        if lane is None:
+            return None
+        if not lane.acquire():
+            retry_after = lane.retry_after()
+            logger.warning(f"Shed {request.method} {request.path} from the {lane.name} lane, retry after {retry_after}s")
+            response = jsonify({
+                'success': False,
+                'error': {
+                    'code': 'OVERLOADED',
+                    'message': f'Too many {lane.name} requests in progress, retry after {retry_after} seconds'
+                },
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        g.admission = (lane, time.monotonic())
+        return None
+
+    def _release(self, exception=None):
+        admission = g.pop('admission', None)
+        if admission is not None:
+            lane, started = admission
+            lane.release(time.monotonic() - started)
+
+    def status(self):
+        return {'pid': os.getpid(), 'lanes': {name: lane.status() for name, lane in self.lanes.items()}}
+
+admission_control = AdmissionControl()
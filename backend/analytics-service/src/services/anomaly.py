@@ -0,0 +1,327 @@
+import json
+import math
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, select, update
+from src.models.analytics import db, DetectorState, RealTimeStats
+from src.services.upsert import insert_if_missing
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Watched metrics and the direction that is bad (+1: high, -1: low)
+ANOMALY_METRICS = {
+    'system_load_percentage': 1,
+    'api_response_time_ms': 1,
+    'average_queue_time': 1,
+    'payment_success_rate': -1,
+    'cache_hit_rate': -1,
+}
+
+METRIC_LABELS = {
+    'system_load_percentage': 'system load',
+    'api_response_time_ms': 'API response time',
+    'average_queue_time': 'average queue time',
+    'payment_success_rate': 'payment success rate',
+    'cache_hit_rate': 'cache hit rate',
+}
+
+# Row of detector_state holding this detector's baselines and alerts
+DETECTOR_NAME = 'real_time_anomalies'
+
+# Hard limits on the smoothed level of a metric, most severe first per metric
+STATIC_LIMITS = (
+    ('system_load_percentage', 1, 90, 'CRITICAL', 'High system load: {value:.1f}%'),
+    ('system_load_percentage', 1, 75, 'WARNING', 'Elevated system load: {value:.1f}%'),
+    ('api_response_time_ms', 1, 1000, 'WARNING', 'Slow API response time: {value:.0f}ms'),
+    ('payment_success_rate', -1, 95, 'CRITICAL', 'Low payment success rate: {value:.1f}%'),
+)
+
+class EwmaState:
+    """Exponentially weighted mean and variance of one series"""
+
+    __slots__ = ('alpha', 'mean', 'variance', 'count')
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = None
+        self.variance = 0.0
+        self.count = 0
+
+    def zscore(self, value):
+        """Standard score of `value` against the current estimate, before it is applied"""
+        if self.mean is None:
+            return None
+        # Floor the deviation so a perfectly flat series does not make every change infinite
+        deviation = max(math.sqrt(self.variance), 0.01 * abs(self.mean), 1e-6)
+        return (value - self.mean) / deviation
+
+    def dump(self):
+        return [self.mean, self.variance, self.count]
+
+    def load(self, values):
+        self.mean, self.variance, self.count = values
+
+    def update(self, value):
+        self.count += 1
+        if self.mean is None:
+            self.mean = value
+            return
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+
+class AnomalyDetector:
+    """
+    Online anomaly detection over the real-time stats stream.
+
+    Each snapshot updates, per metric, a fast EWMA of the recent level and a
+    slower EWMA for the same hour of day, in constant time. A snapshot whose
+    z-score against either baseline exceeds `threshold` in the bad direction
+    raises an alert (CRITICAL above `critical_threshold`); it clears once the
+    score falls below half the threshold. The STATIC_LIMITS are checked
+    against the fast EWMA level.
+
+    Detection runs at ingest: `ingest` applies the snapshots past the
+    watermark in `detector_state`, ordered by (timestamp, id), once they are
+    `settle` old, since concurrent posts may commit out of timestamp order.
+    The snapshot a post has just committed is applied at once, ahead of the
+    watermark; it is remembered until the watermark passes it, so it is not
+    applied again. The baselines and alerts are stored with the watermark, so every worker
+    reports the same alerts. Saves are versioned: when two workers apply the
+    same snapshots at once, only the first save counts. Alerts expire once
+    no snapshot newer than `stale_after` has been applied, so a stalled feed
+    does not keep its last alerts.
+    """
+
+    def __init__(self, alpha=0.05, seasonal_alpha=0.01, threshold=3.0, critical_threshold=5.0,
+                 warmup=30, settle=timedelta(seconds=2), stale_after=timedelta(minutes=5),
+                 prime_window=timedelta(hours=1)):
+        self.alpha = alpha
+        self.seasonal_alpha = seasonal_alpha
+        self.threshold = threshold
+        self.critical_threshold = critical_threshold
+        self.warmup = warmup
+        self.settle = settle
+        self.stale_after = stale_after
+        self.prime_window = prime_window
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._levels = {metric: EwmaState(self.alpha) for metric in ANOMALY_METRICS}
+        self._seasonal = {
+            metric: [EwmaState(self.seasonal_alpha) for _ in range(24)] for metric in ANOMALY_METRICS
+        }
+        self._alerts = {}
+        # Snapshots applied ahead of the watermark: id -> timestamp
+        self._ahead = {}
+
+    # Stored state
+
+    def _state_row(self, connection, create=False):
+        table = DetectorState.__table__
+        query = select(table).where(table.c.detector == DETECTOR_NAME)
+        row = connection.execute(query).first()
+        if row is None and create:
+            insert_if_missing(connection, table, {'detector': DETECTOR_NAME, 'state': '{}', 'version': 0}, 'unique_detector_state')
+            row = connection.execute(query).first()
+        return row
+
+    def _load(self, row):
+        self._reset()
+        state = json.loads(row.state) if row is not None else {}
+        for metric, values in state.get('levels', {}).items():
+            if metric in self._levels:
+                self._levels[metric].load(values)
+        for metric, hours in state.get('seasonal', {}).items():
+            if metric in self._seasonal:
+                for hour, values in enumerate(hours):
+                    self._seasonal[metric][hour].load(values)
+        for alert in state.get('alerts', []):
+            self._alerts[(alert['metric'], 'limit' if alert['kind'] == 'limit' else 'anomaly')] = alert
+        for snapshot_id, timestamp in state.get('ahead', []):
+            self._ahead[snapshot_id] = datetime.fromisoformat(timestamp)
+
+    def _dump(self):
+        return json.dumps({
+            'levels': {metric: level.dump() for metric, level in self._levels.items()},
+            'seasonal': {metric: [hour.dump() for hour in hours] for metric, hours in self._seasonal.items()},
+            'alerts': list(self._alerts.values()),
+            'ahead': [[snapshot_id, timestamp.isoformat()] for snapshot_id, timestamp in self._ahead.items()]
+        })
+
+    def _last_applied(self, row):
+        """Timestamp of the newest snapshot applied, at or past the watermark"""
+        return max(filter(None, [row.position_timestamp, *self._ahead.values()]), default=None)
+
+    # Detection
+
+    def ingest(self, now=None, batch_size=1000, snapshot_id=None):
+        """
+        Apply the settled snapshots past the watermark (the last
+        `prime_window` on first use), then snapshot `snapshot_id`, just
+        committed, without waiting for it to settle. Returns the number
+        applied, 0 when another worker applied them first.
+        """
+        now = now or datetime.utcnow()
+        table = RealTimeStats.__table__
+        columns = [table.c.id, table.c.timestamp] + [table.c[metric] for metric in ANOMALY_METRICS]
+        with self._lock:
+            connection = db.session.connection()
+            try:
+                row = self._state_row(connection, create=True)
+                self._load(row)
+                position = (row.position_timestamp, row.position_id)
+                if position[0] is None:
+                    position = (now - self.prime_window, '')
+                start = position
+                applied = 0
+                while True:
+                    stats = connection.execute(select(*columns).where(
+                        table.c.timestamp <= now - self.settle,
+                        table.c.timestamp >= position[0],
+                        or_(table.c.timestamp > position[0], table.c.id > position[1])
+                    ).order_by(table.c.timestamp, table.c.id).limit(batch_size)).all()
+                    for stat in stats:
+                        # Applied ahead by the post that committed it
+                        if self._ahead.pop(stat.id, None) is None:
+                            self._apply(stat)
+                            applied += 1
+                    if stats:
+                        position = (stats[-1].timestamp, stats[-1].id)
+                    if len(stats) < batch_size:
+                        break
+                if snapshot_id is not None and snapshot_id not in self._ahead:
+                    stat = connection.execute(select(*columns).where(table.c.id == snapshot_id)).first()
+                    if stat is not None and (stat.timestamp, stat.id) > position:
+                        self._apply(stat)
+                        self._ahead[stat.id] = stat.timestamp
+                        applied += 1
+                if not applied and position == start:
+                    # Keeps the state row if this call created it
+                    db.session.commit()
+                    return 0
+
+                states = DetectorState.__table__
+                saved = connection.execute(update(states).where(
+                    states.c.id == row.id, states.c.version == row.version
+                ).values(
+                    state=self._dump(), position_timestamp=position[0], position_id=position[1],
+                    version=row.version + 1, updated_at=datetime.utcnow()
+                ))
+                if saved.rowcount != 1:
+                    # Another worker saved first, having applied these snapshots itself
+                    db.session.rollback()
+                    return 0
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        return applied
+
+    def active_alerts(self, now=None):
+        """Alerts of the stored state, or none once its last snapshot is older than `stale_after`"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            row = self._state_row(db.session.connection())
+            self._load(row)
+            last = self._last_applied(row) if row is not None else None
+            if last is None or last < now - self.stale_after:
+                return []
+            return sorted(
+                (dict(alert) for alert in self._alerts.values()),
+                key=lambda alert: (alert['level'] != 'CRITICAL', alert['timestamp'])
+            )
+
+    def state(self):
+        """Stored EWMA level and deviation per metric"""
+        with self._lock:
+            self._load(self._state_row(db.session.connection()))
+            return {
+                metric: {
+                    'mean': level.mean,
+                    'stddev': math.sqrt(level.variance),
+                    'samples': level.count
+                }
+                for metric, level in self._levels.items()
+            }
+
+    def _apply(self, stat):
+        timestamp = stat.timestamp
+        for metric, direction in ANOMALY_METRICS.items():
+            value = getattr(stat, metric)
+            if value is None:
+                continue
+            value = float(value)
+            level = self._levels[metric]
+            seasonal = self._seasonal[metric][timestamp.hour]
+
+            self._check_anomaly(metric, direction, value, level, seasonal, timestamp)
+            level.update(value)
+            seasonal.update(value)
+            self._check_limits(metric, level.mean, timestamp)
+
+    def _check_anomaly(self, metric, direction, value, level, seasonal, timestamp):
+        scores = []
+        if level.count >= self.warmup:
+            scores.append(('zscore', level.zscore(value) * direction, level.mean))
+        if seasonal.count >= self.warmup:
+            scores.append(('seasonal', seasonal.zscore(value) * direction, seasonal.mean))
+
+        key = (metric, 'anomaly')
+        if not scores:
+            return
+        kind, score, expected = max(scores, key=lambda s: s[1])
+
+        if score > self.threshold:
+            existing = self._alerts.get(key)
+            self._alerts[key] = {
+                'level': 'CRITICAL' if score > self.critical_threshold else 'WARNING',
+                'message': f'Anomalous {METRIC_LABELS[metric]}: {value:.1f} (expected {expected:.1f}, z={score:.1f})',
+                'metric': metric,
+                'kind': kind,
+                'value': value,
+                'expected': round(expected, 2),
+                'z_score': round(score, 2),
+                'timestamp': existing['timestamp'] if existing else timestamp.isoformat(),
+                'last_seen': timestamp.isoformat()
+            }
+        elif score < self.threshold / 2 and key in self._alerts:
+            del self._alerts[key]
+
+    def _check_limits(self, metric, level, timestamp):
+        key = (metric, 'limit')
+        for limit_metric, direction, limit, severity, message in STATIC_LIMITS:
+            if limit_metric != metric or (level - limit) * direction <= 0:
+                continue
+            existing = self._alerts.get(key)
+            self._alerts[key] = {
+                'level': severity,
+                'message': message.format(value=level),
+                'metric': metric,
+                'kind': 'limit',
+                'value': round(level, 2),
+                'timestamp': existing['timestamp'] if existing and existing['level'] == severity else timestamp.isoformat(),
+                'last_seen': timestamp.isoformat()
+            }
+            return
+        self._alerts.pop(key, None)
+
+def current_detector():
+    """The app's anomaly detector, created on first use"""
+    detector = current_app.extensions.get('anomaly_detector')
+    if detector is None:
+        config = current_app.config
+        detector = current_app.extensions.setdefault('anomaly_detector', AnomalyDetector(
+            alpha=config.get('ANOMALY_EWMA_ALPHA', 0.05),
+            seasonal_alpha=config.get('ANOMALY_SEASONAL_ALPHA', 0.01),
+            threshold=config.get('ANOMALY_Z_THRESHOLD', 3.0),
+            critical_threshold=config.get('ANOMALY_CRITICAL_Z_THRESHOLD', 5.0),
+            warmup=config.get('ANOMALY_WARMUP_SAMPLES', 30),
+            settle=timedelta(seconds=config.get('ANOMALY_SETTLE_SECONDS', 2)),
+            stale_after=timedelta(seconds=config.get('ANOMALY_STALE_SECONDS', 300))
+        ))
+    return detector
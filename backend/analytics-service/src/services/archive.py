@@ -0,0 +1,432 @@
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, text
+from src.models.analytics import db, VisitorAnalytics, AttractionAnalytics
+from src.services.attractions import attraction_keys, register_attractions
+from src.services.partitioning import PARTITIONED_TABLES, partition_sessions
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Archived tables and the date column their months are cut on
+ARCHIVED_MODELS = {
+    'visitor_analytics': (VisitorAnalytics, 'visit_date'),
+    'attraction_analytics': (AttractionAnalytics, 'date'),
+}
+
+EPOCH = datetime(1970, 1, 1)
+MANIFEST_NAME = 'manifest.json'
+MONTH_FILE_PATTERN = re.compile(r'^\d{4}-\d{2}\.npz$')
+# Money columns months archived before the switch to integer cents hold as float amounts
+LEGACY_CENTS_COLUMNS = {
+    'total_spending_cents': 'total_spending',
+    'revenue_generated_cents': 'revenue_generated',
+}
+
+def _legacy_attraction_keys(archive):
+    """
+    attraction_key column of an attraction month archived with attraction ids
+    and names, registering attractions the dimension does not hold yet
+    """
+    ids = archive['attraction_id']
+    unique_ids, positions = np.unique(ids, return_inverse=True)
+    names = dict(zip(ids.tolist(), archive['attraction_name'].tolist()))
+    with db.engine.begin() as connection:
+        keys = attraction_keys(connection, unique_ids.tolist())
+        keys.update(register_attractions(connection, {
+            attraction_id: {'name': names[attraction_id]} for attraction_id in unique_ids.tolist() if attraction_id not in keys
+        }))
+    return np.array([keys[attraction_id] for attraction_id in unique_ids.tolist()], dtype=np.int64)[positions]
+
+def _python_kind(column):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return 'datetime'
+    if python_type is date:
+        return 'date'
+    if python_type is int:
+        return 'int'
+    if python_type in (float, Decimal):
+        return 'float'
+    return 'str'
+
+def _encode_column(kind, values):
+    """Encode a column as a typed array plus a null mask"""
+    nulls = np.array([v is None for v in values], dtype=bool)
+    if kind == 'datetime':
+        data = np.array([int((v - EPOCH).total_seconds() * 1_000_000) if v is not None else 0 for v in values], dtype=np.int64)
+    elif kind == 'date':
+        data = np.array([v.toordinal() if v is not None else 0 for v in values], dtype=np.int32)
+    elif kind == 'int':
+        data = np.array([v if v is not None else 0 for v in values], dtype=np.int64)
+    elif kind == 'float':
+        data = np.array([float(v) if v is not None else 0.0 for v in values], dtype=np.float64)
+    else:
+        data = np.array([v if v is not None else '' for v in values], dtype=np.str_)
+    return data, nulls
+
+def _decode_value(kind, value):
+    if kind == 'datetime':
+        return EPOCH + timedelta(microseconds=int(value))
+    if kind == 'date':
+        return date.fromordinal(int(value))
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    return str(value)
+
+class ArchiveMonth:
+    """One archived month of a table, held as column arrays"""
+
+    def __init__(self, columns, nulls, kinds):
+        self.columns = columns
+        self.nulls = nulls
+        self.kinds = kinds
+
+    @property
+    def row_count(self):
+        first = next(iter(self.columns.values()), None)
+        return 0 if first is None else len(first)
+
+    def mask(self, date_column, start, end, filters):
+        """Boolean row mask for a date range and equality filters, computed column-wise"""
+        ordinals = self.columns[date_column]
+        selected = (ordinals >= start.toordinal()) & (ordinals <= end.toordinal())
+        for name, value in filters.items():
+            if value is None:
+                continue
+            selected &= (self.columns[name] == value) & ~self.nulls[name]
+        return selected
+
+    def rows(self, model, selected, columns=None):
+        """Materialize selected rows as transient model instances, or as plain records of just `columns`"""
+        indices = np.flatnonzero(selected)
+        decoded = {}
+        for name in columns or self.columns:
+            data = self.columns[name]
+            kind = self.kinds[name]
+            nulls = self.nulls[name]
+            decoded[name] = [
+                None if nulls[i] else _decode_value(kind, data[i]) for i in indices
+            ]
+        make = model if columns is None else SimpleNamespace
+        return [
+            make(**{name: values[position] for name, values in decoded.items()})
+            for position in range(len(indices))
+        ]
+
+class ColdArchive:
+    """
+    Cold tier for visitor and attraction analytics.
+
+    Rows older than the archive cutoff are moved out of the database into one
+    compressed file per table and month (`<table>/YYYY-MM.npz`), stored as
+    typed column arrays with null masks. A manifest records the cutoff per
+    table: dates before it are served from the archive, dates on or after it
+    from the database, so the two never overlap even if an archive run was
+    interrupted before its delete finished.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._cache = {}
+
+    # Manifest
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self._manifest_path() + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self._manifest_path())
+
+    def cutoff(self, table):
+        """First date still held in the database, or None if nothing is archived"""
+        value = self._read_manifest().get(table, {}).get('cutoff')
+        return date.fromisoformat(value) if value else None
+
+    def first_month(self, table):
+        """First day of the earliest archived month of `table`, or None"""
+        months = self._months(table)
+        return months[0] if months else None
+
+    # Month files
+
+    def _month_path(self, table, month):
+        return os.path.join(self.directory, table, f'{month.strftime("%Y-%m")}.npz')
+
+    def _months(self, table):
+        directory = os.path.join(self.directory, table)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            datetime.strptime(name[:-4], '%Y-%m').date()
+            for name in os.listdir(directory) if MONTH_FILE_PATTERN.match(name)
+        )
+
+    def _load_month(self, table, month):
+        path = self._month_path(table, month)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        model = ARCHIVED_MODELS[table][0]
+        kinds = {c.name: _python_kind(c) for c in model.__table__.columns}
+        columns, nulls = {}, {}
+        with np.load(path, allow_pickle=False) as archive:
+            for name in kinds:
+                if name in archive.files:
+                    columns[name] = archive[name]
+                    nulls[name] = archive[f'{name}__null']
+                elif LEGACY_CENTS_COLUMNS.get(name) in archive.files:
+                    legacy = LEGACY_CENTS_COLUMNS[name]
+                    columns[name] = np.rint(archive[legacy] * 100).astype(np.int64)
+                    nulls[name] = archive[f'{legacy}__null']
+                elif name == 'attraction_key' and 'attraction_id' in archive.files:
+                    columns[name] = _legacy_attraction_keys(archive)
+                    nulls[name] = archive['attraction_id__null']
+        # Columns added to the model after the month was archived read as null
+        row_count = len(next(iter(columns.values()))) if columns else 0
+        for name, kind in kinds.items():
+            if name not in columns:
+                columns[name], nulls[name] = _encode_column(kind, [None] * row_count)
+
+        month_data = ArchiveMonth(columns, nulls, kinds)
+        self._cache[path] = (mtime, month_data)
+        return month_data
+
+    def _write_month(self, table, month, columns, nulls):
+        arrays = {}
+        for name, data in columns.items():
+            arrays[name] = data
+            arrays[f'{name}__null'] = nulls[name]
+
+        path = self._month_path(table, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp.npz'
+        np.savez_compressed(temp_path, **arrays)
+        os.replace(temp_path, path)
+
+    # Reads
+
+    def archived_rows(self, table, start, end, columns=None, **filters):
+        """Archived rows of `table` dated within [start, end]"""
+        model, date_column = ARCHIVED_MODELS[table]
+        rows = []
+        for month in self._months(table):
+            next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+            if next_month <= start or month > end:
+                continue
+            month_data = self._load_month(table, month)
+            rows.extend(month_data.rows(model, month_data.mask(date_column, start, end, filters), columns))
+        return rows
+
+    def archived_count(self, table, start, end, **filters):
+        """Number of archived rows of `table` dated within [start, end]"""
+        _, date_column = ARCHIVED_MODELS[table]
+        total = 0
+        for month in self._months(table):
+            next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+            if next_month <= start or month > end:
+                continue
+            total += int(self._load_month(table, month).mask(date_column, start, end, filters).sum())
+        return total
+
+    # Archiving
+
+    def archive_before(self, table, cutoff, batch_size=5000):
+        """
+        Move rows of `table` dated before `cutoff` into the archive.
+        Month files are written first, then the manifest cutoff advances,
+        then the rows are deleted from the database. Each month is streamed
+        from the database in chunks of `batch_size` rows.
+        """
+        model, date_column = ARCHIVED_MODELS[table]
+        column = getattr(model, date_column)
+        previous_cutoff = self.cutoff(table)
+        if previous_cutoff and cutoff <= previous_cutoff:
+            return {'table': table, 'rows_archived': 0, 'cutoff': previous_cutoff.isoformat()}
+
+        last_day = cutoff - timedelta(days=1)
+        oldest = [
+            session.query(db.func.min(column)).filter(column < cutoff).scalar()
+            for session in partition_sessions(model, end=last_day)
+        ]
+        oldest = min((day for day in oldest if day is not None), default=None)
+        archived = 0
+        month = oldest.replace(day=1) if oldest else None
+        while month is not None and month < cutoff:
+            next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+            month_end = min(next_month, cutoff)
+            existing = None
+            known_ids = set()
+            if os.path.exists(self._month_path(table, month)):
+                # Earlier run archived part of this month; keep it and skip rows already there
+                existing = self._load_month(table, month)
+                known_ids = set(existing.columns['id'].tolist())
+            count, columns, nulls = self._stored_columns(table, month, month_end, known_ids, batch_size)
+            if count:
+                if existing is not None:
+                    columns = {name: np.concatenate([existing.columns[name], data]) for name, data in columns.items()}
+                    nulls = {name: np.concatenate([existing.nulls[name], mask]) for name, mask in nulls.items()}
+                self._write_month(table, month, columns, nulls)
+                archived += count
+            month = next_month
+
+        manifest = self._read_manifest()
+        manifest[table] = {'cutoff': cutoff.isoformat(), 'archived_at': datetime.utcnow().isoformat()}
+        self._write_manifest(manifest)
+
+        self._delete_before(table, date_column, cutoff, batch_size)
+        logger.info(f"Archived {archived} rows of {table} before {cutoff.isoformat()}")
+        return {'table': table, 'rows_archived': archived, 'cutoff': cutoff.isoformat()}
+
+    def _stored_columns(self, table, start, end, skip_ids, batch_size):
+        """
+        Rows of `table` dated within [start, end) in the database, except
+        `skip_ids`, as (row count, column arrays, null masks). Rows are read
+        with Core selects in chunks of `batch_size` and encoded chunk by
+        chunk, so a month is never held as Python objects at once.
+        """
+        model, date_column = ARCHIVED_MODELS[table]
+        table_columns = list(model.__table__.columns)
+        kinds = [_python_kind(c) for c in table_columns]
+        date_col = model.__table__.c[date_column]
+        query = select(*table_columns).where(date_col >= start, date_col < end)
+        data_chunks = [[] for _ in table_columns]
+        null_chunks = [[] for _ in table_columns]
+        count = 0
+        for session in partition_sessions(model, start, end - timedelta(days=1)):
+            result = session.execute(query, execution_options={'yield_per': batch_size})
+            for chunk in result.partitions():
+                if skip_ids:
+                    chunk = [row for row in chunk if row.id not in skip_ids]
+                if not chunk:
+                    continue
+                for position, kind in enumerate(kinds):
+                    data, nulls = _encode_column(kind, [row[position] for row in chunk])
+                    data_chunks[position].append(data)
+                    null_chunks[position].append(nulls)
+                count += len(chunk)
+
+        columns, nulls = {}, {}
+        for position, (column, kind) in enumerate(zip(table_columns, kinds)):
+            if data_chunks[position]:
+                columns[column.name] = np.concatenate(data_chunks[position])
+                nulls[column.name] = np.concatenate(null_chunks[position])
+            else:
+                columns[column.name], nulls[column.name] = _encode_column(kind, [])
+        return count, columns, nulls
+
+    def _delete_before(self, table, date_column, cutoff, batch_size):
+        """Delete archived rows in bounded batches, including sealed SQLite partitions"""
+        model = ARCHIVED_MODELS[table][0]
+        for session in partition_sessions(model, end=cutoff - timedelta(days=1)):
+            while True:
+                result = session.execute(text(
+                    f'DELETE FROM {table} WHERE id IN '
+                    f'(SELECT id FROM {table} WHERE {date_column} < :cutoff LIMIT :limit)'
+                ), {'cutoff': cutoff.isoformat(), 'limit': batch_size})
+                session.commit()
+                if result.rowcount < batch_size:
+                    break
+
+    def status(self):
+        """Archived months and row counts per table"""
+        manifest = self._read_manifest()
+        return {
+            table: {
+                'cutoff': manifest.get(table, {}).get('cutoff'),
+                'months': {
+                    month.strftime('%Y-%m'): self._load_month(table, month).row_count
+                    for month in self._months(table)
+                }
+            }
+            for table in ARCHIVED_MODELS
+        }
+
+def current_archive():
+    """The app's cold archive, created on first use, or None when archiving is not configured"""
+    archive = current_app.extensions.get('cold_archive')
+    if archive is None and current_app.config.get('ARCHIVE_DIR'):
+        archive = current_app.extensions.setdefault('cold_archive', ColdArchive(current_app.config['ARCHIVE_DIR']))
+    return archive
+
+def _date_column(model):
+    table = model.__tablename__
+    return getattr(model, ARCHIVED_MODELS[table][1] if table in ARCHIVED_MODELS else PARTITIONED_TABLES[table])
+
+def fetch_range(model, start, end, order_by=None, columns=None, **filters):
+    """
+    Rows of `model` dated within [start, end] from the database, including
+    the sealed month partitions the range overlaps, plus archived rows when
+    the range reaches before the archive cutoff. `filters` are equality
+    filters applied to every tier. With `columns` (names, including any
+    `order_by` columns) only those are loaded, as read-only records instead
+    of model instances, which is much cheaper for aggregations.
+    """
+    table = model.__tablename__
+    column = _date_column(model)
+    archive = current_archive() if table in ARCHIVED_MODELS else None
+    cutoff = archive.cutoff(table) if archive else None
+
+    rows = []
+    if cutoff and start < cutoff:
+        archived = archive.archived_rows(table, start, min(end, cutoff - timedelta(days=1)), columns, **filters)
+        if order_by:
+            archived.sort(key=lambda r: tuple(getattr(r, c.key) for c in order_by))
+        rows.extend(archived)
+
+    if cutoff is None or end >= cutoff:
+        lower = max(start, cutoff) if cutoff else start
+        stored = []
+        sources = 0
+        for session in partition_sessions(model, lower, end):
+            query = session.query(model) if columns is None else session.query(*(getattr(model, name) for name in columns))
+            query = query.filter(column >= lower, column <= end)
+            for name, value in filters.items():
+                if value is not None:
+                    query = query.filter(getattr(model, name) == value)
+            if order_by:
+                query = query.order_by(*order_by)
+            stored.extend(query.all())
+            sources += 1
+        if order_by and sources > 1:
+            stored.sort(key=lambda r: tuple(getattr(r, c.key) for c in order_by))
+        rows.extend(stored)
+
+    return rows
+
+def count_range(model, start, end):
+    """Row count of `model` dated within [start, end] across the database and the archive"""
+    table = model.__tablename__
+    column = _date_column(model)
+    archive = current_archive() if table in ARCHIVED_MODELS else None
+    cutoff = archive.cutoff(table) if archive else None
+
+    total = 0
+    if cutoff and start < cutoff:
+        total += archive.archived_count(table, start, min(end, cutoff - timedelta(days=1)))
+    if cutoff is None or end >= cutoff:
+        lower = max(start, cutoff) if cutoff else start
+        for session in partition_sessions(model, lower, end):
+            total += session.query(model).filter(column >= lower, column <= end).count()
+    return total
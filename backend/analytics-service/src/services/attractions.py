@@ -0,0 +1,192 @@
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import select, update
+from src.models.analytics import db, AttractionDimension
+from src.services.upsert import dialect_insert
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Dimension columns a sync may overwrite
+DETAIL_COLUMNS = ('name', 'max_capacity', 'duration_minutes')
+# Ids per IN (...) lookup
+LOOKUP_CHUNK = 500
+
+def _entry(row):
+    return SimpleNamespace(
+        attraction_key=row.attraction_key, attraction_id=row.attraction_id, name=row.name,
+        max_capacity=row.max_capacity, duration_minutes=row.duration_minutes
+    )
+
+class AttractionDirectory:
+    """
+    In-process cache of the attraction dimension, so hourly rows only carry
+    a compact key and handlers look names up instead of reading them per row.
+
+    The whole dimension (one row per attraction) is loaded at once. It is
+    reloaded when it is older than `ttl_seconds`, when it is invalidated
+    after a local write, and when a key or id is missing (another process
+    added the attraction).
+    """
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._by_key = {}
+        self._by_id = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _load(self, stale_before=None):
+        with self._lock:
+            # Another thread may have reloaded while this one waited
+            if self._loaded_at is not None and (stale_before is None or self._loaded_at > stale_before):
+                return
+            by_key, by_id = {}, {}
+            for row in db.session.query(AttractionDimension):
+                entry = _entry(row)
+                by_key[entry.attraction_key] = entry
+                by_id[entry.attraction_id] = entry
+            self._by_key, self._by_id = by_key, by_id
+            self._loaded_at = time.monotonic()
+
+    def _current(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl_seconds:
+            self._load(loaded_at)
+
+    def _reload_for_miss(self):
+        # At most one reload per second for keys that really are unknown
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > 1:
+            self._load(loaded_at)
+
+    def get(self, key):
+        """Entry of attraction `key`; unknown keys get a placeholder with no id or name"""
+        self._current()
+        entry = self._by_key.get(key)
+        if entry is None:
+            self._reload_for_miss()
+            entry = self._by_key.get(key)
+        if entry is None:
+            return SimpleNamespace(
+                attraction_key=key, attraction_id=None, name=None, max_capacity=None, duration_minutes=None
+            )
+        return entry
+
+    def key_for(self, attraction_id):
+        """Key of the attraction with id `attraction_id`, or None"""
+        self._current()
+        entry = self._by_id.get(attraction_id)
+        if entry is None:
+            self._reload_for_miss()
+            entry = self._by_id.get(attraction_id)
+        return entry.attraction_key if entry else None
+
+    def entries(self):
+        self._current()
+        return list(self._by_key.values())
+
+def current_attractions():
+    """The app's attraction directory, created on first use"""
+    directory = current_app.extensions.get('attractions')
+    if directory is None:
+        directory = current_app.extensions.setdefault('attractions', AttractionDirectory(
+            ttl_seconds=current_app.config.get('ATTRACTION_CACHE_TTL_SECONDS', 300)
+        ))
+    return directory
+
+def _stored(connection, attraction_ids):
+    table = AttractionDimension.__table__
+    stored = {}
+    ids = sorted(attraction_ids)
+    for offset in range(0, len(ids), LOOKUP_CHUNK):
+        query = select(table).where(table.c.attraction_id.in_(ids[offset:offset + LOOKUP_CHUNK]))
+        for row in connection.execute(query):
+            stored[row.attraction_id] = row
+    return stored
+
+def register_attractions(connection, attractions):
+    """
+    Keys of `attractions` ({attraction_id: {name, max_capacity, duration_minutes}}),
+    adding the ones the dimension lacks and updating the details that changed.
+    Details that are missing or None leave the stored value alone; a new
+    attraction without a name is named after its id. Runs in the caller's
+    transaction; the cache picks the changes up once they are committed.
+    """
+    if not attractions:
+        return {}
+    table = AttractionDimension.__table__
+    stored = _stored(connection, attractions)
+    now = datetime.utcnow()
+
+    missing = [
+        {
+            'attraction_id': attraction_id,
+            'name': details.get('name') or attraction_id,
+            'max_capacity': details.get('max_capacity'),
+            'duration_minutes': details.get('duration_minutes'),
+            'updated_at': now
+        }
+        for attraction_id, details in attractions.items() if attraction_id not in stored
+    ]
+    if missing:
+        statement = dialect_insert(connection, table)
+        if connection.dialect.name in ('postgresql', 'sqlite'):
+            # A concurrent writer may add the same attraction first
+            statement = statement.on_conflict_do_nothing(index_elements=['attraction_id'])
+        connection.execute(statement, missing)
+        stored.update(_stored(connection, [row['attraction_id'] for row in missing]))
+
+    changed = False
+    for attraction_id, details in attractions.items():
+        row = stored[attraction_id]
+        values = {
+            name: details[name] for name in DETAIL_COLUMNS
+            if details.get(name) is not None and details[name] != getattr(row, name)
+        }
+        if values:
+            connection.execute(update(table).where(table.c.attraction_key == row.attraction_key).values(
+                updated_at=now, **values
+            ))
+            changed = True
+
+    if missing or changed:
+        current_attractions().invalidate()
+    return {attraction_id: row.attraction_key for attraction_id, row in stored.items()}
+
+def attraction_keys(connection, attraction_ids):
+    """Key of each attraction id the dimension holds, read through `connection` for ids the cache does not know yet"""
+    directory = current_attractions()
+    keys = {}
+    for attraction_id in set(attraction_ids):
+        key = directory.key_for(attraction_id)
+        if key is not None:
+            keys[attraction_id] = key
+    unknown = set(attraction_ids).difference(keys)
+    if unknown:
+        keys.update({attraction_id: row.attraction_key for attraction_id, row in _stored(connection, unknown).items()})
+    return keys
+
+def attraction_ids(connection, keys):
+    """Attraction id of each key, read through `connection` for keys the cache does not know yet"""
+    directory = current_attractions()
+    ids = {}
+    unknown = []
+    for key in set(keys):
+        entry = directory.get(key)
+        if entry.attraction_id is None:
+            unknown.append(key)
+        else:
+            ids[key] = entry.attraction_id
+    if unknown:
+        # Keys added earlier in the caller's uncommitted transaction
+        table = AttractionDimension.__table__
+        query = select(table.c.attraction_key, table.c.attraction_id).where(table.c.attraction_key.in_(unknown))
+        ids.update(dict(connection.execute(query).all()))
+    return ids
@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from flask import current_app
+from src.models.analytics import (
+    db, BackfillCheckpoint, OperationalMetrics, RealTimeStats, RealTimeStatsMinute, RealTimeStatsHour,
+    VisitorAnalytics
+)
+from src.services.archive import fetch_range
+import logging
+
+logger = logging.getLogger(__name__)
+
+def day_chunks(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+# Rollups
+
+def _hourly_queue_times(day):
+    """Sample-weighted average real-time queue time per hour of `day`, across the raw and rollup tiers"""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    totals = defaultdict(lambda: [0.0, 0])
+    samples = 0
+
+    raw = db.session.query(RealTimeStats.timestamp, RealTimeStats.average_queue_time).filter(
+        RealTimeStats.timestamp >= start, RealTimeStats.timestamp < end
+    )
+    for timestamp, value in raw:
+        samples += 1
+        if value is not None:
+            totals[timestamp.hour][0] += float(value)
+            totals[timestamp.hour][1] += 1
+
+    # Compaction moves each sample to exactly one tier, so the tiers simply add up
+    for model in (RealTimeStatsMinute, RealTimeStatsHour):
+        buckets = db.session.query(
+            model.bucket_start, model.sample_count, model.average_queue_time_avg, model.average_queue_time_count
+        ).filter(
+            model.bucket_start >= start, model.bucket_start < end
+        )
+        for bucket_start, count, value, value_count in buckets:
+            samples += count or 0
+            if value is not None and value_count:
+                totals[bucket_start.hour][0] += value * value_count
+                totals[bucket_start.hour][1] += value_count
+
+    return {hour: total / count for hour, (total, count) in totals.items() if count}, samples
+
+def operational_hours(day):
+    """
+    OperationalMetrics values per hour of `day` recomputed from raw data:
+    visitors, revenue and satisfaction from the visitor rows (archived ones
+    included) by entry hour, and the average wait from the real-time queue
+    times sampled in the hour. Covers every hour with visitor entries or an
+    existing row, so an hour whose visitors were mis-attributed is zeroed.
+    Returns the rows and the number of source rows read.
+    """
+    visits = fetch_range(VisitorAnalytics, day, day)
+    queue_times, samples = _hourly_queue_times(day)
+
+    hours = defaultdict(lambda: {'visitors': 0, 'revenue': 0, 'ratings': []})
+    for visit in visits:
+        if visit.entry_time is None:
+            continue
+        bucket = hours[visit.entry_time.hour]
+        bucket['visitors'] += 1
+        bucket['revenue'] += visit.total_spending_cents or 0
+        if visit.satisfaction_rating is not None:
+            bucket['ratings'].append(visit.satisfaction_rating)
+
+    existing = {row.metric_hour for row in fetch_range(OperationalMetrics, day, day, columns=('metric_hour',))}
+
+    rows = []
+    for hour in sorted(existing | set(hours)):
+        bucket = hours[hour]
+        ratings = bucket['ratings']
+        rows.append({
+            'metric_date': day,
+            'metric_hour': hour,
+            'total_visitors': bucket['visitors'],
+            'total_revenue_cents': bucket['revenue'],
+            'average_wait_time': int(round(queue_times.get(hour, 0))),
+            'customer_satisfaction_avg': round(sum(ratings) / len(ratings), 2) if ratings else 0
+        })
+    return rows, len(visits) + samples
+
+# Each rollup: target model, the columns it recomputes (others keep their
+# stored values) and the function computing one day of rows
+ROLLUPS = {
+    'operational': {
+        'model': OperationalMetrics,
+        'columns': ('total_visitors', 'total_revenue_cents', 'average_wait_time', 'customer_satisfaction_avg'),
+        'compute': operational_hours,
+    },
+}
+
+def backfill_day(name, day, job):
+    """Recompute one day of rollup `name` and upsert it together with its checkpoint"""
+    rollup = ROLLUPS[name]
+    started = perf_counter()
+    rows, source_rows = rollup['compute'](day)
+    # End the read transaction first: on SQLite a reader upgrading to a writer can deadlock with another worker
+    db.session.commit()
+
+    current_app.extensions['partitions'].upsert_rows(
+        db.session.connection(), rollup['model'].__table__, rows, rollup['columns']
+    )
+    db.session.add(BackfillCheckpoint(job=job, chunk_date=day, rows_written=len(rows)))
+    db.session.commit()
+
+    return {
+        'date': day.isoformat(),
+        'rows_written': len(rows),
+        'source_rows': source_rows,
+        'seconds': perf_counter() - started
+    }
+
+# Process pool
+
+_worker_app = None
+
+def _init_worker(app):
+    """Pool initializer: keep the forked app, dropping the database connections inherited from the parent"""
+    global _worker_app
+    _worker_app = app
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def _run_chunk(name, day, job):
+    with _worker_app.app_context():
+        return backfill_day(name, day, job)
+
+class RollupBackfill:
+    """
+    Recompute a rollup for every day in [start, end].
+
+    Days are independent, so they are spread over a pool of worker
+    processes (forked from the app; one in-process worker where fork is not
+    available). Each day commits its upserted rows together with a
+    checkpoint under `job`; days already checkpointed are skipped, so an
+    interrupted run resumes where it stopped and rerunning is idempotent.
+    """
+
+    def __init__(self, name, start, end, job=None):
+        if name not in ROLLUPS:
+            raise ValueError(f'Unknown rollup: {name}')
+        if end < start:
+            raise ValueError('End date must not be before start date')
+        self.name = name
+        self.start = start
+        self.end = end
+        self.job = job or f'{name}:{start.isoformat()}:{end.isoformat()}'
+
+    def reset(self):
+        """Forget the job's checkpoints so every day is recomputed"""
+        deleted = BackfillCheckpoint.query.filter_by(job=self.job).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def pending(self):
+        done = {
+            row.chunk_date for row in db.session.query(BackfillCheckpoint.chunk_date).filter(
+                BackfillCheckpoint.job == self.job,
+                BackfillCheckpoint.chunk_date >= self.start,
+                BackfillCheckpoint.chunk_date <= self.end
+            )
+        }
+        return [day for day in day_chunks(self.start, self.end) if day not in done]
+
+    def run(self, days, workers=None):
+        """Process `days`, yielding each day's result (with an `error` instead when it failed)"""
+        workers = max(1, min(workers or os.cpu_count() or 1, len(days)))
+        if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            for day in days:
+                yield self._run_local(day)
+            return
+
+        app = current_app._get_current_object()
+        # Connections must not be shared with the forked workers
+        db.session.remove()
+        db.engine.dispose()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=(app,)
+        ) as pool:
+            futures = {pool.submit(_run_chunk, self.name, day, self.job): day for day in days}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logger.error(f"Backfill of {self.name} failed for {futures[future].isoformat()}: {str(e)}")
+                    yield {'date': futures[future].isoformat(), 'error': str(e)}
+
+    def _run_local(self, day):
+        try:
+            return backfill_day(self.name, day, self.job)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Backfill of {self.name} failed for {day.isoformat()}: {str(e)}")
+            return {'date': day.isoformat(), 'error': str(e)}
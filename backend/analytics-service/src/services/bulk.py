@@ -0,0 +1,318 @@
+import json
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from flask import current_app
+from sqlalchemy import Date, Integer, Numeric, String, select
+from src.models.analytics import db, AttractionAnalytics, AttractionDimension, OperationalMetrics, PaymentAnalytics
+from src.models.money import to_cents
+from src.services.attractions import attraction_keys, register_attractions
+from src.services.partitioning import PARTITIONED_TABLES
+from src.services.upsert import HOURLY_UPSERT_KEYS
+
+# Hourly tables accepting bulk upserts
+BULK_MODELS = {
+    'operational_metrics': OperationalMetrics,
+    'attraction_analytics': AttractionAnalytics,
+    'payment_analytics': PaymentAnalytics,
+}
+
+# Set by the service, never accepted from clients
+MANAGED_COLUMNS = ('id', 'created_at', 'updated_at')
+HOUR_COLUMNS = ('hour', 'metric_hour')
+# Money is stored as integer cents in `<name>_cents` columns; clients may send either
+# the integer cents or the decimal amount under the API name
+CENTS_SUFFIX = '_cents'
+# Largest amount accepted, in currency units
+MAX_AMOUNT = 10 ** 12
+# Attraction rows name their attraction by id (and optionally name); both are
+# kept in attraction_dimension and the rows store its key
+ATTRACTION_FIELDS = {
+    'attraction_id': AttractionDimension.__table__.c.attraction_id,
+    'attraction_name': AttractionDimension.__table__.c.name,
+}
+
+def parse_bulk_rows(body, mimetype):
+    """Rows of a JSON array (or {"rows": [...]}) or NDJSON request body"""
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    if mimetype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        rows = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f'Invalid JSON on line {number}: {str(e)}')
+        return rows
+
+    try:
+        data = json.loads(text) if text.strip() else None
+    except ValueError as e:
+        raise ValueError(f'Invalid JSON: {str(e)}')
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of rows or NDJSON')
+    return data
+
+# Validation
+
+def _number(value):
+    if isinstance(value, str):
+        try:
+            value = Decimal(value)
+        except InvalidOperation:
+            raise ValueError('must be a number')
+        if not value.is_finite():
+            raise ValueError('must be a number')
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError('must be a number')
+    return value
+
+def _integer(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+        raise ValueError('must be an integer')
+    return int(value)
+
+def _converter(column):
+    """Function validating and converting a client value for `column`"""
+    column_type = column.type
+    if column.name in HOUR_COLUMNS:
+        def convert(value):
+            value = _integer(value)
+            if not 0 <= value <= 23:
+                raise ValueError('must be between 0 and 23')
+            return value
+    elif isinstance(column_type, Date):
+        def convert(value):
+            if not isinstance(value, str):
+                raise ValueError('must be a YYYY-MM-DD date')
+            return date.fromisoformat(value)
+    elif isinstance(column_type, Integer):
+        convert = _integer
+    elif isinstance(column_type, Numeric):
+        # Largest magnitude the column stores, e.g. 1000 for NUMERIC(5, 2)
+        limit = 10 ** (column_type.precision - column_type.scale) if column_type.precision else float('inf')
+
+        def convert(value):
+            value = _number(value)
+            # NaN fails the comparison too
+            if not abs(value) < limit:
+                raise ValueError(f'must be a number below {limit}')
+            return value
+    elif isinstance(column_type, String):
+        def convert(value):
+            if not isinstance(value, str):
+                raise ValueError('must be a string')
+            if column_type.length and len(value) > column_type.length:
+                raise ValueError(f'must be at most {column_type.length} characters')
+            return value
+    else:
+        def convert(value):
+            return value
+
+    return convert
+
+def _amount_in_cents(value):
+    value = _number(value)
+    # NaN fails the comparison too
+    if not abs(value) < MAX_AMOUNT:
+        raise ValueError(f'must be a number below {MAX_AMOUNT}')
+    return to_cents(value)
+
+class BulkUpsert:
+    """
+    Validates hourly rows for one table and upserts them in batches.
+
+    Rows are applied in request order: several rows for the same key merge
+    into one, later values winning. Each row's outcome is `inserted`,
+    `updated` or `error`; invalid rows are reported and skipped while the
+    others are written in one transaction. Only the columns a row carries
+    are written, so partial rows update just those columns.
+
+    Telling inserts from updates takes a read of the stored keys before the
+    write. With `report_outcomes=False` that read is limited to rows lacking a
+    required column, and valid rows are only counted as `written`.
+    """
+
+    def __init__(self, model, batch_size=5000):
+        self.model = model
+        self.table = model.__table__
+        self.batch_size = batch_size
+        _, self.key_columns = HOURLY_UPSERT_KEYS[self.table.name]
+        self.date_column = PARTITIONED_TABLES[self.table.name]
+        # Client field -> (column, converter)
+        self.fields = {
+            column.name: (column.name, _converter(column))
+            for column in self.table.columns if column.name not in MANAGED_COLUMNS
+        }
+        for name in list(self.fields):
+            if name.endswith(CENTS_SUFFIX):
+                self.fields[name[:-len(CENTS_SUFFIX)]] = (name, _amount_in_cents)
+        # Key columns as clients send them
+        self.client_keys = list(self.key_columns)
+        if model is AttractionAnalytics:
+            del self.fields['attraction_key']
+            for name, column in ATTRACTION_FIELDS.items():
+                self.fields[name] = (name, _converter(column))
+            self.client_keys[self.client_keys.index('attraction_key')] = 'attraction_id'
+        self.nullable = {column.name for column in self.table.columns if column.nullable and not column.primary_key}
+        # Needed to insert a row; the key columns are always required
+        self.required = [
+            column.name for column in self.table.columns
+            if not column.nullable and column.default is None
+            and column.name not in MANAGED_COLUMNS and column.name not in self.key_columns
+        ]
+
+    def _validate(self, raw):
+        if not isinstance(raw, dict):
+            raise ValueError('Row must be a JSON object')
+        row = {}
+        fields = self.fields
+        for name, value in raw.items():
+            field = fields.get(name)
+            if field is None:
+                raise ValueError(f'Unknown field: {name}')
+            column, converter = field
+            if value is None:
+                if column not in self.nullable:
+                    raise ValueError(f'{name} must not be null')
+                row[column] = None
+                continue
+            try:
+                row[column] = converter(value)
+            except ValueError as e:
+                raise ValueError(f'{name} {str(e)}')
+        for name in self.client_keys:
+            if row.get(name) is None:
+                raise ValueError(f'{name} is required')
+        return row
+
+    def _resolve_attractions(self, connection, valid, errors):
+        """
+        Replace the attraction id and name of `valid` rows with the attraction's
+        key, registering new attractions and renamed ones. Rows of unknown
+        attractions that carry no name are reported and dropped.
+        """
+        names = {}
+        for _, row in valid:
+            if 'attraction_name' in row:
+                names[row['attraction_id']] = row['attraction_name']
+        keys = register_attractions(connection, {attraction_id: {'name': name} for attraction_id, name in names.items()})
+        unnamed = {row['attraction_id'] for _, row in valid}.difference(keys)
+        if unnamed:
+            keys.update(attraction_keys(connection, unnamed))
+
+        resolved = []
+        for index, row in valid:
+            key = keys.get(row.pop('attraction_id'))
+            row.pop('attraction_name', None)
+            if key is None:
+                errors.append({'index': index, 'message': 'attraction_name required for new attractions'})
+                continue
+            row['attraction_key'] = key
+            resolved.append((index, row))
+        return resolved
+
+    def _existing(self, connection, keys):
+        """Stored values of the columns needed to complete partial rows, as key -> {column: value}"""
+        table = self.table
+        # Partial rows are completed with the stored values of required columns
+        names = list(self.required)
+        dates = [key[self.key_columns.index(self.date_column)] for key in keys]
+        query = select(*(table.c[name] for name in list(self.key_columns) + names)).where(
+            table.c[self.date_column] >= min(dates), table.c[self.date_column] <= max(dates)
+        )
+        key_count = len(self.key_columns)
+        wanted = set(keys)
+        existing = {}
+
+        def collect(result):
+            for row in result:
+                key = tuple(row[:key_count])
+                if key in wanted:
+                    existing[key] = dict(zip(names, row[key_count:]))
+
+        collect(connection.execute(query))
+        # Rows of sealed months are in their partition files
+        partitions = current_app.extensions['partitions']
+        for month in partitions.sealed_months(table.name, min(dates), max(dates)):
+            with partitions.month_session(month) as session:
+                collect(session.execute(query))
+        return existing
+
+    def apply(self, rows, report_outcomes=True):
+        outcomes = [None] * len(rows)
+        errors = []
+        valid = []
+        for index, raw in enumerate(rows):
+            try:
+                valid.append((index, self._validate(raw)))
+            except ValueError as e:
+                errors.append({'index': index, 'message': str(e)})
+
+        connection = db.session.connection()
+        if self.model is AttractionAnalytics and valid:
+            valid = self._resolve_attractions(connection, valid, errors)
+        for error in errors:
+            outcomes[error['index']] = 'error'
+
+        merged = {}
+        for index, row in valid:
+            key = tuple(row[name] for name in self.key_columns)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = (row, [index])
+            else:
+                entry[0].update(row)
+                entry[1].append(index)
+
+        if report_outcomes:
+            lookup = list(merged)
+        else:
+            # Only rows that would fail as inserts need their stored values
+            lookup = [key for key, (row, _) in merged.items() if any(row.get(name) is None for name in self.required)]
+        existing = self._existing(connection, lookup) if lookup else {}
+        groups = defaultdict(list)
+        for key, (row, indices) in merged.items():
+            stored = existing.get(key)
+            if stored is None:
+                missing = [name for name in self.required if row.get(name) is None]
+                if missing:
+                    for index in indices:
+                        outcomes[index] = 'error'
+                        errors.append({'index': index, 'message': f"{', '.join(missing)} required for new rows"})
+                    continue
+            for position, index in enumerate(indices):
+                if not report_outcomes:
+                    outcomes[index] = 'written'
+                else:
+                    outcomes[index] = 'inserted' if stored is None and position == 0 else 'updated'
+
+            # Rows are batched by the columns they carry: those are the ones an update overwrites
+            columns = frozenset(row)
+            if stored is not None:
+                # The INSERT half of the upsert is checked for NOT NULL columns even when it conflicts
+                row = dict(stored, **row)
+            groups[(columns, stored is not None)].append(row)
+
+        partitions = current_app.extensions['partitions']
+        for (columns, _), group in groups.items():
+            update_columns = sorted(columns.difference(self.key_columns))
+            for offset in range(0, len(group), self.batch_size):
+                partitions.upsert_rows(connection, self.table, group[offset:offset + self.batch_size], update_columns)
+
+        db.session.commit()
+
+        errors.sort(key=lambda error: error['index'])
+        if not report_outcomes:
+            return {'received': len(rows), 'written': outcomes.count('written'), 'failed': len(errors), 'errors': errors}
+        return {
+            'received': len(rows),
+            'inserted': outcomes.count('inserted'),
+            'updated': outcomes.count('updated'),
+            'failed': len(errors),
+            'outcomes': outcomes,
+            'errors': errors
+        }
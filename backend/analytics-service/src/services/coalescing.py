@@ -0,0 +1,125 @@
+import threading
+from flask import Response, current_app, g, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+def coalesce(view):
+    """Mark a GET view whose concurrent identical requests may share one response"""
+    view.coalesce = True
+    return view
+
+class Flight:
+    """One in-flight computation; followers wait for its response"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.read_source = None
+        self.followers = 0
+
+class SingleFlight:
+    """
+    In-process coalescing of identical concurrent GET requests.
+
+    The first request for an endpoint and normalized query string leads: it runs
+    the view, and its status, body and content type are handed to every identical
+    request that arrived while it was running. Followers wait at most
+    `COALESCE_TIMEOUT_SECONDS` and then run the view themselves, as they do when
+    the leader fails or was shed. Nothing is kept once the leader finishes, so
+    this never serves a response computed before the request arrived.
+
+    Followers are answered before admission control, so they do not take a lane
+    slot while they wait. A timeout of 0 turns coalescing off.
+    """
+
+    def __init__(self):
+        self.timeout = 5
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    def init_app(self, app):
+        self.timeout = app.config.get('COALESCE_TIMEOUT_SECONDS', 5)
+        app.before_request(self._join)
+        app.after_request(self._publish)
+        app.teardown_request(self._land)
+        app.extensions['single_flight'] = self
+
+    def _key(self):
+        # Parameter order and empty parameters do not change the response
+        params = sorted((name, value) for name, values in request.args.lists() for value in values if value != '')
+        return (request.endpoint, tuple(params))
+
+    def _join(self):
+        if self.timeout <= 0 or request.method != 'GET' or request.endpoint is None:
+            return None
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, 'coalesce', False):
+            return None
+
+        key = self._key()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+                g.flight = (key, flight)
+                return None
+            flight.followers += 1
+
+        landed = flight.done.wait(self.timeout)
+        shared = flight.response if landed else None
+        with self._lock:
+            flight.followers -= 1
+            if not landed:
+                self.timeouts += 1
+            elif shared is not None:
+                self.followers += 1
+        if not landed:
+            logger.warning(f"Coalesced {request.path} waited {self.timeout}s for its leader, running it separately")
+        if shared is None:
+            return None
+        status, data, mimetype = shared
+        if flight.read_source is not None:
+            # Lets the read-source header describe the leader's reads
+            g.prefer_replica = True
+            g.read_source = flight.read_source
+        response = Response(data, status=status, mimetype=mimetype)
+        response.headers['X-Coalesced'] = 'true'
+        return response
+
+    def _publish(self, response):
+        entry = g.get('flight')
+        # A shed leader says nothing about the query; its followers go through admission themselves
+        if entry is not None and not response.is_streamed and response.status_code != 429:
+            _, flight = entry
+            flight.response = (response.status_code, response.get_data(), response.mimetype)
+            if g.get('prefer_replica'):
+                flight.read_source = g.get('read_source', 'primary')
+        return response
+
+    def _land(self, exception=None):
+        entry = g.pop('flight', None)
+        if entry is None:
+            return
+        key, flight = entry
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        # Without a response (the view raised) the followers run the view themselves
+        flight.done.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'waiting': sum(flight.followers for flight in self._flights.values()),
+                'leaders': self.leaders,
+                'followers_served': self.followers,
+                'follower_timeouts': self.timeouts,
+            }
+
+single_flight = SingleFlight()
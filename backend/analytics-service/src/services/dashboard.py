@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from functools import cached_property
+from src.models.analytics import db, AttractionAnalytics, OperationalMetrics, PaymentAnalytics, RealTimeStats, VisitorAnalytics
+from src.services.archive import fetch_range
+
+# Columns the attraction status reads
+ATTRACTION_STATUS_COLUMNS = (
+    AttractionAnalytics.attraction_key, AttractionAnalytics.hour, AttractionAnalytics.total_visitors,
+    AttractionAnalytics.average_wait_time, AttractionAnalytics.capacity_utilization,
+    AttractionAnalytics.satisfaction_rating
+)
+
+class DashboardData:
+    """
+    The datasets dashboard panels are built from, each loaded on first use.
+
+    A panel endpoint builds from its own instance; `/dashboard/batch` shares
+    one across its sub-queries, so a page load reads e.g. the latest real-time
+    snapshot once instead of once per panel. The clock is read once, so every
+    panel of a batch describes the same day and hour.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now()
+        self.today = self.now.date()
+
+    @cached_property
+    def latest_stats(self):
+        return RealTimeStats.query.order_by(RealTimeStats.timestamp.desc()).first()
+
+    # The current month is never sealed into a partition, so today's rows are all in the main tables
+
+    @cached_property
+    def today_visitors(self):
+        return VisitorAnalytics.query.filter(VisitorAnalytics.visit_date == self.today).all()
+
+    @cached_property
+    def today_metrics(self):
+        return OperationalMetrics.query.filter(OperationalMetrics.metric_date == self.today).all()
+
+    @cached_property
+    def today_attraction_rows(self):
+        """Today's hourly attraction rows up to the current hour"""
+        return db.session.query(*ATTRACTION_STATUS_COLUMNS).filter(
+            AttractionAnalytics.date == self.today,
+            AttractionAnalytics.hour <= self.now.hour
+        ).all()
+
+    @cached_property
+    def week_payments(self):
+        """Payment rows of the last week, today included"""
+        return fetch_range(PaymentAnalytics, self.today - timedelta(days=7), self.today)
+
+def format_real_time_stats(latest_stats):
+    """The `/analytics/real-time` body for the latest snapshot, or defaults when there is none"""
+    if not latest_stats:
+        return {
+            'current_visitors': 0,
+            'active_queues': 0,
+            'average_queue_time': 0,
+            'system_load_percentage': 0.0,
+            'payment_success_rate': 100.0,
+            'api_response_time_ms': 0,
+            'cache_hit_rate': 0.0,
+            'concurrent_users': 0,
+            'last_updated': datetime.utcnow().isoformat()
+        }
+    stats_data = latest_stats.to_dict()
+    stats_data['last_updated'] = stats_data['timestamp']
+    del stats_data['timestamp']
+    del stats_data['id']
+    return stats_data
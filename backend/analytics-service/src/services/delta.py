@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from src.models.routing import replica_lag_allowance
+
+
+def parse_watermark(value):
+    """
+    Parse a `since` watermark.
+    An empty value or `0` means "from the beginning" and returns None.
+    Raises ValueError for anything else that is not an ISO timestamp.
+    """
+    if value is None or value.strip() in ('', '0'):
+        return None
+    return datetime.fromisoformat(value.strip())
+
+
+def next_watermark(since, settle_seconds):
+    """
+    Compute the watermark to hand back to a polling client.
+
+    Rows are stamped with `updated_at` before their transaction commits, so a
+    row can become visible slightly after a later-stamped row. The watermark
+    therefore trails the clock by `settle_seconds`; rows inside that window
+    are sent again on the next poll and clients apply them idempotently.
+    When the rows were read from a replica it also trails by the replica's
+    staleness bound, so commits not yet replayed there are not skipped.
+    """
+    watermark = datetime.utcnow() - timedelta(seconds=settle_seconds + replica_lag_allowance())
+    if since is not None and since > watermark:
+        watermark = since
+    return watermark.isoformat()
+
+
+def filter_changed_since(query, column, since):
+    """Restrict a query to rows whose change column is newer than the watermark"""
+    if since is None:
+        return query
+    return query.filter(column > since)
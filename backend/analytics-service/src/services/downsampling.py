@@ -0,0 +1,56 @@
+import numpy as np
+
+# Fewer points than this cannot keep both ends and a point in between
+MIN_POINTS = 3
+
+def lttb_indices(values, max_points, x=None):
+    """
+    Indices of at most `max_points` points of a series chosen by
+    Largest-Triangle-Three-Buckets: the first and last points, plus from each
+    of `max_points - 2` equal buckets the point spanning the largest triangle
+    with the previously kept point and the average of the next bucket. Peaks
+    and troughs survive, unlike with averaging or striding. `x` defaults to
+    the positions of the points.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < MIN_POINTS:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # Bucket i holds interior points [edges[i], edges[i + 1])
+    buckets = max_points - 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    counts = np.diff(edges)
+    # Every bucket's average in one pass; the last bucket looks ahead to the last point
+    mean_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1])[1:] / counts[1:], x[-1])
+    mean_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1])[1:] / counts[1:], y[-1])
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        px, py = x[previous], y[previous]
+        # Twice the triangle areas of every candidate in the bucket
+        areas = np.abs(
+            (px - mean_x[bucket]) * (y[start:end] - py) - (px - x[start:end]) * (mean_y[bucket] - py)
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+def downsample(points, max_points, metric, x=None):
+    """
+    Points (dicts in time order) kept by LTTB on `metric`, and a description
+    of the downsampling for the response, or None when nothing was dropped
+    """
+    if max_points is None or len(points) <= max_points or max_points < MIN_POINTS:
+        return points, None
+    kept = lttb_indices([point[metric] or 0 for point in points], max_points, x)
+    return [points[i] for i in kept], {
+        'method': 'lttb',
+        'metric': metric,
+        'points': len(kept),
+        'source_points': len(points)
+    }
@@ -0,0 +1,450 @@
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+from flask import current_app
+from sqlalchemy import and_, create_engine, delete, func, or_, select, update
+from src.models.analytics import (
+    db, AttractionAnalytics, EtlBucket, EtlWatermark, OperationalMetrics, PaymentAnalytics, QuantileSketch
+)
+from src.models.money import average_cents, to_cents
+from src.models.sources import (
+    SOURCE_SCHEMAS, attraction_queue, attractions, entry_logs, payment_methods, transactions
+)
+from src.services.attractions import register_attractions
+from src.services.quantiles import WAIT_TIME_METRIC, DDSketch, store_wait_sketches
+from src.services.upsert import insert_if_missing, upsert_rows
+import logging
+
+logger = logging.getLogger(__name__)
+
+def source_engine():
+    """Engine for the core API tables: ETL_SOURCE_DATABASE_URL, or the analytics database itself"""
+    engine = current_app.extensions.get('etl_source')
+    if engine is None:
+        url = current_app.config.get('ETL_SOURCE_DATABASE_URL')
+        engine = create_engine(url, pool_pre_ping=True) if url else db.engine
+        if engine.dialect.name == 'sqlite':
+            engine = engine.execution_options(schema_translate_map={schema: None for schema in SOURCE_SCHEMAS})
+        current_app.extensions['etl_source'] = engine
+    return engine
+
+# Time handling: the hourly tables use naive local time, watermarks keep
+# time zone aware source timestamps as naive UTC
+
+def _local_naive(value):
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+def _local_hour(value):
+    return _local_naive(value).replace(minute=0, second=0, microsecond=0)
+
+def _from_local(engine, value):
+    return value.astimezone() if engine.dialect.name == 'postgresql' else value
+
+def _position(value):
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+def _source_time(engine, value):
+    return value.replace(tzinfo=timezone.utc) if engine.dialect.name == 'postgresql' else value
+
+def _settled(engine, settle_seconds):
+    """Events newer than this may still be committing out of order and are left for the next run"""
+    now = datetime.now(timezone.utc) if engine.dialect.name == 'postgresql' else datetime.now()
+    return now - timedelta(seconds=settle_seconds)
+
+# Totals
+
+def merge_totals(left, right):
+    """Merge two totals dicts: `*_max` keys keep the larger value, all others add up"""
+    merged = dict(left)
+    for key, value in right.items():
+        if key not in merged:
+            merged[key] = value
+        elif key.endswith('_max'):
+            merged[key] = max(merged[key], value)
+        else:
+            merged[key] += value
+    return merged
+
+def _accumulate(connection, stream, deltas):
+    """Fold per-bucket `deltas` into the stored totals; returns the merged totals of the touched buckets"""
+    table = EtlBucket.__table__
+    stored = {}
+    hours = sorted({bucket_start for _, bucket_start in deltas})
+    for offset in range(0, len(hours), 500):
+        rows = connection.execute(select(table.c.scope, table.c.bucket_start, table.c.totals).where(
+            table.c.stream == stream,
+            table.c.bucket_start.in_(hours[offset:offset + 500])
+        ))
+        for row in rows:
+            stored[(row.scope, row.bucket_start)] = json.loads(row.totals)
+
+    merged = {key: merge_totals(stored.get(key, {}), delta) for key, delta in deltas.items()}
+    upsert_rows(connection, table, [
+        {'stream': stream, 'scope': scope, 'bucket_start': bucket_start, 'totals': json.dumps(totals)}
+        for (scope, bucket_start), totals in merged.items()
+    ], ('totals',))
+    return merged
+
+def _write_hourly(connection, model, date_column, rows, columns):
+    """Upsert hourly rows, sending rows of sealed SQLite months to their partition file"""
+    current_app.extensions['partitions'].upsert_rows(connection, model.__table__, rows, columns)
+
+# Streams
+
+def _fold_entries(events):
+    """Valid gate entries per hour"""
+    deltas = defaultdict(lambda: {'entries': 0})
+    for event in events:
+        if event.is_valid_entry is False:
+            continue
+        deltas[('', _local_hour(event.entry_timestamp))]['entries'] += 1
+    return deltas
+
+def _apply_entries(connection, source, totals):
+    _write_hourly(connection, OperationalMetrics, 'metric_date', [
+        {'metric_date': hour.date(), 'metric_hour': hour.hour, 'total_visitors': bucket['entries']}
+        for (_, hour), bucket in totals.items()
+    ], ('total_visitors',))
+
+def _queue_wait(event):
+    """Minutes a rider waited: from joining the queue to being served, else the estimate given on joining"""
+    if event.joined_at is not None:
+        return max((event.served_at - event.joined_at).total_seconds() / 60, 0.0)
+    return event.estimated_wait_time
+
+def _fold_queue(events):
+    """Riders and waits per attraction and park-wide, by the hour they were served"""
+    deltas = {}
+    for event in events:
+        hour = _local_hour(event.served_at)
+        wait = _queue_wait(event)
+        for scope in (event.attraction_id, ''):
+            bucket = deltas.get((scope, hour))
+            if bucket is None:
+                bucket = deltas[(scope, hour)] = {'riders': 0, 'wait_sum': 0.0, 'wait_count': 0, 'wait_max': 0.0}
+            bucket['riders'] += 1
+            if wait is not None:
+                bucket['wait_sum'] += wait
+                bucket['wait_count'] += 1
+                bucket['wait_max'] = max(bucket['wait_max'], float(wait))
+    return deltas
+
+def queue_wait_sketches(events):
+    """Sketch of every rider's wait per (attraction id, hour served)"""
+    sketches = defaultdict(DDSketch)
+    for event in events:
+        sketches[(event.attraction_id, _local_hour(event.served_at))].add(_queue_wait(event))
+    return sketches
+
+def _sketch_queue(connection, events):
+    store_wait_sketches(connection, queue_wait_sketches(events))
+
+def _attraction_details(row):
+    # max_capacity riders per cycle, one cycle per duration_minutes
+    cycles = 60 / row.duration_minutes if row.duration_minutes else 1
+    return {
+        'name': row.name,
+        'max_capacity': row.max_capacity,
+        'duration_minutes': row.duration_minutes,
+        'hourly_capacity': (row.max_capacity or 0) * cycles
+    }
+
+def attraction_details(source, attraction_ids):
+    """Name, capacity and cycle time of attractions from the core API"""
+    details = {}
+    if not attraction_ids:
+        return details
+    rows = source.execute(select(attractions).where(attractions.c.attraction_id.in_(sorted(attraction_ids))))
+    for row in rows:
+        details[str(row.attraction_id)] = _attraction_details(row)
+    return details
+
+def sync_attractions():
+    """Copy every core API attraction into attraction_dimension; returns the number of attractions read"""
+    with source_engine().connect() as source:
+        details = {str(row.attraction_id): _attraction_details(row) for row in source.execute(select(attractions))}
+    try:
+        register_attractions(db.session.connection(), details)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(details)
+
+def _average_wait(bucket):
+    return int(round(bucket['wait_sum'] / bucket['wait_count'])) if bucket.get('wait_count') else 0
+
+def _apply_queue(connection, source, totals):
+    scopes = {scope for scope, _ in totals if scope}
+    details = attraction_details(source, scopes)
+    # Attractions missing from the core API are registered under their id
+    keys = register_attractions(connection, {scope: details.get(scope, {}) for scope in scopes})
+    attraction_rows = []
+    park_rows = []
+    for (scope, hour), bucket in totals.items():
+        if not scope:
+            park_rows.append({'metric_date': hour.date(), 'metric_hour': hour.hour, 'average_wait_time': _average_wait(bucket)})
+            continue
+        capacity = details.get(scope, {}).get('hourly_capacity')
+        attraction_rows.append({
+            'attraction_key': keys[scope],
+            'date': hour.date(),
+            'hour': hour.hour,
+            'total_visitors': bucket['riders'],
+            'average_wait_time': _average_wait(bucket),
+            'max_wait_time': int(round(bucket.get('wait_max', 0))),
+            'capacity_utilization': round(min(100.0, 100.0 * bucket['riders'] / capacity), 2) if capacity else 0
+        })
+
+    _write_hourly(connection, AttractionAnalytics, 'date', attraction_rows, (
+        'total_visitors', 'average_wait_time', 'max_wait_time', 'capacity_utilization'
+    ))
+    _write_hourly(connection, OperationalMetrics, 'metric_date', park_rows, ('average_wait_time',))
+
+# Payments. Transactions change status after they are created, so instead
+# of folding events once, the hours from the watermark on are rebuilt from
+# all of their transactions, starting a revision window early so payments
+# still pending at the last run are picked up once they resolve.
+
+SUCCESSFUL_PAYMENT_STATUSES = ('COMPLETED', 'REFUNDED')
+PAYMENT_COLUMNS = (
+    'transaction_count', 'total_amount_cents', 'average_transaction_amount_cents', 'success_rate',
+    'average_processing_time_ms'
+)
+# Hours of transactions rebuilt per database transaction
+PAYMENT_CHUNK = timedelta(hours=24)
+
+def payment_hours(rows):
+    """PaymentAnalytics rows per local hour and payment method of transaction rows"""
+    buckets = {}
+    for row in rows:
+        key = (_local_hour(row.created_at), row.method_type or 'UNKNOWN')
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {
+                'count': 0, 'succeeded': 0, 'failed': 0, 'amount': 0, 'processing_ms': 0.0, 'processed': 0
+            }
+        bucket['count'] += 1
+        if row.status in SUCCESSFUL_PAYMENT_STATUSES:
+            bucket['succeeded'] += 1
+            bucket['amount'] += to_cents(row.amount) or 0
+        elif row.status == 'FAILED':
+            bucket['failed'] += 1
+        if row.completed_at is not None:
+            bucket['processing_ms'] += (row.completed_at - row.created_at).total_seconds() * 1000
+            bucket['processed'] += 1
+
+    hours = []
+    for (hour, method), bucket in buckets.items():
+        resolved = bucket['succeeded'] + bucket['failed']
+        hours.append({
+            'date': hour.date(),
+            'hour': hour.hour,
+            'payment_method': method,
+            'transaction_count': bucket['count'],
+            'total_amount_cents': bucket['amount'],
+            'average_transaction_amount_cents': average_cents(bucket['amount'], bucket['succeeded']),
+            # Pending payments count towards neither side until they resolve
+            'success_rate': round(100.0 * bucket['succeeded'] / resolved, 2) if resolved else 100,
+            'average_processing_time_ms': int(round(bucket['processing_ms'] / bucket['processed'])) if bucket['processed'] else 0
+        })
+    return hours
+
+def run_payments(settle_seconds=5):
+    """
+    Rebuild PaymentAnalytics for the hours from the watermark (less
+    ETL_PAYMENT_REVISION_MINUTES) up to the settled present, committing a
+    chunk of hours with the advanced watermark at a time. Rebuilt hours
+    replace their rows, so a rerun after a crash gives the same result.
+    Returns the number of transactions read.
+    """
+    engine = source_engine()
+    revision = timedelta(minutes=current_app.config.get('ETL_PAYMENT_REVISION_MINUTES', 15))
+    created = transactions.c.created_at
+    upper = _local_naive(_settled(engine, settle_seconds))
+    query = select(
+        transactions.c.amount, transactions.c.status, created, transactions.c.completed_at, payment_methods.c.method_type
+    ).select_from(transactions.outerjoin(
+        payment_methods, transactions.c.payment_method_id == payment_methods.c.payment_method_id
+    ))
+
+    read = 0
+    start = None
+    while True:
+        connection = db.session.connection()
+        try:
+            watermark = _lock_watermark(connection, 'transactions')
+            if start is None:
+                if watermark.position_timestamp is not None:
+                    start = _local_naive(_source_time(engine, watermark.position_timestamp)) - revision
+                else:
+                    with engine.connect() as source:
+                        first = source.execute(select(func.min(created))).scalar()
+                    start = _local_naive(first) if first is not None else upper
+                start = start.replace(minute=0, second=0, microsecond=0)
+            if start >= upper:
+                db.session.rollback()
+                return read
+
+            end = min(start + PAYMENT_CHUNK, upper)
+            with engine.connect() as source:
+                rows = source.execute(query.where(
+                    created >= _from_local(engine, start), created < _from_local(engine, end)
+                )).all()
+            _write_hourly(connection, PaymentAnalytics, 'date', payment_hours(rows), PAYMENT_COLUMNS)
+
+            watermarks = EtlWatermark.__table__
+            connection.execute(update(watermarks).where(watermarks.c.id == watermark.id).values(
+                position_timestamp=_position(_from_local(engine, end)),
+                events_processed=watermarks.c.events_processed + len(rows),
+                updated_at=datetime.utcnow()
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        read += len(rows)
+        if end >= upper:
+            return read
+        start = end
+
+# Each folded stream: source table, event time and tie-breaking key columns,
+# how a batch is folded into bucket totals and applied to the hourly tables,
+# and optionally how its individual events are added to quantile sketches
+STREAMS = {
+    'entry_logs': {
+        'table': entry_logs,
+        'timestamp': 'entry_timestamp',
+        'key': 'entry_id',
+        'fold': _fold_entries,
+        'apply': _apply_entries,
+    },
+    'attraction_queue': {
+        'table': attraction_queue,
+        'timestamp': 'served_at',
+        'key': 'queue_id',
+        'fold': _fold_queue,
+        'apply': _apply_queue,
+        'sketch': _sketch_queue,
+    },
+    # Rebuilt rather than folded, see run_payments
+    'transactions': {
+        'recompute': run_payments,
+    },
+}
+
+# Runner
+
+def _lock_watermark(connection, name):
+    table = EtlWatermark.__table__
+    insert_if_missing(connection, table, {'stream': name, 'events_processed': 0}, 'unique_etl_stream')
+    query = select(table).where(table.c.stream == name)
+    if connection.dialect.name == 'postgresql':
+        # Concurrent runners of a stream queue up here instead of applying a batch twice
+        query = query.with_for_update()
+    return connection.execute(query).one()
+
+def run_batch(name, batch_size=10000, settle_seconds=5):
+    """
+    Fold the next batch of a stream's events past its watermark into the
+    bucket totals, hourly rows and sketches. All of them and the advanced
+    watermark commit in one transaction, so after a crash or restart every
+    event is applied exactly once. Returns the number of events read.
+    """
+    stream = STREAMS[name]
+    table = stream['table']
+    timestamp, key = table.c[stream['timestamp']], table.c[stream['key']]
+    engine = source_engine()
+    connection = db.session.connection()
+
+    try:
+        watermark = _lock_watermark(connection, name)
+        query = select(table).where(timestamp <= _settled(engine, settle_seconds))
+        if watermark.position_timestamp is not None:
+            position = _source_time(engine, watermark.position_timestamp)
+            # The redundant lower bound lets the planner seek the timestamp index instead of scanning
+            query = query.where(
+                timestamp >= position,
+                or_(timestamp > position, and_(timestamp == position, key > watermark.position_id))
+            )
+
+        with engine.connect() as source:
+            events = source.execute(query.order_by(timestamp, key).limit(batch_size)).all()
+            if not events:
+                db.session.rollback()
+                return 0
+            totals = _accumulate(connection, name, stream['fold'](events))
+            stream['apply'](connection, source, totals)
+            if 'sketch' in stream:
+                stream['sketch'](connection, events)
+
+        last = events[-1]
+        watermarks = EtlWatermark.__table__
+        connection.execute(update(watermarks).where(watermarks.c.id == watermark.id).values(
+            position_timestamp=_position(getattr(last, stream['timestamp'])),
+            position_id=str(getattr(last, stream['key'])),
+            events_processed=watermarks.c.events_processed + len(events),
+            updated_at=datetime.utcnow()
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(events)
+
+def run_stream(name, batch_size=10000, settle_seconds=5):
+    """Apply batches until the stream has caught up; returns the number of events applied"""
+    if 'recompute' in STREAMS[name]:
+        return STREAMS[name]['recompute'](settle_seconds)
+    applied = 0
+    while True:
+        count = run_batch(name, batch_size, settle_seconds)
+        applied += count
+        if count < batch_size:
+            return applied
+
+def etl_status():
+    """Watermark of every stream"""
+    watermarks = {w.stream: w for w in EtlWatermark.query.all()}
+    return {
+        name: watermarks[name].to_dict() if name in watermarks else None
+        for name in STREAMS
+    }
+
+def rebuild_wait_sketches(start, end):
+    """
+    Recompute the wait-time sketches of dates in [start, end] from the queue
+    events the ETL has applied (those up to its watermark); later events
+    are added by the next run as usual. Returns the number of events read.
+    """
+    engine = source_engine()
+    table = attraction_queue
+    served = table.c.served_at
+    range_start = datetime.combine(start, time.min)
+    range_end = datetime.combine(end + timedelta(days=1), time.min)
+    connection = db.session.connection()
+    try:
+        watermark = _lock_watermark(connection, 'attraction_queue')
+        sketches = QuantileSketch.__table__
+        connection.execute(delete(sketches).where(
+            sketches.c.metric == WAIT_TIME_METRIC,
+            sketches.c.granularity == 'hour',
+            sketches.c.bucket_start >= range_start,
+            sketches.c.bucket_start < range_end
+        ))
+        events = []
+        if watermark.position_timestamp is not None:
+            position = _source_time(engine, watermark.position_timestamp)
+            with engine.connect() as source:
+                events = source.execute(select(table).where(
+                    served >= _from_local(engine, range_start), served < _from_local(engine, range_end),
+                    or_(served < position, and_(served == position, table.c.queue_id <= watermark.position_id))
+                )).all()
+            store_wait_sketches(connection, queue_wait_sketches(events))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Rebuilt wait-time sketches for {start.isoformat()} to {end.isoformat()} from {len(events)} queue events")
+    return len(events)
@@ -0,0 +1,226 @@
+import math
+import threading
+from datetime import date, datetime, timedelta
+import numpy as np
+from flask import current_app
+from src.models.analytics import OperationalMetrics, AttractionAnalytics
+from src.models.money import from_cents
+from src.services.archive import fetch_range
+from src.services.attractions import current_attractions
+from src.services.delta import next_watermark
+from src.services.partitioning import partition_sessions
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+# Hour-of-week indicators plus a linear trend (in days)
+FEATURE_COUNT = HOURS_PER_WEEK + 1
+# z for the reported 80% prediction interval
+INTERVAL_Z = 1.2816
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def hour_index(day, hour):
+    """Hours since the epoch for a local date and hour"""
+    return (day.toordinal() - _EPOCH_ORDINAL) * 24 + hour
+
+def hour_timestamp(index):
+    return datetime(1970, 1, 1) + timedelta(hours=int(index))
+
+def _design(hours, origin):
+    """Design matrix: one-hot hour of week (1970-01-01 was a Thursday) and days since `origin`"""
+    hours = np.asarray(hours, dtype=np.int64)
+    hour_of_week = ((hours // 24 + 3) % 7) * 24 + hours % 24
+    design = np.zeros((len(hours), FEATURE_COUNT))
+    design[np.arange(len(hours)), hour_of_week] = 1.0
+    design[:, HOURS_PER_WEEK] = (hours - origin) / 24.0
+    return design
+
+class SeasonalModel:
+    """
+    Hour-of-week seasonal model with a linear trend for one hourly series.
+
+    Fitted by exponentially weighted least squares: an observation's weight
+    grows with its time (half-life `half_life_days`), so recent weeks count
+    most. The model keeps only the weighted normal equations and the last
+    value per hour, so new hours are folded in with a rank-k update and a
+    revised hour replaces its old contribution; refitting is one small
+    linear solve regardless of history length.
+    """
+
+    def __init__(self, origin, half_life_days=28):
+        self.origin = origin
+        self.rate = math.log(2) / (half_life_days * 24)
+        self.normal = np.zeros((FEATURE_COUNT, FEATURE_COUNT))
+        self.moment = np.zeros(FEATURE_COUNT)
+        self.weight_sum = 0.0
+        self.weighted_squares = 0.0
+        self.values = {}
+        self._fit = None
+
+    def observe(self, hours, values):
+        """Add or revise hourly observations"""
+        replaced = [h for h in hours if h in self.values]
+        if replaced:
+            self._accumulate(replaced, [self.values[h] for h in replaced], -1.0)
+        self._accumulate(hours, values, 1.0)
+        self.values.update(zip(hours, values))
+        self._fit = None
+
+    def _accumulate(self, hours, values, sign):
+        hours = np.asarray(hours, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        weights = sign * np.exp((hours - self.origin) * self.rate)
+        design = _design(hours, self.origin)
+        self.normal += (design * weights[:, None]).T @ design
+        self.moment += design.T @ (weights * values)
+        self.weight_sum += float(weights.sum())
+        self.weighted_squares += float((weights * values * values).sum())
+
+    def _solve(self):
+        if self._fit is None:
+            normal = self.normal / self.weight_sum
+            moment = self.moment / self.weight_sum
+            # Ridge scaled per column keeps the system well-posed (unseen hours of the week
+            # get a zero coefficient) without shrinking the seasonal terms towards the trend
+            ridge = np.diag(1e-6 * np.diag(normal) + 1e-12)
+            coefficients = np.linalg.solve(normal + ridge, moment)
+            residual = self.weighted_squares / self.weight_sum - 2 * coefficients @ moment + coefficients @ normal @ coefficients
+            self._fit = (coefficients, math.sqrt(max(residual, 0.0)), np.diag(normal)[:HOURS_PER_WEEK] > 0)
+        return self._fit
+
+    def predict(self, hours):
+        """Point forecast and 80% interval for each hour; hours of the week never observed are skipped"""
+        if not self.weight_sum:
+            return []
+        coefficients, stddev, observed = self._solve()
+        hours = np.asarray(hours, dtype=np.int64)
+        design = _design(hours, self.origin)
+        keep = observed[np.argmax(design[:, :HOURS_PER_WEEK], axis=1)]
+        predicted = np.maximum(design[keep] @ coefficients, 0.0)
+        return [
+            {
+                'timestamp': hour_timestamp(h).isoformat(),
+                'value': round(float(v), 2),
+                'lower': round(max(float(v) - INTERVAL_Z * stddev, 0.0), 2),
+                'upper': round(float(v) + INTERVAL_Z * stddev, 2)
+            }
+            for h, v in zip(hours[keep], predicted)
+        ]
+
+def _changed_rows(model, columns, since):
+    """`columns` of the rows of `model` written after `since`, in any partition"""
+    rows = []
+    for session in partition_sessions(model):
+        rows.extend(session.query(*(getattr(model, name) for name in columns)).filter(model.updated_at > since).all())
+    return rows
+
+class ForecastCache:
+    """
+    Fitted forecast models per series, kept warm in memory.
+
+    The first refresh fits `history_days` of history (archived attraction
+    months included); later refreshes only read rows whose `updated_at` moved
+    past the table's watermark and fold them into the models.
+    """
+
+    def __init__(self, history_days=120, half_life_days=28, settle_seconds=2):
+        self.history_days = history_days
+        self.half_life_days = half_life_days
+        self.settle_seconds = settle_seconds
+        self.models = {}
+        self.watermarks = {}
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    def _model(self, key, origin):
+        model = self.models.get(key)
+        if model is None:
+            model = self.models[key] = SeasonalModel(origin, self.half_life_days)
+        return model
+
+    def refresh(self):
+        with self._lock:
+            self._refresh_operational()
+            self._refresh_attractions()
+            self.refreshed_at = datetime.utcnow()
+
+    def _next_watermark(self, table):
+        since = self.watermarks.get(table)
+        return since, datetime.fromisoformat(next_watermark(since, self.settle_seconds))
+
+    def _refresh_operational(self):
+        since, watermark = self._next_watermark('operational_metrics')
+        columns = ('metric_date', 'metric_hour', 'total_visitors', 'total_revenue_cents')
+        if since is None:
+            rows = fetch_range(
+                OperationalMetrics, date.today() - timedelta(days=self.history_days), date.max, columns=columns
+            )
+        else:
+            rows = _changed_rows(OperationalMetrics, columns, since)
+
+        if rows:
+            hours = [hour_index(r.metric_date, r.metric_hour) for r in rows]
+            origin = min(hours)
+            self._model(('visitors', ''), origin).observe(hours, [float(r.total_visitors or 0) for r in rows])
+            self._model(('revenue', ''), origin).observe(hours, [from_cents(r.total_revenue_cents) for r in rows])
+        self.watermarks['operational_metrics'] = watermark
+
+    def _refresh_attractions(self):
+        since, watermark = self._next_watermark('attraction_analytics')
+        columns = ('attraction_key', 'date', 'hour', 'average_wait_time')
+        if since is None:
+            rows = fetch_range(
+                AttractionAnalytics, date.today() - timedelta(days=self.history_days), date.today(), columns=columns
+            )
+        else:
+            rows = _changed_rows(AttractionAnalytics, columns, since)
+
+        by_key = {}
+        for row in rows:
+            series = by_key.setdefault(row.attraction_key, {})
+            series[hour_index(row.date, row.hour)] = float(row.average_wait_time or 0)
+        # Models stay keyed by attraction id, the scope the API and the sketches use
+        directory = current_attractions()
+        by_attraction = {directory.get(key).attraction_id: series for key, series in by_key.items()}
+        by_attraction.pop(None, None)
+        for attraction_id, series in by_attraction.items():
+            hours = list(series)
+            self._model(('wait_time', attraction_id), min(hours)).observe(hours, list(series.values()))
+        self.watermarks['attraction_analytics'] = watermark
+
+    def forecast(self, start_hour, hour_count, attraction_id=None):
+        """Forecasts for the `hour_count` hours from `start_hour` (an hour index)"""
+        hours = np.arange(start_hour, start_hour + hour_count)
+        directory = current_attractions()
+        with self._lock:
+            result = {
+                'visitors': self._predict(('visitors', ''), hours),
+                'revenue': self._predict(('revenue', ''), hours),
+                'wait_times': {}
+            }
+            for (series, scope), model in sorted(self.models.items()):
+                if series != 'wait_time' or (attraction_id and scope != attraction_id):
+                    continue
+                result['wait_times'][scope] = {
+                    'attraction_name': directory.get(directory.key_for(scope)).name,
+                    'forecast': model.predict(hours)
+                }
+        return result
+
+    def _predict(self, key, hours):
+        model = self.models.get(key)
+        return model.predict(hours) if model else []
+
+def current_forecasts():
+    """The app's forecast cache, created on first use"""
+    forecasts = current_app.extensions.get('forecasts')
+    if forecasts is None:
+        config = current_app.config
+        forecasts = current_app.extensions.setdefault('forecasts', ForecastCache(
+            history_days=config.get('FORECAST_HISTORY_DAYS', 120),
+            half_life_days=config.get('FORECAST_HALF_LIFE_DAYS', 28),
+            settle_seconds=config.get('DELTA_SYNC_SETTLE_SECONDS', 2)
+        ))
+    return forecasts
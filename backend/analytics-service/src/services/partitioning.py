@@ -0,0 +1,391 @@
+import os
+import re
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+from flask import current_app, has_app_context
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from src.models.analytics import db
+from src.models.migrations import add_missing_columns, rekey_attraction_rows
+from src.models.routing import RoutingSession
+from src.services.upsert import upsert_rows
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Hourly tables partitioned by month, with their partition key column
+PARTITIONED_TABLES = {
+    'attraction_analytics': 'date',
+    'operational_metrics': 'metric_date',
+    'payment_analytics': 'date',
+}
+
+MONTH_FILE_PATTERN = re.compile(r'^analytics_(\d{4})_(\d{2})\.db$')
+
+def parse_month(value):
+    """Parse a YYYY-MM month into the date of its first day"""
+    return datetime.strptime(value, '%Y-%m').date()
+
+def month_start(value):
+    return value.replace(day=1)
+
+def next_month(value):
+    value = month_start(value)
+    return value.replace(year=value.year + 1, month=1) if value.month == 12 else value.replace(month=value.month + 1)
+
+def month_suffix(value):
+    return f'{value.year:04d}_{value.month:02d}'
+
+class PartitionManager:
+    """
+    Monthly partitions for the hourly analytics tables.
+
+    PostgreSQL: the tables are declared `PARTITION BY RANGE` on their date
+    column (see the models); this class creates a DEFAULT partition plus one
+    partition per month, and detaches or drops months as metadata-only
+    operations. The planner prunes range filters to the months they touch.
+
+    SQLite: a closed month is sealed into its own database file
+    (`analytics_YYYY_MM.db`) under `partition_dir`, holding the same tables.
+    `main` keeps every other month and acts as the default partition. Range
+    reads are routed when the query is built: `partition_sessions` gives the
+    app's session plus one session per sealed month the range overlaps, each
+    on its own engine, and `fetch_range` (archive.py) combines their rows, so
+    months outside the range are never opened and any number of months can be
+    sealed. Writes of a sealed month's rows go through `upsert_rows`, which
+    sends them to the month file; ORM flushes of such rows are rejected, since
+    they would land in `main` next to the sealed copy. Detaching moves a file
+    to `detached/`, dropping deletes it.
+    """
+
+    def __init__(self, engine, metadata, partition_dir=None):
+        self.engine = engine
+        self.metadata = metadata
+        self.partition_dir = partition_dir
+        self.dialect = engine.dialect.name
+        self._month_engines = {}
+
+        if self.sqlite_enabled:
+            os.makedirs(self.detached_dir, exist_ok=True)
+
+    def _month_engine(self, month):
+        """Engine of a sealed month's file, replaced when the file at its path changes"""
+        path = self._sqlite_path(month)
+        inode = os.stat(path).st_ino
+        cached = self._month_engines.get(month)
+        if cached is None or cached[0] != inode:
+            if cached is not None:
+                cached[1].dispose()
+            cached = self._month_engines[month] = (inode, create_engine(f'sqlite:///{path}'))
+        return cached[1]
+
+    def _dispose(self, month=None):
+        """Close the connections to one month's file (or to all of them) before it is moved or removed"""
+        for cached_month in list(self._month_engines):
+            if month is None or cached_month == month:
+                self._month_engines.pop(cached_month)[1].dispose()
+
+    @property
+    def sqlite_enabled(self):
+        return self.dialect == 'sqlite' and bool(self.partition_dir)
+
+    @property
+    def detached_dir(self):
+        return os.path.join(self.partition_dir, 'detached')
+
+    def _tables(self):
+        return [self.metadata.tables[name] for name in PARTITIONED_TABLES]
+
+    def sealed_months(self, table_name, start=None, end=None):
+        """First days of the sealed months of `table_name` overlapping [start, end], or all of them without bounds"""
+        if not self.sqlite_enabled or table_name not in PARTITIONED_TABLES:
+            return []
+        return [
+            month for month in self._sqlite_months(self.partition_dir)
+            if (start is None or next_month(month) > start) and (end is None or month <= end)
+        ]
+
+    def sealed_month(self, table_name, day):
+        """The sealed month holding rows of `table_name` dated `day`, or None when they belong in `main`"""
+        if not self.sqlite_enabled or table_name not in PARTITIONED_TABLES or day is None:
+            return None
+        month = month_start(day)
+        return month if os.path.exists(self._sqlite_path(month)) else None
+
+    @contextmanager
+    def month_session(self, month):
+        """A session on a sealed month's file"""
+        session = Session(bind=self._month_engine(month))
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def upsert_rows(self, connection, table, rows, update_columns):
+        """
+        `upsert_rows` (upsert.py) that keeps each row in its partition. Rows
+        of sealed SQLite months are upserted into their month file, in a
+        transaction of its own that commits before the caller's; they hold
+        absolute values, so a caller that rolls back and retries writes the
+        same values again. Other rows are upserted on `connection`.
+        """
+        by_month = defaultdict(list)
+        if self.sqlite_enabled and table.name in PARTITIONED_TABLES:
+            column = PARTITIONED_TABLES[table.name]
+            sealed = {}
+            for row in rows:
+                month = month_start(row[column])
+                if month not in sealed:
+                    sealed[month] = self.sealed_month(table.name, month)
+                by_month[sealed[month]].append(row)
+        else:
+            by_month[None] = rows
+
+        for month, month_rows in by_month.items():
+            if month is not None:
+                with self._month_engine(month).begin() as month_connection:
+                    upsert_rows(month_connection, table, month_rows, update_columns)
+        upsert_rows(connection, table, by_month.get(None, []), update_columns)
+
+    def month_files(self):
+        """Paths of the sealed and detached month files (SQLite)"""
+        if not self.sqlite_enabled:
+            return []
+        return (
+            [self._sqlite_path(m) for m in self._sqlite_months(self.partition_dir)] +
+            [self._sqlite_path(m, detached=True) for m in self._sqlite_months(self.detached_dir)]
+        )
+
+    # Listing
+
+    def list_partitions(self):
+        """Return partitions as dicts with month, name and state"""
+        if self.dialect == 'postgresql':
+            return self._pg_list()
+        if self.sqlite_enabled:
+            return (
+                [{'month': m.strftime('%Y-%m'), 'name': f'p_{month_suffix(m)}', 'state': 'attached'}
+                 for m in self._sqlite_months(self.partition_dir)] +
+                [{'month': m.strftime('%Y-%m'), 'name': f'p_{month_suffix(m)}', 'state': 'detached'}
+                 for m in self._sqlite_months(self.detached_dir)]
+            )
+        return []
+
+    # Lifecycle
+
+    def prepare(self, months_ahead=2):
+        """Bring partitions in line with the models at startup"""
+        if self.dialect == 'postgresql':
+            self.ensure_partitions(months_ahead)
+        elif self.sqlite_enabled:
+            self._dispose()
+            for month in self._sqlite_months(self.partition_dir):
+                self._sqlite_sync_schema(self._sqlite_path(month))
+
+    def ensure_partitions(self, months_ahead=2):
+        """Create partitions for the current month and `months_ahead` months after it (PostgreSQL)"""
+        if self.dialect != 'postgresql':
+            return []
+        month = month_start(date.today())
+        created = []
+        for _ in range(months_ahead + 1):
+            created.extend(self.create_partition(month))
+            month = next_month(month)
+        return created
+
+    def create_partition(self, month):
+        """
+        Create the partition for `month`.
+        On SQLite this seals a closed month: its rows move from `main` into the month file.
+        """
+        month = month_start(month)
+        if self.dialect == 'postgresql':
+            return self._pg_create(month)
+        if self.sqlite_enabled:
+            return self._sqlite_seal(month)
+        raise ValueError('Partitioning is not enabled for this database')
+
+    def detach_partition(self, month):
+        """Detach `month` from the partitioned tables, keeping its data"""
+        month = month_start(month)
+        if self.dialect == 'postgresql':
+            with self.engine.begin() as connection:
+                for table in PARTITIONED_TABLES:
+                    connection.execute(text(
+                        f'ALTER TABLE {table} DETACH PARTITION {table}_{month_suffix(month)}'
+                    ))
+        elif self.sqlite_enabled:
+            self._sqlite_move(month, self._sqlite_path(month), self._sqlite_path(month, detached=True))
+        else:
+            raise ValueError('Partitioning is not enabled for this database')
+        logger.info(f"Detached partition {month.strftime('%Y-%m')}")
+
+    def attach_partition(self, month):
+        """Re-attach a previously detached month"""
+        month = month_start(month)
+        if self.dialect == 'postgresql':
+            with self.engine.begin() as connection:
+                for table in PARTITIONED_TABLES:
+                    connection.execute(text(
+                        f"ALTER TABLE {table} ATTACH PARTITION {table}_{month_suffix(month)} "
+                        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                    ))
+        elif self.sqlite_enabled:
+            detached = self._sqlite_path(month, detached=True)
+            if os.path.exists(detached):
+                # The month may have been detached before a schema change
+                self._sqlite_sync_schema(detached)
+            self._sqlite_move(month, detached, self._sqlite_path(month))
+        else:
+            raise ValueError('Partitioning is not enabled for this database')
+        logger.info(f"Attached partition {month.strftime('%Y-%m')}")
+
+    def drop_partition(self, month):
+        """Drop `month` and all of its rows"""
+        month = month_start(month)
+        if self.dialect == 'postgresql':
+            with self.engine.begin() as connection:
+                for table in PARTITIONED_TABLES:
+                    connection.execute(text(f'DROP TABLE IF EXISTS {table}_{month_suffix(month)}'))
+        elif self.sqlite_enabled:
+            for detached in (False, True):
+                path = self._sqlite_path(month, detached=detached)
+                if os.path.exists(path):
+                    self._dispose(month)
+                    os.remove(path)
+        else:
+            raise ValueError('Partitioning is not enabled for this database')
+        logger.info(f"Dropped partition {month.strftime('%Y-%m')}")
+
+    # PostgreSQL
+
+    def _pg_is_partitioned(self, connection, table):
+        relkind = connection.execute(
+            text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)'), {'table': table}
+        ).scalar()
+        return relkind == 'p'
+
+    def _pg_create(self, month):
+        created = []
+        with self.engine.begin() as connection:
+            for table in PARTITIONED_TABLES:
+                if not self._pg_is_partitioned(connection, table):
+                    logger.warning(f"Table {table} is not partitioned; skipping partition creation")
+                    continue
+                connection.execute(text(f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT'))
+                name = f'{table}_{month_suffix(month)}'
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                ))
+                created.append(name)
+        return created
+
+    def _pg_list(self):
+        rows = []
+        with self.engine.connect() as connection:
+            for table in PARTITIONED_TABLES:
+                result = connection.execute(text(
+                    'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                    'WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname'
+                ), {'table': table})
+                for (name,) in result:
+                    suffix = name[len(table) + 1:]
+                    month = suffix.replace('_', '-') if suffix != 'default' else None
+                    rows.append({'table': table, 'month': month, 'name': name, 'state': 'attached'})
+        return rows
+
+    # SQLite
+
+    def _sqlite_path(self, month, detached=False):
+        directory = self.detached_dir if detached else self.partition_dir
+        return os.path.join(directory, f'analytics_{month_suffix(month)}.db')
+
+    def _sqlite_months(self, directory):
+        months = []
+        for name in sorted(os.listdir(directory)):
+            match = MONTH_FILE_PATTERN.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return months
+
+    def _sqlite_sync_schema(self, path):
+        """Create or upgrade the partitioned tables inside a month file"""
+        month_engine = create_engine(f'sqlite:///{path}')
+        try:
+            self.metadata.create_all(month_engine, tables=self._tables())
+            rekey_attraction_rows(self.engine, self.metadata, path)
+            add_missing_columns(month_engine, self.metadata)
+        finally:
+            month_engine.dispose()
+
+    def _sqlite_move(self, month, source, target):
+        if not os.path.exists(source):
+            raise ValueError(f'Partition file not found: {source}')
+        self._dispose(month)
+        os.replace(source, target)
+
+    def _sqlite_seal(self, month):
+        if month >= month_start(date.today()):
+            raise ValueError('Only closed months can be sealed into a partition file on SQLite')
+        path = self._sqlite_path(month)
+        if os.path.exists(path):
+            return []
+        self._sqlite_sync_schema(path)
+
+        # Move the month's rows out of the default (main) tables
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql('ATTACH DATABASE ? AS sealing', (path,))
+            try:
+                for table in self._tables():
+                    column = PARTITIONED_TABLES[table.name]
+                    columns = ', '.join(c.name for c in table.columns)
+                    bounds = {'start': month.isoformat(), 'end': next_month(month).isoformat()}
+                    connection.execute(text(
+                        f'INSERT INTO sealing.{table.name} ({columns}) SELECT {columns} FROM main.{table.name} '
+                        f'WHERE {column} >= :start AND {column} < :end'
+                    ), bounds)
+                    connection.execute(text(
+                        f'DELETE FROM main.{table.name} WHERE {column} >= :start AND {column} < :end'
+                    ), bounds)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.exec_driver_sql('DETACH DATABASE sealing')
+
+        logger.info(f"Sealed partition {month.strftime('%Y-%m')} into {path}")
+        return [f'p_{month_suffix(month)}']
+
+def partition_sessions(model, start=None, end=None):
+    """
+    Sessions a read of `model` dated within [start, end] has to query: the
+    app's session, then on SQLite one per sealed month of the range (of any
+    date without bounds). Each month session is closed once the next one is
+    requested, so run the query before moving on.
+    """
+    yield db.session
+    partitions = current_app.extensions['partitions']
+    for month in partitions.sealed_months(model.__tablename__, start, end):
+        with partitions.month_session(month) as session:
+            yield session
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _reject_sealed_month_writes(session, flush_context, instances):
+    """ORM writes go to `main`; rows of a sealed month there would shadow or duplicate the month file's"""
+    partitions = current_app.extensions.get('partitions') if has_app_context() else None
+    if partitions is None or not partitions.sqlite_enabled:
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table_name = getattr(obj, '__tablename__', None)
+        column = PARTITIONED_TABLES.get(table_name)
+        if column is None:
+            continue
+        month = partitions.sealed_month(table_name, getattr(obj, column))
+        if month is not None:
+            raise ValueError(
+                f"{table_name} rows of {month.strftime('%Y-%m')} are in a sealed partition; "
+                f"write them with PartitionManager.upsert_rows"
+            )
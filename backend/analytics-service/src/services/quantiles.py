@@ -0,0 +1,279 @@
+import math
+import struct
+import zlib
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import numpy as np
+from sqlalchemy import event, select, update
+from src.models.analytics import db, QuantileSketch, RealTimeStats
+from src.models.keys import new_id
+from src.models.routing import RoutingSession
+from src.services.upsert import dialect_insert, insert_if_missing
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every reported quantile is within 1% of the true value (relative error)
+QUANTILE_RELATIVE_ACCURACY = 0.01
+REPORTED_QUANTILES = (('p50', 0.50), ('p90', 0.90), ('p99', 0.99))
+
+# Real-time metrics sketched per minute, park-wide
+REAL_TIME_QUANTILE_METRICS = ('api_response_time_ms', 'average_queue_time')
+# Attraction wait times, sketched per attraction-hour
+WAIT_TIME_METRIC = 'wait_time'
+
+_GAMMA = (1 + QUANTILE_RELATIVE_ACCURACY) / (1 - QUANTILE_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_INDEXED_VALUE = 1e-9
+
+class DDSketch:
+    """
+    DDSketch quantile sketch.
+
+    Values fall into logarithmic bins of ratio gamma, so any quantile read
+    back is within QUANTILE_RELATIVE_ACCURACY of the exact one. Merging adds
+    bin weights, which makes merged sketches identical to a sketch built
+    from all the values at once.
+    """
+
+    def __init__(self, bins=None, zero_count=0.0):
+        self.bins = bins if bins is not None else {}
+        self.zero_count = zero_count
+
+    @classmethod
+    def from_bytes(cls, data):
+        raw = zlib.decompress(data)
+        zero_count, size = struct.unpack_from('<dI', raw)
+        offset = struct.calcsize('<dI')
+        keys = np.frombuffer(raw, dtype='<i4', count=size, offset=offset)
+        weights = np.frombuffer(raw, dtype='<f8', count=size, offset=offset + 4 * size)
+        return cls(dict(zip(keys.tolist(), weights.tolist())), zero_count)
+
+    def to_bytes(self):
+        keys = sorted(self.bins)
+        return zlib.compress(
+            struct.pack('<dI', self.zero_count, len(keys))
+            + np.array(keys, dtype='<i4').tobytes()
+            + np.array([self.bins[k] for k in keys], dtype='<f8').tobytes()
+        )
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value, weight=1.0):
+        if value is None or weight <= 0:
+            return self
+        value = float(value)
+        if value <= _MIN_INDEXED_VALUE:
+            self.zero_count += weight
+        else:
+            index = int(math.ceil(math.log(value) / _LOG_GAMMA))
+            self.bins[index] = self.bins.get(index, 0.0) + weight
+        return self
+
+    def merge(self, other):
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0.0) + weight
+        self.zero_count += other.zero_count
+        return self
+
+    def quantile(self, q):
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative > rank:
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.bins) / (_GAMMA + 1)
+
+def percentiles(sketch):
+    """p50/p90/p99 of a sketch (None while it is empty)"""
+    result = {}
+    for name, q in REPORTED_QUANTILES:
+        value = sketch.quantile(q) if sketch is not None else None
+        result[name] = round(value, 1) if value is not None else None
+    return result
+
+# Storage
+
+def store_sketch(connection, metric, scope, granularity, bucket_start, sketch, merge=True):
+    """Merge `sketch` into its stored bucket, or replace the bucket when `merge` is False"""
+    table = QuantileSketch.__table__
+    if not merge and connection.dialect.name in ('postgresql', 'sqlite'):
+        # Replacing needs no read: a single upsert
+        values = {
+            'metric': metric,
+            'scope': scope,
+            'granularity': granularity,
+            'bucket_start': bucket_start,
+            'sample_count': sketch.count,
+            'sketch': sketch.to_bytes()
+        }
+        statement = dialect_insert(connection, table).values(id=new_id(), **values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['metric', 'scope', 'granularity', 'bucket_start'],
+            set_={'sample_count': values['sample_count'], 'sketch': values['sketch'], 'updated_at': datetime.utcnow()}
+        ))
+        return
+
+    query = select(table.c.id, table.c.sketch).where(
+        table.c.metric == metric,
+        table.c.scope == scope,
+        table.c.granularity == granularity,
+        table.c.bucket_start == bucket_start
+    )
+    if connection.dialect.name == 'postgresql':
+        query = query.with_for_update()
+
+    row = connection.execute(query).first()
+    if row is None:
+        insert_if_missing(connection, table, {
+            'metric': metric,
+            'scope': scope,
+            'granularity': granularity,
+            'bucket_start': bucket_start,
+            'sample_count': 0,
+            'sketch': DDSketch().to_bytes()
+        }, 'unique_quantile_sketch_bucket')
+        row = connection.execute(query).first()
+
+    if merge:
+        sketch = DDSketch.from_bytes(row.sketch).merge(sketch)
+    connection.execute(
+        update(table).where(table.c.id == row.id).values(
+            sketch=sketch.to_bytes(), sample_count=sketch.count, updated_at=datetime.utcnow()
+        )
+    )
+
+def store_wait_sketches(connection, sketches):
+    """
+    Merge sketches of individual riders' waits, keyed by (attraction id,
+    hour start), into their stored buckets. Each wait must reach this once:
+    the ETL calls it in the transaction that advances its watermark.
+    """
+    for (attraction_id, hour), sketch in sketches.items():
+        if sketch.count:
+            store_sketch(connection, WAIT_TIME_METRIC, attraction_id, 'hour', hour, sketch)
+
+def real_time_minute_sketches(stats):
+    """Sketches of real-time snapshots per (metric, minute)"""
+    sketches = defaultdict(DDSketch)
+    for stat in stats:
+        if stat.timestamp is None:
+            continue
+        minute = stat.timestamp.replace(second=0, microsecond=0)
+        for metric in REAL_TIME_QUANTILE_METRICS:
+            sketches[(metric, minute)].add(getattr(stat, metric))
+    return sketches
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _sketch_new_measurements(session, flush_context):
+    """Keep real-time quantile sketches current as snapshots are written"""
+    stats = [obj for obj in session.new if isinstance(obj, RealTimeStats)]
+    if not stats:
+        return
+
+    connection = session.connection()
+    for (metric, minute), sketch in real_time_minute_sketches(stats).items():
+        store_sketch(connection, metric, '', 'minute', minute, sketch)
+
+# Maintenance
+
+def roll_up_real_time_sketches(cutoff, batch_size=5000):
+    """Merge real-time minute sketches older than `cutoff` into hour sketches"""
+    moved = 0
+    while True:
+        rows = QuantileSketch.query.filter(
+            QuantileSketch.granularity == 'minute',
+            QuantileSketch.bucket_start < cutoff
+        ).order_by(QuantileSketch.bucket_start).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        hours = defaultdict(DDSketch)
+        for row in rows:
+            hour = row.bucket_start.replace(minute=0)
+            hours[(row.metric, row.scope, hour)].merge(DDSketch.from_bytes(row.sketch))
+
+        connection = db.session.connection()
+        for (metric, scope, hour), sketch in hours.items():
+            store_sketch(connection, metric, scope, 'hour', hour, sketch)
+
+        QuantileSketch.query.filter(
+            QuantileSketch.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    return moved
+
+def rebuild_quantile_sketches(start, end):
+    """
+    Recompute real-time minute sketches for the raw snapshots still retained
+    in [start, end]. Wait-time sketches are rebuilt from the queue events,
+    see etl.rebuild_wait_sketches.
+    """
+    connection = db.session.connection()
+    range_start = datetime.combine(start, time.min)
+    range_end = datetime.combine(end + timedelta(days=1), time.min)
+    stats = RealTimeStats.query.filter(
+        RealTimeStats.timestamp >= range_start,
+        RealTimeStats.timestamp < range_end
+    ).all()
+    for (metric, minute), sketch in real_time_minute_sketches(stats).items():
+        store_sketch(connection, metric, '', 'minute', minute, sketch, merge=False)
+
+    db.session.commit()
+    logger.info(f"Rebuilt real-time quantile sketches from {len(stats)} snapshots")
+    return len(stats)
+
+# Queries
+
+def merged_sketches(metric, granularity, start, end, scope=None):
+    """Stored sketches with bucket_start in [start, end), merged per scope"""
+    query = db.session.query(QuantileSketch.scope, QuantileSketch.sketch).filter(
+        QuantileSketch.metric == metric,
+        QuantileSketch.granularity == granularity,
+        QuantileSketch.bucket_start >= start,
+        QuantileSketch.bucket_start < end
+    )
+    if scope is not None:
+        query = query.filter(QuantileSketch.scope == scope)
+
+    merged = defaultdict(DDSketch)
+    for row in query:
+        merged[row.scope].merge(DDSketch.from_bytes(row.sketch))
+    return merged
+
+def wait_time_sketches(start_date, end_date, attraction_id=None):
+    """Wait-time sketches per attraction for dates in [start_date, end_date]"""
+    return merged_sketches(
+        WAIT_TIME_METRIC, 'hour',
+        datetime.combine(start_date, time.min),
+        datetime.combine(end_date + timedelta(days=1), time.min),
+        scope=attraction_id
+    )
+
+def real_time_percentiles(start, now=None):
+    """Percentiles of each real-time quantile metric since `start`"""
+    start = start.replace(second=0, microsecond=0)
+    end = (now or datetime.utcnow()) + timedelta(minutes=1)
+    result = {}
+    for metric in REAL_TIME_QUANTILE_METRICS:
+        sketch = DDSketch()
+        # Minute and hour buckets never overlap: compaction deletes minutes as it merges them
+        for granularity in ('minute', 'hour'):
+            for scoped in merged_sketches(metric, granularity, start, end).values():
+                sketch.merge(scoped)
+        result[metric] = percentiles(sketch)
+    return result
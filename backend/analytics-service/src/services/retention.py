@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from src.models.analytics import (
+    db, RealTimeStats, RealTimeStatsMinute, RealTimeStatsHour, REAL_TIME_METRICS
+)
+from src.services.quantiles import roll_up_real_time_sketches
+import logging
+
+logger = logging.getLogger(__name__)
+
+def configured_retention():
+    """Raw and minute-tier retention windows from the app config"""
+    config = current_app.config
+    return (
+        timedelta(hours=config.get('REAL_TIME_RAW_RETENTION_HOURS', 24)),
+        timedelta(days=config.get('REAL_TIME_MINUTE_RETENTION_DAYS', 30))
+    )
+
+def floor_minute(value):
+    return value.replace(second=0, microsecond=0)
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _aggregate_from_raw(stat):
+    """
+    Express a raw snapshot as a single-sample aggregate: per metric
+    (min, max, avg, last, samples with a value)
+    """
+    aggregate = {'count': 1, 'last_timestamp': stat.timestamp}
+    for metric in REAL_TIME_METRICS:
+        value = getattr(stat, metric)
+        value = float(value) if value is not None else None
+        aggregate[metric] = (value, value, value, value, 0 if value is None else 1)
+    return aggregate
+
+def _aggregate_from_bucket(bucket):
+    """Express a rollup bucket as an aggregate"""
+    aggregate = {'count': bucket.sample_count or 0, 'last_timestamp': bucket.last_timestamp}
+    for metric in REAL_TIME_METRICS:
+        aggregate[metric] = tuple(
+            getattr(bucket, f'{metric}_{name}') for name in ('min', 'max', 'avg', 'last')
+        ) + (getattr(bucket, f'{metric}_count') or 0,)
+    return aggregate
+
+def _merge_aggregates(left, right):
+    """Merge two aggregates; averages are weighted by the samples that have a value"""
+    if left is None:
+        return right
+
+    count = left['count'] + right['count']
+    right_is_newer = (left['last_timestamp'] or datetime.min) <= (right['last_timestamp'] or datetime.min)
+    merged = {
+        'count': count,
+        'last_timestamp': right['last_timestamp'] if right_is_newer else left['last_timestamp']
+    }
+    for metric in REAL_TIME_METRICS:
+        l_min, l_max, l_avg, l_last, l_count = left[metric]
+        r_min, r_max, r_avg, r_last, r_count = right[metric]
+        values_min = [v for v in (l_min, r_min) if v is not None]
+        values_max = [v for v in (l_max, r_max) if v is not None]
+        if l_avg is None or r_avg is None:
+            avg = l_avg if r_avg is None else r_avg
+        else:
+            avg = (l_avg * l_count + r_avg * r_count) / max(l_count + r_count, 1)
+        merged[metric] = (
+            min(values_min) if values_min else None,
+            max(values_max) if values_max else None,
+            avg,
+            r_last if right_is_newer else l_last,
+            l_count + r_count
+        )
+    return merged
+
+def _write_bucket(bucket, aggregate):
+    bucket.sample_count = aggregate['count']
+    bucket.last_timestamp = aggregate['last_timestamp']
+    for metric in REAL_TIME_METRICS:
+        for name, value in zip(('min', 'max', 'avg', 'last', 'count'), aggregate[metric]):
+            setattr(bucket, f'{metric}_{name}', value)
+
+def _roll_up(source_model, timestamp_column, target_model, bucket_of, to_aggregate, cutoff, batch_size):
+    """
+    Move source rows older than `cutoff` into `target_model` buckets.
+    Each batch merges into the target buckets and deletes its source rows in
+    one transaction, so a sample is always in exactly one tier.
+    """
+    moved = 0
+    while True:
+        rows = source_model.query.filter(
+            timestamp_column < cutoff
+        ).order_by(timestamp_column).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        batch = {}
+        for row in rows:
+            key = bucket_of(getattr(row, timestamp_column.key))
+            batch[key] = _merge_aggregates(batch.get(key), to_aggregate(row))
+
+        existing = {
+            b.bucket_start: b for b in target_model.query.filter(
+                target_model.bucket_start.in_(list(batch.keys()))
+            ).all()
+        }
+        for bucket_start, aggregate in batch.items():
+            bucket = existing.get(bucket_start)
+            if bucket is None:
+                bucket = target_model(bucket_start=bucket_start)
+                db.session.add(bucket)
+            else:
+                aggregate = _merge_aggregates(_aggregate_from_bucket(bucket), aggregate)
+            _write_bucket(bucket, aggregate)
+
+        source_model.query.filter(
+            source_model.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    return moved
+
+def compact_real_time_stats(raw_retention, minute_retention, batch_size=5000, now=None):
+    """
+    Roll raw real-time snapshots older than `raw_retention` into per-minute
+    buckets, and minute buckets (and minute percentile sketches) older than
+    `minute_retention` into per-hour buckets. Hour buckets are kept indefinitely.
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = floor_minute(now - raw_retention)
+    minute_cutoff = floor_hour(now - minute_retention)
+
+    raw_rows = _roll_up(
+        RealTimeStats, RealTimeStats.timestamp, RealTimeStatsMinute,
+        floor_minute, _aggregate_from_raw, raw_cutoff, batch_size
+    )
+    minute_rows = _roll_up(
+        RealTimeStatsMinute, RealTimeStatsMinute.bucket_start, RealTimeStatsHour,
+        floor_hour, _aggregate_from_bucket, minute_cutoff, batch_size
+    )
+
+    # Percentile sketches follow the minute tier's retention
+    sketch_rows = roll_up_real_time_sketches(minute_cutoff, batch_size)
+
+    logger.info(f"Compacted {raw_rows} raw snapshots, {minute_rows} minute buckets and {sketch_rows} minute sketches")
+    return {
+        'raw_rows_compacted': raw_rows,
+        'minute_buckets_compacted': minute_rows,
+        'minute_sketches_compacted': sketch_rows,
+        'raw_cutoff': raw_cutoff.isoformat(),
+        'minute_cutoff': minute_cutoff.isoformat()
+    }
+
+def summarize_real_time_window(start, raw_retention, minute_retention, now=None):
+    """
+    Sample count and per-metric averages of real-time stats since `start`.
+
+    Data newer than a tier's retention window is never compacted, so the
+    rollup tiers are only read when `start` reaches past them. Each tier is
+    aggregated in SQL and combined weighted by sample count.
+    """
+    now = now or datetime.utcnow()
+    partials = []
+
+    # Per tier: sample count, then the sum and count of each metric's non-null values
+    raw_columns = [func.count(RealTimeStats.id)]
+    for metric in REAL_TIME_METRICS:
+        column = getattr(RealTimeStats, metric)
+        raw_columns += [func.sum(column), func.count(column)]
+    partials.append(db.session.query(*raw_columns).filter(RealTimeStats.timestamp >= start).one())
+
+    for model, retention in ((RealTimeStatsMinute, raw_retention), (RealTimeStatsHour, minute_retention)):
+        if start >= now - retention:
+            continue
+        # Weighted sums so the averages combine exactly across tiers
+        columns = [func.sum(model.sample_count)]
+        for metric in REAL_TIME_METRICS:
+            count = getattr(model, f'{metric}_count')
+            columns += [func.sum(getattr(model, f'{metric}_avg') * count), func.sum(count)]
+        partials.append(db.session.query(*columns).filter(model.bucket_start >= start).one())
+
+    total = sum(int(p[0] or 0) for p in partials)
+    averages = {}
+    for index, metric in enumerate(REAL_TIME_METRICS):
+        weighted = sum(float(p[1 + 2 * index] or 0) for p in partials)
+        values = sum(int(p[2 + 2 * index] or 0) for p in partials)
+        averages[metric] = weighted / values if values else None
+
+    return {'count': total, 'averages': averages}
@@ -0,0 +1,546 @@
+import threading
+import time as clock
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, event, func, update
+from src.models.analytics import (
+    db, AttractionAnalytics, AttractionRollup, OperationalMetrics, OperationalRollup, RollupState,
+    VisitorAnalytics, VisitorRollup
+)
+from src.models.routing import RoutingSession
+from src.services.archive import ARCHIVED_MODELS, current_archive, fetch_range
+from src.services.partitioning import next_month, partition_sessions
+from src.services.upsert import insert_if_missing
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+# Tiers are raw, hour, day and month. `raw` is the visitor rows themselves; the
+# hourly tables are the hour tier of their own rollups.
+# Coarsest tier whose buckets still nest inside each granularity's periods
+GRANULARITY_TIER = {'hour': 'hour', 'day': 'day', 'week': 'day', 'month': 'month'}
+
+def day_range(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+def period_of(granularity, day):
+    """Label of the day, week (its Monday) or month period holding `day`"""
+    if granularity == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == 'month':
+        return day.strftime('%Y-%m')
+    return day.isoformat()
+
+def visitor_hour_period(visit_date, entry_time):
+    """Hour label of a visit; visits without an entry time fall back to their date"""
+    return entry_time.strftime('%Y-%m-%d %H:00') if entry_time else visit_date.isoformat()
+
+# Sources
+
+class RollupSource:
+    """
+    A table with rollup tiers: how its rows are read and what each tier sums.
+
+    `measures` maps each tier column to how buckets combine it (`sum` or `max`)
+    and to its value for one source row.
+    """
+
+    def __init__(self, model, date_column, tier_model, tier_date_column, base_tier, tiers,
+                 raw_columns, measures, count_column, scope_column=None, tracks_changes=True):
+        self.name = model.__tablename__
+        self.model = model
+        self.date_column = date_column
+        self.tier_model = tier_model
+        self.tier_date_column = tier_date_column
+        self.base_tier = base_tier
+        self.tiers = tiers
+        self.raw_columns = raw_columns
+        self.measures = measures
+        # Tier column counting the source rows behind a bucket
+        self.count_column = count_column
+        self.scope_column = scope_column
+        # Sources whose rows are revised in place; their changed dates are read raw until refreshed
+        self.tracks_changes = tracks_changes
+        self.archived = self.name in ARCHIVED_MODELS
+        self.has_period = 'period' in tier_model.__table__.c
+
+    def tier_for(self, granularity):
+        """Tier answering `granularity`, which is the base tier when the source has no coarser one"""
+        tier = GRANULARITY_TIER[granularity]
+        return tier if tier in self.tiers else self.base_tier
+
+VISITOR_SOURCE = RollupSource(
+    VisitorAnalytics, 'visit_date', VisitorRollup, 'visit_date', 'raw', ('hour', 'day', 'month'),
+    ('visit_date', 'entry_time', 'total_duration_minutes', 'total_spending_cents', 'satisfaction_rating'),
+    {
+        'visitors': ('sum', lambda row: 1),
+        'spending_cents': ('sum', lambda row: row.total_spending_cents or 0),
+        'duration_minutes': ('sum', lambda row: row.total_duration_minutes or 0),
+        'satisfaction_sum': ('sum', lambda row: row.satisfaction_rating or 0),
+        'satisfaction_count': ('sum', lambda row: 1 if row.satisfaction_rating else 0),
+    },
+    'visitors',
+    # Visit rows are only ever added, and their tiers are updated as they are flushed
+    tracks_changes=False
+)
+
+OPERATIONAL_SOURCE = RollupSource(
+    OperationalMetrics, 'metric_date', OperationalRollup, 'metric_date', 'hour', ('day', 'month'),
+    (
+        'metric_date', 'total_visitors', 'total_revenue_cents', 'average_wait_time', 'peak_capacity_percentage',
+        'staff_efficiency_score', 'system_uptime_percentage', 'customer_satisfaction_avg', 'error_count'
+    ),
+    {
+        'hours': ('sum', lambda row: 1),
+        'total_visitors': ('sum', lambda row: row.total_visitors or 0),
+        'total_revenue_cents': ('sum', lambda row: row.total_revenue_cents or 0),
+        'wait_time_sum': ('sum', lambda row: row.average_wait_time or 0),
+        'capacity_sum': ('sum', lambda row: float(row.peak_capacity_percentage or 0)),
+        'efficiency_sum': ('sum', lambda row: float(row.staff_efficiency_score or 0)),
+        'uptime_sum': ('sum', lambda row: float(row.system_uptime_percentage or 0)),
+        'satisfaction_sum': ('sum', lambda row: float(row.customer_satisfaction_avg or 0)),
+        'error_count': ('sum', lambda row: row.error_count or 0),
+    },
+    'hours'
+)
+
+ATTRACTION_SOURCE = RollupSource(
+    AttractionAnalytics, 'date', AttractionRollup, 'date', 'hour', ('day', 'month'),
+    (
+        'attraction_key', 'date', 'total_visitors', 'average_wait_time', 'max_wait_time',
+        'capacity_utilization', 'satisfaction_rating', 'downtime_minutes', 'revenue_generated_cents'
+    ),
+    {
+        'hours': ('sum', lambda row: 1),
+        'total_visitors': ('sum', lambda row: row.total_visitors or 0),
+        'wait_time_sum': ('sum', lambda row: row.average_wait_time or 0),
+        'max_wait_time': ('max', lambda row: row.max_wait_time or 0),
+        'capacity_sum': ('sum', lambda row: float(row.capacity_utilization or 0)),
+        'satisfaction_sum': ('sum', lambda row: float(row.satisfaction_rating or 0)),
+        'downtime_minutes': ('sum', lambda row: row.downtime_minutes or 0),
+        'revenue_cents': ('sum', lambda row: row.revenue_generated_cents or 0),
+    },
+    'hours',
+    scope_column='attraction_key'
+)
+
+ROLLUP_SOURCES = {source.name: source for source in (VISITOR_SOURCE, OPERATIONAL_SOURCE, ATTRACTION_SOURCE)}
+
+def _add(source, totals, row, raw):
+    """Fold a source row (`raw`) or a tier row into `totals`"""
+    for column, (combine, value) in source.measures.items():
+        amount = value(row) if raw else getattr(row, column)
+        if combine == 'max':
+            totals[column] = max(totals.get(column, 0), amount)
+        else:
+            totals[column] = totals.get(column, 0) + amount
+
+def _scope(source, row):
+    return getattr(row, source.scope_column) if source.scope_column else None
+
+def _raw_rows(source, start, end, scope=None):
+    """Source rows dated within [start, end], archived ones included, with only the columns the tiers need"""
+    filters = {source.scope_column: scope} if source.scope_column else {}
+    return fetch_range(source.model, start, end, columns=source.raw_columns, **filters)
+
+def _tier_rows(source, granularity, start, end, scope=None, skip_dates=()):
+    """Stored buckets of one tier dated within [start, end]"""
+    tier = source.tier_model
+    column = getattr(tier, source.tier_date_column)
+    names = ['granularity', source.tier_date_column, *source.measures]
+    if source.scope_column:
+        names.append(source.scope_column)
+    if source.has_period:
+        names.append('period')
+    query = db.session.query(*(getattr(tier, name) for name in names)).filter(
+        tier.granularity == granularity, column >= start, column <= end
+    )
+    if scope is not None:
+        query = query.filter(getattr(tier, source.scope_column) == scope)
+    if skip_dates:
+        query = query.filter(column.notin_(sorted(skip_dates)))
+    return query.all()
+
+def changed_dates(source, since, start=None, end=None, scope=None):
+    """Dates of `source` rows written after `since`"""
+    model = source.model
+    column = getattr(model, source.date_column)
+    dates = set()
+    for session in partition_sessions(model, start, end):
+        query = session.query(column).filter(model.updated_at > since)
+        if start is not None:
+            query = query.filter(column >= start, column <= end)
+        if scope is not None:
+            query = query.filter(getattr(model, source.scope_column) == scope)
+        dates.update(day for (day,) in query.distinct())
+    return dates
+
+# Planning
+
+class QueryPlan:
+    """Granularity and tier chosen for one range query, with the planner's row estimate"""
+
+    def __init__(self, source, granularity, tier, estimated_rows, changed=()):
+        self.source = source
+        self.granularity = granularity
+        self.tier = tier
+        self.estimated_rows = estimated_rows
+        # Dates revised since the last refresh, read from the source rows instead of the tier
+        self.changed = set(changed)
+
+    def to_dict(self):
+        return {
+            'tier': self.tier,
+            'granularity': self.granularity,
+            'estimated_rows': self.estimated_rows,
+            'dates_read_raw': len(self.changed),
+        }
+
+class TierStatistics:
+    """
+    Row counts per date of each tier of one source, read from the day and
+    month tiers (the day tier also counts the source rows behind it).
+    """
+
+    def __init__(self, state=None, counts=None):
+        self.built = state is not None
+        self.covered_from = state.covered_from if state else None
+        self.refreshed_through = state.refreshed_through if state else None
+        self.counts = counts or {}
+        days = self.counts.get('day', {})
+        # Buckets per date in the day tier, i.e. the number of scopes (attractions)
+        self.scopes = max(days.values()) if days else 1
+
+    def covers(self, start):
+        return self.built and (self.covered_from is None or self.covered_from <= start)
+
+    def estimate(self, tier, start, end):
+        """Rows of `tier` dated within [start, end]; dates past the last refresh count as an average day"""
+        by_date = self.counts.get(tier)
+        if not by_date:
+            return 0
+        if tier == 'month':
+            start = start.replace(day=1)
+        rows = sum(count for day, count in by_date.items() if start <= day <= end)
+        last = max(by_date)
+        if tier != 'month' and end > last:
+            per_day = sum(by_date.values()) / len(by_date)
+            rows += per_day * ((end - max(start, last + timedelta(days=1))).days + 1)
+        return int(rows)
+
+def load_statistics(source):
+    state = RollupState.query.filter_by(source=source.name).first()
+    if state is None:
+        return TierStatistics()
+    tier = source.tier_model
+    column = getattr(tier, source.tier_date_column)
+    counts = defaultdict(dict)
+    rows = db.session.query(
+        tier.granularity, column, func.count(), func.sum(getattr(tier, source.count_column))
+    ).group_by(tier.granularity, column)
+    for granularity, day, buckets, source_rows in rows:
+        counts[granularity][day] = buckets
+        if granularity == 'day':
+            counts[source.base_tier][day] = int(source_rows or 0)
+    return TierStatistics(state, counts)
+
+class QueryPlanner:
+    """
+    Picks the tier each range query reads from.
+
+    Row counts come from statistics of the rollup tiers, cached per process
+    for `statistics_seconds`. A query reads the source rows while they are
+    estimated at no more than `max_rows`; wider ranges read the coarsest tier
+    that still answers the requested granularity. Without one the granularity
+    is `hour`, so the shape of a response never depends on the data volume.
+    Tiers only serve ranges they cover (see `rollups refresh`), and dates
+    revised since the last refresh are read from the source rows, so every
+    tier gives the same answer.
+    """
+
+    def __init__(self, max_rows=50000, statistics_seconds=300):
+        self.max_rows = max_rows
+        self.statistics_seconds = statistics_seconds
+        self._statistics = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._statistics = {}
+
+    def statistics(self, source):
+        cached = self._statistics.get(source.name)
+        if cached is None or clock.monotonic() - cached[0] > self.statistics_seconds:
+            with self._lock:
+                cached = self._statistics.get(source.name)
+                if cached is None or clock.monotonic() - cached[0] > self.statistics_seconds:
+                    cached = self._statistics[source.name] = (clock.monotonic(), load_statistics(source))
+        return cached[1]
+
+    def plan(self, name, start, end, granularity=None, scope=None):
+        """Plan a query of source `name` over [start, end]; `scope` filters on the source's scope column"""
+        source = ROLLUP_SOURCES[name]
+        statistics = self.statistics(source)
+        usable = statistics.covers(start)
+        share = 1 / statistics.scopes if scope is not None and source.scope_column else 1
+
+        def estimate(tier):
+            return int(statistics.estimate(tier, start, end) * share) if statistics.built else None
+
+        granularity = granularity or 'hour'
+        tier = source.base_tier
+        target = source.tier_for(granularity)
+        if usable and target != tier and estimate(tier) > self.max_rows:
+            tier = target
+
+        changed = ()
+        if tier != source.base_tier and source.tracks_changes:
+            changed = changed_dates(source, statistics.refreshed_through, start, end, scope)
+        return QueryPlan(source, granularity, tier, estimate(tier), changed)
+
+def current_planner():
+    """The app's query planner, created on first use"""
+    planner = current_app.extensions.get('query_planner')
+    if planner is None:
+        config = current_app.config
+        planner = current_app.extensions.setdefault('query_planner', QueryPlanner(
+            max_rows=config.get('QUERY_PLANNER_MAX_ROWS', 50000),
+            statistics_seconds=config.get('QUERY_PLANNER_STATISTICS_SECONDS', 300)
+        ))
+    return planner
+
+# Reading
+
+def _month_segments(start, end, changed):
+    """Whole months of [start, end] the month tier can answer, and the remaining date ranges"""
+    changed_months = {day.replace(day=1) for day in changed}
+    months, ranges = [], []
+    cursor = start
+    while cursor <= end:
+        first = cursor.replace(day=1)
+        following = next_month(first)
+        last = min(end, following - timedelta(days=1))
+        if cursor == first and last == following - timedelta(days=1) and first not in changed_months:
+            months.append(first)
+        else:
+            ranges.append((cursor, last))
+        cursor = following
+    return months, ranges
+
+def _date_runs(dates):
+    """Consecutive runs of `dates` as (first, last) pairs"""
+    runs = []
+    for day in sorted(dates):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+def read_periods(plan, start, end, scope=None):
+    """
+    Totals of the plan's measures per (scope, period) over [start, end],
+    where periods are the buckets of the plan's granularity
+    """
+    source = plan.source
+    granularity = plan.granularity
+    totals = defaultdict(dict)
+
+    def add_raw(rows):
+        for row in rows:
+            day = getattr(row, source.date_column)
+            if granularity == 'hour':
+                period = visitor_hour_period(day, row.entry_time)
+            else:
+                period = period_of(granularity, day)
+            _add(source, totals[(_scope(source, row), period)], row, raw=True)
+
+    if plan.tier == source.base_tier:
+        add_raw(_raw_rows(source, start, end, scope))
+        return totals
+
+    def add_tier(rows):
+        for row in rows:
+            if source.has_period and row.granularity == 'hour':
+                period = row.period
+            else:
+                period = period_of(granularity, getattr(row, source.tier_date_column))
+            _add(source, totals[(_scope(source, row), period)], row, raw=False)
+
+    ranges = [(start, end)]
+    if plan.tier == 'month':
+        months, ranges = _month_segments(start, end, plan.changed)
+        if months:
+            # Months in between with changed dates are read by day instead
+            wanted = set(months)
+            add_tier(
+                row for row in _tier_rows(source, 'month', months[0], months[-1], scope)
+                if getattr(row, source.tier_date_column) in wanted
+            )
+    day_tier = 'hour' if plan.tier == 'hour' else 'day'
+    for first, last in ranges:
+        add_tier(_tier_rows(source, day_tier, first, last, scope, plan.changed))
+    for first, last in _date_runs(day for day in plan.changed if start <= day <= end):
+        add_raw(_raw_rows(source, first, last, scope))
+    return totals
+
+# Maintenance
+
+def _tier_values(source, granularity, scope, day, period, totals):
+    values = dict(totals, granularity=granularity)
+    values[source.tier_date_column] = day
+    if source.scope_column:
+        values[source.scope_column] = scope
+    if source.has_period:
+        values['period'] = period
+    return values
+
+def _day_buckets(source, rows):
+    """Tier buckets of source rows below the month tier, keyed by (granularity, scope, date, period)"""
+    buckets = defaultdict(dict)
+    for row in rows:
+        day = getattr(row, source.date_column)
+        scope = _scope(source, row)
+        _add(source, buckets[('day', scope, day, day.isoformat())], row, raw=True)
+        if 'hour' in source.tiers:
+            _add(source, buckets[('hour', scope, day, visitor_hour_period(day, row.entry_time))], row, raw=True)
+    return buckets
+
+def _recompute(source, dates):
+    """Rewrite the day-level tiers of `dates` and the month tier of their months, one transaction per month"""
+    table = source.tier_model.__table__
+    column = table.c[source.tier_date_column]
+    day_tiers = [tier for tier in source.tiers if tier != 'month']
+    by_month = defaultdict(set)
+    for day in dates:
+        by_month[day.replace(day=1)].add(day)
+
+    rows_read = 0
+    for month, days in sorted(by_month.items()):
+        rows = [row for row in _raw_rows(source, min(days), max(days)) if getattr(row, source.date_column) in days]
+        rows_read += len(rows)
+        connection = db.session.connection()
+        connection.execute(delete(table).where(table.c.granularity.in_(day_tiers), column.in_(sorted(days))))
+        buckets = _day_buckets(source, rows)
+        if buckets:
+            connection.execute(table.insert(), [
+                _tier_values(source, granularity, scope, day, period, totals)
+                for (granularity, scope, day, period), totals in buckets.items()
+            ])
+
+        # The month tier is summed from the month's day buckets
+        month_totals = defaultdict(dict)
+        for row in _tier_rows(source, 'day', month, next_month(month) - timedelta(days=1)):
+            _add(source, month_totals[_scope(source, row)], row, raw=False)
+        connection.execute(delete(table).where(table.c.granularity == 'month', column == month))
+        if month_totals:
+            connection.execute(table.insert(), [
+                _tier_values(source, 'month', scope, month, period_of('month', month), totals)
+                for scope, totals in month_totals.items()
+            ])
+        db.session.commit()
+    return rows_read
+
+def _date_bounds(source):
+    """First and last dates of stored and archived rows of `source`"""
+    column = getattr(source.model, source.date_column)
+    bounds = [session.query(func.min(column), func.max(column)).one() for session in partition_sessions(source.model)]
+    firsts = [first for first, _ in bounds if first is not None]
+    lasts = [last for _, last in bounds if last is not None]
+    first, last = min(firsts, default=None), max(lasts, default=None)
+    archive = current_archive() if source.archived else None
+    if archive is not None:
+        archived_from = archive.first_month(source.name)
+        if archived_from is not None:
+            first = min(first, archived_from) if first else archived_from
+            last = last or archive.cutoff(source.name) - timedelta(days=1)
+    return first, last
+
+def refresh_rollups(name, start=None, settle_seconds=60):
+    """
+    Bring the tiers of source `name` up to date: recompute every date from
+    `start` (every stored date when the tiers were never built) and the dates
+    whose rows changed since the last refresh. Rows written in the last
+    `settle_seconds` before the refresh may not be visible to it yet, so they
+    are picked up again by the next one.
+    """
+    source = ROLLUP_SOURCES[name]
+    started = datetime.utcnow()
+    state = RollupState.query.filter_by(source=name).first()
+    covered_from = state.covered_from if state else None
+
+    dates = set()
+    if start is not None or state is None:
+        if state is None and start is None:
+            # Drop buckets of rows that no longer exist
+            db.session.execute(delete(source.tier_model.__table__))
+        first, last = _date_bounds(source)
+        if start is not None:
+            first = start
+            if state is None:
+                covered_from = start
+            elif covered_from is not None:
+                covered_from = min(covered_from, start)
+        if first is not None and last is not None:
+            dates.update(day_range(first, last))
+    if state is not None and source.tracks_changes:
+        dates.update(changed_dates(source, state.refreshed_through))
+
+    rows_read = _recompute(source, dates)
+
+    if state is None:
+        state = RollupState(source=name)
+        db.session.add(state)
+    state.covered_from = covered_from
+    state.refreshed_through = started - timedelta(seconds=settle_seconds)
+    db.session.commit()
+    logger.info(f"Refreshed {name} rollups for {len(dates)} dates from {rows_read} rows")
+    return {'source': name, 'dates': len(dates), 'rows_read': rows_read}
+
+def recompute_rollups(name, start, end):
+    """Recompute the tiers of dates in [start, end], e.g. after a month of rows was dropped or detached"""
+    source = ROLLUP_SOURCES[name]
+    if RollupState.query.filter_by(source=name).first() is None:
+        return 0
+    return _recompute(source, set(day_range(start, end)))
+
+def _visitor_buckets(visitor):
+    day = visitor.visit_date
+    month = day.replace(day=1)
+    return (
+        ('hour', day, visitor_hour_period(day, visitor.entry_time)),
+        ('day', day, day.isoformat()),
+        ('month', month, period_of('month', month)),
+    )
+
+def merge_into_visitor_rollups(connection, visitors):
+    """Add visitor rows to the totals of their hour, day and month buckets, creating missing buckets"""
+    increments = defaultdict(dict)
+    for visitor in visitors:
+        if visitor.visit_date is None:
+            continue
+        for bucket in _visitor_buckets(visitor):
+            _add(VISITOR_SOURCE, increments[bucket], visitor, raw=True)
+
+    table = VisitorRollup.__table__
+    now = datetime.utcnow()
+    for (granularity, day, period), totals in increments.items():
+        insert_if_missing(connection, table, {
+            'granularity': granularity, 'visit_date': day, 'period': period
+        }, 'unique_visitor_rollup')
+        connection.execute(
+            update(table).where(
+                table.c.granularity == granularity, table.c.visit_date == day, table.c.period == period
+            ).values(updated_at=now, **{column: table.c[column] + amount for column, amount in totals.items()})
+        )
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _roll_up_new_visitors(session, flush_context):
+    """Keep the visitor tiers current as visitor rows are ingested, in the same transaction"""
+    visitors = [obj for obj in session.new if isinstance(obj, VisitorAnalytics)]
+    if visitors:
+        merge_into_visitor_rollups(session.connection(), visitors)
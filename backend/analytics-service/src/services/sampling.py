@@ -0,0 +1,318 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import case, event, func, insert, select, update
+from src.models.analytics import db, RollupState, VisitorAnalytics, VisitorSample, VisitorSampleStratum
+from src.models.routing import RoutingSession
+from src.services.archive import current_archive, fetch_range
+from src.services.partitioning import partition_sessions
+from src.services.upsert import insert_if_missing
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Two-sided 95% normal quantile; intervals are estimate ± Z * standard error
+CONFIDENCE = 0.95
+Z_SCORE = 1.959964
+
+# Coverage is recorded with the rollup states, under this source name
+SAMPLE_SOURCE = 'visitor_samples'
+
+SAMPLED_COLUMNS = ('id', 'visit_date', 'total_duration_minutes', 'total_spending_cents', 'satisfaction_rating')
+
+def _sampled(key, rate):
+    """Whether the visit with id `key` is in a `rate` sample; stable, so rebuilds pick the same visits"""
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') < rate * 2 ** 64
+
+def _sample_row(visitor, census):
+    return {
+        'visit_date': visitor.visit_date,
+        'census': census,
+        'total_duration_minutes': visitor.total_duration_minutes,
+        'total_spending_cents': visitor.total_spending_cents,
+        'satisfaction_rating': visitor.satisfaction_rating
+    }
+
+# Maintenance
+
+def merge_into_sample(connection, visitors, rate, census_per_day):
+    """
+    Count visitor rows into their day's stratum and add the sampled ones. The
+    first `census_per_day` visits of each day are all kept, so quiet days are
+    exact; later visits are kept at `rate`.
+    """
+    by_day = defaultdict(list)
+    for visitor in visitors:
+        if visitor.visit_date is not None:
+            by_day[visitor.visit_date].append(visitor)
+
+    strata = VisitorSampleStratum.__table__
+    samples = VisitorSample.__table__
+    for day, day_visitors in by_day.items():
+        query = select(strata.c.id, strata.c.visits).where(strata.c.visit_date == day)
+        if connection.dialect.name == 'postgresql':
+            query = query.with_for_update()
+
+        row = connection.execute(query).first()
+        if row is None:
+            insert_if_missing(connection, strata, {'visit_date': day}, 'unique_sample_stratum')
+            row = connection.execute(query).first()
+
+        rows = []
+        census = sampled = 0
+        for position, visitor in enumerate(day_visitors, start=row.visits):
+            if position < census_per_day:
+                census += 1
+                rows.append(_sample_row(visitor, True))
+            elif _sampled(visitor.id, rate):
+                sampled += 1
+                rows.append(_sample_row(visitor, False))
+        if rows:
+            connection.execute(insert(samples), rows)
+        connection.execute(
+            update(strata).where(strata.c.id == row.id).values(
+                visits=strata.c.visits + len(day_visitors),
+                census=strata.c.census + census,
+                sampled=strata.c.sampled + sampled,
+                updated_at=datetime.utcnow()
+            )
+        )
+
+def _sample_settings():
+    config = current_app.config
+    return config.get('VISITOR_SAMPLE_RATE', 0.05), config.get('VISITOR_SAMPLE_CENSUS_PER_DAY', 10)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _sample_new_visitors(session, flush_context):
+    """Keep the sample current as visitor rows are ingested, in the same transaction"""
+    visitors = [obj for obj in session.new if isinstance(obj, VisitorAnalytics)]
+    if visitors:
+        merge_into_sample(session.connection(), visitors, *_sample_settings())
+
+def rebuild_sample(start, end):
+    """Resample visit dates in [start, end] from stored and archived rows; approximate queries then cover them"""
+    rate, census_per_day = _sample_settings()
+    for model in (VisitorSample, VisitorSampleStratum):
+        model.query.filter(model.visit_date >= start, model.visit_date <= end).delete(synchronize_session=False)
+
+    visitors_seen = 0
+    day = start
+    while day <= end:
+        visitors = fetch_range(VisitorAnalytics, day, day, columns=SAMPLED_COLUMNS)
+        merge_into_sample(db.session.connection(), visitors, rate, census_per_day)
+        db.session.commit()
+        visitors_seen += len(visitors)
+        day += timedelta(days=1)
+
+    state = RollupState.query.filter_by(source=SAMPLE_SOURCE).first()
+    if state is None:
+        state = RollupState(source=SAMPLE_SOURCE, covered_from=start)
+        db.session.add(state)
+    elif state.covered_from is not None and start < state.covered_from <= end + timedelta(days=1):
+        # Only a rebuild reaching the covered dates extends them without a gap
+        state.covered_from = start
+    state.refreshed_through = datetime.utcnow()
+    db.session.commit()
+
+    logger.info(f"Rebuilt the visitor sample for {start.isoformat()} to {end.isoformat()} from {visitors_seen} rows")
+    return visitors_seen
+
+def _last_visit_date():
+    """Latest visit date stored in the database, its sealed months or the archive"""
+    last = None
+    for session in partition_sessions(VisitorAnalytics):
+        day = session.query(func.max(VisitorAnalytics.visit_date)).scalar()
+        if day is not None and (last is None or day > last):
+            last = day
+    archive = current_archive()
+    cutoff = archive.cutoff(VisitorAnalytics.__tablename__) if archive else None
+    if last is None and cutoff is not None:
+        last = cutoff - timedelta(days=1)
+    return last
+
+def start_sample_coverage():
+    """
+    Record where the sample starts when it is first maintained: visits
+    ingested from now on are sampled, so it covers the dates after the last
+    stored visit (every date when there are none). `sketches rebuild` extends
+    it to earlier dates.
+    """
+    if RollupState.query.filter_by(source=SAMPLE_SOURCE).first() is not None:
+        return
+    last = _last_visit_date()
+    covered_from = last + timedelta(days=1) if last is not None else None
+    db.session.add(RollupState(source=SAMPLE_SOURCE, covered_from=covered_from, refreshed_through=datetime.utcnow()))
+    db.session.commit()
+    logger.info(f"Visitor sample covers {covered_from.isoformat() if covered_from else 'every date'} on")
+
+def sample_gap(start):
+    """Why the sample cannot answer for dates from `start` on, or None when it holds all of them"""
+    state = RollupState.query.filter_by(source=SAMPLE_SOURCE).first()
+    if state is None:
+        return 'the visitor sample has not been built'
+    if state.covered_from is not None and state.covered_from > start:
+        return f'the visitor sample covers visits from {state.covered_from.isoformat()} on'
+    return None
+
+def sample_covers(start):
+    """Whether the sample holds every visit date from `start` on"""
+    return sample_gap(start) is None
+
+def sampled_day_visits(start, end):
+    """Visits dated within [start, end], counted exactly by the sample's strata"""
+    return int(db.session.query(func.coalesce(func.sum(VisitorSampleStratum.visits), 0)).filter(
+        VisitorSampleStratum.visit_date >= start,
+        VisitorSampleStratum.visit_date <= end
+    ).scalar())
+
+# Estimation
+
+class VisitorSampleEstimator:
+    """
+    Stratified estimates of visit totals and means over dates in [start, end].
+
+    Each day is a stratum whose visits are known exactly: its census visits
+    count once, and each of its other sampled visits stands for
+    (later visits / later visits sampled) of them. Standard errors use the
+    stratified variance with the finite-population correction; means are
+    ratio estimates, linearized. Days with fewer than two sampled later visits
+    are pooled into one stratum, as they were sampled at the same rate.
+
+    Only sums of the sampled values and of their squares per date and census
+    flag are read, aggregated by the database. Periods are whole days, as a
+    single hour holds too few sampled visits for a useful estimate.
+    """
+
+    def __init__(self, start, end):
+        strata = db.session.query(
+            VisitorSampleStratum.visit_date, VisitorSampleStratum.visits,
+            VisitorSampleStratum.census, VisitorSampleStratum.sampled
+        ).filter(
+            VisitorSampleStratum.visit_date >= start,
+            VisitorSampleStratum.visit_date <= end
+        ).order_by(VisitorSampleStratum.visit_date).all()
+
+        duration = func.coalesce(VisitorSample.total_duration_minutes, 0) * 1.0
+        spending = func.coalesce(VisitorSample.total_spending_cents, 0) * 1.0
+        satisfaction = func.coalesce(VisitorSample.satisfaction_rating, 0) * 1.0
+        groups = db.session.query(
+            VisitorSample.visit_date, VisitorSample.census, func.count(),
+            func.sum(duration), func.sum(duration * duration),
+            func.sum(spending), func.sum(spending * spending),
+            func.sum(satisfaction), func.sum(satisfaction * satisfaction),
+            func.sum(case((satisfaction != 0, 1), else_=0))
+        ).filter(
+            VisitorSample.visit_date >= start,
+            VisitorSample.visit_date <= end
+        ).group_by(VisitorSample.visit_date, VisitorSample.census).all()
+
+        self.dates = [stratum.visit_date for stratum in strata]
+        self.visits_by_date = np.array([stratum.visits for stratum in strata], dtype=np.int64)
+        day_index = {day: i for i, day in enumerate(self.dates)}
+        self.day = np.array([day_index[group[0]] for group in groups], dtype=np.int64)
+        self.census = np.array([bool(group[1]) for group in groups], dtype=bool)
+        # Per group: count, then the sum and sum of squares of each measure, then the rated count
+        sums = np.array([group[2:] for group in groups], dtype=np.float64).reshape(len(groups), 8)
+        self.count = sums[:, 0]
+        self.duration, self.duration_squares = sums[:, 1], sums[:, 2]
+        self.spending, self.spending_squares = sums[:, 3], sums[:, 4]
+        self.satisfaction, self.satisfaction_squares = sums[:, 5], sums[:, 6]
+        self.rated = sums[:, 7]
+
+        # Later-visit strata: one per day with two or more sampled, plus the pooled one
+        later_visits = np.array([stratum.visits - stratum.census for stratum in strata], dtype=np.float64)
+        later_sampled = np.array([stratum.sampled for stratum in strata], dtype=np.float64)
+        pooled = len(strata)
+        stratum_of_day = np.where(later_sampled >= 2, np.arange(len(strata)), pooled)
+        self.stratum_count = len(strata) + 1
+        self.population = np.bincount(stratum_of_day, later_visits, minlength=self.stratum_count)
+        self.sampled = np.bincount(stratum_of_day, later_sampled, minlength=self.stratum_count)
+        self.stratum = stratum_of_day[self.day]
+
+        expansion = np.divide(self.population, self.sampled, out=np.zeros(self.stratum_count), where=self.sampled > 0)
+        self.weights = np.where(self.census, 1.0, expansion[self.stratum])
+        # N (N - n) / (n (n - 1)): the variance of an expanded stratum total per unit of sample variance
+        n = self.sampled
+        self.variance_factor = np.divide(
+            self.population * (self.population - n), n * (n - 1),
+            out=np.zeros(self.stratum_count), where=n >= 2
+        )
+
+    @property
+    def sampled_visits(self):
+        return int(self.count.sum())
+
+    @property
+    def visits(self):
+        return int(self.visits_by_date.sum())
+
+    def _totals(self, sums, squares, domains, count):
+        """Estimated domain totals of a measure with these group sums and sums of squares, and their variances"""
+        totals = np.bincount(domains, self.weights * sums, minlength=count)
+        later = ~self.census
+        pairs = domains[later] * self.stratum_count + self.stratum[later]
+        keys, inverse = np.unique(pairs, return_inverse=True)
+        stratum_sums = np.bincount(inverse, sums[later], minlength=len(keys))
+        stratum_squares = np.bincount(inverse, squares[later], minlength=len(keys))
+        strata = keys % self.stratum_count
+        n = np.maximum(self.sampled[strata], 1)
+        within = np.maximum(stratum_squares - stratum_sums * stratum_sums / n, 0) * self.variance_factor[strata]
+        return totals, np.bincount(keys // self.stratum_count, within, minlength=count)
+
+    def _ratio(self, sums, squares, base, domains, count):
+        """
+        Estimated domain ratios of a measure's total to the count of visits in
+        `base` (group counts of an indicator the measure is only nonzero with),
+        and their standard errors
+        """
+        top, _ = self._totals(sums, squares, domains, count)
+        bottom, _ = self._totals(base, base, domains, count)
+        ratio = np.divide(top, bottom, out=np.zeros(count), where=bottom > 0)
+        # Sums and squares of the linearized residuals y - ratio * x, with x an indicator
+        r = ratio[domains]
+        _, variance = self._totals(sums - r * base, squares - 2 * r * sums + r * r * base, domains, count)
+        return ratio, np.divide(np.sqrt(variance), bottom, out=np.zeros(count), where=bottom > 0)
+
+    def estimate(self, period_of):
+        """Estimates per period label `period_of(day)`, as {name: (value, standard error)}"""
+        if not self.dates:
+            return {}
+        periods, day_domains = np.unique(np.array([period_of(day) for day in self.dates], dtype=object), return_inverse=True)
+        domains = day_domains[self.day]
+        count = len(periods)
+
+        mean_spending, mean_spending_error = self._ratio(self.spending, self.spending_squares, self.count, domains, count)
+        mean_duration, mean_duration_error = self._ratio(self.duration, self.duration_squares, self.count, domains, count)
+        mean_satisfaction, mean_satisfaction_error = self._ratio(
+            self.satisfaction, self.satisfaction_squares, self.rated, domains, count
+        )
+        # Visits per period are known, so totals are ratio estimates: visits times the estimated mean
+        visits = np.bincount(day_domains, self.visits_by_date, minlength=count).astype(np.float64)
+
+        return {
+            str(period): {
+                'visitors': (visits[i], 0.0),
+                'spending_cents': (visits[i] * mean_spending[i], visits[i] * mean_spending_error[i]),
+                'average_spending_cents': (mean_spending[i], mean_spending_error[i]),
+                'average_duration': (mean_duration[i], mean_duration_error[i]),
+                'average_satisfaction': (mean_satisfaction[i], mean_satisfaction_error[i]),
+            }
+            for i, period in enumerate(periods)
+        }
+
+    def describe(self):
+        return {
+            'method': 'stratified_sample',
+            'confidence': CONFIDENCE,
+            'sampled_visits': self.sampled_visits,
+            'visits': self.visits
+        }
+
+def confidence_interval(estimate, scale=1, digits=None):
+    """Lower and upper bounds of an estimate's confidence interval, from its (value, standard error)"""
+    value, error = estimate
+    bounds = [float((value - Z_SCORE * error) * scale), float((value + Z_SCORE * error) * scale)]
+    return [round(bound, digits) for bound in bounds] if digits is not None else bounds
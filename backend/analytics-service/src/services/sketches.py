@@ -0,0 +1,198 @@
+import hashlib
+import math
+import zlib
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import numpy as np
+from sqlalchemy import event, select, update
+from src.models.analytics import db, VisitorAnalytics, VisitorSketch
+from src.models.routing import RoutingSession
+from src.services.archive import fetch_range
+from src.services.upsert import insert_if_missing
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 2^12 one-byte registers: 4 KiB per sketch before compression
+HLL_PRECISION = 12
+HLL_REGISTER_COUNT = 1 << HLL_PRECISION
+# Relative standard error of an estimate (~1.6%); about 95% of estimates fall within twice this
+HLL_STANDARD_ERROR = 1.04 / math.sqrt(HLL_REGISTER_COUNT)
+
+SKETCHED_FIELDS = ('user_id', 'session_id')
+
+_VALUE_BITS = 64 - HLL_PRECISION
+
+def _hash_values(values):
+    """Stable 64-bit hashes (Python's hash() is salted per process)"""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(v).encode(), digest_size=8).digest(), 'little') for v in values),
+        dtype=np.uint64,
+        count=len(values)
+    )
+
+def _bit_length(values):
+    """int.bit_length over a uint64 array"""
+    lengths = np.zeros(values.shape, dtype=np.uint8)
+    remaining = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = remaining >= np.uint64(1 << shift)
+        lengths[high] += shift
+        remaining[high] >>= np.uint64(shift)
+    return lengths + (remaining > 0).astype(np.uint8)
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch.
+
+    Sketches of the same precision merge by taking the register-wise maximum,
+    so any range of hour or day buckets merges in constant time per bucket.
+    Estimates use linear counting while many registers are still empty.
+    """
+
+    def __init__(self, registers=None):
+        if registers is None:
+            registers = np.zeros(HLL_REGISTER_COUNT, dtype=np.uint8)
+        self.registers = registers
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(np.frombuffer(zlib.decompress(data), dtype=np.uint8).copy())
+
+    def to_bytes(self):
+        return zlib.compress(self.registers.tobytes())
+
+    def add(self, values):
+        values = [v for v in values if v]
+        if not values:
+            return self
+        hashes = _hash_values(values)
+        index = (hashes >> np.uint64(_VALUE_BITS)).astype(np.intp)
+        rest = hashes & np.uint64((1 << _VALUE_BITS) - 1)
+        rank = (_VALUE_BITS + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = HLL_REGISTER_COUNT
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if zeros == m:
+            return 0
+        if zeros:
+            # Linear counting is unbiased here, where the raw estimate is not
+            linear = m * math.log(m / zeros)
+            if linear <= 2.5 * m:
+                return int(round(linear))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        return int(round(alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))))
+
+# Maintenance
+
+def _visitor_buckets(visitor):
+    buckets = [('day', datetime.combine(visitor.visit_date, time.min))]
+    if visitor.entry_time:
+        buckets.append(('hour', visitor.entry_time.replace(minute=0, second=0, microsecond=0)))
+    return buckets
+
+def group_visitor_ids(visitors):
+    """User and session ids of `visitors` per (granularity, field, bucket_start)"""
+    groups = defaultdict(list)
+    for visitor in visitors:
+        if visitor.visit_date is None:
+            continue
+        for granularity, bucket_start in _visitor_buckets(visitor):
+            for field in SKETCHED_FIELDS:
+                value = getattr(visitor, field)
+                if value:
+                    groups[(granularity, field, bucket_start)].append(value)
+    return groups
+
+def merge_into_sketches(connection, groups):
+    """Add ids to their stored sketches, creating missing buckets"""
+    table = VisitorSketch.__table__
+    for (granularity, field, bucket_start), values in groups.items():
+        query = select(table.c.id, table.c.registers).where(
+            table.c.granularity == granularity,
+            table.c.field == field,
+            table.c.bucket_start == bucket_start
+        )
+        if connection.dialect.name == 'postgresql':
+            query = query.with_for_update()
+
+        row = connection.execute(query).first()
+        if row is None:
+            insert_if_missing(connection, table, {
+                'granularity': granularity,
+                'field': field,
+                'bucket_start': bucket_start,
+                'registers': HyperLogLog().to_bytes()
+            }, 'unique_sketch_bucket')
+            row = connection.execute(query).first()
+
+        sketch = HyperLogLog.from_bytes(row.registers).add(values)
+        connection.execute(
+            update(table).where(table.c.id == row.id).values(
+                registers=sketch.to_bytes(), updated_at=datetime.utcnow()
+            )
+        )
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _sketch_new_visitors(session, flush_context):
+    """Keep sketches current as visitor rows are ingested, in the same transaction"""
+    visitors = [obj for obj in session.new if isinstance(obj, VisitorAnalytics)]
+    if visitors:
+        merge_into_sketches(session.connection(), group_visitor_ids(visitors))
+
+def rebuild_sketches(start, end):
+    """Recompute the sketches of visit dates in [start, end] from stored and archived rows"""
+    range_start = datetime.combine(start, time.min)
+    range_end = datetime.combine(end + timedelta(days=1), time.min)
+    VisitorSketch.query.filter(
+        VisitorSketch.bucket_start >= range_start,
+        VisitorSketch.bucket_start < range_end
+    ).delete(synchronize_session=False)
+
+    visitors_seen = 0
+    day = start
+    while day <= end:
+        visitors = fetch_range(VisitorAnalytics, day, day)
+        merge_into_sketches(db.session.connection(), group_visitor_ids(visitors))
+        db.session.commit()
+        visitors_seen += len(visitors)
+        day += timedelta(days=1)
+
+    logger.info(f"Rebuilt visitor sketches for {start.isoformat()} to {end.isoformat()} from {visitors_seen} rows")
+    return visitors_seen
+
+# Queries
+
+def load_sketches(granularity, start_date, end_date):
+    """Stored hour or day sketches for dates in [start_date, end_date], keyed by (field, bucket_start)"""
+    rows = db.session.query(
+        VisitorSketch.field, VisitorSketch.bucket_start, VisitorSketch.registers
+    ).filter(
+        VisitorSketch.granularity == granularity,
+        VisitorSketch.bucket_start >= datetime.combine(start_date, time.min),
+        VisitorSketch.bucket_start < datetime.combine(end_date + timedelta(days=1), time.min)
+    ).all()
+    return {(row.field, row.bucket_start): HyperLogLog.from_bytes(row.registers) for row in rows}
+
+def unique_visitors_by(sketches, key):
+    """Estimated distinct users and sessions per `key(bucket_start)`"""
+    merged = defaultdict(lambda: {field: HyperLogLog() for field in SKETCHED_FIELDS})
+    for (field, bucket_start), sketch in sketches.items():
+        merged[key(bucket_start)][field].merge(sketch)
+    return {
+        group: {'users': fields['user_id'].estimate(), 'sessions': fields['session_id'].estimate()}
+        for group, fields in merged.items()
+    }
+
+def unique_visitors(sketches):
+    """Estimated distinct users and sessions across all `sketches`, with the error bound"""
+    counts = unique_visitors_by(sketches, lambda bucket_start: None).get(None, {'users': 0, 'sessions': 0})
+    counts['relative_standard_error'] = round(HLL_STANDARD_ERROR, 4)
+    return counts
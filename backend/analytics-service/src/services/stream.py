@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, insert, select, text
+from src.models.analytics import db, StreamEventRecord
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEvent:
+    """A single published event, kept in the broker's replay buffer"""
+
+    __slots__ = ('id', 'event', 'data', 'payload')
+
+    def __init__(self, event_id, event, data):
+        self.id = event_id
+        self.event = event
+        self.data = data  # Serialized JSON
+        # Built once per process; every subscriber shares the bytes
+        self.payload = (
+            f"id: {event_id}\n"
+            f"event: {event}\n"
+            f"data: {data}\n\n"
+        )
+
+
+class EventBroker:
+    """
+    Fan-out for Server-Sent Events across worker processes.
+
+    Publishers insert into `stream_events`, whose increasing id is the event
+    id, so an event published by any worker reaches the subscribers of every
+    worker. Each process runs one poller, only while it has subscribers, that
+    reads the new rows every `poll_interval` seconds into a bounded buffer and
+    wakes every waiting subscriber through one shared condition: the database
+    sees one indexed query per process per interval however many streams are
+    open. Subscribers hold no queue of their own, only the id of the last
+    event they sent, which is also what `Last-Event-ID` resumes after.
+
+    The waits use `threading` primitives, which gevent makes cooperative in
+    the stream server (gunicorn.stream.conf.py): an idle stream holds a
+    greenlet, not an OS thread.
+    """
+
+    def __init__(self, engine, history_size=256, poll_interval=0.5):
+        self._engine = engine
+        self._table = StreamEventRecord.__table__
+        self._history_size = history_size
+        self._poll_interval = poll_interval
+        self._events = deque(maxlen=history_size)
+        self._condition = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._last_id = None  # Unknown until the first poll
+        self._subscribers = 0
+        self._poller = None
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event, data):
+        """Store an event for the pollers of all processes and wake this process's subscribers"""
+        data = json.dumps(data, separators=(',', ':'))
+        with self._engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                # Ids must become visible in order, or a poller could pass one still uncommitted
+                connection.execute(text(f'LOCK TABLE {self._table.name} IN EXCLUSIVE MODE'))
+            event_id = connection.execute(
+                insert(self._table).values(event=event, data=data, created_at=datetime.utcnow())
+            ).inserted_primary_key[0]
+            # Only the replay window is kept
+            connection.execute(delete(self._table).where(self._table.c.id <= event_id - self._history_size))
+        self.poll()
+        return StreamEvent(event_id, event, data)
+
+    def _read(self, after_id):
+        """Stored events after `after_id`, or only the latest one when it is None"""
+        query = select(self._table.c.id, self._table.c.event, self._table.c.data)
+        if after_id is None:
+            query = query.order_by(self._table.c.id.desc()).limit(1)
+        else:
+            query = query.where(self._table.c.id > after_id).order_by(self._table.c.id).limit(self._history_size)
+        with self._engine.connect() as connection:
+            rows = connection.execute(query).all()
+        return sorted((StreamEvent(*row) for row in rows), key=lambda e: e.id)
+
+    def poll(self):
+        """Buffer events published since the last poll, by any process, and wake the subscribers"""
+        with self._poll_lock:
+            events = self._read(self._last_id)
+            with self._condition:
+                self._events.extend(events)
+                if events:
+                    self._last_id = events[-1].id
+                elif self._last_id is None:
+                    self._last_id = 0
+                self._condition.notify_all()
+        return events
+
+    def latest(self):
+        """Return the most recent event, if any"""
+        with self._condition:
+            return self._events[-1] if self._events else None
+
+    def events_since(self, last_id):
+        """Return the events published after `last_id` that are still kept"""
+        with self._condition:
+            if self._events and self._events[0].id <= last_id + 1:
+                return [e for e in self._events if e.id > last_id]
+            if last_id >= self._last_id:
+                return []
+        # Older than this process's buffer, e.g. a reconnect to another worker
+        return self._read(last_id)
+
+    def wait_for_events(self, last_id, timeout):
+        """Wait until an event newer than `last_id` exists or `timeout` elapses"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._last_id > last_id, timeout=timeout):
+                return []
+        return self.events_since(last_id)
+
+    def _ensure_poller(self):
+        with self._condition:
+            # A poller started before a fork does not survive into the child
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._run_poller, name='stream-poller', daemon=True)
+                self._poller.start()
+
+    def _run_poller(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._subscribers > 0)
+            time.sleep(self._poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error polling stream events: {str(e)}")
+
+    def subscribe(self, last_event_id=None, heartbeat_seconds=15, retry_ms=3000):
+        """
+        Generate the SSE wire format for one subscriber.
+
+        A fresh connection (or one whose id is unknown, e.g. from before the
+        table was reset) starts with the current snapshot; a reconnect replays
+        whatever it missed that is still kept. Idle connections get a comment
+        line every `heartbeat_seconds` so proxies keep them open.
+        """
+        yield f"retry: {retry_ms}\n\n"
+
+        self._ensure_poller()
+        with self._condition:
+            self._subscribers += 1
+            self._condition.notify_all()
+        try:
+            if self._last_id is None:
+                self.poll()
+
+            if last_event_id is None or last_event_id > self._last_id:
+                latest = self.latest()
+                cursor = self._last_id
+                if latest is not None:
+                    yield latest.payload
+                    cursor = latest.id
+            else:
+                cursor = last_event_id
+
+            while True:
+                events = self.wait_for_events(cursor, heartbeat_seconds)
+                if not events:
+                    yield f": heartbeat {datetime.utcnow().isoformat()}\n\n"
+                    continue
+                for stream_event in events:
+                    yield stream_event.payload
+                    cursor = stream_event.id
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+
+
+def parse_last_event_id(value):
+    """Parse a `Last-Event-ID` header value, ignoring anything malformed"""
+    try:
+        last_id = int(value)
+    except (TypeError, ValueError):
+        return None
+    return last_id if last_id >= 0 else None
+
+
+def current_broker():
+    """The app's broker for real-time stats and system health updates, created on first use"""
+    broker = current_app.extensions.get('live_stats_broker')
+    if broker is None:
+        config = current_app.config
+        broker = current_app.extensions.setdefault('live_stats_broker', EventBroker(
+            db.engine,
+            history_size=config.get('STREAM_HISTORY_SIZE', 256),
+            poll_interval=config.get('STREAM_POLL_SECONDS', 0.5)
+        ))
+    return broker
@@ -0,0 +1,79 @@
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.keys import new_id
+
+
+def dialect_insert(connection, table):
+    """INSERT construct with ON CONFLICT support for the connection's dialect, if it has one"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql_insert(table)
+    if dialect == 'sqlite':
+        return sqlite_insert(table)
+    return table.insert()
+
+
+def insert_if_missing(connection, table, values, constraint):
+    """Insert a row unless one already exists under the unique `constraint`"""
+    statement = dialect_insert(connection, table).values(**values)
+    if connection.dialect.name == 'postgresql':
+        statement = statement.on_conflict_do_nothing(constraint=constraint)
+    elif connection.dialect.name == 'sqlite':
+        statement = statement.on_conflict_do_nothing()
+    connection.execute(statement)
+
+
+# Unique key of each hourly table, as (constraint name, key columns)
+HOURLY_UPSERT_KEYS = {
+    'operational_metrics': ('unique_date_hour', ('metric_date', 'metric_hour')),
+    'attraction_analytics': ('unique_attraction_date_hour', ('attraction_key', 'date', 'hour')),
+    'payment_analytics': ('unique_payment_date_hour_method', ('date', 'hour', 'payment_method')),
+    'etl_buckets': ('unique_etl_bucket', ('stream', 'scope', 'bucket_start')),
+}
+
+
+def upsert_rows(connection, table, rows, update_columns):
+    """
+    Insert `rows` (dicts of column values) into an hourly table, overwriting
+    `update_columns` of rows that already exist under the table's unique key.
+    Columns left out of `update_columns` keep their stored values. New rows get
+    an id and both timestamps, updated rows a new `updated_at` where the table has one.
+    """
+    if not rows:
+        return
+    constraint, key_columns = HOURLY_UPSERT_KEYS[table.name]
+    now = datetime.utcnow()
+    stamped = []
+    for row in rows:
+        row = dict(row, id=new_id(), created_at=now)
+        if 'updated_at' in table.c:
+            row['updated_at'] = now
+        stamped.append(row)
+
+    if connection.dialect.name not in ('postgresql', 'sqlite'):
+        for row in stamped:
+            changes = {column: row[column] for column in update_columns}
+            if 'updated_at' in table.c:
+                changes['updated_at'] = now
+            if not changes:
+                changes = {key_columns[0]: row[key_columns[0]]}
+            result = connection.execute(
+                update(table).where(*(table.c[column] == row[column] for column in key_columns)).values(**changes)
+            )
+            if not result.rowcount:
+                connection.execute(table.insert().values(**row))
+        return
+
+    statement = dialect_insert(connection, table)
+    changes = {column: statement.excluded[column] for column in update_columns}
+    if 'updated_at' in table.c:
+        changes['updated_at'] = statement.excluded.updated_at
+    if not changes:
+        statement = statement.on_conflict_do_nothing()
+    elif connection.dialect.name == 'postgresql':
+        statement = statement.on_conflict_do_update(constraint=constraint, set_=changes)
+    else:
+        statement = statement.on_conflict_do_update(index_elements=list(key_columns), set_=changes)
+    connection.execute(statement, stamped)
@@ -0,0 +1,4 @@
+"""Production entry point: gunicorn --config gunicorn.conf.py (which serves src.wsgi:app)"""
+from src.main import create_app
+
+app = create_app()
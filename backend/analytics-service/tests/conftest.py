@@ -0,0 +1,37 @@
+"""
+Shared fixtures: an app on a fresh SQLite database per test.
+
+Run from backend/analytics-service: python -m pytest
+"""
+import pytest
+from src.main import create_app
+from src.models.analytics import db
+from src.models.sources import source_metadata
+from src.services.etl import source_engine
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'analytics.db'}",
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+        'ANALYTICS_MIGRATE_ON_START': True,
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def source(app):
+    """Engine of the core API tables the ETL reads, created in the analytics database"""
+    engine = source_engine()
+    source_metadata.create_all(engine)
+    return engine
@@ -0,0 +1,56 @@
+import threading
+import time
+from datetime import date, timedelta
+import pytest
+from src.services.admission import Lane, admission_control
+
+
+def test_a_full_lane_queues_then_sheds():
+    lane = Lane('heavy', limit=1, queue_size=1, queue_seconds=0.05)
+    assert lane.acquire()
+
+    # One request may wait; it times out since the slot is never released
+    assert not lane.acquire()
+    assert lane.shed_timeout == 1
+
+    waiting = threading.Thread(target=lane.acquire)
+    lane.queue_seconds = 5
+    waiting.start()
+    while lane.waiting == 0:
+        time.sleep(0.001)
+    assert not lane.acquire()
+    assert lane.shed_queue_full == 1
+
+    lane.release(2.0)
+    waiting.join(1)
+    assert (lane.active, lane.waiting, lane.admitted) == (1, 0, 2)
+    assert lane.retry_after() == 2
+
+
+@pytest.mark.parametrize('path, lane', [
+    ('/health', None),
+    ('/api/v1/dashboard/overview', 'live'),
+    ('/api/v1/reports/daily-summary', 'heavy'),
+    ('/api/v1/analytics/visitor-stats', None),
+    (f'/api/v1/analytics/visitor-stats?start_date={date.today() - timedelta(days=40)}', 'heavy'),
+    ('/api/v1/analytics/visitor-stats?start_date=junk', None),
+])
+def test_requests_are_classified_by_endpoint_and_range(app, path, lane):
+    with app.test_request_context(path):
+        assert admission_control.classify() == lane
+
+
+def test_shed_requests_get_429_with_retry_after(app, client):
+    heavy = admission_control.lanes['heavy']
+    heavy.queue_size = 0
+    assert heavy.acquire()
+    try:
+        response = client.get('/api/v1/reports/daily-summary')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+        assert response.get_json()['error']['code'] == 'OVERLOADED'
+        # The live lane is unaffected
+        assert client.get('/api/v1/dashboard/overview').status_code == 200
+    finally:
+        heavy.release(0.1)
+    assert client.get('/api/v1/reports/daily-summary').status_code == 200
@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timedelta
+from itertools import count
+import pytest
+from src.models.analytics import db, DetectorState, RealTimeStats, StreamEventRecord
+from src.services.anomaly import AnomalyDetector, EwmaState, current_detector
+
+NOW = datetime(2026, 10, 19, 12, 0, 0)
+SETTLE = timedelta(seconds=2)
+SNAPSHOT_IDS = count(1)
+
+
+def add_snapshot(timestamp, api_response_time_ms=100):
+    # Core insert: the ORM hooks would also sketch the snapshot, which is not under test here
+    db.session.execute(RealTimeStats.__table__.insert(), {
+        'id': f'{next(SNAPSHOT_IDS):032x}', 'timestamp': timestamp, 'system_load_percentage': 40,
+        'api_response_time_ms': api_response_time_ms, 'payment_success_rate': 99, 'cache_hit_rate': 80,
+        'average_queue_time': 10
+    })
+    db.session.commit()
+
+
+def add_baseline(count=40, end=NOW - timedelta(minutes=1)):
+    for n in range(count):
+        add_snapshot(end - timedelta(seconds=10 * (count - n)), api_response_time_ms=100 + n % 5)
+
+
+def detector():
+    return AnomalyDetector(warmup=30, settle=SETTLE, stale_after=timedelta(minutes=5))
+
+
+def test_ewma_tracks_level_and_spread():
+    state = EwmaState(0.1)
+    assert state.zscore(5) is None
+    for value in [10, 12] * 200:
+        state.update(value)
+
+    assert state.mean == pytest.approx(11, abs=0.2)
+    assert state.zscore(30) > 10
+    assert abs(state.zscore(11)) < 1
+
+
+def test_a_spike_raises_an_alert_seen_by_every_worker(app):
+    add_baseline()
+    add_snapshot(NOW - timedelta(seconds=5), api_response_time_ms=5000)
+
+    assert detector().ingest(now=NOW) == 41
+
+    alerts = detector().active_alerts(now=NOW)
+    assert [(alert['metric'], alert['level']) for alert in alerts] == [('api_response_time_ms', 'CRITICAL')]
+    assert detector().state()['api_response_time_ms']['samples'] == 41
+
+
+def test_snapshots_committed_late_within_the_settle_window_are_applied(app):
+    add_baseline(5)
+    first = detector()
+    add_snapshot(NOW - timedelta(seconds=1))
+    assert first.ingest(now=NOW) == 5
+
+    # Committed after the previous one, with an earlier timestamp
+    add_snapshot(NOW - timedelta(seconds=1.5))
+
+    assert first.ingest(now=NOW + timedelta(seconds=5)) == 2
+    assert first.ingest(now=NOW + timedelta(seconds=5)) == 0
+
+
+def test_alerts_expire_when_the_feed_stalls(app):
+    add_baseline()
+    add_snapshot(NOW - timedelta(seconds=5), api_response_time_ms=5000)
+    detector().ingest(now=NOW)
+
+    assert detector().active_alerts(now=NOW + timedelta(minutes=4))
+    assert detector().active_alerts(now=NOW + timedelta(minutes=6)) == []
+
+
+def test_concurrent_saves_apply_snapshots_once(app, monkeypatch):
+    add_baseline(5)
+    slow, fast = detector(), detector()
+    fast.ingest(now=NOW - timedelta(minutes=2))
+    stale_row = DetectorState.query.one()
+    db.session.commit()
+    assert fast.ingest(now=NOW) == 5
+
+    # `slow` read the state before `fast` saved
+    monkeypatch.setattr(slow, '_state_row', lambda connection, create=False: stale_row)
+    assert slow.ingest(now=NOW) == 0
+
+    monkeypatch.undo()
+    assert detector().state()['api_response_time_ms']['samples'] == 5
+
+
+def test_a_committed_snapshot_is_applied_at_once_and_only_once(app):
+    add_baseline(5)
+    add_snapshot(NOW)
+    own_id = RealTimeStats.query.order_by(RealTimeStats.timestamp.desc()).first().id
+
+    assert detector().ingest(now=NOW, snapshot_id=own_id) == 6
+    assert detector().active_alerts(now=NOW + timedelta(minutes=4)) == []
+
+    # Catch-up passes the snapshot applied ahead without applying it again
+    add_snapshot(NOW + timedelta(seconds=1))
+    assert detector().ingest(now=NOW + timedelta(seconds=10)) == 1
+    assert detector().state()['api_response_time_ms']['samples'] == 7
+    assert json.loads(DetectorState.query.one().state)['ahead'] == []
+
+
+def test_posting_an_anomalous_snapshot_alerts_at_once(client, app):
+    assert app.config['ANOMALY_SETTLE_SECONDS'] == 2
+    for n in range(35):
+        assert client.post('/api/v1/dashboard/update-real-time', json={'api_response_time_ms': 100 + n % 5}).status_code == 200
+
+    response = client.post('/api/v1/dashboard/update-real-time', json={'api_response_time_ms': 5000})
+
+    assert response.status_code == 200
+    assert current_detector().state()['api_response_time_ms']['samples'] == 36
+    health = client.get('/api/v1/dashboard/system-health').get_json()['data']
+    assert health['status'] == 'CRITICAL'
+    assert [alert['metric'] for alert in health['alerts']] == ['api_response_time_ms']
+    live = json.loads(StreamEventRecord.query.order_by(StreamEventRecord.id.desc()).first().data)
+    assert live['system_health']['alerts'] == health['alerts']
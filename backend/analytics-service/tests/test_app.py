@@ -0,0 +1,51 @@
+from sqlalchemy import inspect
+from src.main import create_app
+from src.models.analytics import db, VisitorAnalytics
+
+
+def make_app(tmp_path, name='analytics.db', **config):
+    return create_app(dict({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / name}"}, **config))
+
+
+def test_creating_the_app_leaves_the_database_alone(tmp_path):
+    app = make_app(tmp_path)
+
+    assert not (tmp_path / 'analytics.db').exists()
+    assert app.test_client().get('/health').status_code == 200
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_config_overrides_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('BULK_UPSERT_MAX_ROWS', '7')
+    monkeypatch.setenv('FORECAST_MAX_DAYS', '3')
+
+    app = make_app(tmp_path, BULK_UPSERT_MAX_ROWS=11)
+
+    assert app.config['BULK_UPSERT_MAX_ROWS'] == 11
+    assert app.config['FORECAST_MAX_DAYS'] == 3
+
+
+def test_db_upgrade_command_creates_the_schema(tmp_path):
+    app = make_app(tmp_path)
+
+    result = app.test_cli_runner().invoke(args=['db', 'upgrade'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Schema up to date' in result.output
+    with app.app_context():
+        assert {'visitor_analytics', 'attraction_dimension', 'etl_watermarks'} <= set(inspect(db.engine).get_table_names())
+        db.engine.dispose()
+
+
+def test_apps_keep_their_own_databases(tmp_path):
+    first = make_app(tmp_path, 'first.db', ANALYTICS_MIGRATE_ON_START=True)
+    second = make_app(tmp_path, 'second.db', ANALYTICS_MIGRATE_ON_START=True)
+
+    first.test_client().post('/api/v1/analytics/feedback', json={'rating': 4})
+
+    for app, count in ((first, 1), (second, 0)):
+        with app.app_context():
+            assert VisitorAnalytics.query.count() == count
+            db.session.remove()
+            db.engine.dispose()
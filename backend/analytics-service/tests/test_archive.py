@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import event
+from src.models.analytics import db, VisitorAnalytics
+from src.services.archive import ColdArchive, current_archive, fetch_range, count_range
+
+START = date(2026, 3, 30)
+CUTOFF = date(2026, 5, 1)
+
+
+def add_visits(days):
+    for number, day in enumerate(days):
+        db.session.add(VisitorAnalytics(
+            visit_date=day, user_id=f'user-{number}', entry_time=datetime(day.year, day.month, day.day, 9),
+            total_spending_cents=1000 + number, satisfaction_rating=None if number % 2 else 5
+        ))
+    db.session.commit()
+
+
+def visit_days():
+    return [START + timedelta(days=offset) for offset in range(0, 40, 3)]
+
+
+def snapshot(rows):
+    return sorted(
+        (row.visit_date, row.user_id, row.entry_time, row.total_spending_cents, row.satisfaction_rating)
+        for row in rows
+    )
+
+
+def test_archived_rows_read_back_unchanged(app):
+    add_visits(visit_days())
+    before = snapshot(VisitorAnalytics.query.all())
+
+    result = current_archive().archive_before('visitor_analytics', CUTOFF, batch_size=2)
+
+    archived = [day for day in visit_days() if day < CUTOFF]
+    assert result['rows_archived'] == len(archived)
+    assert VisitorAnalytics.query.filter(VisitorAnalytics.visit_date < CUTOFF).count() == 0
+    assert snapshot(fetch_range(VisitorAnalytics, START, date(2026, 12, 31))) == before
+    assert count_range(VisitorAnalytics, START, CUTOFF - timedelta(days=1)) == len(archived)
+    assert current_archive().status()['visitor_analytics']['months'] == {'2026-03': 1, '2026-04': 10}
+
+
+def test_rerun_after_an_interrupted_archive_skips_rows_already_written(app, monkeypatch):
+    add_visits(visit_days())
+
+    def interrupt(self, manifest):
+        raise RuntimeError('interrupted')
+    monkeypatch.setattr(ColdArchive, '_write_manifest', interrupt)
+    with pytest.raises(RuntimeError):
+        current_archive().archive_before('visitor_analytics', CUTOFF, batch_size=4)
+    monkeypatch.undo()
+    add_visits([date(2026, 4, 30)])
+
+    result = current_archive().archive_before('visitor_analytics', CUTOFF, batch_size=4)
+
+    assert result['rows_archived'] == 1
+    assert current_archive().status()['visitor_analytics']['months'] == {'2026-03': 1, '2026-04': 11}
+    assert len(fetch_range(VisitorAnalytics, START, CUTOFF - timedelta(days=1))) == 12
+
+
+def test_archive_streams_rows_without_loading_model_instances(app):
+    add_visits(visit_days())
+    db.session.expunge_all()
+    loaded = []
+    listener = lambda target, context: loaded.append(target)
+    event.listen(VisitorAnalytics, 'load', listener)
+    try:
+        current_archive().archive_before('visitor_analytics', CUTOFF, batch_size=3)
+    finally:
+        event.remove(VisitorAnalytics, 'load', listener)
+
+    assert loaded == []
@@ -0,0 +1,72 @@
+from sqlalchemy import text
+from src.models.analytics import db, AttractionAnalytics, AttractionDimension
+from src.models.migrations import upgrade_schema
+from src.services import attractions
+from src.services.attractions import current_attractions, register_attractions
+
+
+def register(details):
+    keys = register_attractions(db.session.connection(), details)
+    db.session.commit()
+    return keys
+
+
+def test_register_adds_new_attractions_and_updates_changed_details(app):
+    keys = register({'coaster': {'name': 'Coaster', 'max_capacity': 20}, 'wheel': {}})
+
+    assert current_attractions().get(keys['wheel']).name == 'wheel'
+    again = register({'coaster': {'name': 'Big Coaster', 'max_capacity': None}, 'wheel': {'duration_minutes': 12}})
+
+    assert again == keys
+    coaster = current_attractions().get(keys['coaster'])
+    assert (coaster.name, coaster.max_capacity) == ('Big Coaster', 20)
+    assert current_attractions().get(keys['wheel']).duration_minutes == 12
+
+
+def test_directory_reloads_on_expiry_and_on_a_miss(app, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(attractions.time, 'monotonic', lambda: clock[0])
+    keys = register({'coaster': {'name': 'Coaster'}})
+    directory = current_attractions()
+    assert directory.get(keys['coaster']).name == 'Coaster'
+
+    # Another process renames the attraction and adds one
+    db.session.execute(text("UPDATE attraction_dimension SET name = 'Renamed'"))
+    db.session.execute(AttractionDimension.__table__.insert(), [{'attraction_id': 'wheel', 'name': 'Wheel'}])
+    db.session.commit()
+
+    assert directory.get(keys['coaster']).name == 'Coaster'
+    clock[0] += 2
+    assert directory.key_for('wheel') is not None
+    assert directory.get(keys['coaster']).name == 'Renamed'
+    assert directory.get(999).attraction_id is None
+
+
+def test_upgrade_moves_inline_attraction_names_into_the_dimension(app):
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP TABLE attraction_analytics'))
+        connection.execute(text(
+            'CREATE TABLE attraction_analytics (id VARCHAR(36) NOT NULL, date DATE NOT NULL, '
+            'attraction_id VARCHAR(36) NOT NULL, attraction_name VARCHAR(200) NOT NULL, hour INTEGER NOT NULL, '
+            'total_visitors INTEGER, revenue_generated NUMERIC(10, 2), created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id, date), '
+            'CONSTRAINT unique_attraction_date_hour UNIQUE (attraction_id, date, hour))'
+        ))
+        connection.execute(text(
+            "INSERT INTO attraction_analytics VALUES "
+            "('00000000-0000-7000-8000-000000000001', '2026-07-01', 'coaster', 'Coaster', 9, 10, 1.5, "
+            "'2026-07-01 09:00:00', '2026-07-01 09:00:00'), "
+            "('00000000-0000-7000-8000-000000000002', '2026-07-01', 'coaster', 'Thunder Coaster', 10, 20, 2.25, "
+            "'2026-07-01 10:00:00', '2026-07-01 10:00:00'), "
+            "('00000000-0000-7000-8000-000000000003', '2026-07-01', 'wheel', 'Wheel', 9, 30, 0, "
+            "'2026-07-01 09:00:00', '2026-07-01 09:00:00')"
+        ))
+    db.session.remove()
+
+    upgrade_schema(db)
+    current_attractions().invalidate()
+
+    rows = AttractionAnalytics.query.order_by(AttractionAnalytics.total_visitors).all()
+    names = [(current_attractions().get(row.attraction_key).name, row.hour, row.total_visitors) for row in rows]
+    # The latest name of each attraction wins
+    assert names == [('Thunder Coaster', 9, 10), ('Thunder Coaster', 10, 20), ('Wheel', 9, 30)]
+    assert [row.revenue_generated_cents for row in rows] == [150, 225, 0]
@@ -0,0 +1,58 @@
+from datetime import date, datetime
+from src.models.analytics import db, OperationalMetrics, RealTimeStats, VisitorAnalytics
+from src.services.backfill import RollupBackfill
+
+START = date(2026, 9, 1)
+END = date(2026, 9, 3)
+
+
+def add_visits():
+    for day in (START, END):
+        for hour, spending, rating in ((9, 1000, 4), (9, 500, 2), (14, 250, None)):
+            db.session.add(VisitorAnalytics(
+                visit_date=day, entry_time=datetime.combine(day, datetime.min.time()).replace(hour=hour),
+                total_spending_cents=spending, satisfaction_rating=rating
+            ))
+    db.session.add(RealTimeStats(timestamp=datetime(2026, 9, 1, 9, 30), average_queue_time=12))
+    # An hour without visitor entries, from an earlier wrong import
+    db.session.add(OperationalMetrics(metric_date=START, metric_hour=3, total_visitors=99, total_revenue_cents=5))
+    db.session.commit()
+
+
+def hours(day):
+    return {
+        row.metric_hour: (row.total_visitors, row.total_revenue_cents, row.average_wait_time, float(row.customer_satisfaction_avg))
+        for row in OperationalMetrics.query.filter_by(metric_date=day)
+    }
+
+
+def test_backfill_recomputes_hours_from_raw_data(app):
+    add_visits()
+    backfill = RollupBackfill('operational', START, END)
+
+    results = list(backfill.run(backfill.pending(), workers=1))
+
+    assert [result['rows_written'] for result in results] == [3, 0, 2]
+    assert hours(START) == {3: (0, 0, 0, 0.0), 9: (2, 1500, 12, 3.0), 14: (1, 250, 0, 0.0)}
+    assert backfill.pending() == []
+
+
+def test_rerun_resumes_from_checkpoints(app):
+    add_visits()
+    backfill = RollupBackfill('operational', START, END)
+    list(backfill.run([START], workers=1))
+
+    assert backfill.pending() == [date(2026, 9, 2), END]
+    assert backfill.reset() == 1
+    assert backfill.pending() == [START, date(2026, 9, 2), END]
+
+
+def test_parallel_workers_give_the_same_rows(app):
+    add_visits()
+    backfill = RollupBackfill('operational', START, END)
+
+    results = list(backfill.run(backfill.pending(), workers=2))
+
+    assert sorted(result['date'] for result in results) == ['2026-09-01', '2026-09-02', '2026-09-03']
+    assert not any('error' in result for result in results)
+    assert hours(END) == {9: (2, 1500, 0, 3.0), 14: (1, 250, 0, 0.0)}
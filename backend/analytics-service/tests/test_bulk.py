@@ -0,0 +1,103 @@
+import json
+from datetime import date, timedelta
+import pytest
+from src.main import create_app
+from src.models.analytics import db, AttractionAnalytics, OperationalMetrics
+from src.services.attractions import current_attractions
+from src.services.partitioning import month_start
+
+DAY = date(2026, 9, 7)
+
+
+def post_rows(client, dataset, rows, query=''):
+    body = '\n'.join(json.dumps(row) for row in rows)
+    response = client.post(f'/api/v1/analytics/{dataset}/bulk{query}', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['data']
+
+
+def test_outcomes_report_inserts_updates_and_errors(client):
+    data = post_rows(client, 'operational-metrics', [
+        {'metric_date': DAY.isoformat(), 'metric_hour': 10, 'total_visitors': 100, 'total_revenue': '10.50'},
+        {'metric_date': DAY.isoformat(), 'metric_hour': 10, 'average_wait_time': 12},
+        {'metric_date': DAY.isoformat(), 'metric_hour': 24},
+        {'metric_date': DAY.isoformat(), 'metric_hour': 11, 'colour': 'blue'},
+    ])
+
+    assert data['outcomes'] == ['inserted', 'updated', 'error', 'error']
+    assert [error['index'] for error in data['errors']] == [2, 3]
+    row = OperationalMetrics.query.one()
+    assert (row.total_visitors, row.total_revenue_cents, row.average_wait_time) == (100, 1050, 12)
+
+
+def test_partial_rows_keep_the_other_stored_columns(client):
+    post_rows(client, 'operational-metrics', [
+        {'metric_date': DAY.isoformat(), 'metric_hour': 9, 'total_visitors': 80, 'average_wait_time': 20}
+    ])
+
+    data = post_rows(client, 'operational-metrics', [
+        {'metric_date': DAY.isoformat(), 'metric_hour': 9, 'total_visitors': 90}
+    ])
+
+    assert data['outcomes'] == ['updated']
+    db.session.expire_all()
+    row = OperationalMetrics.query.one()
+    assert (row.total_visitors, row.average_wait_time) == (90, 20)
+
+
+def test_without_outcomes_rows_are_only_counted(client):
+    rows = [{'metric_date': DAY.isoformat(), 'metric_hour': hour, 'total_visitors': hour} for hour in range(5)]
+    post_rows(client, 'operational-metrics', rows[:2])
+
+    data = post_rows(client, 'operational-metrics', rows + [{'metric_date': 'soon', 'metric_hour': 1}], '?outcomes=false')
+
+    assert (data['written'], data['failed']) == (5, 1)
+    assert 'outcomes' not in data
+    assert OperationalMetrics.query.count() == 5
+
+
+def test_attraction_rows_need_a_name_the_first_time(client):
+    data = post_rows(client, 'attractions', [
+        {'attraction_id': 'ATR001', 'attraction_name': 'Thunder Mountain', 'date': DAY.isoformat(), 'hour': 10, 'total_visitors': 212},
+        {'attraction_id': 'ATR009', 'date': DAY.isoformat(), 'hour': 11, 'average_wait_time': 31},
+        {'attraction_id': 'ATR001', 'date': DAY.isoformat(), 'hour': 11, 'revenue_generated': '99.99'},
+    ])
+
+    assert data['outcomes'] == ['inserted', 'error', 'inserted']
+    rows = AttractionAnalytics.query.order_by(AttractionAnalytics.hour).all()
+    assert {current_attractions().get(row.attraction_key).name for row in rows} == {'Thunder Mountain'}
+    assert rows[1].revenue_generated_cents == 9999
+
+
+@pytest.fixture
+def partitioned_app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'analytics.db'}",
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+        'ANALYTICS_PARTITION_DIR': str(tmp_path / 'partitions'),
+        'ANALYTICS_MIGRATE_ON_START': True,
+    })
+    with app.app_context():
+        yield app
+        app.extensions['partitions']._dispose()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_rows_of_sealed_months_are_written_to_the_month_file(partitioned_app):
+    partitions = partitioned_app.extensions['partitions']
+    sealed = month_start(month_start(date.today()) - timedelta(days=1))
+    db.session.add(OperationalMetrics(metric_date=sealed, metric_hour=8, total_visitors=1))
+    db.session.commit()
+    partitions.create_partition(sealed)
+
+    data = post_rows(partitioned_app.test_client(), 'operational-metrics', [
+        {'metric_date': sealed.isoformat(), 'metric_hour': 8, 'total_visitors': 2},
+        {'metric_date': sealed.isoformat(), 'metric_hour': 9, 'total_visitors': 3},
+    ])
+
+    assert data['outcomes'] == ['updated', 'inserted']
+    assert OperationalMetrics.query.count() == 0
+    with partitions.month_session(sealed) as session:
+        assert sorted(session.query(OperationalMetrics.metric_hour, OperationalMetrics.total_visitors)) == [(8, 2), (9, 3)]
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from flask import Flask, jsonify, request
+from src.services.coalescing import SingleFlight, coalesce
+
+
+@pytest.fixture
+def service():
+    """An app with one slow coalesced view that waits for `release`"""
+    app = Flask(__name__)
+    app.config['COALESCE_TIMEOUT_SECONDS'] = 5
+    flights = SingleFlight()
+    flights.init_app(app)
+    state = {'calls': 0, 'entered': threading.Event(), 'release': threading.Event(), 'fail': False}
+
+    @app.route('/slow')
+    @coalesce
+    def slow():
+        state['calls'] += 1
+        state['entered'].set()
+        state['release'].wait(5)
+        if state['fail']:
+            state['fail'] = False
+            raise RuntimeError('leader failed')
+        return jsonify({'call': state['calls'], 'args': sorted(request.args.items())})
+
+    return app, flights, state
+
+
+def get_in_thread(app, path, responses):
+    def run():
+        response = app.test_client().get(path)
+        responses.append((response.status_code, response.get_json(), response.headers.get('X-Coalesced')))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_followers(flights, count):
+    deadline = time.monotonic() + 5
+    while flights.status()['waiting'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_identical_requests_share_the_leaders_response(service):
+    app, flights, state = service
+    responses = []
+    threads = [get_in_thread(app, '/slow?b=2&a=1', responses)]
+    state['entered'].wait(5)
+    # Parameter order and empty parameters do not make a request different
+    threads += [get_in_thread(app, path, responses) for path in ('/slow?a=1&b=2', '/slow?b=2&a=1&c=', '/slow?b=2&a=1')]
+    wait_for_followers(flights, 3)
+
+    state['release'].set()
+    for thread in threads:
+        thread.join(5)
+
+    assert state['calls'] == 1
+    assert sorted(header or '' for _, _, header in responses) == ['', 'true', 'true', 'true']
+    assert {body['call'] for _, body, _ in responses} == {1}
+    assert flights.status() == {'in_flight': 0, 'waiting': 0, 'leaders': 1, 'followers_served': 3, 'follower_timeouts': 0}
+
+
+def test_different_queries_run_separately(service):
+    app, flights, state = service
+    state['release'].set()
+    client = app.test_client()
+
+    client.get('/slow?a=1')
+    client.get('/slow?a=2')
+
+    assert state['calls'] == 2
+    assert flights.status()['followers_served'] == 0
+
+
+def test_followers_run_the_view_when_the_leader_fails(service):
+    app, flights, state = service
+    state['fail'] = True
+    responses = []
+    leader = get_in_thread(app, '/slow', responses)
+    state['entered'].wait(5)
+    follower = get_in_thread(app, '/slow', responses)
+    wait_for_followers(flights, 1)
+
+    state['release'].set()
+    leader.join(5)
+    follower.join(5)
+
+    assert sorted(status for status, _, _ in responses) == [200, 500]
+    assert state['calls'] == 2
+
+
+def test_followers_stop_waiting_after_the_timeout(service):
+    app, flights, state = service
+    flights.timeout = 0.05
+    responses = []
+    leader = get_in_thread(app, '/slow', responses)
+    state['entered'].wait(5)
+
+    follower = get_in_thread(app, '/slow', responses)
+    follower.join(1)
+    assert flights.status()['follower_timeouts'] == 1
+    state['release'].set()
+    leader.join(5)
+    follower.join(5)
+
+    assert state['calls'] == 2
+    assert [header for _, _, header in responses] == [None, None]
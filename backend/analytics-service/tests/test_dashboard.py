@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from src.models.analytics import db, AttractionAnalytics, OperationalMetrics, PaymentAnalytics, VisitorAnalytics
+from src.routes import dashboard
+from src.services.attractions import register_attractions
+
+PANELS = {
+    'overview': '/api/v1/dashboard/overview',
+    'attractions-status': '/api/v1/dashboard/attractions-status',
+    'payment-trends': '/api/v1/dashboard/payment-trends',
+    'system-health': '/api/v1/dashboard/system-health',
+}
+
+
+@pytest.fixture
+def park(app, client):
+    """Today's visits, hourly metrics, attraction hours and payments, plus a real-time snapshot"""
+    now = datetime.now()
+    today = now.date()
+    keys = register_attractions(db.session.connection(), {'coaster': {'name': 'Coaster'}, 'wheel': {'name': 'Wheel'}})
+    for n in range(30):
+        db.session.add(VisitorAnalytics(
+            visit_date=today, entry_time=datetime.combine(today, datetime.min.time()) + timedelta(minutes=n * 40),
+            user_id=f'user-{n}', total_spending_cents=1000 + n, satisfaction_rating=n % 5 or None
+        ))
+    for hour in range(now.hour + 1):
+        db.session.add(OperationalMetrics(metric_date=today, metric_hour=hour, total_visitors=100 + hour,
+                                          total_revenue_cents=5000, average_wait_time=hour))
+        for key in keys.values():
+            db.session.add(AttractionAnalytics(attraction_key=key, date=today, hour=hour, total_visitors=10 + key,
+                                               average_wait_time=20, max_wait_time=40, capacity_utilization=50))
+    for days_ago in range(8):
+        db.session.add(PaymentAnalytics(date=today - timedelta(days=days_ago), hour=12, payment_method='CASH',
+                                        transaction_count=10, total_amount_cents=2500, success_rate=99))
+    db.session.commit()
+    assert client.post('/api/v1/dashboard/update-real-time', json={
+        'current_visitors': 1200, 'active_queues': 14, 'average_queue_time': 18, 'system_load_percentage': 40,
+        'api_response_time_ms': 120, 'concurrent_users': 300
+    }).status_code == 200
+
+
+def data(response):
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_batch_panels_match_their_endpoints(client, park):
+    batch = data(client.get('/api/v1/dashboard/batch'))
+
+    assert batch['errors'] == {}
+    assert set(batch['results']) == set(dashboard.BATCH_QUERIES)
+    for name, path in PANELS.items():
+        assert batch['results'][name] == data(client.get(path)), name
+    assert batch['results']['real-time'] == data(client.get('/api/v1/analytics/real-time'))
+
+
+def test_shared_datasets_are_loaded_once(app, client, park):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        client.get('/api/v1/dashboard/batch')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    latest = [s for s in statements if 'FROM real_time_stats ORDER BY real_time_stats.timestamp DESC' in s]
+    attraction_rows = [s for s in statements if 'FROM attraction_analytics' in s]
+    assert len(latest) == 1
+    assert len(attraction_rows) == 1
+
+
+def test_only_the_requested_panels_are_built(client, park):
+    batch = data(client.get('/api/v1/dashboard/batch?queries=real-time, overview,real-time'))
+
+    assert set(batch['results']) == {'real-time', 'overview'}
+
+
+def test_a_failing_panel_does_not_fail_the_others(client, park, monkeypatch):
+    def fail(data):
+        raise RuntimeError('payments unavailable')
+    monkeypatch.setitem(dashboard.BATCH_QUERIES, 'payment-trends', (fail, 'Failed to retrieve payment trends'))
+
+    batch = data(client.get('/api/v1/dashboard/batch?queries=payment-trends,overview'))
+
+    assert batch['errors'] == {
+        'payment-trends': {'code': 'INTERNAL_ERROR', 'message': 'Failed to retrieve payment trends'}
+    }
+    assert batch['results']['overview']['summary']['total_visitors_today'] == 30
+
+
+def test_since_is_passed_to_the_attraction_status(client, park):
+    batch = data(client.get('/api/v1/dashboard/batch?queries=attractions-status&since=0'))
+
+    status = batch['results']['attractions-status']
+    assert status['full_sync'] is True
+    assert [attraction['attraction_id'] for attraction in status['attractions']] == ['wheel', 'coaster']
+
+
+@pytest.mark.parametrize('query,code', [
+    ('queries=overview,forecast', 'INVALID_PARAMETER'),
+    ('since=yesterday', 'INVALID_WATERMARK'),
+])
+def test_invalid_parameters_are_rejected(client, query, code):
+    response = client.get(f'/api/v1/dashboard/batch?{query}')
+
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == code
@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta
+import pytest
+from src.models.analytics import db, OperationalMetrics
+from src.services.delta import next_watermark, parse_watermark
+
+
+def add_hour(day, hour, updated_at, visitors=10):
+    metric = OperationalMetrics(metric_date=day, metric_hour=hour, total_visitors=visitors)
+    db.session.add(metric)
+    db.session.flush()
+    metric.updated_at = updated_at
+    db.session.commit()
+    return metric
+
+
+def fetch(client, since):
+    day = date.today().isoformat()
+    return client.get(f'/api/v1/analytics/operational-metrics?start_date={day}&end_date={day}&since={since}')
+
+
+def test_parse_watermark():
+    assert parse_watermark(None) is None
+    assert parse_watermark(' 0 ') is None
+    assert parse_watermark('2026-01-02T03:04:05') == datetime(2026, 1, 2, 3, 4, 5)
+    with pytest.raises(ValueError):
+        parse_watermark('yesterday')
+
+
+def test_watermark_trails_the_clock_by_the_settle_window():
+    before = datetime.utcnow()
+    watermark = datetime.fromisoformat(next_watermark(None, 10))
+
+    assert before - timedelta(seconds=11) < watermark <= before - timedelta(seconds=9)
+    # Never moves a client's watermark backwards
+    future = datetime.utcnow() + timedelta(hours=1)
+    assert next_watermark(future, 10) == future.isoformat()
+
+
+def test_operational_metrics_returns_only_rows_changed_after_the_watermark(client):
+    now = datetime.utcnow()
+    today = date.today()
+    add_hour(today, 9, now - timedelta(hours=2))
+    add_hour(today, 10, now - timedelta(minutes=5), visitors=25)
+
+    full = fetch(client, '0').get_json()['data']
+    assert full['full_sync'] is True
+    assert [row['metric_hour'] for row in full['hourly_data']] == [9, 10]
+
+    since = (now - timedelta(hours=1)).isoformat()
+    delta = fetch(client, since).get_json()['data']
+    assert delta['full_sync'] is False
+    assert [(row['metric_hour'], row['total_visitors']) for row in delta['hourly_data']] == [(10, 25)]
+
+
+def test_invalid_watermark_is_rejected(client):
+    response = fetch(client, 'not-a-time')
+
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'INVALID_WATERMARK'
@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from src.models.analytics import db, OperationalMetrics
+from src.services.downsampling import downsample, lttb_indices
+
+
+def reference_lttb(x, y, max_points):
+    """LTTB written point by point, over the same buckets"""
+    n = len(y)
+    buckets = max_points - 2
+    edges = [int(edge) for edge in np.linspace(1, n - 1, buckets + 1)]
+    kept = [0]
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < buckets:
+            following = range(edges[bucket + 1], edges[bucket + 2])
+            mean_x = sum(x[i] for i in following) / len(following)
+            mean_y = sum(y[i] for i in following) / len(following)
+        else:
+            mean_x, mean_y = x[-1], y[-1]
+        px, py = x[kept[-1]], y[kept[-1]]
+        areas = [abs((px - mean_x) * (y[i] - py) - (px - x[i]) * (mean_y - py)) for i in range(start, end)]
+        kept.append(start + areas.index(max(areas)))
+    return kept + [n - 1]
+
+
+def series(values):
+    return [{'period': n, 'visitors': value} for n, value in enumerate(values)]
+
+
+@pytest.mark.parametrize('max_points', [None, 5, 6])
+def test_series_that_fit_are_returned_unchanged(max_points):
+    points = series([3, 1, 4, 1, 5])
+
+    assert downsample(points, max_points, 'visitors') == (points, None)
+
+
+@pytest.mark.parametrize('max_points', [0, 1, 2])
+def test_too_few_points_to_keep_both_ends_leave_the_series_alone(max_points):
+    points = series(range(10))
+
+    assert list(lttb_indices(range(10), max_points)) == list(range(10))
+    assert downsample(points, max_points, 'visitors') == (points, None)
+
+
+def test_ends_and_peaks_are_kept():
+    values = [10] * 1000
+    values[437], values[812] = 900, -50
+    points = series(values)
+
+    kept, downsampling = downsample(points, 20, 'visitors')
+
+    assert downsampling == {'method': 'lttb', 'metric': 'visitors', 'points': 20, 'source_points': 1000}
+    assert kept[0] is points[0] and kept[-1] is points[-1]
+    assert {point['visitors'] for point in kept} == {10, 900, -50}
+
+
+@pytest.mark.parametrize('n,max_points', [(100, 3), (1000, 37), (5000, 200), (7, 6)])
+def test_matches_a_point_by_point_implementation(n, max_points):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.integers(1, 5, n)).astype(float)
+    y = rng.normal(size=n).cumsum()
+
+    assert list(lttb_indices(y, max_points, x)) == reference_lttb(list(x), list(y), max_points)
+
+
+def test_missing_values_count_as_zero():
+    points = series([5, None, 7, None, 9, 8])
+
+    kept, _ = downsample(points, 4, 'visitors')
+
+    assert len(kept) == 4
+
+
+def test_routes_downsample_and_reject_too_small_limits(app, client):
+    first = date(2026, 9, 1)
+    for n in range(240):
+        db.session.add(OperationalMetrics(
+            metric_date=first + timedelta(days=n // 24), metric_hour=n % 24, total_visitors=5000 if n == 100 else n % 7
+        ))
+    db.session.commit()
+    path = f'/api/v1/analytics/operational-metrics?start_date={first}&end_date={first + timedelta(days=9)}'
+
+    data = client.get(f'{path}&max_points=24').get_json()['data']
+    assert len(data['hourly_data']) == 24 and data['downsampling']['source_points'] == 240
+    assert max(hour['total_visitors'] for hour in data['hourly_data']) == 5000
+    assert data['summary']['total_visitors'] == sum(5000 if n == 100 else n % 7 for n in range(240))
+
+    assert 'downsampling' not in client.get(f'{path}&max_points=500').get_json()['data']
+    response = client.get(f'{path}&max_points=2')
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'INVALID_PARAMETER'
@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta
+import pytest
+from src.models.analytics import AttractionAnalytics, EtlWatermark, OperationalMetrics
+from src.models.sources import attraction_queue, attractions, entry_logs
+from src.services import etl
+from src.services.attractions import current_attractions
+from src.services.etl import run_batch, run_stream
+
+DAY = date.today() - timedelta(days=1)
+OPENING = datetime.combine(DAY, datetime.min.time()).replace(hour=9)
+
+
+def add_entries(source, times, valid=True, first_id=0):
+    with source.begin() as connection:
+        connection.execute(entry_logs.insert(), [
+            {'entry_id': f'e{first_id + n:06d}', 'entry_timestamp': timestamp, 'is_valid_entry': valid}
+            for n, timestamp in enumerate(times)
+        ])
+
+
+def visitors_per_hour():
+    return {
+        row.metric_hour: row.total_visitors
+        for row in OperationalMetrics.query.filter_by(metric_date=DAY).order_by(OperationalMetrics.metric_hour)
+    }
+
+
+def test_entries_are_counted_per_hour(source):
+    add_entries(source, [OPENING + timedelta(minutes=10 * n) for n in range(9)])
+    add_entries(source, [OPENING], valid=False, first_id=100)
+
+    assert run_stream('entry_logs', settle_seconds=0) == 10
+
+    assert visitors_per_hour() == {9: 6, 10: 3}
+
+
+def test_batches_split_on_equal_timestamps_apply_every_event_once(source):
+    # Ten entries share each timestamp, so batch boundaries fall between equal timestamps
+    add_entries(source, [OPENING + timedelta(minutes=n // 10) for n in range(95)])
+
+    assert run_stream('entry_logs', batch_size=7, settle_seconds=0) == 95
+    assert run_stream('entry_logs', batch_size=7, settle_seconds=0) == 0
+
+    assert visitors_per_hour() == {9: 95}
+    assert EtlWatermark.query.filter_by(stream='entry_logs').one().events_processed == 95
+
+
+def test_a_failed_batch_is_rolled_back_and_applied_once_on_retry(source, monkeypatch):
+    add_entries(source, [OPENING + timedelta(minutes=n) for n in range(30)])
+    run_batch('entry_logs', batch_size=10, settle_seconds=0)
+    add_entries(source, [OPENING + timedelta(minutes=90)], first_id=200)
+
+    def crash(connection, source, totals):
+        apply_entries(connection, source, totals)
+        raise RuntimeError('killed after writing the hourly rows')
+    apply_entries = etl.STREAMS['entry_logs']['apply']
+    monkeypatch.setitem(etl.STREAMS['entry_logs'], 'apply', crash)
+    with pytest.raises(RuntimeError):
+        run_batch('entry_logs', batch_size=10, settle_seconds=0)
+    monkeypatch.undo()
+
+    assert visitors_per_hour() == {9: 10}
+    run_stream('entry_logs', batch_size=10, settle_seconds=0)
+    assert visitors_per_hour() == {9: 30, 10: 1}
+
+
+def test_recent_events_wait_for_the_settle_window(source):
+    now = datetime.now()
+    add_entries(source, [now - timedelta(minutes=5), now - timedelta(seconds=1)])
+
+    assert run_stream('entry_logs', settle_seconds=30) == 1
+    assert run_stream('entry_logs', settle_seconds=0) == 1
+
+
+def test_queue_events_become_attraction_hours(source):
+    with source.begin() as connection:
+        connection.execute(attractions.insert(), [
+            {'attraction_id': 'coaster', 'name': 'Coaster', 'max_capacity': 20, 'duration_minutes': 6}
+        ])
+        connection.execute(attraction_queue.insert(), [
+            {
+                'queue_id': f'q{n:03d}', 'attraction_id': 'coaster', 'estimated_wait_time': 15,
+                'joined_at': None if n == 0 else OPENING + timedelta(minutes=n) - timedelta(minutes=wait),
+                'served_at': OPENING + timedelta(minutes=n)
+            }
+            for n, wait in enumerate([0, 10, 20, 30])
+        ])
+
+    assert run_stream('attraction_queue', settle_seconds=0) == 4
+
+    row = AttractionAnalytics.query.one()
+    assert current_attractions().get(row.attraction_key).name == 'Coaster'
+    assert (row.hour, row.total_visitors, row.average_wait_time, row.max_wait_time) == (9, 4, 19, 30)
+    # 20 riders per 6-minute cycle: 200 riders an hour
+    assert float(row.capacity_utilization) == 2.0
+    assert OperationalMetrics.query.one().average_wait_time == 19
@@ -0,0 +1,95 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+import pytest
+from src.models.analytics import db, OperationalMetrics
+from src.services.forecasting import ForecastCache, SeasonalModel, hour_index
+
+START = hour_index(date(2026, 6, 1), 0)
+
+
+def seasonal_series(hours):
+    """Daily shape, a weekend bump and a trend of one visitor per day"""
+    hours = np.asarray(hours)
+    day_of_week = (hours // 24 + 3) % 7
+    return 50 + 10 * np.sin(hours % 24 / 24 * 2 * np.pi) + 20 * (day_of_week >= 5) + (hours - START) / 24.0
+
+
+def test_model_recovers_a_seasonal_series_with_trend():
+    hours = list(range(START, START + 8 * 168))
+    model = SeasonalModel(START)
+    model.observe(hours, seasonal_series(hours).tolist())
+
+    ahead = np.arange(hours[-1] + 1, hours[-1] + 49)
+    forecast = model.predict(ahead)
+
+    assert [point['value'] for point in forecast] == pytest.approx(seasonal_series(ahead).tolist(), abs=0.05)
+    assert all(point['upper'] - point['lower'] < 0.1 for point in forecast)
+
+
+def test_revised_hours_replace_their_old_value():
+    hours = list(range(START, START + 2 * 168))
+    values = seasonal_series(hours).tolist()
+    revised = SeasonalModel(START)
+    revised.observe(hours, [0.0] * len(hours))
+    revised.observe(hours, values)
+    fresh = SeasonalModel(START)
+    fresh.observe(hours, values)
+
+    ahead = range(hours[-1] + 1, hours[-1] + 25)
+
+    assert revised.predict(ahead) == fresh.predict(ahead)
+
+
+def test_hours_of_the_week_never_observed_are_skipped():
+    model = SeasonalModel(START)
+    assert model.predict([START]) == []
+    # Only mornings observed
+    hours = [START + day * 24 + hour for day in range(14) for hour in range(8, 12)]
+    model.observe(hours, [100.0] * len(hours))
+
+    forecast = model.predict(range(START + 14 * 24, START + 15 * 24))
+
+    assert [datetime.fromisoformat(point['timestamp']).hour for point in forecast] == [8, 9, 10, 11]
+
+
+def add_hours(days, visitors, updated_at=None):
+    today = date.today()
+    rows = []
+    for offset in range(days, 0, -1):
+        for hour in range(24):
+            rows.append(OperationalMetrics(
+                metric_date=today - timedelta(days=offset), metric_hour=hour, total_visitors=visitors
+            ))
+    db.session.add_all(rows)
+    db.session.flush()
+    if updated_at:
+        for row in rows:
+            row.updated_at = updated_at
+    db.session.commit()
+    return rows
+
+
+def test_cache_folds_in_rows_changed_since_the_last_refresh(app):
+    rows = add_hours(14, 100, updated_at=datetime.utcnow() - timedelta(hours=1))
+    cache = ForecastCache(history_days=30, settle_seconds=0)
+    cache.refresh()
+    next_hour = hour_index(date.today() + timedelta(days=1), 12)
+    assert cache.forecast(next_hour, 1)['visitors'][0]['value'] == pytest.approx(100, abs=0.5)
+
+    for row in rows:
+        row.total_visitors = 300
+    db.session.commit()
+    cache.refresh()
+
+    assert cache.forecast(next_hour, 1)['visitors'][0]['value'] == pytest.approx(300, abs=0.5)
+
+
+def test_forecast_endpoint(client):
+    add_hours(14, 80)
+
+    response = client.get('/api/v1/analytics/forecast?days=1')
+
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert len(data['visitors']) == 24
+    assert all(point['lower'] <= point['value'] <= point['upper'] for point in data['visitors'])
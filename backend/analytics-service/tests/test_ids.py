@@ -0,0 +1,88 @@
+import sqlite3
+import uuid
+from datetime import date
+import pytest
+from src.main import create_app
+from src.models.analytics import db, VisitorAnalytics
+from src.models.keys import id_from_bytes, id_to_bytes, new_id, set_id_storage
+from src.models.migrations import convert_id_storage, stored_id_storages
+
+
+@pytest.fixture
+def database(tmp_path):
+    yield tmp_path / 'analytics.db'
+    set_id_storage('text')
+
+
+def open_app(database, storage):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+        'ANALYTICS_MIGRATE_ON_START': True,
+        'ANALYTICS_ID_STORAGE': storage,
+    })
+
+
+def stored_ids(database):
+    with sqlite3.connect(database) as connection:
+        return connection.execute('SELECT typeof(id), id FROM visitor_analytics ORDER BY user_id').fetchall()
+
+
+def test_new_ids_are_time_ordered_uuids():
+    ids = [new_id() for _ in range(50)]
+
+    assert all(uuid.UUID(value).version == 7 for value in ids)
+    # The first 48 bits are milliseconds, so ids of later milliseconds sort after earlier ones
+    assert [value[:13] for value in ids] == sorted(value[:13] for value in ids)
+    assert id_from_bytes(id_to_bytes(ids[0])) == ids[0]
+
+
+def test_ids_round_trip_through_binary_and_back(database):
+    app = open_app(database, 'text')
+    with app.app_context():
+        db.session.add_all(VisitorAnalytics(user_id=f'user-{n}', visit_date=date(2026, 5, n + 1)) for n in range(3))
+        db.session.commit()
+        ids = [row.id for row in VisitorAnalytics.query.order_by(VisitorAnalytics.user_id)]
+        engine, metadata = db.engine, db.metadata
+        db.session.remove()
+        engine.dispose()
+
+        converted = convert_id_storage(engine, metadata, storage='binary', batch_size=2)
+
+        assert ('visitor_analytics', 3) in [(table, rows) for _, table, rows in converted]
+        assert stored_ids(database) == [('blob', id_to_bytes(value)) for value in ids]
+        assert stored_id_storages(engine, metadata)['visitor_analytics'] == 'binary'
+        # A second run finds nothing left to convert
+        assert convert_id_storage(engine, metadata, storage='binary') == []
+
+    app = open_app(database, 'binary')
+    with app.app_context():
+        assert [row.id for row in VisitorAnalytics.query.order_by(VisitorAnalytics.user_id)] == ids
+        db.session.add(VisitorAnalytics(user_id='user-3', visit_date=date(2026, 5, 4)))
+        db.session.commit()
+        ids.append(VisitorAnalytics.query.filter_by(user_id='user-3').one().id)
+        engine = db.engine
+        db.session.remove()
+        engine.dispose()
+
+        convert_id_storage(engine, db.metadata, storage='text')
+
+    assert stored_ids(database) == [('text', value) for value in ids]
+
+
+def test_conversion_of_a_table_with_a_bad_id_rolls_back(database):
+    app = open_app(database, 'text')
+    with app.app_context():
+        db.session.execute(VisitorAnalytics.__table__.insert(), [
+            {'id': new_id(), 'user_id': 'good', 'visit_date': date(2026, 5, 1)},
+            {'id': 'not-a-uuid', 'user_id': 'zbad', 'visit_date': date(2026, 5, 1)},
+        ])
+        db.session.commit()
+        engine = db.engine
+        db.session.remove()
+        engine.dispose()
+
+        with pytest.raises(ValueError, match='not a UUID'):
+            convert_id_storage(engine, db.metadata, storage='binary')
+
+    assert [kind for kind, _ in stored_ids(database)] == ['text', 'text']
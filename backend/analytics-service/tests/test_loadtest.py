@@ -0,0 +1,67 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import pytest
+from werkzeug.serving import make_server
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def loadtest():
+    spec = importlib.util.spec_from_file_location('loadtest', os.path.join(SERVICE_DIR, 'benchmarks', 'loadtest.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def result(at, latency, outcome='ok'):
+    return {'route': 'a', 'at': at, 'done': at + latency, 'latency': latency, 'service': latency, 'outcome': outcome, 'bytes': 0}
+
+
+def test_curve_is_interpolated_between_hours_and_clamped(loadtest):
+    curve = {8: 0.2, 9: 1.0, 10: 0.6}
+
+    assert loadtest.curve_at(curve, 8.5) == pytest.approx(0.6)
+    assert loadtest.curve_at(curve, 9.75) == pytest.approx(0.7)
+    assert (loadtest.curve_at(curve, 6), loadtest.curve_at(curve, 23)) == (0.2, 0.6)
+
+
+def test_flat_routes_keep_their_rate_all_day(loadtest):
+    test = loadtest.LoadTest('http://127.0.0.1:1', [
+        {'name': 'a', 'path': '/a', 'weight': 3}, {'name': 'b', 'path': '/b', 'weight': 1, 'curve': False}
+    ], {8: 0.5, 9: 1.0}, peak_rps=40, duration=10)
+
+    assert test._rates(0)[0] == [15.0, 10.0]
+    assert test._rates(10)[0] == [30.0, 10.0]
+
+
+def test_the_first_window_over_the_latency_objective_is_reported_as_saturation(loadtest):
+    test = loadtest.LoadTest('http://127.0.0.1:1', [{'name': 'a', 'path': '/a', 'weight': 1}],
+                             {8: 1.0, 9: 1.0, 10: 1.0}, peak_rps=10, duration=2, slo_ms=100)
+    test.results = [result(n / 10, 0.01) for n in range(10)] + [result(1 + n / 10, 0.5) for n in range(9)]
+
+    report = test.report(2)
+
+    assert [window['saturated'] for window in report['windows']] == [False, True]
+    assert report['saturated_at_park_hour'] == pytest.approx(9.5)
+    assert report['max_sustained_rps'] == pytest.approx(10)
+
+
+def test_a_short_run_against_a_local_app(loadtest, app):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        test = loadtest.LoadTest(f'http://127.0.0.1:{server.port}', [
+            {'name': 'health', 'path': '/health', 'weight': 1},
+            {'name': 'feedback', 'method': 'POST', 'path': '/api/v1/analytics/feedback', 'weight': 1, 'body': 'feedback'},
+        ], {8: 1.0, 9: 1.0}, peak_rps=20, duration=1, connections=4)
+        elapsed = asyncio.run(test.run())
+    finally:
+        server.shutdown()
+
+    report = test.report(elapsed)
+    assert report['total']['requests'] > 0
+    assert report['total']['error_rate'] == 0
@@ -0,0 +1,63 @@
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import inspect, text
+from src.models.analytics import db, PaymentAnalytics, VisitorAnalytics
+from src.models.migrations import upgrade_schema
+from src.models.money import average_cents, from_cents, to_cents
+
+DAY = date(2026, 6, 1)
+
+
+def test_cents_conversions_round_half_up():
+    assert to_cents('12.345') == 1235
+    assert to_cents(Decimal('-0.005')) == -1
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents(None) is None
+    assert from_cents(1250) == 12.5
+    assert average_cents(1001, 2) == 501
+    assert average_cents(1000, 3) == 333
+    assert average_cents(5, 0) == 0
+
+
+def test_upgrade_moves_decimal_amounts_into_cents_columns(app):
+    with db.engine.begin() as connection:
+        connection.execute(text('ALTER TABLE visitor_analytics DROP COLUMN total_spending_cents'))
+        connection.execute(text('ALTER TABLE visitor_analytics ADD COLUMN total_spending NUMERIC(10, 2)'))
+        connection.execute(text('ALTER TABLE payment_analytics DROP COLUMN total_amount_cents'))
+        connection.execute(text('ALTER TABLE payment_analytics DROP COLUMN average_transaction_amount_cents'))
+        connection.execute(text('ALTER TABLE payment_analytics ADD COLUMN total_amount NUMERIC(12, 2)'))
+        connection.execute(text('ALTER TABLE payment_analytics ADD COLUMN average_transaction_amount NUMERIC(10, 2)'))
+        connection.execute(text(
+            "INSERT INTO visitor_analytics (id, visit_date, user_id, total_spending) VALUES "
+            "('00000000-0000-7000-8000-000000000001', '2026-06-01', 'a', 19.99), "
+            "('00000000-0000-7000-8000-000000000002', '2026-06-01', 'b', 0.1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO payment_analytics (id, date, hour, payment_method, transaction_count, total_amount, "
+            "average_transaction_amount) VALUES ('00000000-0000-7000-8000-000000000003', '2026-06-01', 10, 'CASH', 3, "
+            "1234.56, 411.52)"
+        ))
+    db.session.remove()
+
+    upgrade_schema(db)
+
+    spending = dict(db.session.query(VisitorAnalytics.user_id, VisitorAnalytics.total_spending_cents))
+    assert spending == {'a': 1999, 'b': 10}
+    payment = PaymentAnalytics.query.one()
+    assert (payment.total_amount_cents, payment.average_transaction_amount_cents) == (123456, 41152)
+    assert payment.to_dict()['total_amount'] == 1234.56
+    columns = {column['name'] for column in inspect(db.engine).get_columns('payment_analytics')}
+    assert not columns & {'total_amount', 'average_transaction_amount'}
+
+
+def test_revenue_sums_are_exact(client):
+    db.session.add_all(
+        PaymentAnalytics(date=DAY, hour=hour, payment_method='CASH', transaction_count=1, total_amount_cents=10)
+        for hour in range(10)
+    )
+    db.session.commit()
+
+    response = client.get(f'/api/v1/analytics/payments?start_date={DAY}&end_date={DAY}')
+
+    # Ten 0.10 amounts summed as floats would give 0.9999999999999999
+    assert response.get_json()['data']['summary']['total_amount'] == 1.0
@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+import pytest
+from src.main import create_app
+from src.models.analytics import db, OperationalMetrics
+from src.services.archive import fetch_range
+from src.services.partitioning import month_start
+
+# More months than SQLite can ATTACH to one connection
+MONTHS = 12
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'analytics.db'}",
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+        'ANALYTICS_PARTITION_DIR': str(tmp_path / 'partitions'),
+        'ANALYTICS_MIGRATE_ON_START': True,
+    })
+    with app.app_context():
+        yield app
+        app.extensions['partitions']._dispose()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def partitions(app):
+    return app.extensions['partitions']
+
+
+def past_months():
+    month = month_start(date.today())
+    months = []
+    for _ in range(MONTHS):
+        month = month_start(month - timedelta(days=1))
+        months.append(month)
+    return sorted(months)
+
+
+def seal_months(partitions):
+    months = past_months()
+    for month in months:
+        db.session.add(OperationalMetrics(metric_date=month + timedelta(days=4), metric_hour=10, total_visitors=month.month))
+    db.session.commit()
+    for month in months:
+        partitions.create_partition(month)
+    return months
+
+
+def operational_row(day, visitors):
+    return {'metric_date': day, 'metric_hour': 10, 'total_visitors': visitors}
+
+
+def test_reads_cover_every_sealed_month(partitions):
+    months = seal_months(partitions)
+
+    rows = fetch_range(OperationalMetrics, months[0], date.today(), order_by=(OperationalMetrics.metric_date,))
+
+    assert [row.metric_date for row in rows] == [month + timedelta(days=4) for month in months]
+    assert db.session.query(OperationalMetrics).count() == 0
+
+
+def test_reads_open_only_the_months_in_range(partitions, monkeypatch):
+    months = seal_months(partitions)
+    opened = []
+    month_session = partitions.month_session
+    monkeypatch.setattr(partitions, 'month_session', lambda month: opened.append(month) or month_session(month))
+
+    rows = fetch_range(OperationalMetrics, months[3], months[3] + timedelta(days=10))
+
+    assert [row.total_visitors for row in rows] == [months[3].month]
+    assert opened == [months[3]]
+
+
+def test_orm_writes_to_a_sealed_month_are_rejected(partitions):
+    months = seal_months(partitions)
+
+    db.session.add(OperationalMetrics(metric_date=months[0] + timedelta(days=1), metric_hour=3, total_visitors=1))
+    with pytest.raises(ValueError, match='sealed partition'):
+        db.session.flush()
+    db.session.rollback()
+
+    # Rows of months that are not sealed are written as usual
+    db.session.add(OperationalMetrics(metric_date=date.today(), metric_hour=3, total_visitors=1))
+    db.session.commit()
+
+
+def test_upsert_rows_writes_into_the_month_file(partitions):
+    months = seal_months(partitions)
+    sealed_day = months[5] + timedelta(days=4)
+
+    partitions.upsert_rows(db.session.connection(), OperationalMetrics.__table__, [
+        operational_row(sealed_day, 500), operational_row(date.today(), 7)
+    ], ['total_visitors'])
+    db.session.commit()
+
+    assert db.session.query(OperationalMetrics.total_visitors).all() == [(7,)]
+    with partitions.month_session(months[5]) as session:
+        assert session.query(OperationalMetrics.total_visitors).all() == [(500,)]
+
+
+def test_detached_months_drop_out_of_reads_until_attached(partitions):
+    months = seal_months(partitions)
+
+    partitions.detach_partition(months[0])
+    assert len(fetch_range(OperationalMetrics, months[0], date.today())) == MONTHS - 1
+    assert partitions.sealed_month('operational_metrics', months[0]) is None
+
+    partitions.attach_partition(months[0])
+    assert len(fetch_range(OperationalMetrics, months[0], date.today())) == MONTHS
@@ -0,0 +1,83 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import update
+from src.models.analytics import PaymentAnalytics
+from src.models.sources import payment_methods, transactions
+from src.services import etl
+from src.services.etl import run_payments
+
+DAY = date.today() - timedelta(days=1)
+OPENING = datetime.combine(DAY, datetime.min.time()).replace(hour=9)
+
+
+def add_payments(source, payments):
+    with source.begin() as connection:
+        connection.execute(payment_methods.insert(), [
+            {'payment_method_id': 'card', 'method_type': 'CREDIT_CARD'},
+            {'payment_method_id': 'wallet', 'method_type': 'MOBILE_WALLET'},
+        ])
+        connection.execute(transactions.insert(), [
+            {
+                'transaction_id': f't{n:03d}', 'payment_method_id': method, 'amount': Decimal(amount), 'status': status,
+                'created_at': OPENING + timedelta(minutes=minute),
+                'completed_at': None if status == 'PENDING' else OPENING + timedelta(minutes=minute, seconds=2)
+            }
+            for n, (method, amount, status, minute) in enumerate(payments)
+        ])
+
+
+def payment_rows():
+    return {
+        (row.hour, row.payment_method): row
+        for row in PaymentAnalytics.query.filter_by(date=DAY)
+    }
+
+
+def test_transactions_become_hours_per_payment_method(source):
+    add_payments(source, [
+        ('card', '10.10', 'COMPLETED', 0),
+        ('card', '5.05', 'REFUNDED', 5),
+        ('card', '99.99', 'FAILED', 10),
+        ('card', '20.00', 'PENDING', 15),
+        ('wallet', '3.50', 'COMPLETED', 70),
+    ])
+
+    assert run_payments(settle_seconds=0) == 5
+
+    rows = payment_rows()
+    assert set(rows) == {(9, 'CREDIT_CARD'), (10, 'MOBILE_WALLET')}
+    card = rows[(9, 'CREDIT_CARD')]
+    assert (card.transaction_count, card.total_amount_cents, card.average_transaction_amount_cents) == (4, 1515, 758)
+    # The pending payment counts towards neither side
+    assert float(card.success_rate) == 66.67
+    assert card.average_processing_time_ms == 2000
+    assert rows[(10, 'MOBILE_WALLET')].total_amount_cents == 350
+
+
+def test_pending_payments_are_revised_once_they_resolve(app, source):
+    app.config['ETL_PAYMENT_REVISION_MINUTES'] = 3 * 24 * 60
+    add_payments(source, [('card', '10.00', 'COMPLETED', 0), ('card', '20.00', 'PENDING', 1)])
+    run_payments(settle_seconds=0)
+    assert payment_rows()[(9, 'CREDIT_CARD')].total_amount_cents == 1000
+
+    with source.begin() as connection:
+        connection.execute(update(transactions).where(transactions.c.transaction_id == 't001').values(
+            status='COMPLETED', completed_at=OPENING + timedelta(minutes=2)
+        ))
+    run_payments(settle_seconds=0)
+
+    card = payment_rows()[(9, 'CREDIT_CARD')]
+    assert (card.transaction_count, card.total_amount_cents, float(card.success_rate)) == (2, 3000, 100.0)
+
+
+def test_rebuilt_hours_replace_their_rows_across_chunks(app, source, monkeypatch):
+    app.config['ETL_PAYMENT_REVISION_MINUTES'] = 3 * 24 * 60
+    monkeypatch.setattr(etl, 'PAYMENT_CHUNK', timedelta(hours=1))
+    add_payments(source, [('card', '1.00', 'COMPLETED', 30 * n) for n in range(8)])
+
+    run_payments(settle_seconds=0)
+    run_payments(settle_seconds=0)
+
+    rows = payment_rows()
+    assert sorted(hour for hour, _ in rows) == [9, 10, 11, 12]
+    assert [rows[(hour, 'CREDIT_CARD')].transaction_count for hour in range(9, 13)] == [2, 2, 2, 2]
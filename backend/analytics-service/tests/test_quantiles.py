@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+from src.models.analytics import db, QuantileSketch
+from src.models.sources import attraction_queue
+from src.services.etl import rebuild_wait_sketches, run_stream
+from src.services.quantiles import QUANTILE_RELATIVE_ACCURACY, REPORTED_QUANTILES, DDSketch, percentiles, wait_time_sketches
+
+DAY = date.today() - timedelta(days=1)
+HOUR = datetime.combine(DAY, datetime.min.time()).replace(hour=10)
+
+
+def exact_quantile(values, q):
+    return np.sort(values)[int(q * (len(values) - 1))]
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    values = np.random.default_rng(7).lognormal(mean=2.5, sigma=1.0, size=20000)
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+
+    for _, q in REPORTED_QUANTILES + (('p999', 0.999),):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= QUANTILE_RELATIVE_ACCURACY * exact * 1.0001
+
+
+def test_merged_sketches_equal_one_built_from_all_values():
+    first, second, both = DDSketch(), DDSketch(), DDSketch()
+    for value in range(0, 500):
+        (first if value % 3 else second).add(value)
+        both.add(value)
+
+    merged = DDSketch.from_bytes(first.to_bytes()).merge(DDSketch.from_bytes(second.to_bytes()))
+
+    assert merged.bins == both.bins and merged.zero_count == both.zero_count == 1
+    assert percentiles(merged) == percentiles(both)
+    assert percentiles(None) == {'p50': None, 'p90': None, 'p99': None}
+
+
+def add_riders(source, waits, attraction_id='coaster'):
+    with source.begin() as connection:
+        start = connection.execute(select(func.count()).select_from(attraction_queue)).scalar()
+        connection.execute(attraction_queue.insert(), [
+            {
+                'queue_id': f'q{start + n:06d}', 'attraction_id': attraction_id, 'estimated_wait_time': 10,
+                'joined_at': HOUR + timedelta(seconds=10 * (start + n)) - timedelta(minutes=wait),
+                'served_at': HOUR + timedelta(seconds=10 * (start + n))
+            }
+            for n, wait in enumerate(waits)
+        ])
+
+
+def wait_percentiles():
+    return percentiles(wait_time_sketches(DAY, DAY).get('coaster'))
+
+
+def test_etl_sketches_every_riders_wait(source):
+    # The hourly mean is 14.5 minutes; the tail is the 10 riders who waited 100
+    add_riders(source, [5] * 90 + [100] * 10)
+
+    run_stream('attraction_queue', settle_seconds=0)
+
+    result = wait_percentiles()
+    assert result['p50'] == pytest.approx(5, rel=QUANTILE_RELATIVE_ACCURACY)
+    assert result['p99'] == pytest.approx(100, rel=QUANTILE_RELATIVE_ACCURACY)
+    assert QuantileSketch.query.one().sample_count == 100
+
+
+def test_later_batches_merge_into_the_hour(source):
+    add_riders(source, [5] * 50)
+    run_stream('attraction_queue', settle_seconds=0)
+    add_riders(source, [60] * 50)
+
+    run_stream('attraction_queue', batch_size=20, settle_seconds=0)
+    run_stream('attraction_queue', settle_seconds=0)
+
+    assert QuantileSketch.query.one().sample_count == 100
+    assert wait_percentiles()['p90'] == pytest.approx(60, rel=QUANTILE_RELATIVE_ACCURACY)
+
+
+def test_bulk_upserts_leave_the_sketch_alone(client, source):
+    add_riders(source, [5] * 90 + [100] * 10)
+    run_stream('attraction_queue', settle_seconds=0)
+    before = QuantileSketch.query.one().sketch
+
+    response = client.post('/api/v1/analytics/attractions/bulk', json=[
+        {'attraction_id': 'coaster', 'date': DAY.isoformat(), 'hour': 10, 'average_wait_time': 30, 'total_visitors': 500}
+    ])
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert QuantileSketch.query.one().sketch == before
+
+
+def test_rebuild_recomputes_only_applied_events(source):
+    add_riders(source, [5] * 90 + [100] * 10)
+    run_stream('attraction_queue', settle_seconds=0)
+    before = wait_percentiles()
+    # Not applied by the ETL yet
+    add_riders(source, [200] * 10)
+
+    assert rebuild_wait_sketches(DAY, DAY) == 100
+
+    assert wait_percentiles() == before
+    run_stream('attraction_queue', settle_seconds=0)
+    assert QuantileSketch.query.one().sample_count == 110
@@ -0,0 +1,65 @@
+from datetime import datetime
+import pytest
+from src.main import create_app
+from src.models.analytics import db, RealTimeStats
+from src.models.routing import replica_router
+
+
+def make_app(tmp_path, replica_uri):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'analytics.db'}",
+        'SQLALCHEMY_REPLICA_URI': replica_uri,
+        'REPLICA_CHECK_INTERVAL_SECONDS': 0,
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+        'ANALYTICS_MIGRATE_ON_START': True,
+    })
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    app = make_app(tmp_path, f"sqlite:///{tmp_path / 'replica.db'}")
+    with app.app_context():
+        db.metadata.create_all(replica_router.engine)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def add_stats(engine, visitors):
+    with engine.begin() as connection:
+        connection.execute(RealTimeStats.__table__.insert(), {
+            'id': f'{visitors:032x}', 'timestamp': datetime.utcnow(), 'current_visitors': visitors
+        })
+
+
+def current_visitors(client):
+    response = client.get('/api/v1/analytics/real-time')
+    return response.headers.get('X-Read-Source'), response.get_json()['data']['current_visitors']
+
+
+def test_get_requests_read_from_the_replica(replica_app):
+    add_stats(db.engine, 10)
+    add_stats(replica_router.engine, 20)
+
+    assert current_visitors(replica_app.test_client()) == ('replica', 20)
+
+
+def test_writes_go_to_the_primary(replica_app):
+    response = replica_app.test_client().post('/api/v1/dashboard/update-real-time', json={'current_visitors': 42})
+
+    assert response.status_code == 200
+    assert db.session.query(RealTimeStats.current_visitors).all() == [(42,)]
+    with replica_router.engine.connect() as connection:
+        assert connection.execute(RealTimeStats.__table__.select()).all() == []
+
+
+def test_unreachable_replica_falls_back_to_the_primary(tmp_path):
+    app = make_app(tmp_path, f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    with app.app_context():
+        add_stats(db.engine, 10)
+
+        assert current_visitors(app.test_client()) == ('primary', 10)
+        assert replica_router.status()['healthy'] is False
+        db.session.remove()
+        db.engine.dispose()
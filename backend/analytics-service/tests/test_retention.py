@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+from src.models.analytics import db, RealTimeStats, RealTimeStatsMinute, RealTimeStatsHour
+from src.models.migrations import upgrade_schema
+from src.services.retention import compact_real_time_stats, summarize_real_time_window
+
+NOW = datetime(2026, 10, 19, 12, 0, 0)
+RAW_RETENTION = timedelta(hours=1)
+MINUTE_RETENTION = timedelta(days=1)
+
+
+def add_snapshots(minute, values):
+    # Core insert, since the ORM would replace None by the column default
+    db.session.execute(RealTimeStats.__table__.insert(), [
+        {'timestamp': minute + timedelta(seconds=second), 'current_visitors': 100, 'api_response_time_ms': value}
+        for second, value in enumerate(values)
+    ])
+    db.session.commit()
+
+
+def test_averages_skip_samples_without_a_value(app):
+    minute = NOW - timedelta(hours=3)
+    add_snapshots(minute, [10, None, None, 20])
+
+    compact_real_time_stats(RAW_RETENTION, MINUTE_RETENTION, batch_size=3, now=NOW)
+
+    bucket = RealTimeStatsMinute.query.one()
+    assert bucket.sample_count == 4
+    assert bucket.api_response_time_ms_count == 2
+    assert bucket.api_response_time_ms_avg == pytest.approx(15)
+    assert (bucket.api_response_time_ms_min, bucket.api_response_time_ms_max) == (10, 20)
+    assert bucket.current_visitors_avg == pytest.approx(100)
+
+
+def test_hour_rollup_keeps_the_weights(app):
+    old = NOW - timedelta(days=2)
+    add_snapshots(old, [10, None])
+    add_snapshots(old + timedelta(minutes=1), [40, 40, 40])
+
+    result = compact_real_time_stats(RAW_RETENTION, MINUTE_RETENTION, now=NOW)
+
+    assert result['raw_rows_compacted'] == 5
+    assert RealTimeStats.query.count() == 0
+    assert RealTimeStatsMinute.query.count() == 0
+    bucket = RealTimeStatsHour.query.one()
+    assert bucket.sample_count == 5
+    assert bucket.api_response_time_ms_avg == pytest.approx(32.5)
+
+
+def test_summary_combines_tiers_by_samples_with_a_value(app):
+    add_snapshots(NOW - timedelta(hours=2), [10, None, None])
+    compact_real_time_stats(RAW_RETENTION, MINUTE_RETENTION, now=NOW)
+    add_snapshots(NOW - timedelta(minutes=10), [30, None])
+
+    summary = summarize_real_time_window(NOW - timedelta(hours=3), RAW_RETENTION, MINUTE_RETENTION, now=NOW)
+
+    assert summary['count'] == 5
+    assert summary['averages']['api_response_time_ms'] == pytest.approx(20)
+    assert summary['averages']['current_visitors'] == pytest.approx(100)
+
+
+def test_upgrade_backfills_counts_of_existing_buckets(app):
+    db.session.add(RealTimeStatsMinute(bucket_start=NOW, sample_count=6, api_response_time_ms_avg=12.0))
+    db.session.commit()
+    with db.engine.begin() as connection:
+        connection.execute(text('ALTER TABLE real_time_stats_minute DROP COLUMN api_response_time_ms_count'))
+        connection.execute(text('ALTER TABLE real_time_stats_minute DROP COLUMN cache_hit_rate_count'))
+    db.session.remove()
+
+    upgrade_schema(db)
+
+    bucket = RealTimeStatsMinute.query.one()
+    assert bucket.api_response_time_ms_count == 6
+    assert bucket.cache_hit_rate_count == 0
@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import pytest
+from src.models.analytics import db, AttractionAnalytics, OperationalMetrics, VisitorAnalytics
+from src.services.attractions import register_attractions
+from src.services.rollups import QueryPlanner, refresh_rollups
+
+FIRST = date(2026, 6, 1)
+DAYS = 75
+RANGE = f'start_date={FIRST.isoformat()}&end_date={(FIRST + timedelta(days=DAYS - 1)).isoformat()}'
+
+
+def use_planner(app, max_rows):
+    """Raw rows while the range fits `max_rows`; a tier otherwise"""
+    app.extensions['query_planner'] = QueryPlanner(max_rows=max_rows)
+
+
+def fill():
+    keys = register_attractions(db.session.connection(), {'coaster': {'name': 'Coaster'}, 'wheel': {'name': 'Wheel'}})
+    for n in range(DAYS):
+        day = FIRST + timedelta(days=n)
+        for hour in range(9, 21):
+            db.session.add(OperationalMetrics(
+                metric_date=day, metric_hour=hour, total_visitors=100 + n * 7 + hour, total_revenue_cents=12345 + n,
+                average_wait_time=(n + hour) % 40, peak_capacity_percentage=Decimal('81.25'),
+                system_uptime_percentage=Decimal('99.50'), customer_satisfaction_avg=Decimal('4.20'), error_count=n % 3
+            ))
+            for name, key in keys.items():
+                db.session.add(AttractionAnalytics(
+                    attraction_key=key, date=day, hour=hour, total_visitors=20 + (n + hour) % 13,
+                    average_wait_time=hour, max_wait_time=hour + n % 17, capacity_utilization=0.75,
+                    revenue_generated_cents=1505
+                ))
+        for visit in range(5):
+            db.session.add(VisitorAnalytics(
+                visit_date=day, entry_time=datetime(day.year, day.month, day.day, 9 + visit),
+                user_id=f'user-{visit}', total_duration_minutes=30 * visit, total_spending_cents=999 * visit,
+                satisfaction_rating=visit or None
+            ))
+    db.session.commit()
+    for name in ('visitor_analytics', 'operational_metrics', 'attraction_analytics'):
+        refresh_rollups(name, settle_seconds=0)
+
+
+def rounded(value):
+    """`value` with floats rounded, as sums over tiers add in another order"""
+    if isinstance(value, float):
+        return round(value, 9)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+def answer(client, path):
+    """Response data without the plan, and the tier it was read from"""
+    response = client.get(path)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    if isinstance(data, dict):
+        data.pop('query_plan')
+    return rounded(data), response.headers['X-Query-Tier']
+
+
+def compare(app, client, path, tier):
+    use_planner(app, 10 ** 9)
+    raw, raw_tier = answer(client, path)
+    use_planner(app, 0)
+    rolled, rolled_tier = answer(client, path)
+
+    assert rolled_tier == tier and raw_tier != tier
+    assert rolled == raw
+
+
+@pytest.mark.parametrize('granularity,tier', [('day', 'day'), ('week', 'day'), ('month', 'month')])
+def test_operational_tiers_answer_like_the_hourly_rows(app, client, granularity, tier):
+    fill()
+
+    compare(app, client, f'/api/v1/analytics/operational-metrics?{RANGE}&granularity={granularity}', tier)
+
+
+@pytest.mark.parametrize('granularity,tier', [('hour', 'hour'), ('day', 'day'), ('month', 'month')])
+def test_visitor_tiers_answer_like_the_visit_rows(app, client, granularity, tier):
+    fill()
+
+    compare(app, client, f'/api/v1/analytics/visitor-stats?{RANGE}&granularity={granularity}', tier)
+
+
+def test_attraction_tiers_answer_like_the_hourly_rows(app, client):
+    fill()
+
+    compare(app, client, f'/api/v1/analytics/attractions?{RANGE}&granularity=month', 'month')
+    compare(app, client, f'/api/v1/analytics/attractions?{RANGE}&granularity=day&attraction_id=wheel', 'day')
+
+
+def test_rows_revised_after_a_refresh_are_read_from_the_hourly_rows(app, client):
+    fill()
+    revised = OperationalMetrics.query.filter_by(metric_date=FIRST + timedelta(days=40), metric_hour=12).one()
+    revised.total_visitors += 5000
+    db.session.commit()
+
+    use_planner(app, 0)
+    response = client.get(f'/api/v1/analytics/operational-metrics?{RANGE}&granularity=month')
+    data = response.get_json()['data']
+
+    assert data['query_plan']['dates_read_raw'] == 1
+    assert data['summary']['total_visitors'] == sum(m.total_visitors for m in OperationalMetrics.query)
+
+
+def test_response_shape_does_not_depend_on_the_data_volume(app, client):
+    fill()
+    use_planner(app, 0)
+
+    metrics = client.get(f'/api/v1/analytics/operational-metrics?{RANGE}').get_json()['data']
+    attractions = client.get(f'/api/v1/analytics/attractions?{RANGE}').get_json()['data']
+    visitors = client.get(f'/api/v1/analytics/visitor-stats?{RANGE}').get_json()['data']
+
+    assert metrics['granularity'] == 'hour' and len(metrics['hourly_data']) == DAYS * 12
+    assert 'time_series' not in metrics
+    assert [len(entry['daily_data']) for entry in attractions] == [DAYS * 12, DAYS * 12]
+    assert visitors['granularity'] == 'day' and len(visitors['time_series']) == DAYS
@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+import random
+from src.models.analytics import db, RollupState, VisitorAnalytics, VisitorSample, VisitorSampleStratum
+from src.services.sampling import SAMPLE_SOURCE, _sampled, rebuild_sample, sample_covers, start_sample_coverage
+
+FIRST = date(2026, 9, 7)  # A Monday
+
+
+def add_visits(day, count, seed=0):
+    rng = random.Random(seed)
+    for n in range(count):
+        db.session.add(VisitorAnalytics(
+            visit_date=day, entry_time=datetime(day.year, day.month, day.day, 9) + timedelta(seconds=n * 7),
+            user_id=f'user-{seed}-{n}', total_duration_minutes=rng.randrange(30, 600),
+            total_spending_cents=rng.randrange(0, 30000), satisfaction_rating=rng.choice((None, 2, 3, 4, 5))
+        ))
+    db.session.commit()
+
+
+def exact(start, end):
+    visits = VisitorAnalytics.query.filter(VisitorAnalytics.visit_date.between(start, end)).all()
+    return len(visits), sum(v.total_spending_cents for v in visits) / 100
+
+
+def test_hashing_picks_a_stable_share_of_visits():
+    keys = [f'visit-{n}' for n in range(20000)]
+    picked = [key for key in keys if _sampled(key, 0.05)]
+
+    assert 900 < len(picked) < 1100
+    assert picked == [key for key in keys if _sampled(key, 0.05)]
+
+
+def test_ingest_keeps_strata_with_a_census_of_the_first_visits(app):
+    app.config['VISITOR_SAMPLE_CENSUS_PER_DAY'] = 10
+    add_visits(FIRST, 6)
+    add_visits(FIRST, 600, seed=1)
+
+    stratum = VisitorSampleStratum.query.filter_by(visit_date=FIRST).one()
+    assert (stratum.visits, stratum.census) == (606, 10)
+    assert VisitorSample.query.filter_by(census=False).count() == stratum.sampled
+    assert 10 < stratum.sampled < 60
+
+
+def test_approximate_stats_bracket_the_exact_answer(app, client):
+    # An empty database is covered from the start
+    assert sample_covers(date(2000, 1, 1))
+    for n in range(3):
+        add_visits(FIRST + timedelta(days=n), 1500, seed=n)
+    last = FIRST + timedelta(days=2)
+    path = f'/api/v1/analytics/visitor-stats?start_date={FIRST}&end_date={last}&approx=true'
+
+    response = client.get(path)
+    data = response.get_json()['data']
+
+    visits, spending = exact(FIRST, last)
+    assert response.headers['X-Query-Tier'] == 'sample'
+    assert data['approximate']['visits'] == visits
+    assert data['approximate']['sampled_visits'] < visits / 5
+    assert data['summary']['total_visitors'] == visits
+    # Visit ids, and so the sample, differ per run: allow about four standard errors
+    lower, upper = data['summary']['confidence_intervals']['total_revenue']
+    assert 0 < upper - lower < spending / 5
+    assert abs(spending - (lower + upper) / 2) <= upper - lower
+    assert [period['visitors'] for period in data['time_series']] == [1500, 1500, 1500]
+
+
+def test_quiet_days_are_exact(app, client):
+    add_visits(FIRST, 8)
+
+    data = client.get(f'/api/v1/analytics/visitor-stats?start_date={FIRST}&end_date={FIRST}&approx=true').get_json()['data']
+
+    _, spending = exact(FIRST, FIRST)
+    assert data['summary']['total_revenue'] == spending
+    assert data['summary']['confidence_intervals']['total_revenue'] == [spending, spending]
+
+
+def test_coverage_starts_after_the_visits_stored_before_the_sample(app, client):
+    add_visits(FIRST, 50)
+    RollupState.query.filter_by(source=SAMPLE_SOURCE).delete()
+    VisitorSampleStratum.query.delete()
+    VisitorSample.query.delete()
+    db.session.commit()
+
+    start_sample_coverage()
+
+    assert RollupState.query.filter_by(source=SAMPLE_SOURCE).one().covered_from == FIRST + timedelta(days=1)
+    data = client.get(f'/api/v1/analytics/visitor-stats?start_date={FIRST}&end_date={FIRST}&approx=true').get_json()['data']
+    assert data['approximate'] is False
+    assert data['approximate_reason'] == f'the visitor sample covers visits from {FIRST + timedelta(days=1)} on'
+    assert data['summary']['total_visitors'] == 50
+
+    # A rebuild that stops short of the covered dates would leave a gap
+    assert rebuild_sample(FIRST - timedelta(days=30), FIRST - timedelta(days=20)) == 0
+    assert not sample_covers(FIRST)
+    assert rebuild_sample(FIRST, FIRST) == 50
+    assert sample_covers(FIRST)
+    data = client.get(f'/api/v1/analytics/visitor-stats?start_date={FIRST}&end_date={FIRST}&approx=true').get_json()['data']
+    assert data['approximate']['visits'] == 50
+
+
+def test_hourly_series_say_why_they_are_exact(app, client):
+    add_visits(FIRST, 20)
+
+    path = f'/api/v1/analytics/visitor-stats?start_date={FIRST}&end_date={FIRST}&granularity=hour&approx=true'
+    data = client.get(path).get_json()['data']
+
+    assert data['approximate'] is False
+    assert data['approximate_reason'] == 'hourly periods are answered exactly'
+    assert 'approximate' not in client.get(path.replace('&approx=true', '')).get_json()['data']
+
+
+def test_weekly_summary_counts_visits_from_the_strata(app, client):
+    for n in range(14):
+        add_visits(FIRST + timedelta(days=n), 40 + n, seed=n)
+    end = FIRST + timedelta(days=13)
+
+    approximate = client.get(f'/api/v1/reports/weekly-summary?end_date={end}&approx=true').get_json()['data']
+    exact_summary = client.get(f'/api/v1/reports/weekly-summary?end_date={end}').get_json()['data']
+
+    assert approximate['approximate']['visits'] == sum(40 + n for n in range(7, 14))
+    assert approximate['summary']['total_visitors'] == exact_summary['summary']['total_visitors']
+    assert 'approximate' not in exact_summary
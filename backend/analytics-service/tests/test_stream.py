@@ -0,0 +1,82 @@
+import json
+import threading
+from src.models.analytics import db, StreamEventRecord
+from src.services.stream import EventBroker, parse_last_event_id
+
+
+def event_ids(chunks):
+    return [int(line[4:]) for chunk in chunks for line in chunk.splitlines() if line.startswith('id: ')]
+
+
+def test_publish_reaches_a_broker_of_another_process(app):
+    publisher = EventBroker(db.engine)
+    subscriber = EventBroker(db.engine)
+
+    published = publisher.publish('live-update', {'value': 1})
+
+    assert subscriber.poll()[0].id == published.id
+    stream = subscriber.subscribe()
+    assert next(stream).startswith('retry:')
+    assert json.loads(next(stream).split('data: ')[1]) == {'value': 1}
+
+
+def test_poller_wakes_waiting_subscribers(app):
+    publisher = EventBroker(db.engine)
+    subscriber = EventBroker(db.engine, poll_interval=0.05)
+    stream = subscriber.subscribe(heartbeat_seconds=5)
+    next(stream)
+
+    received = []
+    reader = threading.Thread(target=lambda: received.append(next(stream)))
+    reader.start()
+    publisher.publish('live-update', {'value': 2})
+    reader.join(timeout=5)
+
+    assert received and '"value":2' in received[0]
+    stream.close()
+
+
+def test_last_event_id_replays_missed_events(app):
+    broker = EventBroker(db.engine)
+    first, second, third = (broker.publish('live-update', {'value': n}) for n in range(3))
+
+    stream = EventBroker(db.engine).subscribe(last_event_id=first.id, heartbeat_seconds=0.01)
+    chunks = [next(stream) for _ in range(3)]
+
+    assert event_ids(chunks) == [second.id, third.id]
+
+
+def test_unknown_last_event_id_starts_from_the_latest_snapshot(app):
+    broker = EventBroker(db.engine)
+    broker.publish('live-update', {'value': 1})
+    latest = broker.publish('live-update', {'value': 2})
+
+    stream = broker.subscribe(last_event_id=latest.id + 100, heartbeat_seconds=0.01)
+    chunks = [next(stream) for _ in range(3)]
+
+    assert event_ids(chunks) == [latest.id]
+    assert chunks[2].startswith(': heartbeat')
+
+
+def test_history_is_bounded(app):
+    broker = EventBroker(db.engine, history_size=3)
+    for n in range(5):
+        broker.publish('live-update', {'value': n})
+
+    assert StreamEventRecord.query.count() == 3
+
+
+def test_update_real_time_publishes_a_live_update(client):
+    response = client.post('/api/v1/dashboard/update-real-time', json={'current_visitors': 42})
+
+    assert response.status_code == 200
+    record = StreamEventRecord.query.one()
+    assert record.event == 'live-update'
+    assert json.loads(record.data)['real_time']['current_visitors'] == 42
+
+
+def test_parse_last_event_id():
+    assert parse_last_event_id('7') == 7
+    assert parse_last_event_id('-1') is None
+    assert parse_last_event_id('abc') is None
+    assert parse_last_event_id(None) is None
@@ -204,7 +204,7 @@ CREATE TABLE analytics.visitor_analytics (
     exit_time TIMESTAMP WITH TIME ZONE,
     total_duration_minutes INTEGER,
     attractions_visited INTEGER DEFAULT 0,
-    total_spending DECIMAL(10,2) DEFAULT 0.00,
+    total_spending_cents BIGINT DEFAULT 0,
     queue_time_minutes INTEGER DEFAULT 0,
     satisfaction_rating INTEGER CHECK (satisfaction_rating >= 1 AND satisfaction_rating <= 5),
     feedback_comments TEXT,
@@ -218,14 +218,15 @@ CREATE TABLE analytics.operational_metrics (
     metric_date DATE NOT NULL,
     metric_hour INTEGER CHECK (metric_hour >= 0 AND metric_hour <= 23),
     total_visitors INTEGER DEFAULT 0,
-    total_revenue DECIMAL(12,2) DEFAULT 0.00,
+    total_revenue_cents BIGINT DEFAULT 0,
     average_wait_time INTEGER DEFAULT 0,
     peak_capacity_percentage DECIMAL(5,2) DEFAULT 0.00,
     staff_efficiency_score DECIMAL(5,2) DEFAULT 0.00,
     system_uptime_percentage DECIMAL(5,2) DEFAULT 100.00,
     error_count INTEGER DEFAULT 0,
     customer_satisfaction_avg DECIMAL(3,2) DEFAULT 0.00,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE analytics.real_time_stats (
@@ -288,6 +289,7 @@ CREATE INDEX idx_attractions_category ON access_control.attractions(category);
 CREATE INDEX idx_queue_attraction_id ON access_control.attraction_queue(attraction_id);
 CREATE INDEX idx_queue_user_id ON access_control.attraction_queue(user_id);
 CREATE INDEX idx_queue_status ON access_control.attraction_queue(status);
+CREATE INDEX idx_queue_served_at ON access_control.attraction_queue(served_at);
 
 CREATE INDEX idx_transactions_user_id ON payment_system.transactions(user_id);
 CREATE INDEX idx_transactions_status ON payment_system.transactions(status);
@@ -300,6 +302,7 @@ CREATE INDEX idx_visitor_analytics_date ON analytics.visitor_analytics(visit_dat
 CREATE INDEX idx_visitor_analytics_user_id ON analytics.visitor_analytics(user_id);
 
 CREATE INDEX idx_operational_metrics_date ON analytics.operational_metrics(metric_date);
+CREATE INDEX idx_operational_metrics_updated_at ON analytics.operational_metrics(updated_at);
 CREATE INDEX idx_real_time_stats_timestamp ON analytics.real_time_stats(timestamp);
 
 CREATE INDEX idx_audit_logs_user_id ON system_config.audit_logs(user_id);
@@ -319,6 +322,7 @@ CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON user_management.users FO
 CREATE TRIGGER update_tickets_updated_at BEFORE UPDATE ON access_control.tickets FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_attractions_updated_at BEFORE UPDATE ON access_control.attractions FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_payment_methods_updated_at BEFORE UPDATE ON payment_system.payment_methods FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_operational_metrics_updated_at BEFORE UPDATE ON analytics.operational_metrics FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_settings_updated_at BEFORE UPDATE ON system_config.application_settings FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 -- Insert default system settings
@@ -341,7 +345,7 @@ SELECT
     COUNT(DISTINCT user_id) as unique_visitors,
     COUNT(*) as total_visits,
     AVG(total_duration_minutes) as avg_visit_duration,
-    SUM(total_spending) as total_revenue,
+    SUM(total_spending_cents) / 100.0 as total_revenue,
     AVG(satisfaction_rating) as avg_satisfaction
 FROM analytics.visitor_analytics
 WHERE visit_date >= CURRENT_DATE - INTERVAL '30 days'
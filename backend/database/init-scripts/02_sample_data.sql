@@ -107,24 +107,24 @@ INSERT INTO access_control.attraction_queue (attraction_id, user_id, ticket_id,
 ('650e8400-e29b-41d4-a716-446655440005', '550e8400-e29b-41d4-a716-446655440009', '750e8400-e29b-41d4-a716-446655440005', 1, 12, 'WAITING');
 
 -- Insert sample visitor analytics
-INSERT INTO analytics.visitor_analytics (user_id, visit_date, entry_time, total_duration_minutes, attractions_visited, total_spending, satisfaction_rating, feedback_comments) VALUES
-('550e8400-e29b-41d4-a716-446655440005', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '4 hours', 240, 5, 105.49, 5, 'Amazing experience! The QR system made everything so smooth.'),
-('550e8400-e29b-41d4-a716-446655440006', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '3 hours', 180, 3, 114.99, 4, 'Great day at the park. Loved the new mobile payment system.'),
-('550e8400-e29b-41d4-a716-446655440007', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '5 hours', 300, 6, 168.74, 5, 'Multi-day pass is excellent value. Very convenient QR entry.'),
-('550e8400-e29b-41d4-a716-446655440008', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '6 hours', 360, 8, 199.99, 5, 'VIP experience was worth every penny. No waiting in lines!'),
-('550e8400-e29b-41d4-a716-446655440009', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '2 hours', 120, 2, 89.99, 4, 'Good experience overall. The app could use some improvements.');
+INSERT INTO analytics.visitor_analytics (user_id, visit_date, entry_time, total_duration_minutes, attractions_visited, total_spending_cents, satisfaction_rating, feedback_comments) VALUES
+('550e8400-e29b-41d4-a716-446655440005', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '4 hours', 240, 5, 10549, 5, 'Amazing experience! The QR system made everything so smooth.'),
+('550e8400-e29b-41d4-a716-446655440006', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '3 hours', 180, 3, 11499, 4, 'Great day at the park. Loved the new mobile payment system.'),
+('550e8400-e29b-41d4-a716-446655440007', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '5 hours', 300, 6, 16874, 5, 'Multi-day pass is excellent value. Very convenient QR entry.'),
+('550e8400-e29b-41d4-a716-446655440008', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '6 hours', 360, 8, 19999, 5, 'VIP experience was worth every penny. No waiting in lines!'),
+('550e8400-e29b-41d4-a716-446655440009', CURRENT_DATE, CURRENT_TIMESTAMP - INTERVAL '2 hours', 120, 2, 8999, 4, 'Good experience overall. The app could use some improvements.');
 
 -- Insert sample operational metrics
-INSERT INTO analytics.operational_metrics (metric_date, metric_hour, total_visitors, total_revenue, average_wait_time, peak_capacity_percentage, customer_satisfaction_avg) VALUES
-(CURRENT_DATE, 9, 150, 13499.25, 8, 45.5, 4.2),
-(CURRENT_DATE, 10, 280, 25199.50, 12, 67.8, 4.3),
-(CURRENT_DATE, 11, 420, 37899.75, 15, 85.2, 4.1),
-(CURRENT_DATE, 12, 580, 52199.00, 18, 92.5, 4.0),
-(CURRENT_DATE, 13, 650, 58499.25, 22, 98.7, 3.9),
-(CURRENT_DATE, 14, 720, 64799.50, 25, 95.3, 4.1),
-(CURRENT_DATE, 15, 680, 61199.75, 20, 89.6, 4.2),
-(CURRENT_DATE, 16, 590, 53099.00, 16, 78.4, 4.4),
-(CURRENT_DATE, 17, 450, 40499.25, 12, 65.7, 4.5);
+INSERT INTO analytics.operational_metrics (metric_date, metric_hour, total_visitors, total_revenue_cents, average_wait_time, peak_capacity_percentage, customer_satisfaction_avg) VALUES
+(CURRENT_DATE, 9, 150, 1349925, 8, 45.5, 4.2),
+(CURRENT_DATE, 10, 280, 2519950, 12, 67.8, 4.3),
+(CURRENT_DATE, 11, 420, 3789975, 15, 85.2, 4.1),
+(CURRENT_DATE, 12, 580, 5219900, 18, 92.5, 4.0),
+(CURRENT_DATE, 13, 650, 5849925, 22, 98.7, 3.9),
+(CURRENT_DATE, 14, 720, 6479950, 25, 95.3, 4.1),
+(CURRENT_DATE, 15, 680, 6119975, 20, 89.6, 4.2),
+(CURRENT_DATE, 16, 590, 5309900, 16, 78.4, 4.4),
+(CURRENT_DATE, 17, 450, 4049925, 12, 65.7, 4.5);
 
 -- Insert sample real-time stats
 INSERT INTO analytics.real_time_stats (current_visitors, active_queues, average_queue_time, system_load_percentage, payment_success_rate, api_response_time_ms, concurrent_users) VALUES